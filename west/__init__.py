@@ -5,6 +5,9 @@ import configuration
 import data_management
 import data_manipulation
 import data_map
+import data_map_channel_bitmask
+import data_map_parallel
+import data_map_tiled
 #import data_map_signal_strength
 import device
 import helpers
@@ -25,3 +28,4 @@ import region
 import region_united_states
 import ruleset
 import ruleset_fcc2012
+import whitespace_server
@@ -4,6 +4,8 @@ from custom_logging import getModuleLogger
 from shapely.geometry import Point, shape
 import shapely
 import fiona
+import numpy
+from matplotlib.path import Path
 import configuration
 
 class Boundary(object):
@@ -13,6 +15,10 @@ class Boundary(object):
     """
     __metaclass__ = ABCMeta
 
+    # Points which are closer than this to an edge are tested with shapely
+    # by :meth:`locations_inside_boundary`
+    _edge_tolerance_degrees = 1e-6
+
     def __init__(self):
         self.log = getModuleLogger(self)
 
@@ -38,6 +44,75 @@ class Boundary(object):
 
         return self.point_inside_boundary(Point( (location[1], location[0]) ))
 
+    def locations_inside_boundary(self, latitudes, longitudes):
+        """
+        Vectorized version of :meth:`location_inside_boundary`. The
+        latitudes and longitudes may be any arrays which broadcast against
+        each other (e.g. a column of latitudes and a row of longitudes).
+
+        Points which are within :attr:`_edge_tolerance_degrees` of an edge
+        (e.g. on a straight border which is aligned with a grid) are tested
+        with shapely so that the results are identical to those of
+        :meth:`location_inside_boundary`.
+
+        :param latitudes: latitudes in decimal degrees
+        :type latitudes: :class:`numpy.ndarray`
+        :param longitudes: longitudes in decimal degrees
+        :type longitudes: :class:`numpy.ndarray`
+        :return: True where the location is inside the boundary and False \
+                otherwise
+        :rtype: :class:`numpy.ndarray` of bools
+        """
+        (latitudes, longitudes) = numpy.broadcast_arrays(latitudes,
+                                                         longitudes)
+        points = numpy.column_stack((longitudes.ravel(), latitudes.ravel()))
+        is_inside = numpy.zeros(len(points), dtype=bool)
+
+        for polygon in self._get_constituent_polygons():
+            (min_lon, min_lat, max_lon, max_lat) = polygon.bounds
+            candidates = numpy.flatnonzero(
+                numpy.logical_not(is_inside) &
+                (min_lon <= points[:, 0]) & (points[:, 0] <= max_lon) &
+                (min_lat <= points[:, 1]) & (points[:, 1] <= max_lat))
+            if len(candidates) == 0:
+                continue
+
+            # The paths are grown and shrunk by the tolerance (the sign of
+            # the radius which grows a path depends on its orientation);
+            # points whose results differ are near an edge
+            in_polygon = numpy.ones(len(candidates), dtype=bool)
+            is_near_edge = numpy.zeros(len(candidates), dtype=bool)
+            for (ring, is_hole) in [(polygon.exterior, False)] + \
+                    [(interior, True) for interior in polygon.interiors]:
+                path = Path(numpy.asarray(ring.coords))
+                (in_grown_ring, in_shrunk_ring) = [
+                    path.contains_points(points[candidates], radius=radius)
+                    for radius in [self._edge_tolerance_degrees,
+                                   -self._edge_tolerance_degrees]]
+                is_near_edge |= in_grown_ring != in_shrunk_ring
+                in_polygon &= in_grown_ring != is_hole
+            for index in numpy.flatnonzero(is_near_edge):
+                in_polygon[index] = Point(points[candidates[index]]).within(
+                    polygon)
+            is_inside[candidates[in_polygon]] = True
+
+        return is_inside.reshape(latitudes.shape)
+
+    def _get_constituent_polygons(self):
+        """
+        :return: the individual polygons which make up the boundary (i.e. \
+                with multi-part polygons split into their parts)
+        :rtype: list of :class:`shapely.geometry.Polygon` objects
+        """
+        polygons = []
+        for geometry in self._geometries:
+            if isinstance(geometry, shapely.geometry.polygon.Polygon):
+                polygons.append(geometry)
+            elif isinstance(geometry, shapely.geometry.multipolygon.MultiPolygon):
+                for poly in geometry:
+                    polygons.append(poly)
+        return polygons
+
     def point_inside_boundary(self, point):
         """
         Tests whether or not the point is included in this boundary.
@@ -107,16 +182,8 @@ class BoundaryShapefile(Boundary):
         self._geometries = self._filter_geometries(geometries_and_properties)
 
     def get_sets_of_exterior_coordinates(self):
-        polygons = []
-        for geometry in self._geometries:
-            if isinstance(geometry, shapely.geometry.polygon.Polygon):
-                polygons.append(geometry)
-            elif isinstance(geometry, shapely.geometry.multipolygon.MultiPolygon):
-                for poly in geometry:
-                    polygons.append(poly)
-
         sets_of_coordinates = []
-        for polygon in polygons:
+        for polygon in self._get_constituent_polygons():
             e = polygon.exterior
             (lons, lats) = e.coords.xy
             sets_of_coordinates.append((lats, lons))
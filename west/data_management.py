@@ -4,11 +4,14 @@ from device import Device
 from propagation_model import PropagationModel
 from region import Region
 from boundary import Boundary
-from data_map import DataMap2D, DataMap3D, DataMap2DWithFixedBoundingBox
+from data_map import DataMap2D, DataMap3D, DataMap2DWithFixedBoundingBox, \
+    AGGREGATION_METHODS, load_memmap, _get_block_shape
+from data_map_channel_bitmask import DataMap2DChannelBitmask
 from population import PopulationData
 from custom_logging import getModuleLogger
 import os
 import textwrap
+import numpy
 
 from configuration import base_data_directory
 
@@ -80,9 +83,23 @@ class Specification(object):
        * Implement :meth:`get_map` if possible.
        * Filenames should not exceed 255 characters in order to be compatible
          with common file systems.
+       * Use :meth:`_store_dtype` to let the user choose the data type of the
+         data and :meth:`_get_dtype_strings` to include it in
+         :meth:`to_string`.
+
+    Data is stored as a pickle by default. If :attr:`data_format` is set to
+    "memmap", data is instead stored in the format of
+    :meth:`data_map.DataMap2D.to_memmap` and loaded with
+    :func:`data_map.load_memmap` (in copy-on-write mode), which
+    avoids reading the whole file when only part of the data is needed.
     """
     __metaclass__ = ABCMeta
 
+    #: Format used to save and load data: "pickle" or "memmap"
+    data_format = "pickle"
+
+    _data_file_extensions = {"pickle": ".pkl", "memmap": ".dat"}
+
     @abstractmethod
     def to_string(self):
         """Returns the string representation of the Specification."""
@@ -180,6 +197,34 @@ class Specification(object):
         obj_class = getattr(self, var_name + "_class")
         setattr(self, var_name + "_object", obj_class(**kwargs))
 
+    def _store_dtype(self, dtype, default_dtype):
+        """Stores the data type of the data described by this Specification
+        (``default_dtype`` is used if ``dtype`` is None)."""
+        if dtype is None:
+            dtype = default_dtype
+        self.dtype = numpy.dtype(dtype)
+        self.default_dtype = numpy.dtype(default_dtype)
+
+    def _get_dtype_strings(self):
+        """Returns a list containing the string representation of the data
+        type if it differs from the default (and an empty list otherwise) so
+        that filenames of data with the default data type do not change."""
+        if self.dtype == self.default_dtype:
+            return []
+        return ["dtype=%s" % self.dtype.name]
+
+    def _convert_dtype(self, datamap):
+        """Returns ``datamap`` (a :class:`data_map.DataMap2D` or
+        :class:`data_map.DataMap3D`) if its data type matches :attr:`dtype`;
+        otherwise, returns a copy with the correct data type."""
+        if isinstance(datamap, DataMap3D):
+            values = datamap.mutable_array
+        else:
+            values = datamap.mutable_matrix
+        if values.dtype == self.dtype:
+            return datamap
+        return datamap.astype(self.dtype)
+
     def _expect_of_type(self, obj, expected_types):
         """Raise a TypeError if ``obj`` is neither a subclass nor an instance of
         one of the expected types.
@@ -222,7 +267,12 @@ class Specification(object):
     @property
     def filename(self):
         """Returns a string which is the full path to the file."""
-        return os.path.join(self.full_directory, self.to_string() + ".pkl")
+        if self.data_format not in self._data_file_extensions:
+            raise ValueError("Unknown data format '%s' (expected one of %s)"
+                             % (self.data_format,
+                                str(self._data_file_extensions.keys())))
+        return os.path.join(self.full_directory, self.to_string() +
+                            self._data_file_extensions[self.data_format])
 
     @property
     def full_directory(self):
@@ -237,20 +287,41 @@ class Specification(object):
 
     def load_data(self):
         """Loads the :class:`data_map.DataMap2D` or :class:`data_map.DataMap3D`
-        from a pickle. The filename is determined by :meth:`filename`."""
-        if self._get_datamap_spec().is_datamap2d():
-            return DataMap2D.from_pickle(self.filename)
+        from a pickle (or a memory-mapped file; see :attr:`data_format`).
+        The filename is determined by :meth:`filename`.
+
+        The kind of map is determined by the file rather than by the
+        Specification: memory-mapped files record it in their header (see
+        :func:`data_map.load_memmap`) and pickles record the class of the
+        object. The values are converted to the data type of the
+        Specification (see :meth:`_convert_loaded_data`)."""
+        if self.data_format == "memmap":
+            datamap = load_memmap(self.filename, mode="c")
         else:
-            return DataMap3D.from_pickle(self.filename)
+            datamap = DataMap2D.from_pickle(self.filename)
+        return self._convert_loaded_data(datamap)
+
+    def _convert_loaded_data(self, datamap):
+        """Converts data loaded by :meth:`load_data` to :attr:`dtype` (if
+        the Specification has one). Data saved before the data type was
+        part of the Specification (e.g. float region and whitespace maps,
+        whose filenames have not changed) is thereby loaded with the
+        current data type."""
+        if not hasattr(self, "dtype"):
+            return datamap
+        return self._convert_dtype(datamap)
 
     def save_data(self, datamap):
         """Save the :class:`data_map.DataMap2D` or :class:`data_map.DataMap3D`
-        to a pickle. The filename is determined
-        by :meth:`filename`."""
+        to a pickle (or a memory-mapped file; see :attr:`data_format`). The
+        filename is determined by :meth:`filename`."""
         self._expect_of_type(datamap, [DataMap2D, DataMap3D])
         if not os.path.isdir(self.full_directory):
             os.makedirs(self.full_directory)
-        datamap.to_pickle(self.filename)
+        if self.data_format == "memmap":
+            datamap.to_memmap(self.filename)
+        else:
+            datamap.to_pickle(self.filename)
 
     def fetch_data(self):
         """Fetch the data described by this Specification. If none exists, the
@@ -287,9 +358,11 @@ class SpecificationDataMap(Specification):
     Unlike other classes, it will *always* create a new DataMap2D/DataMap3D when
     "making" or fetching data. Data will
     never be saved.
+
+    The values of the data map have type ``dtype`` (float by default).
     """
     def __init__(self, datamap_derived_class, num_latitude_divisions,
-                 num_longitude_divisions):
+                 num_longitude_divisions, dtype=None):
         self._expect_of_type(datamap_derived_class,
                              DataMap2DWithFixedBoundingBox)
         self._expect_of_type(num_latitude_divisions, int)
@@ -298,15 +371,18 @@ class SpecificationDataMap(Specification):
         self._store_at_least_class("datamap", datamap_derived_class)
         self.num_latitude_divisions = num_latitude_divisions
         self.num_longitude_divisions = num_longitude_divisions
+        self._store_dtype(dtype, float)
 
     def to_string(self):
-        return "%s_%dx%d" % (_make_string(self.datamap_class),
-                             self.num_latitude_divisions,
-                             self.num_longitude_divisions)
+        return "_".join(["%s_%dx%d" % (_make_string(self.datamap_class),
+                                       self.num_latitude_divisions,
+                                       self.num_longitude_divisions)] +
+                        self._get_dtype_strings())
 
     def make_data(self):
         return self.datamap_class.create(self.num_latitude_divisions,
-                                         self.num_longitude_divisions)
+                                         self.num_longitude_divisions,
+                                         dtype=self.dtype)
 
     @property
     def subdirectory(self):
@@ -334,8 +410,10 @@ class SpecificationRegionMap(Specification):
     This Specification describes a :class:`data_map.DataMap2D` which contains
     boolean data. Values will be True (or truthy) if and only if the pixel's
     center is inside the :class:`boundary.Boundary`.
+
+    The values have type ``dtype`` (bool by default).
     """
-    def __init__(self, boundary, datamap_spec):
+    def __init__(self, boundary, datamap_spec, dtype=None):
         self._expect_of_type(boundary, Boundary)
         self._expect_of_type(datamap_spec, SpecificationDataMap)
         if not datamap_spec.is_datamap2d():
@@ -343,26 +421,28 @@ class SpecificationRegionMap(Specification):
 
         self._store_at_least_class("boundary", boundary)
         self.datamap_spec = datamap_spec
+        self._store_dtype(dtype, bool)
 
     def make_data(self):
         self._create_obj_if_needed("boundary")
         boundary = self.boundary_object
 
-        datamap = self.datamap_spec.fetch_data()
+        datamap = self._convert_dtype(self.datamap_spec.fetch_data())
 
-        def is_in_region(latitude, longitude, latitude_index,
-                         longitude_index, current_value):
-            location = (latitude, longitude)
-            return boundary.location_inside_boundary(location)
+        def is_in_region(latitudes, longitudes, latitude_indices,
+                         longitude_indices, current_values):
+            return boundary.locations_inside_boundary(latitudes, longitudes)
 
-        datamap.update_all_values_via_function(update_function=is_in_region)
+        datamap.update_all_values_via_vectorized_function(
+            update_function=is_in_region)
         self.save_data(datamap)
 
         return datamap
 
     def to_string(self):
         return " ".join(["REGION_MAP", _make_string(self.boundary_class),
-                         self.datamap_spec.to_string()])
+                         self.datamap_spec.to_string()] +
+                        self._get_dtype_strings())
 
     @property
     def subdirectory(self):
@@ -388,7 +468,13 @@ class SpecificationWhitespaceMap(Specification):
     accordance with the :class:`ruleset.Ruleset`.
 
     The resulting DataMap3D has layers described by
-    :meth:`region.Region.get_tvws_channel_list()`.
+    :meth:`region.Region.get_tvws_channel_list()`. The values have type
+    ``dtype`` (bool by default).
+
+    If ``use_tv_margin_maps`` is True, the TV exclusions are derived from
+    the TV margin maps (see :class:`SpecificationTVMarginMap`), which are
+    computed once and shared by all devices; this makes it cheap to compute
+    the whitespace for many device HAATs. The result is the same.
 
     .. note:: The naming conventions for this class assume that the default \
         :class:`protected_entities.ProtectedEntities` for the \
@@ -396,7 +482,7 @@ class SpecificationWhitespaceMap(Specification):
         protected  entities, create a new class derived from the desired Region.
     """
     def __init__(self, region_map_spec, region, ruleset, device_object,
-                 propagation_model=None):
+                 propagation_model=None, dtype=None, use_tv_margin_maps=False):
 
         # Type checking
         self._expect_of_type(region_map_spec, SpecificationRegionMap)
@@ -417,20 +503,32 @@ class SpecificationWhitespaceMap(Specification):
         self._expect_of_type(propagation_model, PropagationModel)
         self._store_at_least_class("propagation_model", propagation_model)
 
+        self._store_dtype(dtype, bool)
+        self.use_tv_margin_maps = use_tv_margin_maps
+
 
     def to_string(self):
-        return " ".join(["WHITESPACE_MAP",
-                         "(%s)" % self.region_map_spec.to_string(),
-                         _make_string(self.region_class),
-                         _make_string(self.ruleset_class),
-                         _make_string(self.propagation_model_class),
-                         _make_string(self.device_object)])
+        return " ".join(["WHITESPACE_MAP"] + self._get_parameter_strings())
+
+    def _get_parameter_strings(self):
+        return ["(%s)" % self.region_map_spec.to_string(),
+                _make_string(self.region_class),
+                _make_string(self.ruleset_class),
+                _make_string(self.propagation_model_class),
+                _make_string(self.device_object)] + self._get_dtype_strings()
 
     @property
     def subdirectory(self):
         return "WHITESPACE_MAP"
 
     def make_data(self):
+        whitespace_datamap3d = self._compute_whitespace_datamap3d()
+        self.save_data(whitespace_datamap3d)
+        return whitespace_datamap3d
+
+    def _compute_whitespace_datamap3d(self):
+        """Computes the whitespace :class:`data_map.DataMap3D` without saving
+        it."""
         self._create_obj_if_needed("region")
         self._create_obj_if_needed("propagation_model")
         self.ruleset_object.set_propagation_model(self.propagation_model_object)
@@ -438,15 +536,107 @@ class SpecificationWhitespaceMap(Specification):
         region_datamap = self.region_map_spec.fetch_data()
 
         channel_list = self.region_object.get_tvws_channel_list()
-        whitespace_datamap3d = DataMap3D.from_DataMap2D(region_datamap, channel_list)
-        for channel in channel_list:
-            channel_layer = whitespace_datamap3d.get_layer(channel)
-            self.ruleset_object.apply_all_protections_to_map(self.region_object, channel_layer, channel,
-                                                             self.device_object)
+        whitespace_datamap3d = DataMap3D.from_DataMap2D(region_datamap, channel_list,
+                                                        dtype=self.dtype)
+
+        tv_margin_datamap3ds = None
+        if self.use_tv_margin_maps:
+            tv_margin_datamap3ds = tuple(
+                self.get_tv_margin_map_spec(is_cochannel).fetch_data()
+                for is_cochannel in [True, False])
+        self.ruleset_object.apply_all_protections_to_datamap3d(
+            self.region_object, whitespace_datamap3d, self.device_object,
+            tv_margin_datamap3ds=tv_margin_datamap3ds)
 
-        self.save_data(whitespace_datamap3d)
         return whitespace_datamap3d
 
+    def update_data(self, changed_entities, update_tv_margin_maps=True):
+        """
+        Updates the saved whitespace map after some of the protected entities
+        of the region have been added, removed or modified (see
+        :meth:`ruleset_fcc2012.RulesetFcc2012.update_whitespace_datamap3d`)
+        rather than making it again. The region object given to this
+        Specification must contain the new set of protected entities. If no
+        data has been saved yet, it is made.
+
+        The saved TV margin maps (see ``use_tv_margin_maps``) are shared by
+        the whitespace maps of all devices. Unless ``update_tv_margin_maps``
+        is False, those which exist (in any data format) are updated as well
+        (see :meth:`SpecificationTVMarginMap.update_data`). When the
+        whitespace maps of several devices are updated after the same
+        change, this only needs to be done by the first of them.
+
+        :param changed_entities: the entities which were added, removed or \
+            modified (a modified entity should be listed as it was and as it \
+            is now)
+        :type changed_entities: list of \
+            :class:`protected_entity.ProtectedEntity` objects
+        :param update_tv_margin_maps: whether to update the saved TV margin \
+            maps
+        :type update_tv_margin_maps: bool
+        :return: the updated whitespace map
+        :rtype: :class:`data_map.DataMap3D`
+        """
+        if update_tv_margin_maps:
+            self._update_tv_margin_maps(changed_entities)
+        if not self.data_exists():
+            return self.make_data()
+
+        if self.data_format == "memmap":
+            # The file is updated in place
+            whitespace_datamap3d = DataMap3D.from_memmap(self.filename,
+                                                         mode="r+")
+        else:
+            whitespace_datamap3d = self.load_data()
+
+        self._update_whitespace_datamap3d(whitespace_datamap3d,
+                                          changed_entities)
+
+        if self.data_format == "memmap":
+            whitespace_datamap3d.mutable_array.flush()
+        else:
+            self.save_data(whitespace_datamap3d)
+        return whitespace_datamap3d
+
+    def _update_whitespace_datamap3d(self, whitespace_datamap3d,
+                                     changed_entities):
+        """Updates ``whitespace_datamap3d``; see :meth:`update_data`."""
+        self._create_obj_if_needed("region")
+        self._create_obj_if_needed("propagation_model")
+        self.ruleset_object.set_propagation_model(self.propagation_model_object)
+
+        region_datamap = self.region_map_spec.fetch_data()
+        self.ruleset_object.update_whitespace_datamap3d(
+            self.region_object, whitespace_datamap3d, region_datamap,
+            self.device_object, changed_entities)
+
+    def _update_tv_margin_maps(self, changed_entities):
+        """Updates the saved TV margin maps (in any data format); see
+        :meth:`update_data`."""
+        self._create_obj_if_needed("region")
+        self._create_obj_if_needed("propagation_model")
+        for data_format in sorted(self._data_file_extensions):
+            tv_margin_map_spec = self.get_tv_margin_map_spec(True)
+            tv_margin_map_spec.data_format = data_format
+            if tv_margin_map_spec.data_exists() or \
+                    tv_margin_map_spec.get_other_margin_map_spec()\
+                    .data_exists():
+                # Updates both maps
+                tv_margin_map_spec.update_data(changed_entities)
+
+    def get_tv_margin_map_spec(self, is_cochannel):
+        """Returns the :class:`SpecificationTVMarginMap` used when
+        ``use_tv_margin_maps`` is True."""
+        tv_margin_map_spec = SpecificationTVMarginMap(
+            self.region_map_spec,
+            getattr(self, "region_object", self.region_class),
+            getattr(self, "ruleset_object", self.ruleset_class),
+            is_cochannel,
+            getattr(self, "propagation_model_object",
+                    self.propagation_model_class))
+        tv_margin_map_spec.data_format = self.data_format
+        return tv_margin_map_spec
+
     def get_map(self):
         """Creates a linear-scale :class:`map.Map` with boundary outlines, a
         white background, and a colorbar. The title is automatically set
@@ -468,6 +658,260 @@ class SpecificationWhitespaceMap(Specification):
         return map
 
 
+class SpecificationWhitespaceBitmaskMap(SpecificationWhitespaceMap):
+    """
+    This Specification describes the same data as
+    :class:`SpecificationWhitespaceMap` but stores it as a
+    :class:`data_map_channel_bitmask.DataMap2DChannelBitmask`, which is much
+    smaller than the corresponding :class:`data_map.DataMap3D`. The channels
+    are given by :meth:`region.Region.get_tvws_channel_list()`.
+
+    If the whitespace DataMap3D has already been saved, it is converted;
+    otherwise, the whitespace is computed but only the bitmask is saved.
+    """
+    def to_string(self):
+        return " ".join(["WHITESPACE_BITMASK_MAP"] +
+                        self._get_parameter_strings())
+
+    @property
+    def subdirectory(self):
+        return "WHITESPACE_BITMASK_MAP"
+
+    def _convert_loaded_data(self, datamap):
+        # The bitmask always has its own data type; :attr:`dtype` is that of
+        # the corresponding whitespace map
+        return datamap
+
+    def get_whitespace_map_spec(self):
+        """Returns the :class:`SpecificationWhitespaceMap` which describes
+        the same data as a :class:`data_map.DataMap3D`."""
+        whitespace_map_spec = SpecificationWhitespaceMap(
+            self.region_map_spec,
+            getattr(self, "region_object", self.region_class),
+            getattr(self, "ruleset_object", self.ruleset_class),
+            self.device_object,
+            getattr(self, "propagation_model_object",
+                    self.propagation_model_class),
+            dtype=self.dtype, use_tv_margin_maps=self.use_tv_margin_maps)
+        whitespace_map_spec.data_format = self.data_format
+        return whitespace_map_spec
+
+    def update_data(self, changed_entities, update_tv_margin_maps=True):
+        """
+        Updates the saved bitmask after some of the protected entities of the
+        region have been added, removed or modified; see
+        :meth:`SpecificationWhitespaceMap.update_data`. If the whitespace
+        :class:`data_map.DataMap3D` has been saved as well, it is updated
+        and the bitmask is converted from it; otherwise, the bitmask is
+        expanded into a DataMap3D, updated and converted back.
+
+        :param changed_entities: the entities which were added, removed or \
+            modified
+        :type changed_entities: list of \
+            :class:`protected_entity.ProtectedEntity` objects
+        :param update_tv_margin_maps: whether to update the saved TV margin \
+            maps
+        :type update_tv_margin_maps: bool
+        :return: the updated bitmask
+        :rtype: :class:`data_map_channel_bitmask.DataMap2DChannelBitmask`
+        """
+        if update_tv_margin_maps:
+            self._update_tv_margin_maps(changed_entities)
+        if not self.data_exists():
+            return self.make_data()
+
+        whitespace_map_spec = self.get_whitespace_map_spec()
+        if whitespace_map_spec.data_exists():
+            whitespace_datamap3d = whitespace_map_spec.update_data(
+                changed_entities, update_tv_margin_maps=False)
+        else:
+            whitespace_datamap3d = self.load_data().to_DataMap3D()
+            self._update_whitespace_datamap3d(whitespace_datamap3d,
+                                              changed_entities)
+
+        bitmask = DataMap2DChannelBitmask.from_DataMap3D(whitespace_datamap3d)
+        self.save_data(bitmask)
+        return bitmask
+
+    def make_data(self):
+        whitespace_map_spec = self.get_whitespace_map_spec()
+        if whitespace_map_spec.data_exists():
+            whitespace_datamap3d = whitespace_map_spec.load_data()
+        else:
+            whitespace_datamap3d = self._compute_whitespace_datamap3d()
+
+        bitmask = DataMap2DChannelBitmask.from_DataMap3D(whitespace_datamap3d)
+        self.save_data(bitmask)
+        return bitmask
+
+    def get_map(self):
+        """Creates a linear-scale :class:`map.Map` with boundary outlines, a
+        white background, and a colorbar. The title is automatically set
+        using the Specification information but can be reset with
+        :meth:`map.Map.set_title`. Returns a handle to the map object; does
+        not save or show the map."""
+        bitmask = self.fetch_data()
+        datamap2d = bitmask.count_channels()
+
+        region_map = self.region_map_spec.fetch_data()
+        self.region_map_spec._create_obj_if_needed("boundary")
+        boundary = self.region_map_spec.boundary_object
+
+        map = datamap2d.make_map(is_in_region_map=region_map)
+        map.add_boundary_outlines(boundary)
+        map.add_colorbar(decimal_precision=0)
+        map.set_colorbar_label("Number of available whitespace channels")
+        self._set_map_title(map)
+        return map
+
+
+class SpecificationTVMarginMap(Specification):
+    """
+    This Specification describes the cochannel or adjacent-channel TV margin
+    map (a :class:`data_map.DataMap3D` of distances in kilometers) created
+    by :meth:`ruleset_fcc2012.RulesetFcc2012.create_tv_margin_datamap3ds`.
+    The layers are described by :meth:`region.Region.get_tvws_channel_list()`.
+
+    The margin maps do not depend on the device. Both of them are saved when
+    either of them is made or updated.
+
+    The values have type ``dtype``, which must be a floating-point type
+    (float by default). Lower precisions such as float32 give the same
+    whitespace but may need more margins to be checked against the TV
+    stations (see
+    :meth:`ruleset_fcc2012.RulesetFcc2012.apply_all_protections_to_datamap3d`).
+    """
+    def __init__(self, region_map_spec, region, ruleset, is_cochannel,
+                 propagation_model=None, dtype=None):
+
+        # Type checking
+        self._expect_of_type(region_map_spec, SpecificationRegionMap)
+        self._expect_of_type(region, Region)
+        self._expect_of_type(ruleset, Ruleset)
+
+        # Store data
+        self.region_map_spec = region_map_spec
+        self._store_at_least_class("region", region)
+        self._store_at_least_class("ruleset", ruleset)
+        self.is_cochannel = is_cochannel
+
+        # Propagation model needs special handling
+        if propagation_model is None:
+            self._create_obj_if_needed("ruleset")
+            propagation_model = self.ruleset_object.get_default_propagation_model()
+        self._expect_of_type(propagation_model, PropagationModel)
+        self._store_at_least_class("propagation_model", propagation_model)
+
+        self._store_dtype(dtype, float)
+        if not numpy.issubdtype(self.dtype, numpy.floating):
+            raise TypeError("TV margins must have a floating-point type "
+                            "(got %s)" % self.dtype.name)
+
+    def to_string(self):
+        return " ".join(["TV_MARGIN_MAP",
+                         "COCHANNEL" if self.is_cochannel else
+                         "ADJACENT_CHANNEL",
+                         "(%s)" % self.region_map_spec.to_string(),
+                         _make_string(self.region_class),
+                         _make_string(self.ruleset_class),
+                         _make_string(self.propagation_model_class)] +
+                        self._get_dtype_strings())
+
+    @property
+    def subdirectory(self):
+        return "TV_MARGIN_MAP"
+
+    def make_data(self):
+        self._create_obj_if_needed("region")
+        self._create_obj_if_needed("ruleset")
+        self._create_obj_if_needed("propagation_model")
+        self.ruleset_object.set_propagation_model(self.propagation_model_object)
+
+        region_datamap = self.region_map_spec.fetch_data()
+        (cochannel_margins, adjacent_channel_margins) = \
+            self.ruleset_object.create_tv_margin_datamap3ds(
+                self.region_object, region_datamap,
+                self.region_object.get_tvws_channel_list())
+
+        other_spec = self.get_other_margin_map_spec()
+        if self.is_cochannel:
+            (margins, other_margins) = (cochannel_margins,
+                                        adjacent_channel_margins)
+        else:
+            (margins, other_margins) = (adjacent_channel_margins,
+                                        cochannel_margins)
+        margins = self._convert_dtype(margins)
+        other_margins = self._convert_dtype(other_margins)
+        self.save_data(margins)
+        other_spec.save_data(other_margins)
+        return margins
+
+    def update_data(self, changed_entities):
+        """
+        Updates both saved margin maps after some of the TV stations of the
+        region have been added, removed or modified (see
+        :meth:`ruleset_fcc2012.RulesetFcc2012.update_tv_margin_datamap3ds`)
+        rather than making them again. The region object given to this
+        Specification must contain the new set of protected entities. If
+        either map has not been saved yet, both are made.
+
+        :param changed_entities: the entities which were added, removed or \
+            modified (a modified entity should be listed as it was and as it \
+            is now)
+        :type changed_entities: list of \
+            :class:`protected_entity.ProtectedEntity` objects
+        :return: the updated margin map
+        :rtype: :class:`data_map.DataMap3D`
+        """
+        other_spec = self.get_other_margin_map_spec()
+        if not (self.data_exists() and other_spec.data_exists()):
+            return self.make_data()
+
+        self._create_obj_if_needed("region")
+        self._create_obj_if_needed("ruleset")
+        self._create_obj_if_needed("propagation_model")
+        self.ruleset_object.set_propagation_model(self.propagation_model_object)
+
+        specs = [self, other_spec]
+        if self.data_format == "memmap":
+            # The files are updated in place
+            margin_datamap3ds = [DataMap3D.from_memmap(spec.filename,
+                                                       mode="r+")
+                                 for spec in specs]
+        else:
+            margin_datamap3ds = [spec.load_data() for spec in specs]
+        if not self.is_cochannel:
+            margin_datamap3ds.reverse()
+
+        region_datamap = self.region_map_spec.fetch_data()
+        self.ruleset_object.update_tv_margin_datamap3ds(
+            self.region_object, tuple(margin_datamap3ds), region_datamap,
+            changed_entities)
+
+        if not self.is_cochannel:
+            margin_datamap3ds.reverse()
+        for (spec, margin_datamap3d) in zip(specs, margin_datamap3ds):
+            if self.data_format == "memmap":
+                margin_datamap3d.mutable_array.flush()
+            else:
+                spec.save_data(margin_datamap3d)
+        return margin_datamap3ds[0]
+
+    def get_other_margin_map_spec(self):
+        """Returns the Specification of the other margin map (the
+        adjacent-channel one if this is the cochannel one and vice versa)."""
+        other_spec = SpecificationTVMarginMap(
+            self.region_map_spec,
+            getattr(self, "region_object", self.region_class),
+            getattr(self, "ruleset_object", self.ruleset_class),
+            not self.is_cochannel,
+            getattr(self, "propagation_model_object",
+                    self.propagation_model_class),
+            dtype=self.dtype)
+        other_spec.data_format = self.data_format
+        return other_spec
+
+
 class SpecificationRegionAreaMap(Specification):
     """
     This Specification describes a :class:`data_map.DataMap2D` where the value
@@ -475,29 +919,32 @@ class SpecificationRegionAreaMap(Specification):
 
     This data may be useful e.g. to create a CDF by area using
     :meth:`data_manipulation.calculate_cdf_from_datamap2d`.
+
+    The values have type ``dtype`` (float by default).
     """
-    def __init__(self, datamap_spec):
+    def __init__(self, datamap_spec, dtype=None):
         self._expect_of_type(datamap_spec, SpecificationDataMap)
         self._expect_is_object(datamap_spec)
         self.datamap_spec = datamap_spec
+        self._store_dtype(dtype, float)
 
     @property
     def subdirectory(self):
         return "REGION_AREA"
 
     def to_string(self):
-        return " ".join(["REGION_AREA", "(%s)" % self.datamap_spec.to_string()])
+        return " ".join(["REGION_AREA", "(%s)" % self.datamap_spec.to_string()]
+                        + self._get_dtype_strings())
 
     def make_data(self):
         from geopy.distance import vincenty
 
-        datamap = self.datamap_spec.fetch_data()
+        datamap = self._convert_dtype(self.datamap_spec.fetch_data())
 
         latitude_width = float(datamap.latitudes[1] - datamap.latitudes[0])
         longitude_width = float(datamap.longitudes[1] - datamap.longitudes[0])
 
-        def create_pixel_area(latitude, longitude, latitude_index,
-                              longitude_index, current_value):
+        def create_pixel_area(latitude):
             # Calculate its area by pinpointing each corner of the trapezoid
             # it represents.
             # Assume that it extends lat_div_size/2 east-west.
@@ -506,9 +953,10 @@ class SpecificationRegionAreaMap(Specification):
             NE_lat = latitude - latitude_width/2
             SE_lat = NE_lat
 
-            # Assume that it extends long_div_size/2 north-south.
-            NW_lon = longitude + longitude_width/2
-            SW_lon = longitude - longitude_width/2
+            # Assume that it extends long_div_size/2 north-south. The area
+            # does not depend on the longitude so any longitude may be used.
+            NW_lon = longitude_width/2
+            SW_lon = -longitude_width/2
             NE_lon = NW_lon
             SE_lon = SW_lon
 
@@ -518,8 +966,15 @@ class SpecificationRegionAreaMap(Specification):
 
             return 0.5*height*(top+bottom)
 
-        datamap.update_all_values_via_function(
-            update_function=create_pixel_area)
+        def create_pixel_areas(latitudes, longitudes, latitude_indices,
+                               longitude_indices, current_values):
+            # Every pixel in a row has the same area, so only one area per
+            # latitude is computed and then broadcast across the row.
+            return numpy.array([[create_pixel_area(float(latitude))]
+                                for latitude in latitudes.ravel()])
+
+        datamap.update_all_values_via_vectorized_function(
+            update_function=create_pixel_areas)
         self.save_data(datamap)
         return datamap
 
@@ -544,14 +999,15 @@ class SpecificationPopulationMap(Specification):
     This data may be useful e.g. to create a CDF by population using
     :meth:`data_manipulation.calculate_cdf_from_datamap2d`.
 
-
+    The values have type ``dtype`` (float by default).
     """
-    def __init__(self, region_map_spec, population):
+    def __init__(self, region_map_spec, population, dtype=None):
         self._expect_of_type(region_map_spec, SpecificationRegionMap)
         self._expect_of_type(population, PopulationData)
 
         self.region_map_spec = region_map_spec
         self._store_at_least_class("population", population)
+        self._store_dtype(dtype, float)
 
     @property
     def subdirectory(self):
@@ -559,13 +1015,15 @@ class SpecificationPopulationMap(Specification):
 
     def to_string(self):
         return " ".join(["POPULATION", "(%s)" %
-                         self.region_map_spec.to_string()])
+                         self.region_map_spec.to_string()] +
+                        self._get_dtype_strings())
 
     def make_data(self):
         self._create_obj_if_needed("population")
         region_datamap = self.region_map_spec.fetch_data()
-        population_datamap = self.population_object.create_population_map(
-            is_in_region_datamap2d=region_datamap)
+        population_datamap = self._convert_dtype(
+            self.population_object.create_population_map(
+                is_in_region_datamap2d=region_datamap))
         self.save_data(population_datamap)
         return population_datamap
 
@@ -587,3 +1045,75 @@ class SpecificationPopulationMap(Specification):
         map.add_boundary_outlines(boundary)
         self._set_map_title(map)
         return map
+
+
+class SpecificationPyramidLevel(Specification):
+    """
+    This Specification describes a coarser version of the
+    :class:`data_map.DataMap2D` or :class:`data_map.DataMap3D` described by
+    ``base_spec`` which is obtained by aggregating blocks of pixels (see
+    :meth:`data_map.DataMap2D.aggregate_blocks`). For example, a 200x300
+    population map can be derived from the 800x1200 population map with
+    ``block_shape=4`` and ``method="sum"``.
+
+    The map need not be divisible into blocks: the last row and column of
+    blocks then aggregate the remaining pixels only (see the
+    ``partial_blocks`` option of :meth:`data_map.DataMap2D.aggregate_blocks`).
+
+    The data is stored next to the data of ``base_spec`` and is derived from
+    it when needed, so coarse levels do not require a new computation once
+    the fine map exists.
+
+    The values have type ``dtype`` (by default, float for "sum", "mean" and
+    "fraction" and the data type of the base map for "min" and "max").
+    """
+    def __init__(self, base_spec, block_shape, method="mean", dtype=None):
+        self._expect_of_type(base_spec, Specification)
+        self._expect_is_object(base_spec)
+        if isinstance(base_spec, (SpecificationDataMap,
+                                  SpecificationWhitespaceBitmaskMap)):
+            raise TypeError("The base spec must describe a DataMap2D or "
+                            "DataMap3D which is saved.")
+        if method not in AGGREGATION_METHODS:
+            raise ValueError("Unknown aggregation method '%s' (expected one "
+                             "of %s)" % (method, str(AGGREGATION_METHODS)))
+
+        self.base_spec = base_spec
+        self.block_shape = _get_block_shape(block_shape)
+        self.method = method
+        self.data_format = base_spec.data_format
+        if method in ("min", "max"):
+            self._store_dtype(dtype, base_spec.dtype)
+        else:
+            self._store_dtype(dtype, float)
+
+    def to_string(self):
+        return " ".join(["(%s)" % self.base_spec.to_string(),
+                         "PYRAMID_%dx%d_%s" % (self.block_shape +
+                                               (self.method,))] +
+                        self._get_dtype_strings())
+
+    @property
+    def subdirectory(self):
+        return self.base_spec.subdirectory
+
+    def make_data(self):
+        datamap = self._convert_dtype(
+            self.base_spec.fetch_data().aggregate_blocks(
+                self.block_shape, self.method, partial_blocks=True))
+        self.save_data(datamap)
+        return datamap
+
+    def get_map(self):
+        """Creates a linear-scale :class:`map.Map` with a colorbar (the layers
+        of a :class:`data_map.DataMap3D` are summed). The title is
+        automatically set using the Specification information but can be
+        reset with :meth:`map.Map.set_title`. Returns a handle to the map
+        object; does not save or show the map."""
+        datamap = self.fetch_data()
+        if isinstance(datamap, DataMap3D):
+            datamap = datamap.sum_all_layers()
+        map = datamap.make_map()
+        map.add_colorbar()
+        self._set_map_title(map)
+        return map
@@ -0,0 +1,587 @@
+import data_management
+from data_management import SpecificationDataMap, SpecificationRegionMap, \
+    SpecificationWhitespaceMap, SpecificationWhitespaceBitmaskMap, \
+    SpecificationTVMarginMap, SpecificationPyramidLevel
+from data_map import DataMap2D, DataMap3D, DataMap2DWithFixedBoundingBox, \
+    load_memmap
+from data_map_channel_bitmask import DataMap2DChannelBitmask
+from boundary import Boundary
+from ruleset_fcc2012 import RulesetFcc2012
+from ruleset_fcc2012_test_base import RegionUnitedStatesTest
+from protected_entities_tv_stations import ProtectedEntitiesTVStations
+from protected_entities_plmrs import ProtectedEntitiesPLMRS
+from protected_entity_tv_station import ProtectedEntityTVStation
+from protected_entity_plmrs import ProtectedEntityPLMRS
+from device import Device
+from shapely.geometry import Polygon
+import numpy
+import shutil
+import tempfile
+import unittest
+
+
+class DataMap2DTest(DataMap2DWithFixedBoundingBox):
+    """The grid used by the synthetic regions of
+    :mod:`ruleset_fcc2012_test_base`."""
+    latitude_bounds = [36, 39.5]
+    longitude_bounds = [-124.5, -119.5]
+    default_num_latitude_divisions = 21
+    default_num_longitude_divisions = 26
+
+
+class BoundaryTest(Boundary):
+    """A made-up boundary which covers the grid of :class:`DataMap2DTest`
+    except for its north-eastern corner."""
+    def __init__(self):
+        super(BoundaryTest, self).__init__()
+        self._geometries = [Polygon([(-125, 35), (-119, 35), (-119, 39.1),
+                                     (-120.3, 39.1), (-120.3, 40),
+                                     (-125, 40)])]
+
+    def boundary_filename(self):
+        return None
+
+    def add_to_kml(self, kml):
+        return []
+
+    def get_sets_of_exterior_coordinates(self):
+        (longitudes, latitudes) = self._geometries[0].exterior.xy
+        return [(list(latitudes), list(longitudes))]
+
+
+class BoundaryTestWithSharedBorder(BoundaryTest):
+    """A made-up boundary whose edges (including a border shared by its two
+    polygons, a hole and a diagonal) pass through pixel centers of
+    :class:`DataMap2DTest`."""
+    def __init__(self):
+        super(BoundaryTestWithSharedBorder, self).__init__()
+        self._geometries = [
+            Polygon([(-124, 36.35), (-122.5, 36.35), (-122.5, 38.8),
+                     (-124, 38.8)],
+                    [[(-123.7, 37.05), (-123.1, 37.05), (-123.1, 37.75),
+                      (-123.7, 37.75)]]),
+            Polygon([(-122.5, 36.35), (-120.5, 36.35), (-120.5, 37.4),
+                     (-121.3, 38.8), (-122.5, 38.8)])]
+
+
+class SpecificationTestCase(unittest.TestCase):
+    """Stores all data in a temporary directory."""
+    def setUp(self):
+        self.original_base_data_directory = \
+            data_management.base_data_directory
+        data_management.base_data_directory = tempfile.mkdtemp()
+
+        self.region = RegionUnitedStatesTest()
+        self.ruleset = RulesetFcc2012()
+        self.datamap_spec = SpecificationDataMap(DataMap2DTest, 21, 26)
+        self.region_map_spec = SpecificationRegionMap(BoundaryTest,
+                                                      self.datamap_spec)
+        self.fixed_device = Device(is_portable=False, haat_meters=30)
+        self.portable_device = Device(is_portable=True)
+
+    def tearDown(self):
+        shutil.rmtree(data_management.base_data_directory)
+        data_management.base_data_directory = \
+            self.original_base_data_directory
+
+    def _make_spec(self, spec_class, *args, **kwargs):
+        """Creates a Specification whose data is saved in the format given
+        by the keyword argument ``data_format`` (pickle by default)."""
+        data_format = kwargs.pop("data_format", "pickle")
+        spec = spec_class(*args, **kwargs)
+        spec.data_format = data_format
+        return spec
+
+    def _compute_whitespace(self, device):
+        is_whitespace = DataMap3D.from_DataMap2D(
+            self.region_map_spec.fetch_data(),
+            self.region.get_tvws_channel_list())
+        self.ruleset.apply_all_protections_to_datamap3d(self.region,
+                                                        is_whitespace, device)
+        return is_whitespace.mutable_array
+
+    def _disallow_making_tv_margin_maps(self, ruleset):
+        def create_tv_margin_datamap3ds(*args, **kwargs):
+            raise AssertionError("The TV margin maps should have been loaded")
+        ruleset.create_tv_margin_datamap3ds = create_tv_margin_datamap3ds
+
+
+class DataFormatTestCase(SpecificationTestCase):
+    def test_save_and_load_datamap2d(self):
+        for data_format in ["pickle", "memmap"]:
+            region_map_spec = self._make_spec(
+                SpecificationRegionMap, BoundaryTest, self.datamap_spec,
+                data_format=data_format)
+            region_map = region_map_spec.fetch_data()
+            self.assertTrue(region_map_spec.data_exists())
+            self.assertTrue(region_map_spec.filename.endswith(
+                {"pickle": ".pkl", "memmap": ".dat"}[data_format]))
+
+            reloaded_region_map = region_map_spec.fetch_data()
+            self.assertIsInstance(reloaded_region_map, DataMap2D)
+            self.assertTrue(region_map.datamap_is_comparable(
+                reloaded_region_map)[0])
+            self.assertTrue(numpy.array_equal(
+                reloaded_region_map.mutable_matrix, region_map.mutable_matrix))
+
+    def test_save_and_load_datamap3d(self):
+        for data_format in ["pickle", "memmap"]:
+            whitespace_spec = self._make_spec(
+                SpecificationWhitespaceMap, self.region_map_spec, self.region,
+                self.ruleset, self.fixed_device, data_format=data_format)
+            whitespace_datamap3d = whitespace_spec.fetch_data()
+            self.assertTrue(whitespace_spec.data_exists())
+
+            reloaded_datamap3d = whitespace_spec.fetch_data()
+            self.assertIsInstance(reloaded_datamap3d, DataMap3D)
+            self.assertEqual(reloaded_datamap3d.get_layer_descr_list(),
+                             self.region.get_tvws_channel_list())
+            self.assertTrue(numpy.array_equal(
+                reloaded_datamap3d.mutable_array,
+                whitespace_datamap3d.mutable_array))
+
+    def test_load_legacy_float_data(self):
+        # Region and whitespace maps used to be saved as floats under the
+        # same filenames
+        region_map = self.region_map_spec.make_data()
+        legacy_region_map = region_map.astype(float)
+        self.region_map_spec.save_data(legacy_region_map)
+        self.assertEqual(
+            DataMap2D.from_pickle(self.region_map_spec.filename)
+            .mutable_matrix.dtype, float)
+        reloaded_region_map = self.region_map_spec.fetch_data()
+        self.assertEqual(reloaded_region_map.mutable_matrix.dtype, bool)
+        self.assertTrue(numpy.array_equal(reloaded_region_map.mutable_matrix,
+                                          region_map.mutable_matrix))
+
+        whitespace_spec = SpecificationWhitespaceMap(
+            self.region_map_spec, self.region, self.ruleset, self.fixed_device)
+        whitespace_datamap3d = whitespace_spec.make_data()
+        whitespace_spec.save_data(whitespace_datamap3d.astype(float))
+        reloaded_datamap3d = whitespace_spec.fetch_data()
+        self.assertEqual(reloaded_datamap3d.mutable_array.dtype, bool)
+        self.assertTrue(numpy.array_equal(reloaded_datamap3d.mutable_array,
+                                          whitespace_datamap3d.mutable_array))
+
+    def test_load_memmap(self):
+        bitmask_spec = self._make_spec(
+            SpecificationWhitespaceBitmaskMap, self.region_map_spec,
+            self.region, self.ruleset, self.fixed_device, data_format="memmap")
+        bitmask = bitmask_spec.fetch_data()
+        reloaded_bitmask = load_memmap(bitmask_spec.filename)
+        self.assertIsInstance(reloaded_bitmask, DataMap2DChannelBitmask)
+        self.assertEqual(reloaded_bitmask.get_channel_list(),
+                         bitmask.get_channel_list())
+
+
+class RegionMapTestCase(SpecificationTestCase):
+    def test_matches_boundary_on_edges(self):
+        region_map_spec = SpecificationRegionMap(BoundaryTestWithSharedBorder,
+                                                 self.datamap_spec)
+        region_map = region_map_spec.make_data()
+
+        boundary = BoundaryTestWithSharedBorder()
+        expected = numpy.array(
+            [[boundary.location_inside_boundary((latitude, longitude)) for
+              longitude in region_map.longitudes] for latitude in
+             region_map.latitudes])
+        self.assertTrue(numpy.any(expected))
+        self.assertTrue(numpy.array_equal(region_map.mutable_matrix,
+                                          expected))
+
+
+class WhitespaceBitmaskMapTestCase(SpecificationTestCase):
+    def test_make_and_fetch(self):
+        expected = self._compute_whitespace(self.fixed_device)
+        for data_format in ["pickle", "memmap"]:
+            whitespace_spec = self._make_spec(
+                SpecificationWhitespaceMap, self.region_map_spec, self.region,
+                self.ruleset, self.fixed_device, data_format=data_format)
+            bitmask_spec = self._make_spec(
+                SpecificationWhitespaceBitmaskMap, self.region_map_spec,
+                self.region, self.ruleset, self.fixed_device,
+                data_format=data_format)
+
+            # Made without saving the whitespace DataMap3D
+            bitmask = bitmask_spec.fetch_data()
+            self.assertFalse(whitespace_spec.data_exists())
+            self.assertTrue(bitmask_spec.data_exists())
+            self.assertIsInstance(bitmask, DataMap2DChannelBitmask)
+            self.assertEqual(bitmask.get_channel_list(),
+                             self.region.get_tvws_channel_list())
+            self.assertTrue(numpy.array_equal(
+                bitmask.to_DataMap3D().mutable_array, expected))
+
+            reloaded_bitmask = bitmask_spec.fetch_data()
+            self.assertIsInstance(reloaded_bitmask, DataMap2DChannelBitmask)
+            self.assertTrue(numpy.array_equal(reloaded_bitmask.mutable_matrix,
+                                              bitmask.mutable_matrix))
+
+    def test_make_from_whitespace_map(self):
+        expected = self._compute_whitespace(self.portable_device)
+        for data_format in ["pickle", "memmap"]:
+            whitespace_spec = self._make_spec(
+                SpecificationWhitespaceMap, self.region_map_spec, self.region,
+                self.ruleset, self.portable_device, data_format=data_format)
+            bitmask_spec = self._make_spec(
+                SpecificationWhitespaceBitmaskMap, self.region_map_spec,
+                self.region, self.ruleset, self.portable_device,
+                data_format=data_format)
+
+            whitespace_datamap3d = whitespace_spec.fetch_data()
+            self.assertTrue(numpy.array_equal(
+                whitespace_datamap3d.mutable_array, expected))
+            bitmask = bitmask_spec.fetch_data()
+            self.assertTrue(numpy.array_equal(
+                bitmask.to_DataMap3D().mutable_array,
+                whitespace_datamap3d.mutable_array))
+
+
+class TVMarginMapTestCase(SpecificationTestCase):
+    def _assert_equal_with_nans(self, array, expected):
+        self.assertTrue(numpy.array_equal(numpy.isnan(array),
+                                          numpy.isnan(expected)))
+        self.assertTrue(numpy.array_equal(numpy.nan_to_num(array),
+                                          numpy.nan_to_num(expected)))
+
+    def test_make_saves_both_maps(self):
+        expected = self.ruleset.create_tv_margin_datamap3ds(
+            self.region, self.region_map_spec.fetch_data(),
+            self.region.get_tvws_channel_list())
+        for data_format in ["pickle", "memmap"]:
+            ruleset = RulesetFcc2012()
+            (cochannel_spec, adjacent_channel_spec) = [
+                self._make_spec(SpecificationTVMarginMap, self.region_map_spec,
+                                self.region, ruleset, is_cochannel,
+                                data_format=data_format)
+                for is_cochannel in [True, False]]
+            self.assertNotEqual(cochannel_spec.filename,
+                                adjacent_channel_spec.filename)
+
+            # Making either map saves both of them
+            cochannel_margins = cochannel_spec.fetch_data()
+            self.assertTrue(cochannel_spec.data_exists())
+            self.assertTrue(adjacent_channel_spec.data_exists())
+            self._assert_equal_with_nans(cochannel_margins.mutable_array,
+                                         expected[0].mutable_array)
+
+            self._disallow_making_tv_margin_maps(ruleset)
+            for (spec, expected_margins) in zip(
+                    [cochannel_spec, adjacent_channel_spec], expected):
+                margins = spec.fetch_data()
+                self.assertIsInstance(margins, DataMap3D)
+                self.assertEqual(margins.get_layer_descr_list(),
+                                 self.region.get_tvws_channel_list())
+                self._assert_equal_with_nans(margins.mutable_array,
+                                             expected_margins.mutable_array)
+
+    def test_whitespace_from_margin_maps(self):
+        devices = [self.fixed_device, Device(is_portable=False, haat_meters=5),
+                   Device(is_portable=False, haat_meters=250),
+                   self.portable_device]
+        expected = [self._compute_whitespace(device) for device in devices]
+        for data_format in ["pickle", "memmap"]:
+            ruleset = RulesetFcc2012()
+            for (index, device) in enumerate(devices):
+                whitespace_spec = self._make_spec(
+                    SpecificationWhitespaceMap, self.region_map_spec,
+                    self.region, ruleset, device, use_tv_margin_maps=True,
+                    data_format=data_format)
+                self.assertTrue(numpy.array_equal(
+                    whitespace_spec.fetch_data().mutable_array,
+                    expected[index]))
+                self.assertTrue(numpy.array_equal(
+                    whitespace_spec.load_data().mutable_array,
+                    expected[index]))
+
+                # The margin maps are made once and then reused
+                for is_cochannel in [True, False]:
+                    self.assertTrue(whitespace_spec.get_tv_margin_map_spec(
+                        is_cochannel).data_exists())
+                self._disallow_making_tv_margin_maps(ruleset)
+
+
+    def test_dtype(self):
+        spec = SpecificationTVMarginMap(self.region_map_spec, self.region,
+                                        self.ruleset, True,
+                                        dtype=numpy.float32)
+        self.assertIn("dtype=float32", spec.filename)
+        expected = self.ruleset.create_tv_margin_datamap3ds(
+            self.region, self.region_map_spec.fetch_data(),
+            self.region.get_tvws_channel_list())[0]
+        margins = spec.fetch_data()
+        self.assertEqual(margins.mutable_array.dtype, numpy.float32)
+        self._assert_equal_with_nans(
+            margins.mutable_array,
+            expected.mutable_array.astype(numpy.float32))
+
+        # The margins must be able to hold infinity and NaN
+        for dtype in [int, bool]:
+            self.assertRaises(TypeError, SpecificationTVMarginMap,
+                              self.region_map_spec, self.region, self.ruleset,
+                              True, dtype=dtype)
+
+
+class PyramidLevelTestCase(SpecificationTestCase):
+    def test_datamap2d(self):
+        for data_format in ["pickle", "memmap"]:
+            region_map_spec = self._make_spec(
+                SpecificationRegionMap, BoundaryTest, self.datamap_spec,
+                data_format=data_format)
+            region_map = region_map_spec.fetch_data()
+
+            # 21x26 pixels: the last row and column of blocks are incomplete
+            pyramid_spec = SpecificationPyramidLevel(region_map_spec, 4,
+                                                     "fraction")
+            self.assertEqual(pyramid_spec.data_format, data_format)
+            self.assertEqual(pyramid_spec.subdirectory,
+                             region_map_spec.subdirectory)
+            coarse = pyramid_spec.fetch_data()
+            self.assertTrue(pyramid_spec.data_exists())
+            self.assertEqual(coarse.mutable_matrix.shape, (6, 7))
+            self.assertEqual(coarse.mutable_matrix.dtype, float)
+            self.assertTrue(numpy.allclose(
+                coarse.latitudes[:5],
+                region_map.latitudes[:20].reshape(5, 4).mean(axis=1)))
+            self.assertAlmostEqual(coarse.get_value_by_index(1, 1), 1)
+            self.assertAlmostEqual(coarse.get_value_by_index(5, 6),
+                                   numpy.mean(region_map.mutable_matrix[20:,
+                                                                        24:]))
+            self.assertAlmostEqual(coarse.get_value_by_index(4, 6),
+                                   numpy.mean(region_map.mutable_matrix[16:20,
+                                                                        24:]))
+
+            reloaded_coarse = pyramid_spec.fetch_data()
+            self.assertIsInstance(reloaded_coarse, DataMap2D)
+            self.assertTrue(coarse.datamap_is_comparable(reloaded_coarse)[0])
+            self.assertTrue(numpy.array_equal(reloaded_coarse.mutable_matrix,
+                                              coarse.mutable_matrix))
+
+            # "min" keeps the data type of the base map by default
+            minimum = SpecificationPyramidLevel(region_map_spec, (2, 3),
+                                                "min").fetch_data()
+            self.assertEqual(minimum.mutable_matrix.dtype, bool)
+            self.assertEqual(minimum.get_value_by_index(10, 8),
+                             numpy.min(region_map.mutable_matrix[20:, 24:]))
+
+    def test_datamap3d(self):
+        for data_format in ["pickle", "memmap"]:
+            whitespace_spec = self._make_spec(
+                SpecificationWhitespaceMap, self.region_map_spec, self.region,
+                self.ruleset, self.fixed_device, data_format=data_format)
+            whitespace_datamap3d = whitespace_spec.fetch_data()
+            pyramid_spec = SpecificationPyramidLevel(whitespace_spec, (2, 3),
+                                                     "mean")
+            coarse = pyramid_spec.fetch_data()
+            self.assertEqual(coarse.get_layer_descr_list(),
+                             self.region.get_tvws_channel_list())
+            self.assertEqual(coarse.mutable_array.shape[1:], (11, 9))
+            self.assertEqual(coarse.mutable_array.dtype, float)
+            expected = whitespace_datamap3d.aggregate_blocks(
+                (2, 3), "mean", partial_blocks=True)
+            self.assertTrue(numpy.array_equal(coarse.mutable_array,
+                                              expected.mutable_array))
+            self.assertTrue(numpy.array_equal(
+                coarse.mutable_array[:, -1, -1],
+                numpy.mean(whitespace_datamap3d.mutable_array[:, 20:, 24:],
+                           axis=(1, 2))))
+
+            reloaded_coarse = pyramid_spec.fetch_data()
+            self.assertIsInstance(reloaded_coarse, DataMap3D)
+            self.assertTrue(numpy.array_equal(reloaded_coarse.mutable_array,
+                                              coarse.mutable_array))
+
+    def test_arguments(self):
+        pyramid_spec = SpecificationPyramidLevel(self.region_map_spec, 4,
+                                                 "sum")
+        self.assertEqual(pyramid_spec.block_shape, (4, 4))
+        self.assertEqual(SpecificationPyramidLevel(
+            self.region_map_spec, numpy.int64(4), "sum").to_string(),
+            pyramid_spec.to_string())
+        self.assertEqual(SpecificationPyramidLevel(
+            self.region_map_spec, (numpy.int32(2), 3)).block_shape, (2, 3))
+
+        # Only data types other than the default are part of the filename
+        self.assertEqual(SpecificationPyramidLevel(
+            self.region_map_spec, 4, "sum", dtype=float).to_string(),
+            pyramid_spec.to_string())
+        float32_spec = SpecificationPyramidLevel(self.region_map_spec, 4,
+                                                 "sum", dtype=numpy.float32)
+        self.assertTrue(float32_spec.to_string().endswith("dtype=float32"))
+        self.assertEqual(float32_spec.fetch_data().mutable_matrix.dtype,
+                         numpy.float32)
+
+        margin_spec = SpecificationTVMarginMap(self.region_map_spec,
+                                               self.region, self.ruleset, True)
+        self.assertEqual(SpecificationPyramidLevel(margin_spec, 4,
+                                                   "min").dtype,
+                         numpy.dtype(float))
+
+        self.assertRaises(ValueError, SpecificationPyramidLevel,
+                          self.region_map_spec, 0)
+        self.assertRaises(ValueError, SpecificationPyramidLevel,
+                          self.region_map_spec, 4, "median")
+        self.assertRaises(TypeError, SpecificationPyramidLevel,
+                          self.datamap_spec, 4)
+        self.assertRaises(TypeError, SpecificationPyramidLevel,
+                          SpecificationWhitespaceBitmaskMap(
+                              self.region_map_spec, self.region, self.ruleset,
+                              self.fixed_device), 4)
+
+
+class UpdateDataTestCase(SpecificationTestCase):
+    def setUp(self):
+        super(UpdateDataTestCase, self).setUp()
+        self.other_fixed_device = Device(is_portable=False, haat_meters=5)
+
+    def _reset_region(self):
+        self.region = RegionUnitedStatesTest()
+        self.ruleset = RulesetFcc2012()
+
+    def _change_entities(self):
+        """Adds a TV station and a PLMRS entity and removes a TV station;
+        returns the changed entities."""
+        tv_stations = self.region.get_protected_entities_of_type(
+            ProtectedEntitiesTVStations)
+        plmrs = self.region.get_protected_entities_of_type(
+            ProtectedEntitiesPLMRS)
+
+        new_station = ProtectedEntityTVStation(
+            tv_stations, self.region, 37.3, -121.2, 30, 2e5, 250, 'DT')
+        [removed_station] = [station for station in
+                             tv_stations.list_of_entities() if
+                             station.get_location() == (36.8, -122.8)]
+        tv_stations.remove_entities(lambda station:
+                                    station is not removed_station)
+        tv_stations.add_entity(new_station)
+        new_plmrs = ProtectedEntityPLMRS(plmrs, self.region, 36.6, -123.5, 21,
+                                         False)
+        plmrs.add_entity(new_plmrs)
+        return [new_station, removed_station, new_plmrs]
+
+    def test_whitespace_map(self):
+        for data_format in ["pickle", "memmap"]:
+            for use_tv_margin_maps in [False, True]:
+                self._reset_region()
+                whitespace_spec = self._make_spec(
+                    SpecificationWhitespaceMap, self.region_map_spec,
+                    self.region, self.ruleset, self.fixed_device,
+                    use_tv_margin_maps=use_tv_margin_maps,
+                    data_format=data_format)
+                original = numpy.array(
+                    whitespace_spec.fetch_data().mutable_array)
+
+                changed_entities = self._change_entities()
+                expected = self._compute_whitespace(self.fixed_device)
+                self.assertFalse(numpy.array_equal(original, expected))
+                if use_tv_margin_maps:
+                    # The TV margin maps are updated rather than made again
+                    self._disallow_making_tv_margin_maps(self.ruleset)
+                updated = whitespace_spec.update_data(changed_entities)
+                self.assertTrue(numpy.array_equal(updated.mutable_array,
+                                                  expected))
+                del updated
+                self.assertTrue(numpy.array_equal(
+                    whitespace_spec.load_data().mutable_array, expected))
+
+                # The TV margin maps used for other devices are up to date
+                other_whitespace_spec = self._make_spec(
+                    SpecificationWhitespaceMap, self.region_map_spec,
+                    self.region, self.ruleset, self.other_fixed_device,
+                    use_tv_margin_maps=True, data_format=data_format)
+                self.assertTrue(numpy.array_equal(
+                    other_whitespace_spec.fetch_data().mutable_array,
+                    self._compute_whitespace(self.other_fixed_device)))
+
+                shutil.rmtree(whitespace_spec.full_directory)
+                shutil.rmtree(other_whitespace_spec.get_tv_margin_map_spec(
+                    True).full_directory)
+
+    def test_whitespace_bitmask_map(self):
+        for data_format in ["pickle", "memmap"]:
+            for is_whitespace_map_saved in [False, True]:
+                self._reset_region()
+                whitespace_spec = self._make_spec(
+                    SpecificationWhitespaceMap, self.region_map_spec,
+                    self.region, self.ruleset, self.portable_device,
+                    data_format=data_format)
+                bitmask_spec = self._make_spec(
+                    SpecificationWhitespaceBitmaskMap, self.region_map_spec,
+                    self.region, self.ruleset, self.portable_device,
+                    data_format=data_format)
+                if is_whitespace_map_saved:
+                    whitespace_spec.fetch_data()
+                bitmask_spec.fetch_data()
+
+                changed_entities = self._change_entities()
+                expected = self._compute_whitespace(self.portable_device)
+                bitmask = bitmask_spec.update_data(changed_entities)
+                self.assertIsInstance(bitmask, DataMap2DChannelBitmask)
+                self.assertTrue(numpy.array_equal(
+                    bitmask.to_DataMap3D().mutable_array, expected))
+                self.assertTrue(numpy.array_equal(
+                    bitmask_spec.load_data().mutable_matrix,
+                    bitmask.mutable_matrix))
+
+                self.assertEqual(whitespace_spec.data_exists(),
+                                 is_whitespace_map_saved)
+                if is_whitespace_map_saved:
+                    self.assertTrue(numpy.array_equal(
+                        whitespace_spec.load_data().mutable_array, expected))
+                    shutil.rmtree(whitespace_spec.full_directory)
+                shutil.rmtree(bitmask_spec.full_directory)
+
+    def test_tv_margin_maps_are_updated_once(self):
+        update_calls = []
+        update_tv_margin_datamap3ds = self.ruleset.update_tv_margin_datamap3ds
+
+        def count_updates(*args, **kwargs):
+            update_calls.append(args)
+            return update_tv_margin_datamap3ds(*args, **kwargs)
+        self.ruleset.update_tv_margin_datamap3ds = count_updates
+
+        whitespace_specs = [
+            SpecificationWhitespaceMap(self.region_map_spec, self.region,
+                                       self.ruleset, device,
+                                       use_tv_margin_maps=True)
+            for device in [self.fixed_device, self.other_fixed_device,
+                           self.portable_device]]
+        for whitespace_spec in whitespace_specs:
+            whitespace_spec.fetch_data()
+
+        changed_entities = self._change_entities()
+        self._disallow_making_tv_margin_maps(self.ruleset)
+        for (index, whitespace_spec) in enumerate(whitespace_specs):
+            updated = whitespace_spec.update_data(
+                changed_entities, update_tv_margin_maps=(index == 0))
+            self.assertTrue(numpy.array_equal(
+                updated.mutable_array,
+                self._compute_whitespace(whitespace_spec.device_object)))
+        self.assertEqual(len(update_calls), 1)
+
+    def test_data_is_made_if_missing(self):
+        create_calls = []
+        create_tv_margin_datamap3ds = self.ruleset.create_tv_margin_datamap3ds
+
+        def count_creations(*args, **kwargs):
+            create_calls.append(args)
+            return create_tv_margin_datamap3ds(*args, **kwargs)
+        self.ruleset.create_tv_margin_datamap3ds = count_creations
+
+        whitespace_spec = SpecificationWhitespaceMap(
+            self.region_map_spec, self.region, self.ruleset, self.fixed_device,
+            use_tv_margin_maps=True)
+        changed_entities = self._change_entities()
+        self.assertTrue(numpy.array_equal(
+            whitespace_spec.update_data(changed_entities).mutable_array,
+            self._compute_whitespace(self.fixed_device)))
+        self.assertTrue(whitespace_spec.data_exists())
+        # The missing TV margin maps are only made once
+        self.assertEqual(len(create_calls), 1)
+
+
+from custom_logging import getCurrentLogLevel, changeLogLevel, disableLogging
+original_log_level = getCurrentLogLevel()
+disableLogging()
+unittest.main()
+changeLogLevel(original_log_level)
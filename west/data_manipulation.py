@@ -1,7 +1,39 @@
 from data_map import DataMap2D
+from data_map_tiled import DataMap2DTiled
+import itertools
 import numpy
 
 
+# Approximate number of values per block when data maps are read block by
+# block
+_NUM_VALUES_PER_BLOCK = 2 ** 20
+
+
+def _iter_rows_of_datamaps(datamaps):
+    """
+    Visits comparable data maps (:class:`data_map.DataMap2D` or
+    :class:`data_map_tiled.DataMap2DTiled`) together, a few full rows at a
+    time, and yields a tuple containing the values of each map. The rows
+    are visited in order, so concatenating the flattened values gives the
+    same order as flattening the whole matrix.
+    """
+    num_longitudes = len(datamaps[0].longitudes)
+    block_shape = (max(1, _NUM_VALUES_PER_BLOCK // max(1, num_longitudes)),
+                   max(1, num_longitudes))
+    for blocks in itertools.izip(*[datamap.iter_blocks(block_shape)
+                                   for datamap in datamaps]):
+        yield tuple(block[4] for block in blocks)
+
+
+def _raise_error_if_datamaps_are_incomparable(datamap, other_datamap):
+    """Raises a TypeError if the maps do not describe the same points; tiled
+    maps can be compared to both kinds of maps."""
+    if isinstance(other_datamap, DataMap2DTiled):
+        other_datamap.raise_error_if_datamaps_are_incomparable(datamap)
+    else:
+        datamap.raise_error_if_datamaps_are_incomparable(other_datamap)
+
+
 def calculate_cdf_from_datamap2d(data_map, weight_map=None, mask_map=None):
     """
     Calculate a CDF of a data map given a corresponding (optional) weight map.
@@ -10,41 +42,61 @@ def calculate_cdf_from_datamap2d(data_map, weight_map=None, mask_map=None):
     A mask may be provided. Locations which are zero will not be included in the
     CDF.
 
-    .. note:: Implementation is provided by `calculate_cdf_from_matrices`. This
-    function is merely a convenient wrapper.
+    The maps are read a few rows at a time (see
+    :meth:`data_map.DataMap2D.iter_blocks`), so maps opened with
+    :meth:`data_map.DataMap2D.from_memmap` and tiled maps need not be read
+    into memory; only the values included in the CDF are.
+
+    .. note:: The result is the same as that of \
+    `calculate_cdf_from_matrices` with the matrices of the maps.
 
     :param data_map:
-    :type data_map: :class:`data_map.DataMap2D`
+    :type data_map: :class:`data_map.DataMap2D` or \
+            :class:`data_map_tiled.DataMap2DTiled`
     :param weight_map:
-    :type weight_map: :class:`data_map.DataMap2D`
+    :type weight_map: :class:`data_map.DataMap2D` or \
+            :class:`data_map_tiled.DataMap2DTiled`
     :param mask_map:
-    :type mask_map: :class:`data_map.DataMap2D`
+    :type mask_map: :class:`data_map.DataMap2D` or \
+            :class:`data_map_tiled.DataMap2DTiled`
     :return: cdfX, cdfY, average, median
     """
     # Check data types
-    if not isinstance(data_map, DataMap2D):
+    datamap_types = (DataMap2D, DataMap2DTiled)
+    if not isinstance(data_map, datamap_types):
         raise TypeError("Data map must be a DataMap2D.")
-    if weight_map is not None and not isinstance(weight_map, DataMap2D):
+    if weight_map is not None and not isinstance(weight_map, datamap_types):
         raise TypeError("Weight map must be a DataMap2D.")
-    if mask_map is not None and not isinstance(mask_map, DataMap2D):
+    if mask_map is not None and not isinstance(mask_map, datamap_types):
         raise TypeError("is_in_region map must be a DataMap2D.")
 
     if weight_map is not None:
-        data_map.raise_error_if_datamaps_are_incomparable(weight_map)
+        _raise_error_if_datamaps_are_incomparable(data_map, weight_map)
     if mask_map is not None:
-        data_map.raise_error_if_datamaps_are_incomparable(mask_map)
-
-    data_matrix = data_map.get_matrix_copy()
-    if weight_map is None:
-        weight_matrix = None
-    else:
-        weight_matrix = weight_map.get_matrix_copy()
-    if mask_map is None:
-        mask_matrix = None
-    else:
-        mask_matrix = mask_map.get_matrix_copy()
-
-    return calculate_cdf_from_matrices(data_matrix, weight_matrix, mask_matrix)
+        _raise_error_if_datamaps_are_incomparable(data_map, mask_map)
+
+    datamaps = [datamap for datamap in (data_map, weight_map, mask_map)
+                if datamap is not None]
+    data_arrays = []
+    weight_arrays = []
+    for matrices in _iter_rows_of_datamaps(datamaps):
+        matrices = list(matrices)
+        data_matrix = numpy.asarray(matrices.pop(0), dtype=float)
+        if weight_map is None:
+            weight_matrix = numpy.ones(data_matrix.shape)
+        else:
+            weight_matrix = numpy.asarray(matrices.pop(0), dtype=float)
+        if mask_map is None:
+            data_arrays.append(data_matrix.ravel())
+            weight_arrays.append(weight_matrix.ravel())
+        else:
+            is_included = numpy.asarray(matrices.pop(0), dtype=bool)
+            data_arrays.append(data_matrix[is_included])
+            weight_arrays.append(weight_matrix[is_included])
+
+    # Concatenating copies the values, so the maps are not modified
+    return _calculate_cdf_from_arrays(numpy.concatenate(data_arrays),
+                                      numpy.concatenate(weight_arrays))
 
 
 def calculate_cdf_from_matrices(data_matrix, weight_matrix=None,
@@ -56,36 +108,38 @@ def calculate_cdf_from_matrices(data_matrix, weight_matrix=None,
     A mask may be provided. Elements which are zero will not be included in the
     CDF.
 
+    The inputs are not modified. :class:`numpy.matrix` inputs are accepted as
+    well.
+
     :param data_matrix:
-    :type data_matrix: :class:`numpy.matrix`
+    :type data_matrix: :class:`numpy.ndarray`
     :param weight_matrix:
-    :type weight_matrix: :class:`numpy.matrix`
+    :type weight_matrix: :class:`numpy.ndarray`
     :param mask_matrix:
-    :type mask_matrix: :class:`numpy.matrix`
+    :type mask_matrix: :class:`numpy.ndarray`
     :return: cdfX, cdfY, average, median
     """
+    data_matrix = numpy.asarray(data_matrix, dtype=float)
     if weight_matrix is None:
-        weight_matrix = numpy.ones(numpy.shape(data_matrix))
+        weight_matrix = numpy.ones(data_matrix.shape)
+    else:
+        weight_matrix = numpy.asarray(weight_matrix, dtype=float)
 
+    # 1-D copies of the included elements
     if mask_matrix is None:
-        mask_matrix = numpy.ones(numpy.shape(data_matrix))
-
-    # With numpy, 0 = included after masking and 1 = masked, so flip this
-    mask_matrix = numpy.logical_not(mask_matrix)
+        data_array = data_matrix.flatten()
+        weight_array = weight_matrix.flatten()
+    else:
+        is_included = numpy.asarray(mask_matrix, dtype=bool)
+        data_array = data_matrix[is_included]
+        weight_array = weight_matrix[is_included]
 
-    data_matrix_masked = numpy.ma.masked_array(data_matrix.astype(float),
-                                               mask=mask_matrix)
-    weight_matrix_masked = numpy.ma.masked_array(weight_matrix.astype(float),
-                                                 mask=mask_matrix)
+    return _calculate_cdf_from_arrays(data_array, weight_array)
 
-    data_array = data_matrix_masked.compressed()     # 1-D base array after
-                                                     # removing masked elements
-    if hasattr(data_array, "A1"):
-        data_array = data_array.A1
-    weight_array = weight_matrix_masked.compressed()
-    if hasattr(weight_array, "A1"):
-        weight_array = weight_array.A1
 
+def _calculate_cdf_from_arrays(data_array, weight_array):
+    """Calculates the CDF of the included values (1-D arrays which are
+    modified) for :func:`calculate_cdf_from_matrices`."""
     bad_indices = numpy.logical_or(numpy.isnan(data_array), numpy.isnan(
         weight_array))
     bad_indices = numpy.logical_or(bad_indices, numpy.isinf(data_array))
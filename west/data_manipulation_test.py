@@ -3,6 +3,10 @@ import data_manipulation_test_base
 import unittest
 import numpy
 import data_map
+import data_map_tiled
+import os
+import shutil
+import tempfile
 
 
 class EqualDataEqualWeightsCDFTestCase(
@@ -160,6 +164,76 @@ class ComparableDataMapTestCase(
         self.expected_median = 1
 
 
+class ArrayInputsAreNotModifiedTestCase(unittest.TestCase):
+    def runTest(self):
+        test_data_map = data_map.DataMap2DBayArea.create(2, 3)
+        test_data_map.mutable_matrix[:] = [[numpy.nan, 2, 3], [4, 5, 6]]
+        test_mask_map = test_data_map.get_clean_copy(fill_value=True,
+                                                     dtype=bool)
+        test_mask_map.set_value_by_index(1, 2, False)
+        data_before = test_data_map.get_matrix_copy()
+
+        (cdfX, cdfY, average, median) = \
+            data_manipulation.calculate_cdf_from_datamap2d(
+                test_data_map, mask_map=test_mask_map)
+        self.assertTrue(numpy.array_equal(cdfX, [0, 2, 3, 4, 5]))
+        self.assertAlmostEqual(average, 3.5)
+        self.assertTrue(numpy.array_equal(numpy.isnan(data_before),
+                                          numpy.isnan(
+                                              test_data_map.mutable_matrix)))
+        self.assertTrue(numpy.array_equal(
+            numpy.nan_to_num(data_before),
+            numpy.nan_to_num(test_data_map.mutable_matrix)))
+
+        # Matrices give the same result as arrays
+        matrix_results = data_manipulation.calculate_cdf_from_matrices(
+            numpy.matrix(test_data_map.mutable_matrix), None,
+            numpy.matrix(test_mask_map.mutable_matrix))
+        self.assertTrue(numpy.array_equal(matrix_results[0], cdfX))
+        self.assertTrue(numpy.array_equal(matrix_results[1], cdfY))
+
+
+class OutOfCoreDataMapTestCase(unittest.TestCase):
+    def runTest(self):
+        test_data_map = data_map.DataMap2DBayArea.create(9, 11)
+        test_data_map.mutable_matrix[:] = numpy.random.RandomState(0).randint(
+            0, 5, size=(9, 11))
+        test_data_map.set_value_by_index(3, 4, numpy.nan)
+        test_weight_map = test_data_map.get_clean_copy()
+        test_weight_map.mutable_matrix[:] = numpy.arange(99.0).reshape(9, 11)
+        test_mask_map = test_data_map.get_clean_copy(dtype=bool)
+        test_mask_map.mutable_matrix[:, 2:] = True
+
+        expected = data_manipulation.calculate_cdf_from_matrices(
+            test_data_map.mutable_matrix, test_weight_map.mutable_matrix,
+            test_mask_map.mutable_matrix)
+
+        directory = tempfile.mkdtemp()
+        try:
+            test_data_map.to_memmap(os.path.join(directory, "data.dat"))
+            memmapped_data_map = data_map.DataMap2D.from_memmap(
+                os.path.join(directory, "data.dat"))
+            tiled_weight_map = data_map_tiled.DataMap2DTiled.from_DataMap2D(
+                os.path.join(directory, "weights"), test_weight_map,
+                tile_shape=(2, 3), memory_budget_bytes=1)
+
+            original_num_values_per_block = \
+                data_manipulation._NUM_VALUES_PER_BLOCK
+            data_manipulation._NUM_VALUES_PER_BLOCK = 20
+            try:
+                actual = data_manipulation.calculate_cdf_from_datamap2d(
+                    memmapped_data_map, tiled_weight_map, test_mask_map)
+            finally:
+                data_manipulation._NUM_VALUES_PER_BLOCK = \
+                    original_num_values_per_block
+            del memmapped_data_map
+        finally:
+            shutil.rmtree(directory)
+
+        for (actual_value, expected_value) in zip(actual, expected):
+            self.assertTrue(numpy.array_equal(actual_value, expected_value))
+
+
 class IncomparableDataMapTestCase(unittest.TestCase):
     def runTest(self):
         self.test_data_map = data_map.DataMap2DBayArea.create(2, 3)
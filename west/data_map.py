@@ -1,22 +1,600 @@
 from custom_logging import getModuleLogger
 import numpy
 from map import Map
+import matplotlib.pyplot as plt
+import os
 import simplekml
 import pickle
+import json
+import weakref
 import helpers
+import data_map_parallel
+
+
+# Version of the header written by to_memmap
+_MEMMAP_FORMAT_VERSION = 1
+
+
+def _get_memmap_header_filename(filename):
+    return filename + ".json"
+
+
+def _write_memmap(filename, header, array):
+    """Writes ``array`` as raw data to ``filename`` and the ``header`` (plus
+    the data type and shape of the array) as JSON to a separate file."""
+    array = numpy.ascontiguousarray(array)
+    header = dict(header)
+    header["format_version"] = _MEMMAP_FORMAT_VERSION
+    header["dtype"] = array.dtype.str
+    header["shape"] = list(array.shape)
+
+    array.tofile(filename)
+    with open(_get_memmap_header_filename(filename), "w") as f:
+        json.dump(header, f, indent=1, sort_keys=True)
+
+
+def _read_memmap_header(filename):
+    """Reads the header written by :func:`_write_memmap`."""
+    with open(_get_memmap_header_filename(filename), "r") as f:
+        header = json.load(f)
+
+    if header.get("format_version") != _MEMMAP_FORMAT_VERSION:
+        raise ValueError("Unsupported format version in %s: %s" %
+                         (filename, header.get("format_version")))
+    return header
+
+
+def _read_memmap(filename, expected_kind, mode):
+    """Reads the header written by :func:`_write_memmap` and maps the raw data
+    into memory; no data is read until it is accessed."""
+    header = _read_memmap_header(filename)
+    if header["kind"] != expected_kind:
+        raise TypeError("%s contains a %s, not a %s" %
+                        (filename, header["kind"], expected_kind))
+
+    array = numpy.memmap(filename, dtype=numpy.dtype(str(header["dtype"])),
+                         mode=mode, shape=tuple(header["shape"]))
+    return header, array
+
+
+def _get_memmap_grid_header(datamap2d):
+    return {"latitude_bounds": [float(x) for x in datamap2d._latitude_bounds],
+            "longitude_bounds": [float(x) for x in
+                                 datamap2d._longitude_bounds],
+            "num_latitude_divisions": datamap2d._num_latitude_divisions,
+            "num_longitude_divisions": datamap2d._num_longitude_divisions,
+            "class": datamap2d.__class__.__name__}
+
+
+def _initialize_from_memmap_grid_header(datamap2d, header, matrix):
+    datamap2d._initialize(tuple(header["latitude_bounds"]),
+                          tuple(header["longitude_bounds"]),
+                          header["num_latitude_divisions"],
+                          header["num_longitude_divisions"],
+                          data_type=matrix.dtype, verbose=False, matrix=matrix)
+
+
+def _get_datamap2d_class(class_name):
+    """Returns the class called ``class_name`` among :class:`DataMap2D` and
+    its (imported) subclasses, or :class:`DataMap2D` if there is none."""
+    classes = [DataMap2D]
+    while classes:
+        cls = classes.pop()
+        if cls.__name__ == class_name:
+            return cls
+        classes.extend(cls.__subclasses__())
+    return DataMap2D
+
+
+def load_memmap(filename, mode="r"):
+    """
+    Opens a map saved with :meth:`DataMap2D.to_memmap` or
+    :meth:`DataMap3D.to_memmap`; the header of the file determines which
+    of the two is returned. A DataMap2D is opened with the class which was
+    saved (e.g. :class:`data_map_channel_bitmask.DataMap2DChannelBitmask`)
+    if that class has been imported.
+
+    :param filename: filename given to :meth:`DataMap2D.to_memmap` or \
+            :meth:`DataMap3D.to_memmap`
+    :type filename: str
+    :param mode: see :meth:`DataMap2D.from_memmap`
+    :type mode: str
+    :return: the map
+    :rtype: :class:`DataMap2D` or :class:`DataMap3D`
+    """
+    header = _read_memmap_header(filename)
+    if header["kind"] == "DataMap3D":
+        return DataMap3D.from_memmap(filename, mode=mode)
+    if header["kind"] == "DataMap2D":
+        return _get_datamap2d_class(header["class"]).from_memmap(filename,
+                                                                 mode=mode)
+    raise TypeError("%s contains neither a DataMap2D nor a DataMap3D" %
+                    filename)
+
+
+def _layer_descr_from_json(value):
+    """Undoes the conversions made by JSON to a layer description (tuples
+    become lists and strings become unicode)."""
+    if isinstance(value, list):
+        return tuple(_layer_descr_from_json(item) for item in value)
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return value
+
+
+def _copy_vectorized_update(matrix, new_values):
+    """Copies the result of a vectorized update function into ``matrix``,
+    skipping the masked entries of a :class:`numpy.ma.MaskedArray`."""
+    if isinstance(new_values, numpy.ma.MaskedArray):
+        should_update = numpy.logical_not(numpy.ma.getmaskarray(new_values))
+        numpy.copyto(matrix, numpy.ma.getdata(new_values), casting='unsafe',
+                     where=should_update)
+    else:
+        numpy.copyto(matrix, new_values, casting='unsafe')
+
+
+def _get_positions_on_axis(values, bounds, num_divisions):
+    """
+    Converts coordinates into (fractional) positions on an axis of evenly
+    spaced points, i.e. position i corresponds to the i-th point. Returns
+    the positions (clipped to the axis) and a boolean array which is False
+    for coordinates outside of ``bounds``.
+    """
+    (min_value, max_value) = bounds
+    # Tolerance for rounding errors at the edges of the axis
+    tolerance = 1e-9
+
+    if num_divisions == 1 or max_value == min_value:
+        positions = numpy.zeros(values.shape)
+        is_inside = numpy.abs(values - min_value) <= tolerance
+        return positions, is_inside
+
+    positions = (values - min_value) * ((num_divisions - 1) /
+                                        float(max_value - min_value))
+    with numpy.errstate(invalid='ignore'):
+        is_inside = (positions >= -tolerance) & \
+                    (positions <= num_divisions - 1 + tolerance)
+    positions = numpy.clip(numpy.where(is_inside, positions, 0), 0,
+                           num_divisions - 1)
+    return positions, is_inside
+
+
+def _sample_grid(values, latitude_positions, longitude_positions, is_inside,
+                 method, fill_value):
+    """
+    Samples ``values`` (an array whose last two axes are the latitudes and
+    longitudes of a grid) at the given positions (see
+    :func:`_get_positions_on_axis`). The result has the shape
+    ``values.shape[:-2] + latitude_positions.shape``; locations which are
+    not inside the grid are set to ``fill_value``.
+    """
+    (num_latitudes, num_longitudes) = values.shape[-2:]
+
+    if method == 'nearest':
+        latitude_indices = numpy.floor(latitude_positions + 0.5).astype(int)
+        longitude_indices = numpy.floor(longitude_positions + 0.5).astype(int)
+        result = values[..., latitude_indices, longitude_indices].astype(
+            numpy.result_type(values.dtype, fill_value))
+    elif method == 'bilinear':
+        lower_latitude_indices = numpy.minimum(
+            numpy.floor(latitude_positions).astype(int),
+            max(num_latitudes - 2, 0))
+        lower_longitude_indices = numpy.minimum(
+            numpy.floor(longitude_positions).astype(int),
+            max(num_longitudes - 2, 0))
+        upper_latitude_indices = numpy.minimum(lower_latitude_indices + 1,
+                                               num_latitudes - 1)
+        upper_longitude_indices = numpy.minimum(lower_longitude_indices + 1,
+                                                num_longitudes - 1)
+        latitude_weights = latitude_positions - lower_latitude_indices
+        longitude_weights = longitude_positions - lower_longitude_indices
+
+        result = numpy.zeros(values.shape[:-2] + latitude_positions.shape,
+                             dtype=numpy.result_type(values.dtype, float,
+                                                     fill_value))
+        for (latitude_indices, latitude_weight) in [
+                (lower_latitude_indices, 1 - latitude_weights),
+                (upper_latitude_indices, latitude_weights)]:
+            for (longitude_indices, longitude_weight) in [
+                    (lower_longitude_indices, 1 - longitude_weights),
+                    (upper_longitude_indices, longitude_weights)]:
+                weight = latitude_weight * longitude_weight
+                # Neighbors with zero weight are skipped so that e.g. a NaN
+                # next to an exact grid point does not spread
+                result += numpy.where(
+                    weight == 0, 0,
+                    weight * values[..., latitude_indices, longitude_indices])
+    else:
+        raise ValueError("Unknown interpolation method: %s" % str(method))
+
+    result[..., numpy.logical_not(is_inside)] = fill_value
+    return result
+
+
+def _label_values(matrix, binning_function=None):
+    """
+    Assigns an integer label to each pixel such that pixels share a label if
+    and only if their values (after ``binning_function``, if given) are
+    equal; NaNs are considered equal to each other. ``binning_function`` is
+    called once per distinct value.
+
+    :return: (labels, value of each label)
+    :rtype: (:class:`numpy.ndarray`, list)
+    """
+    matrix = numpy.asarray(matrix)
+    if numpy.issubdtype(matrix.dtype, numpy.inexact):
+        is_nan = numpy.isnan(matrix)
+    else:
+        is_nan = numpy.zeros(matrix.shape, dtype=bool)
+
+    (unique_values, labels) = numpy.unique(matrix[~is_nan],
+                                           return_inverse=True)
+    label_values = unique_values.tolist()
+    full_labels = numpy.empty(matrix.shape, dtype=int)
+    full_labels[~is_nan] = labels
+    if numpy.any(is_nan):
+        full_labels[is_nan] = len(label_values)
+        label_values.append(float('nan'))
+
+    if binning_function is None:
+        return full_labels, label_values
+
+    def get_key(value):
+        # NaN is not equal to itself and would otherwise never be merged
+        return 'nan' if value != value else value
+
+    binned_values = []
+    bin_of_key = {}
+    bin_of_label = []
+    for value in label_values:
+        binned_value = binning_function(value)
+        key = get_key(binned_value)
+        if key not in bin_of_key:
+            bin_of_key[key] = len(binned_values)
+            binned_values.append(binned_value)
+        bin_of_label.append(bin_of_key[key])
+    return numpy.array(bin_of_label, dtype=int)[full_labels], binned_values
+
+
+def _merge_pixels_into_rectangles(labels):
+    """
+    Covers the pixels with rectangles such that all pixels of a rectangle
+    have the same label: each row is split into runs of equal labels and
+    runs with identical extents in consecutive rows are stacked.
+
+    :return: (label, first_row, last_row, first_column, last_column) of \
+            each rectangle (inclusive indices)
+    :rtype: list of tuples
+    """
+    rectangles = []
+    # (first_column, last_column, label) -> first row of the open rectangle
+    open_rectangles = {}
+    for (row_index, row) in enumerate(labels):
+        run_starts = numpy.concatenate(([0],
+                                        numpy.flatnonzero(numpy.diff(row)) + 1))
+        run_ends = numpy.append(run_starts[1:], len(row)) - 1
+        runs = set(zip(run_starts.tolist(), run_ends.tolist(),
+                       row[run_starts].tolist()))
+
+        for run in list(open_rectangles):
+            if run not in runs:
+                (first_column, last_column, label) = run
+                rectangles.append((label, open_rectangles.pop(run),
+                                   row_index - 1, first_column, last_column))
+        for run in runs:
+            open_rectangles.setdefault(run, row_index)
+
+    for ((first_column, last_column, label), first_row) in \
+            open_rectangles.items():
+        rectangles.append((label, first_row, len(labels) - 1, first_column,
+                           last_column))
+    return sorted(rectangles, key=lambda rectangle: rectangle[1:])
+
+
+def _coordinates_are_almost_equal(coordinates, target_coordinates,
+                                  tolerance=1e-4):
+    """Array counterpart of :func:`helpers.lists_are_almost_equal`: compares
+    corresponding elements up to the length of the shorter array."""
+    length = min(len(coordinates), len(target_coordinates))
+    return bool(numpy.all(numpy.abs(
+        numpy.asarray(coordinates[:length]) -
+        numpy.asarray(target_coordinates[:length])) < tolerance))
+
+
+def _is_nonzero(values):
+    """Returns True where ``values`` is nonzero; NaN values are treated as
+    zero (e.g. not available)."""
+    values = numpy.asarray(values)
+    if numpy.issubdtype(values.dtype, numpy.inexact):
+        return numpy.logical_and(values != 0, numpy.logical_not(
+            numpy.isnan(values)))
+    return values != 0
+
+
+def _get_default_fill_value(dtype):
+    """Returns the value used to initialize data of type ``dtype``: NaN for
+    floating-point data and zero (or False) otherwise."""
+    if numpy.issubdtype(dtype, numpy.inexact):
+        return numpy.nan
+    return 0
+
+
+#: Methods supported by :meth:`DataMap2D.aggregate_blocks`
+AGGREGATION_METHODS = ("sum", "mean", "fraction", "min", "max")
+
+
+def _get_block_shape(block_shape):
+    """Returns ``block_shape`` as a (rows, columns) tuple; a single int is
+    used for both dimensions."""
+    if isinstance(block_shape, (int, long, numpy.integer)):
+        block_shape = (block_shape, block_shape)
+    block_shape = tuple(int(size) for size in block_shape)
+    if len(block_shape) != 2 or min(block_shape) < 1:
+        raise ValueError("Block shape must consist of two positive integers "
+                         "(got %s)" % str(block_shape))
+    return block_shape
+
+
+#: Default number of (latitudes, longitudes) per block of
+#: :meth:`DataMap2D.iter_blocks`
+DEFAULT_BLOCK_SHAPE = (256, 256)
+
+
+def _get_block_slices(shape, block_shape):
+    """Returns the (latitude slice, longitude slice) of each block of a grid
+    of the given ``shape`` in row-major order; blocks at the edges may be
+    smaller than ``block_shape``."""
+    (num_latitudes, num_longitudes) = shape
+    (block_height, block_width) = _get_block_shape(block_shape)
+    return [(slice(lat_start, min(lat_start + block_height, num_latitudes)),
+             slice(lon_start, min(lon_start + block_width, num_longitudes)))
+            for lat_start in range(0, num_latitudes, block_height)
+            for lon_start in range(0, num_longitudes, block_width)]
+
+
+def _get_num_blocks(num_points, block_size):
+    """Returns the number of blocks of ``block_size`` points needed to cover
+    ``num_points`` points (the last block may be incomplete)."""
+    return -(-num_points // block_size)
+
+
+def _get_aggregated_coordinates(coordinates, block_size):
+    """Returns the first and last coordinates of the coarse grid whose points
+    are the centers of consecutive blocks of ``block_size`` points. If the
+    last block is incomplete, its point is where the center of a complete
+    block would be so that the coarse grid is evenly spaced."""
+    first_coordinate = float(numpy.mean(coordinates[:block_size]))
+    if len(coordinates) % block_size == 0:
+        return (first_coordinate,
+                float(numpy.mean(coordinates[-block_size:])))
+
+    num_blocks = _get_num_blocks(len(coordinates), block_size)
+    if num_blocks == 1:
+        return (first_coordinate, first_coordinate)
+    spacing = float(coordinates[-1] - coordinates[0]) / (len(coordinates) - 1)
+    return (first_coordinate,
+            first_coordinate + (num_blocks - 1) * block_size * spacing)
+
+
+def _pad_to_blocks(values, block_shape, method):
+    """Pads the last two dimensions of ``values`` so that they can be divided
+    into blocks of shape ``block_shape``. The padding does not change the
+    result of :func:`_aggregate_blocks`: it is NaN (which is ignored) or, for
+    "min" and "max" of non-floating-point values, the identity of the
+    method."""
+    (num_rows, num_columns) = values.shape[-2:]
+    padded_shape = values.shape[:-2] + (
+        _get_num_blocks(num_rows, block_shape[0]) * block_shape[0],
+        _get_num_blocks(num_columns, block_shape[1]) * block_shape[1])
+
+    if numpy.issubdtype(values.dtype, numpy.inexact):
+        fill_value = numpy.nan
+    elif method in ("min", "max"):
+        if values.dtype == bool:
+            fill_value = method == "min"
+        elif method == "min":
+            fill_value = numpy.iinfo(values.dtype).max
+        else:
+            fill_value = numpy.iinfo(values.dtype).min
+    else:
+        # The result is floating-point anyway
+        values = values.astype(float)
+        fill_value = numpy.nan
+
+    padded_values = numpy.empty(padded_shape, dtype=values.dtype)
+    padded_values.fill(fill_value)
+    padded_values[..., :num_rows, :num_columns] = values
+    return padded_values
+
+
+def _aggregate_blocks(values, block_shape, method, partial_blocks=False):
+    """
+    Aggregates the last two dimensions of ``values`` over non-overlapping
+    blocks of shape ``block_shape``. NaN values are ignored; blocks which
+    consist only of NaN values result in NaN. "sum", "mean" and "fraction"
+    (the fraction of nonzero values) return floating-point values; "min" and
+    "max" keep the data type of ``values``.
+
+    If ``partial_blocks`` is True, the dimensions need not be divisible by
+    the block shape: the last blocks along each dimension then aggregate
+    the remaining values only.
+    """
+    if method not in AGGREGATION_METHODS:
+        raise ValueError("Unknown aggregation method '%s' (expected one of "
+                         "%s)" % (method, str(AGGREGATION_METHODS)))
+
+    values = numpy.asarray(values)
+    (block_height, block_width) = block_shape
+    (num_rows, num_columns) = values.shape[-2:]
+    if num_rows % block_height or num_columns % block_width:
+        if not partial_blocks:
+            raise ValueError("The map (%dx%d) cannot be divided into blocks "
+                             "of %dx%d" % (num_rows, num_columns,
+                                           block_height, block_width))
+        values = _pad_to_blocks(values, block_shape, method)
+        (num_rows, num_columns) = values.shape[-2:]
+
+    blocks = values.reshape(values.shape[:-2] +
+                            (num_rows // block_height, block_height,
+                             num_columns // block_width, block_width))
+    block_axes = (-3, -1)
+
+    if not numpy.issubdtype(values.dtype, numpy.inexact):
+        if method in ("min", "max"):
+            return getattr(blocks, method)(axis=block_axes)
+        if method == "fraction":
+            blocks = blocks != 0
+        result = numpy.sum(blocks, axis=block_axes, dtype=float)
+        if method != "sum":
+            result /= block_height * block_width
+        return result
+
+    is_valid = ~numpy.isnan(blocks)
+    num_valid = numpy.sum(is_valid, axis=block_axes)
+    if method == "min":
+        result = numpy.where(is_valid, blocks, numpy.inf).min(axis=block_axes)
+    elif method == "max":
+        result = numpy.where(is_valid, blocks, -numpy.inf).max(
+            axis=block_axes)
+    else:
+        if method == "fraction":
+            blocks = blocks != 0
+        result = numpy.sum(numpy.where(is_valid, blocks, 0), axis=block_axes,
+                           dtype=numpy.result_type(values, float))
+        if method != "sum":
+            with numpy.errstate(invalid="ignore", divide="ignore"):
+                result /= num_valid
+    result[num_valid == 0] = numpy.nan
+    return result
+
+
+class Grid(object):
+    """
+    Immutable description of the points of a :class:`DataMap2D`: the
+    latitude and longitude bounds and the number of divisions along each
+    axis. Grids are shared: creating a Grid with the same arguments as an
+    existing one returns the existing object, so all maps created from the
+    same specification use the same coordinate arrays and two maps are
+    comparable if they have the same Grid.
+
+    Grids are hashable and are pickled by their arguments only.
+    """
+    _existing_grids = weakref.WeakValueDictionary()
+
+    def __new__(cls, latitude_bounds, longitude_bounds, num_latitude_divisions,
+                num_longitude_divisions):
+        (min_lat, max_lat) = latitude_bounds
+        if min_lat > max_lat:
+            raise ValueError("Max. latitude should be greater than min. "
+                             "latitude")
+
+        (min_lon, max_lon) = longitude_bounds
+        if min_lon > max_lon:
+            raise ValueError("Max. longitude should be greater than min. "
+                             "longitude")
+
+        key = ((float(min_lat), float(max_lat)),
+               (float(min_lon), float(max_lon)),
+               int(num_latitude_divisions), int(num_longitude_divisions))
+        grid = cls._existing_grids.get(key)
+        if grid is not None:
+            return grid
+
+        grid = super(Grid, cls).__new__(cls)
+        grid._key = key
+        grid._latitudes = numpy.linspace(min_lat, max_lat,
+                                         num=num_latitude_divisions)
+        grid._longitudes = numpy.linspace(min_lon, max_lon,
+                                          num=num_longitude_divisions)
+        grid._latitudes.flags.writeable = False
+        grid._longitudes.flags.writeable = False
+        grid._latitude_index_dict = None
+        grid._longitude_index_dict = None
+        cls._existing_grids[key] = grid
+        return grid
+
+    def __reduce__(self):
+        return (Grid, self._key)
+
+    def __eq__(self, other):
+        return isinstance(other, Grid) and self._key == other._key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __repr__(self):
+        return "Grid(%r, %r, %d, %d)" % self._key
+
+    @property
+    def latitude_bounds(self):
+        """(min_latitude, max_latitude)"""
+        return self._key[0]
+
+    @property
+    def longitude_bounds(self):
+        """(min_longitude, max_longitude)"""
+        return self._key[1]
+
+    @property
+    def num_latitude_divisions(self):
+        return self._key[2]
+
+    @property
+    def num_longitude_divisions(self):
+        return self._key[3]
+
+    @property
+    def latitudes(self):
+        """Latitudes of the points (read-only array)."""
+        return self._latitudes
+
+    @property
+    def longitudes(self):
+        """Longitudes of the points (read-only array)."""
+        return self._longitudes
+
+    @property
+    def latitude_index_dict(self):
+        """Dictionary which maps each latitude to its index."""
+        if self._latitude_index_dict is None:
+            self._latitude_index_dict = _convert_list_to_dict(self._latitudes)
+        return self._latitude_index_dict
+
+    @property
+    def longitude_index_dict(self):
+        """Dictionary which maps each longitude to its index."""
+        if self._longitude_index_dict is None:
+            self._longitude_index_dict = _convert_list_to_dict(
+                self._longitudes)
+        return self._longitude_index_dict
+
+
+def _convert_list_to_dict(user_list):
+    output_dict = {}
+    for (index, value) in enumerate(user_list):
+        output_dict[value] = index
+    return output_dict
 
 
 class DataMap2D(object):
     """Keeps track of DataPoints whose (latitude, longitude)s naturally belong
     on a grid. Two-dimensional."""
 
+    # True if the matrix is part of a larger array (e.g. a layer of a
+    # DataMap3D) or of a file (see from_memmap) and must therefore be
+    # modified in place
+    _matrix_is_shared = False
+
     def __init__(self):
         self.log = getModuleLogger(self)
 
     @classmethod
     def from_specification(cls, latitude_bounds, longitude_bounds,
                            num_latitude_divisions, num_longitude_divisions,
-                           verbose=True):
+                           verbose=True, dtype=float):
         """
         :param latitude_bounds: (min_latitude, max_latitude)
         :param longitude_bounds: (min_longitude, max_longitude)
@@ -24,32 +602,48 @@ class DataMap2D(object):
         :type num_latitude_divisions: int
         :param num_longitude_divisions: number of longitude points per latitude
         :type num_longitude_divisions: int
+        :param dtype: data type of the values (e.g. bool, numpy.uint8, \
+                numpy.float32, float); floating-point maps are initialized \
+                to NaN and all others to zero (False)
+        :type dtype: :class:`numpy.dtype` or anything convertible to one
         :return:
         :rtype: :class:`DataMap2D`
         """
         obj = cls()
         obj._initialize(latitude_bounds, longitude_bounds,
                         num_latitude_divisions, num_longitude_divisions,
-                        verbose=verbose)
+                        data_type=dtype, verbose=verbose)
         return obj
 
     @classmethod
-    def get_copy_of(cls, other_datamap2d, verbose=True):
+    def get_copy_of(cls, other_datamap2d, verbose=True, dtype=None):
         """
         Creates a copy of the :class:`DataMap2D`. The internal matrix will also
         be copied.
 
         :param other_datamap2d:
         :type other_datamap2d: :class:`DataMap2D`
+        :param dtype: data type of the copy (by default, the data type of \
+                ``other_datamap2d``); values are converted as by \
+                :meth:`numpy.ndarray.astype`
         :return:
         :rtype: :class:`DataMap2D`
         """
-        obj = cls.from_specification(other_datamap2d._latitude_bounds,
-                                     other_datamap2d._longitude_bounds,
-                                     other_datamap2d._num_latitude_divisions,
-                                     other_datamap2d._num_longitude_divisions,
-                                     verbose=verbose)
-        obj.mutable_matrix = other_datamap2d.mutable_matrix
+        if dtype is None:
+            obj = cls.from_specification(other_datamap2d._latitude_bounds,
+                                         other_datamap2d._longitude_bounds,
+                                         other_datamap2d._num_latitude_divisions,
+                                         other_datamap2d._num_longitude_divisions,
+                                         verbose=verbose,
+                                         dtype=other_datamap2d.mutable_matrix.dtype)
+            obj.mutable_matrix = other_datamap2d.mutable_matrix
+        else:
+            obj = cls.from_specification(other_datamap2d._latitude_bounds,
+                                         other_datamap2d._longitude_bounds,
+                                         other_datamap2d._num_latitude_divisions,
+                                         other_datamap2d._num_longitude_divisions,
+                                         verbose=verbose, dtype=dtype)
+            obj._matrix[:] = other_datamap2d.mutable_matrix
         return obj
 
     @classmethod
@@ -61,8 +655,9 @@ class DataMap2D(object):
 
         :param other_datamap2d:
         :type other_datamap2d: :class:`DataMap2D`
-        :param matrix:
-        :type matrix: :class:`numpy.matrix`
+        :param matrix: values (a :class:`numpy.matrix` is converted to an \
+                array) or a scalar
+        :type matrix: :class:`numpy.ndarray`
         :return:
         :rtype: :class:`DataMap2D`
         """
@@ -71,65 +666,79 @@ class DataMap2D(object):
                                      other_datamap2d._num_latitude_divisions,
                                      other_datamap2d._num_longitude_divisions,
                                      verbose=verbose)
-        if isinstance(matrix, numpy.matrix):
-            obj.mutable_matrix = matrix
-        else:
+        if numpy.ndim(matrix) == 0:
             obj.reset_all_values(matrix)
+        else:
+            obj.mutable_matrix = matrix
         return obj
 
-    def get_clean_copy(self, fill_value=numpy.nan):
+    def get_clean_copy(self, fill_value=None, dtype=None):
         """
         Returns a new :class:`DataMap2D` object which has the same properties as
         this one but with the internal matrix filled with ``fill_value``.
 
-        :param fill_value: fill value for the matrix of the new object
+        :param fill_value: fill value for the matrix of the new object (by \
+                default, NaN for floating-point data and zero otherwise)
+        :param dtype: data type of the new object (by default, the data type \
+                of this object)
         :return: new object
         :rtype: :class:`DataMap2D`
         """
-        clean_copy = self.__class__.get_copy_of(self)
+        if dtype is None:
+            dtype = self._matrix.dtype
+        clean_copy = self.__class__.from_specification(
+            self._latitude_bounds, self._longitude_bounds,
+            self._num_latitude_divisions, self._num_longitude_divisions,
+            dtype=dtype)
         clean_copy.reset_all_values(fill_value=fill_value)
         return clean_copy
 
+    def astype(self, dtype):
+        """
+        Returns a copy of this :class:`DataMap2D` whose values are of type
+        ``dtype``. See also: :meth:`get_copy_of`.
+
+        :param dtype: data type of the copy
+        :rtype: :class:`DataMap2D`
+        """
+        return self.__class__.get_copy_of(self, verbose=False, dtype=dtype)
+
     def _initialize(self, latitude_bounds, longitude_bounds,
                     num_latitude_divisions, num_longitude_divisions,
-                    data_type=float, verbose=True):
+                    data_type=float, verbose=True, matrix=None):
+        """If ``matrix`` is given, it is used as the internal matrix without
+        being copied or reset."""
         if verbose:
             self.log.debug("Creating %dx%d data map" % (
                 num_latitude_divisions, num_longitude_divisions))
 
-        (min_lat, max_lat) = latitude_bounds
-        if min_lat > max_lat:
-            raise ValueError("Max. latitude should be greater than min. "
-                             "latitude")
-
-        (min_lon, max_lon) = longitude_bounds
-        if min_lon > max_lon:
-            raise ValueError("Max. longitude should be greater than min. "
-                             "longitude")
-
-        self._latitude_bounds = latitude_bounds
-        self._longitude_bounds = longitude_bounds
-        self._num_latitude_divisions = num_latitude_divisions
-        self._num_longitude_divisions = num_longitude_divisions
-
-        self._latitudes = numpy.linspace(min_lat, max_lat,
-                                         num=num_latitude_divisions)
-        self._longitudes = numpy.linspace(min_lon, max_lon,
-                                          num=num_longitude_divisions)
+        self._grid = Grid(latitude_bounds, longitude_bounds,
+                          num_latitude_divisions, num_longitude_divisions)
 
-        self._latitude_index_dict = self._convert_list_to_dict(self._latitudes)
-        self._longitude_index_dict = self._convert_list_to_dict(
-            self._longitudes)
+        if matrix is not None:
+            self._matrix = matrix
+            return
 
         self._matrix = numpy.empty((num_latitude_divisions,
                                     num_longitude_divisions), dtype=data_type)
         self.reset_all_values()
 
-    def _convert_list_to_dict(self, user_list):
-        output_dict = {}
-        for (index, value) in enumerate(user_list):
-            output_dict[value] = index
-        return output_dict
+    @property
+    def grid(self):
+        """The :class:`Grid` which describes the latitudes and longitudes of
+        this map. Maps with the same bounds and number of divisions share
+        the same Grid."""
+        return self._grid
+
+    # The geometry is stored in the shared Grid
+    _latitude_bounds = property(lambda self: self._grid.latitude_bounds)
+    _longitude_bounds = property(lambda self: self._grid.longitude_bounds)
+    _num_latitude_divisions = property(
+        lambda self: self._grid.num_latitude_divisions)
+    _num_longitude_divisions = property(
+        lambda self: self._grid.num_longitude_divisions)
+    _latitudes = property(lambda self: self._grid.latitudes)
+    _longitudes = property(lambda self: self._grid.longitudes)
 
     def get_latitude_index(self, latitude):
         """
@@ -139,8 +748,9 @@ class DataMap2D(object):
         :return: index such that self.latitudes[index] = latitude (returns None
         if latitude not found)
         """
-        if latitude in self._latitude_index_dict:
-            return self._latitude_index_dict[latitude]
+        latitude_index_dict = self._grid.latitude_index_dict
+        if latitude in latitude_index_dict:
+            return latitude_index_dict[latitude]
         else:
             self.log.error("Latitude not found: %f" % latitude)
             return None
@@ -153,8 +763,9 @@ class DataMap2D(object):
         :return: index such that self.longitudes[index] = longitude (returns \
                 None if longitude not found)
         """
-        if longitude in self._longitude_index_dict:
-            return self._longitude_index_dict[longitude]
+        longitude_index_dict = self._grid.longitude_index_dict
+        if longitude in longitude_index_dict:
+            return longitude_index_dict[longitude]
         else:
             self.log.error("Longitude not found: %f" % longitude)
             return None
@@ -162,28 +773,39 @@ class DataMap2D(object):
     @property
     def mutable_matrix(self):
         """
-        Internal data store for the :class:`DataMap2D`.
+        Internal data store for the :class:`DataMap2D`. When it is set, the
+        new values are copied; a :class:`numpy.matrix` is converted to a
+        plain array.
 
-        :rtype: :class:`numpy.matrix`
+        :rtype: :class:`numpy.ndarray`
         :return: matrix used for storage
         """
         return self._matrix
 
     @mutable_matrix.setter
     def mutable_matrix(self, new_matrix):
-        self._matrix = new_matrix.copy()
+        if self._matrix_is_shared:
+            self._matrix[:] = new_matrix
+        else:
+            self._matrix = numpy.array(new_matrix)
 
     def get_matrix_copy(self):
         """
-        Returns a copy of the internal matrix.
+        Returns a copy of the internal matrix. Use :attr:`mutable_matrix`
+        instead if the values are only read.
+
+        :rtype: :class:`numpy.ndarray`
         """
         return self._matrix.copy()
 
-    def reset_all_values(self, fill_value=numpy.NaN):
+    def reset_all_values(self, fill_value=None):
         """
         Resets all values of the :class:`DataMap2D` to the specified
-        `fill_value`.
+        `fill_value`. By default, floating-point maps are reset to NaN and
+        all others to zero (False).
         """
+        if fill_value is None:
+            fill_value = _get_default_fill_value(self._matrix.dtype)
         self._matrix[:] = fill_value
 
     @property
@@ -272,7 +894,140 @@ class DataMap2D(object):
         self.set_value_by_index(latitude_index, longitude_index, new_value)
         return True
 
-    def update_all_values_via_function(self, update_function, verbose=False):
+    def _get_grid_positions(self, latitudes, longitudes):
+        """
+        Converts the locations into (fractional) positions on the grid: the
+        latitude position i corresponds to ``self.latitudes[i]``. Since the
+        grid is evenly spaced, this is plain arithmetic rather than a lookup.
+
+        :return: (latitude_positions, longitude_positions, is_inside) where \
+                ``is_inside`` is False for locations outside of the map
+        :rtype: tuple of :class:`numpy.ndarray`
+        """
+        (latitudes, longitudes) = numpy.broadcast_arrays(
+            numpy.asarray(latitudes, dtype=float),
+            numpy.asarray(longitudes, dtype=float))
+        (latitude_positions, latitude_is_inside) = _get_positions_on_axis(
+            latitudes, self._latitude_bounds, self._num_latitude_divisions)
+        (longitude_positions, longitude_is_inside) = _get_positions_on_axis(
+            longitudes, self._longitude_bounds, self._num_longitude_divisions)
+        return (latitude_positions, longitude_positions,
+                latitude_is_inside & longitude_is_inside)
+
+    def _get_nearest_indices(self, latitudes, longitudes):
+        """Returns the indices of the pixels nearest to the locations; raises
+        a ValueError if any location is outside of the map."""
+        (latitude_positions, longitude_positions, is_inside) = \
+            self._get_grid_positions(latitudes, longitudes)
+        if not numpy.all(is_inside):
+            raise ValueError("%d location(s) are outside of the map" %
+                             numpy.sum(numpy.logical_not(is_inside)))
+        return (numpy.floor(latitude_positions + 0.5).astype(int),
+                numpy.floor(longitude_positions + 0.5).astype(int))
+
+    def get_values_at_locations(self, latitudes, longitudes,
+                                method='nearest', fill_value=numpy.nan):
+        """
+        Looks up the values at many locations at once. Unlike
+        :meth:`get_value_by_location`, the locations do not need to be
+        points of the grid.
+
+        :param latitudes: latitude of each location
+        :type latitudes: array-like of floats
+        :param longitudes: longitude of each location (must be \
+                broadcastable against ``latitudes``)
+        :type longitudes: array-like of floats
+        :param method: 'nearest' (value of the nearest pixel) or 'bilinear' \
+                (bilinear interpolation between the four surrounding pixels)
+        :type method: str
+        :param fill_value: value returned for locations outside of the map
+        :return: values with the (broadcast) shape of the locations; the \
+                data type is that of the map (promoted to hold \
+                ``fill_value``) or floating-point for 'bilinear'
+        :rtype: :class:`numpy.ndarray`
+        """
+        (latitude_positions, longitude_positions, is_inside) = \
+            self._get_grid_positions(latitudes, longitudes)
+        return _sample_grid(numpy.asarray(self._matrix), latitude_positions,
+                            longitude_positions, is_inside, method,
+                            fill_value)
+
+    def set_values_at_locations(self, latitudes, longitudes, new_values):
+        """
+        Sets the value of the pixel nearest to each location. If several
+        locations share a pixel, the last one wins. Raises a ValueError
+        (without changing anything) if any location is outside of the map.
+
+        :param latitudes: latitude of each location
+        :type latitudes: array-like of floats
+        :param longitudes: longitude of each location (must be \
+                broadcastable against ``latitudes``)
+        :type longitudes: array-like of floats
+        :param new_values: new values (a scalar or one per location)
+        :return: None
+        """
+        (latitude_indices, longitude_indices) = self._get_nearest_indices(
+            latitudes, longitudes)
+        self._matrix[latitude_indices, longitude_indices] = new_values
+
+    def nonzero_indices(self):
+        """
+        Returns the indices of the pixels whose value is nonzero (i.e.
+        truthy). Note that NaN is considered nonzero.
+
+        :return: (latitude_indices, longitude_indices); see \
+                :func:`numpy.nonzero`
+        :rtype: tuple of :class:`numpy.ndarray`
+        """
+        return numpy.nonzero(numpy.asarray(self._matrix))
+
+    def iter_blocks(self, block_shape=DEFAULT_BLOCK_SHAPE):
+        """
+        Visits the map one block of pixels at a time, in row-major order. For
+        each block, yields::
+
+            (lat_slice, lon_slice, latitudes, longitudes, values)
+
+        where the slices select the block within the whole grid,
+        ``latitudes`` and ``longitudes`` are the coordinates of the block
+        and ``values`` is a view (not a copy) of the block of
+        :attr:`mutable_matrix`, so it may be modified in place. Blocks at the
+        edges of the map may be smaller than ``block_shape``.
+
+        Nothing is copied, so iterating over a map opened with
+        :meth:`from_memmap` only reads the block which is being visited. See
+        also: :meth:`data_map_tiled.DataMap2DTiled.iter_blocks`.
+
+        :param block_shape: number of latitudes and longitudes per block; a \
+                single int is used for both
+        :type block_shape: int or tuple of ints
+        """
+        for (lat_slice, lon_slice) in _get_block_slices(self._matrix.shape,
+                                                        block_shape):
+            yield (lat_slice, lon_slice, self._latitudes[lat_slice],
+                   self._longitudes[lon_slice],
+                   self._matrix[lat_slice, lon_slice])
+
+    def _get_mask_matrix(self, mask):
+        """
+        Converts ``mask`` (a :class:`DataMap2D` or anything which can be
+        converted to an array) into a boolean array with the shape of the
+        internal matrix. Raises a TypeError if a DataMap2D is given which is
+        not comparable to this one and a ValueError if the shape is wrong.
+        """
+        if isinstance(mask, DataMap2D):
+            self.raise_error_if_datamaps_are_incomparable(mask)
+            mask = mask.mutable_matrix
+
+        mask = numpy.asarray(mask, dtype=bool)
+        if mask.shape != self._matrix.shape:
+            raise ValueError("Mask has shape %s but expected %s." %
+                             (str(mask.shape), str(self._matrix.shape)))
+        return mask
+
+    def update_all_values_via_function(self, update_function, verbose=False,
+                                       only_where=None, num_processes=1,
+                                       chunk_size=None, use_fork=False):
         """
         Updates each pixel in the :class:`DataMap2D` according to
         ``update_function``. The return value from the update function is
@@ -285,13 +1040,56 @@ class DataMap2D(object):
                 ...
                 return new_value_for_pixel      # may also return None if no update is desired
 
+        If ``only_where`` is given, ``update_function`` is called only for
+        the pixels where ``only_where`` is truthy; all other pixels are
+        skipped without any function call. The mask is evaluated once,
+        before any pixel is updated.
+
+        If ``num_processes`` is not 1, the pixels are evaluated in a pool of
+        worker processes (see :mod:`data_map_parallel`), each of which
+        handles bands of ``chunk_size`` latitude rows. In this case,
+        ``update_function`` must either be picklable (e.g. a module-level
+        function) or ``use_fork`` must be True. Since each worker operates on
+        its own copy of the data, ``update_function`` should not depend on
+        the values of other pixels being updated.
+
         :param update_function: function used to update the values
         :type update_function: function object
         :param verbose: if True, progress updates will be logged (level = \
                 INFO); otherwise, nothing will be logged
         :type verbose: bool
+        :param only_where: mask selecting the pixels to be updated
+        :type only_where: :class:`DataMap2D` or array of bools (same shape \
+                as the matrix)
+        :param num_processes: number of processes used to evaluate \
+                ``update_function`` (None to use all CPUs)
+        :type num_processes: int
+        :param chunk_size: number of latitude rows handed to a worker at once
+        :type chunk_size: int
+        :param use_fork: if True, worker processes inherit \
+                ``update_function`` by forking; this allows closures to be \
+                used
+        :type use_fork: bool
         :return: None
         """
+        mask = None
+        if only_where is not None:
+            mask = self._get_mask_matrix(only_where)
+
+        if num_processes != 1:
+            data_map_parallel.update_matrix_in_parallel(
+                self._matrix, self._latitudes, self._longitudes,
+                update_function, mask=mask, num_processes=num_processes,
+                chunk_size=chunk_size, use_fork=use_fork,
+                log=self.log if verbose else None)
+            return
+
+        if mask is not None:
+            self._update_values_at_indices_via_function(update_function,
+                                                        numpy.nonzero(mask),
+                                                        verbose=verbose)
+            return
+
         for (lat_idx, lat) in enumerate(self.latitudes):
             if verbose and lat_idx % 10 == 0:
                 self.log.info("Latitude number: %d" % lat_idx)
@@ -302,6 +1100,84 @@ class DataMap2D(object):
                 if new_value is not None:
                     self.set_value_by_index(lat_idx, lon_idx, new_value)
 
+    def _update_values_at_indices_via_function(self, update_function,
+                                               indices, verbose=False):
+        """
+        Same as :meth:`update_all_values_via_function` but only visits the
+        pixels given by ``indices`` (a (latitude_indices, longitude_indices)
+        pair as returned by e.g. :meth:`nonzero_indices`).
+        """
+        (latitude_indices, longitude_indices) = indices
+        if verbose:
+            self.log.info("Updating %d of %d pixels" % (len(latitude_indices),
+                                                        self._matrix.size))
+
+        last_logged_lat_idx = None
+        for (lat_idx, lon_idx) in zip(latitude_indices.tolist(),
+                                      longitude_indices.tolist()):
+            if verbose and lat_idx % 10 == 0 and \
+                    lat_idx != last_logged_lat_idx:
+                self.log.info("Latitude number: %d" % lat_idx)
+                last_logged_lat_idx = lat_idx
+            current_value = self.get_value_by_index(lat_idx, lon_idx)
+            new_value = update_function(self._latitudes[lat_idx],
+                                        self._longitudes[lon_idx], lat_idx,
+                                        lon_idx, current_value)
+            if new_value is not None:
+                self.set_value_by_index(lat_idx, lon_idx, new_value)
+
+    def update_all_values_via_vectorized_function(self, update_function,
+                                                  verbose=False):
+        """
+        Vectorized counterpart of :meth:`update_all_values_via_function`.
+        Instead of being called once per pixel, ``update_function`` is
+        called exactly once with arrays describing the whole grid and
+        should return an array of new values.
+
+        The latitude arguments are column vectors (shape ``(num_latitudes,
+        1)``) and the longitude arguments are row vectors (shape ``(1,
+        num_longitudes)``) so that they broadcast against each other and
+        against ``current_values`` (shape ``(num_latitudes,
+        num_longitudes)``).
+
+        The return value must be broadcastable to the shape of the matrix.
+        If it is a :class:`numpy.ma.MaskedArray`, masked entries are not
+        updated (the equivalent of returning None for a single pixel in
+        :meth:`update_all_values_via_function`). If None is returned, no
+        update is performed at all.
+
+        ``update_function`` should have the following signature::
+
+            def update_function(latitudes, longitudes, latitude_indices, longitude_indices, current_values):
+                ...
+                return new_values       # array, masked array, or None
+
+        .. note:: ``current_values`` is the internal matrix itself. It \
+                should be treated as read-only.
+
+        :param update_function: function used to update the values
+        :type update_function: function object
+        :param verbose: if True, progress updates will be logged (level = \
+                INFO); otherwise, nothing will be logged
+        :type verbose: bool
+        :return: None
+        """
+        if verbose:
+            self.log.info("Updating %dx%d data map (vectorized)" %
+                          self._matrix.shape)
+
+        latitudes = numpy.asarray(self._latitudes).reshape(-1, 1)
+        longitudes = numpy.asarray(self._longitudes).reshape(1, -1)
+        latitude_indices = numpy.arange(len(self._latitudes)).reshape(-1, 1)
+        longitude_indices = numpy.arange(len(self._longitudes)).reshape(1, -1)
+
+        new_values = update_function(latitudes, longitudes, latitude_indices,
+                                     longitude_indices, self._matrix)
+        if new_values is None:
+            return
+
+        _copy_vectorized_update(self._matrix, new_values)
+
     def datamap_is_comparable(self, other_datamap2d):
         """Tests two :class:`DataMap2D` objects for comparability (i.e. are
         they describing the same points?).
@@ -315,7 +1191,12 @@ class DataMap2D(object):
         if not isinstance(other_datamap2d, DataMap2D):
             return False, "Expected a DataMap2D"
 
-        if not (self._latitude_bounds == other_datamap2d._latitude_bounds):
+        # Maps with the same coordinates normally share their Grid
+        if self._grid is other_datamap2d._grid:
+            return True, None
+
+        if not (tuple(self._latitude_bounds) ==
+                tuple(other_datamap2d._latitude_bounds)):
             return False, "Latitude bounds are not equal: " + \
                    "(%f, %f) vs. (%f, %f)" \
                    % (self._latitude_bounds[0],
@@ -323,7 +1204,8 @@ class DataMap2D(object):
                       other_datamap2d._latitude_bounds[0],
                       other_datamap2d._latitude_bounds[1])
 
-        if not (self._longitude_bounds == other_datamap2d._longitude_bounds):
+        if not (tuple(self._longitude_bounds) ==
+                tuple(other_datamap2d._longitude_bounds)):
             return False, "Longitude bounds are not equal: " + \
                    "(%f, %f) vs. (%f, %f)" \
                    % (self._longitude_bounds[0],
@@ -375,6 +1257,10 @@ class DataMap2D(object):
 
         Does not modify the data in either :class:`DataMap2D`.
 
+        If ``combination_function`` is a :class:`numpy.ufunc` (e.g.
+        :data:`numpy.maximum`), it is applied to the whole matrices at once
+        instead. See also :func:`data_map_synthesis.combine_datamaps`.
+
         :param other_datamap2d:
         :type other_datamap2d: :class:`DataMap2D`
         :param combination_function: handle to a function taking exactly two \
@@ -385,7 +1271,12 @@ class DataMap2D(object):
         """
         self.raise_error_if_datamaps_are_incomparable(other_datamap2d)
 
-        new_datamap2d = DataMap2D.get_copy_of(self)
+        new_datamap2d = DataMap2D.get_copy_of(self, dtype=float)
+        if isinstance(combination_function, numpy.ufunc):
+            new_datamap2d.mutable_matrix[:] = combination_function(
+                self.mutable_matrix, other_datamap2d.mutable_matrix)
+            return new_datamap2d
+
         new_datamap2d.reset_all_values()
 
         dimensions = self.mutable_matrix.shape
@@ -416,6 +1307,55 @@ class DataMap2D(object):
 
         return new_datamap2d
 
+    def aggregate_blocks(self, block_shape, method="mean",
+                         partial_blocks=False):
+        """
+        Creates a coarser :class:`DataMap2D` in which each pixel aggregates a
+        block of pixels of this map, e.g. an 800x1200 map with
+        ``block_shape=4`` results in a 200x300 map. The pixels of the coarse
+        map are located at the centers of the blocks. Typical methods are
+        "sum" for population or area, "mean" or "fraction" for whitespace
+        and "min" or "max" for signal strength.
+
+        NaN values are ignored; a block which consists only of NaN values
+        results in NaN.
+
+        :param block_shape: number of latitudes and longitudes per block; a \
+                single int is used for both
+        :type block_shape: int or tuple of ints
+        :param method: one of "sum", "mean", "fraction" (fraction of \
+                nonzero values), "min" or "max"
+        :type method: str
+        :param partial_blocks: if True, the map need not be divisible into \
+                blocks (e.g. a 201x301 map with ``block_shape=4`` results \
+                in a 51x76 map): the last row and column of blocks only \
+                aggregate the remaining pixels and their pixels are located \
+                where the centers of complete blocks would be, so the \
+                coarse map remains evenly spaced; if False, a ValueError is \
+                raised for such a map
+        :type partial_blocks: bool
+        :return: coarse data map; "sum", "mean" and "fraction" result in \
+                floating-point values while "min" and "max" keep the data type
+        :rtype: :class:`DataMap2D`
+        """
+        block_shape = _get_block_shape(block_shape)
+        return self._create_aggregated_datamap2d(
+            block_shape, _aggregate_blocks(self._matrix, block_shape, method,
+                                           partial_blocks))
+
+    def _create_aggregated_datamap2d(self, block_shape, matrix):
+        """Creates a :class:`DataMap2D` on the grid whose pixels are the
+        centers of the blocks and which takes ownership of ``matrix``."""
+        (block_height, block_width) = block_shape
+        datamap2d = DataMap2D()
+        datamap2d._initialize(
+            _get_aggregated_coordinates(self._latitudes, block_height),
+            _get_aggregated_coordinates(self._longitudes, block_width),
+            _get_num_blocks(self._num_latitude_divisions, block_height),
+            _get_num_blocks(self._num_longitude_divisions, block_width),
+            data_type=matrix.dtype, verbose=False, matrix=matrix)
+        return datamap2d
+
         # ####
 
     #   DATA EXPORT
@@ -427,10 +1367,20 @@ class DataMap2D(object):
         return Map(self, *args, **kwargs)
 
     def add_to_kml(self, kml=None, geometry_modification_function=None,
-                   include_polygon_function=None, filename=None, save=True):
+                   include_polygon_function=None, filename=None, save=True,
+                   merge_pixels=False, binning_function=None):
         """
         Add the data to a KML object for plotting with e.g. Google Earth.
 
+        By default, one polygon is created per pixel. If ``merge_pixels`` is
+        True, neighboring pixels with the same value are merged into
+        rectangles first, which usually reduces the number of polygons (and
+        the size of the KML) by orders of magnitude. ``binning_function``
+        (one parameter: value of the pixel; returns the binned value) may be
+        given to merge pixels whose values fall into the same bin; the other
+        functions then receive the binned value. For very large maps, see
+        also :meth:`add_to_kml_as_ground_overlay`.
+
         :param kml: existing KML object (created if none given)
         :type kml: :class:`simplekml.Kml`
         :param geometry_modification_function: function which modifies each \
@@ -446,6 +1396,12 @@ class DataMap2D(object):
         :type filename: str
         :param save: if True, the KML is saved with the given filename
         :type save: bool
+        :param merge_pixels: if True, pixels with equal (binned) values are \
+                merged into rectangles
+        :type merge_pixels: bool
+        :param binning_function: function which maps the value of a pixel \
+                to its bin (only used if ``merge_pixels`` is True)
+        :type binning_function: function handle
         :return: KML object
         :rtype: :class:`simplekml.Kml`
         """
@@ -453,6 +1409,38 @@ class DataMap2D(object):
         latitude_width = float(abs(self._latitudes[1] - self._latitudes[0]))
         longitude_width = float(abs(self._longitudes[1] - self._longitudes[0]))
 
+        kml = kml or simplekml.Kml()
+
+        if merge_pixels:
+            (labels, label_values) = _label_values(self._matrix,
+                                                   binning_function)
+            if include_polygon_function is not None:
+                is_included = [include_polygon_function(value) for value in
+                               label_values]
+            else:
+                is_included = [True] * len(label_values)
+
+            for (label, first_row, last_row, first_column, last_column) in \
+                    _merge_pixels_into_rectangles(labels):
+                if not is_included[label]:
+                    continue
+                value = label_values[label]
+
+                poly = kml.newpolygon()
+                max_lat = self._latitudes[last_row] + latitude_width / 2
+                min_lat = self._latitudes[first_row] - latitude_width / 2
+                max_lon = self._longitudes[last_column] + longitude_width / 2
+                min_lon = self._longitudes[first_column] - longitude_width / 2
+                poly.outerboundaryis = [(min_lon, max_lat), (max_lon, max_lat),
+                                        (max_lon, min_lat), (min_lon, min_lat)]
+                poly.description = str(value)
+
+                if geometry_modification_function is not None:
+                    geometry_modification_function(poly, value)
+
+            self._save_kml(kml, filename, save)
+            return kml
+
         def make_box(kml, center_lat, center_lon, value):
 
             if include_polygon_function is not None and not \
@@ -473,21 +1461,81 @@ class DataMap2D(object):
             if geometry_modification_function is not None:
                 geometry_modification_function(poly, value)
 
-        kml = kml or simplekml.Kml()
-
         for (lat_idx, lat) in enumerate(self._latitudes):
             for (lon_idx, lon) in enumerate(self._longitudes):
                 value = self.get_value_by_index(lat_idx, lon_idx)
                 make_box(kml, lat, lon, value)
 
+        self._save_kml(kml, filename, save)
+        return kml
+
+    def add_to_kml_as_ground_overlay(self, image_filename, kml=None,
+                                     filename=None, save=True,
+                                     colormap=None, vmin=None, vmax=None,
+                                     name=None):
+        """
+        Add the data to a KML object as a single image (a GroundOverlay)
+        rather than as polygons. The map is rendered to a PNG with one image
+        pixel per data pixel; NaN values are transparent. This is much
+        faster than :meth:`add_to_kml` and scales to continent-sized maps.
+
+        .. note:: The KML refers to the image by its path relative to \
+                ``filename`` (if given), so the two files should be kept \
+                together.
+
+        :param image_filename: filename of the PNG which is written
+        :type image_filename: str
+        :param kml: existing KML object (created if none given)
+        :type kml: :class:`simplekml.Kml`
+        :param filename: output filename of the KML
+        :type filename: str
+        :param save: if True, the KML is saved with the given filename
+        :type save: bool
+        :param colormap: colormap used to render the values (default: jet)
+        :type colormap: :class:`matplotlib.colors.Colormap` or str
+        :param vmin: value mapped to the lowest color (default: minimum)
+        :type vmin: float
+        :param vmax: value mapped to the highest color (default: maximum)
+        :type vmax: float
+        :param name: name of the overlay
+        :type name: str
+        :return: KML object
+        :rtype: :class:`simplekml.Kml`
+        """
+        values = numpy.ma.masked_invalid(numpy.asarray(self._matrix,
+                                                       dtype=float))
+        plt.imsave(image_filename, values, cmap=colormap or "jet",
+                   vmin=vmin, vmax=vmax, origin="lower", format="png")
+
+        latitude_width = float(abs(self._latitudes[1] - self._latitudes[0]))
+        longitude_width = float(abs(self._longitudes[1] - self._longitudes[0]))
+
+        kml = kml or simplekml.Kml()
+        ground_overlay = kml.newgroundoverlay(name=name)
+        if filename is not None:
+            ground_overlay.icon.href = os.path.relpath(
+                image_filename, os.path.dirname(os.path.abspath(filename)))
+        else:
+            ground_overlay.icon.href = image_filename
+        ground_overlay.latlonbox.north = self._latitudes[-1] + \
+            latitude_width / 2
+        ground_overlay.latlonbox.south = self._latitudes[0] - \
+            latitude_width / 2
+        ground_overlay.latlonbox.east = self._longitudes[-1] + \
+            longitude_width / 2
+        ground_overlay.latlonbox.west = self._longitudes[0] - \
+            longitude_width / 2
+
+        self._save_kml(kml, filename, save)
+        return kml
+
+    def _save_kml(self, kml, filename, save):
         if save:
             if filename is None:
                 self.log.error("Could not save KML: no filename given")
             else:
                 kml.save(filename)
 
-        return kml
-
     def to_pickle(self, filename):
         """
         Save the DataMap2D to a pickle with the specified ``filename``. See
@@ -517,16 +1565,79 @@ class DataMap2D(object):
                 obj.log = getModuleLogger(obj)
             return obj
 
+    def to_memmap(self, filename):
+        """
+        Saves the values of the DataMap2D as raw data to ``filename`` and a
+        description of the map (bounds, divisions, data type) as JSON to
+        ``filename`` + ".json". Unlike a pickle, the result can be opened
+        without reading the data; see :meth:`from_memmap`.
+
+        :param filename: destination filename
+        :type filename: str
+        :return: None
+        """
+        header = self._get_memmap_header()
+        header.update(_get_memmap_grid_header(self), kind="DataMap2D")
+        _write_memmap(filename, header, self._matrix)
+
+    def _get_memmap_header(self):
+        """Returns additional information to be stored by :meth:`to_memmap`;
+        meant to be overridden along with :meth:`_restore_memmap_header`."""
+        return {}
+
+    def _restore_memmap_header(self, header):
+        """Restores the information returned by :meth:`_get_memmap_header`."""
+        pass
+
+    @classmethod
+    def from_memmap(cls, filename, mode="r"):
+        """
+        Opens a DataMap2D saved with :meth:`to_memmap`. The values are mapped
+        into memory with :class:`numpy.memmap` rather than read, so opening
+        the map takes constant time and reading a value (e.g. with
+        :meth:`get_value_by_location`) only touches the pages that are
+        needed. Processes which open the same file read-only share its
+        memory.
+
+        :param filename: filename given to :meth:`to_memmap`
+        :type filename: str
+        :param mode: "r" (read-only), "r+" (changes are written to the \
+                file) or "c" (copy-on-write: changes are kept in memory only)
+        :type mode: str
+        :return:
+        :rtype: :class:`DataMap2D`
+        """
+        (header, matrix) = _read_memmap(filename, "DataMap2D", mode)
+        obj = cls()
+        _initialize_from_memmap_grid_header(obj, header, matrix)
+        obj._restore_memmap_header(header)
+        obj._matrix_is_shared = True
+        return obj
+
     # Helper functions required for pickling
     # Objects with open file descriptors (e.g. logs) cannot be pickled,
-    # so we remove the logs when saving.
+    # so we remove the logs when saving. An unpickled matrix is never shared.
     def __getstate__(self):
         state = self.__dict__.copy()
-        del state['log']
+        state.pop('log', None)
+        state.pop('_matrix_is_shared', None)
         return state
 
     def __setstate__(self, d):
+        d = dict(d)
+        # Older pickles store the geometry in each map rather than in a Grid
+        if '_grid' not in d:
+            d['_grid'] = Grid(d['_latitude_bounds'], d['_longitude_bounds'],
+                              d['_num_latitude_divisions'],
+                              d['_num_longitude_divisions'])
+            for key in ['_latitude_bounds', '_longitude_bounds',
+                        '_num_latitude_divisions', '_num_longitude_divisions',
+                        '_latitudes', '_longitudes', '_latitude_index_dict',
+                        '_longitude_index_dict']:
+                d.pop(key, None)
         self.__dict__.update(d)
+        if 'log' not in self.__dict__:
+            self.log = getModuleLogger(self)
 
     #####
     #   END DATA EXPORT
@@ -536,6 +1647,108 @@ class DataMap2D(object):
     #####
     #   SUBMAPS
     #####
+    def get_submap_index_windows(self, latitude_bounds, longitude_bounds,
+                                 generate_even_if_submap_partially_outside_datamap=False):
+        """
+        Batch counterpart of :meth:`generate_submap` which only determines
+        the indices of the submaps: for each bounding box, the window of the
+        matrix which :meth:`generate_submap` would return. All boxes are
+        handled in one call using binary searches.
+
+        :param latitude_bounds: (min_latitude, max_latitude) of each box
+        :type latitude_bounds: array-like of shape (boxes x 2)
+        :param longitude_bounds: (min_longitude, max_longitude) of each box
+        :type longitude_bounds: array-like of shape (boxes x 2)
+        :param generate_even_if_submap_partially_outside_datamap: see \
+                :meth:`generate_submap`; if True, boxes which do not overlap \
+                the DataMap2D at all get an empty window (start == stop) \
+                rather than raising a ValueError
+        :return: array whose rows are (latitude_start, latitude_stop, \
+                longitude_start, longitude_stop) such that \
+                ``matrix[latitude_start:latitude_stop, \
+                longitude_start:longitude_stop]`` is the submap of that box
+        :rtype: :class:`numpy.ndarray` of ints (boxes x 4)
+        """
+        latitude_bounds = numpy.asarray(latitude_bounds,
+                                        dtype=float).reshape(-1, 2)
+        longitude_bounds = numpy.asarray(longitude_bounds,
+                                         dtype=float).reshape(-1, 2)
+        (min_lats, max_lats) = latitude_bounds.T
+        (min_lons, max_lons) = longitude_bounds.T
+        if numpy.any(min_lats > max_lats):
+            raise ValueError("Max. latitude should be greater than min. "
+                             "latitude")
+        if numpy.any(min_lons > max_lons):
+            raise ValueError("Max. longitude should be greater than min. "
+                             "longitude")
+
+        lower_latitude_indices = \
+            helpers.find_last_value_below_or_equal_in_sorted_array(
+                self._latitudes, min_lats)
+        lower_longitude_indices = \
+            helpers.find_last_value_below_or_equal_in_sorted_array(
+                self._longitudes, min_lons)
+        upper_latitude_indices = \
+            helpers.find_first_value_above_or_equal_in_sorted_array(
+                self._latitudes, max_lats)
+        upper_longitude_indices = \
+            helpers.find_first_value_above_or_equal_in_sorted_array(
+                self._longitudes, max_lons)
+
+        is_partially_outside = (lower_latitude_indices < 0) | \
+                               (upper_latitude_indices < 0) | \
+                               (lower_longitude_indices < 0) | \
+                               (upper_longitude_indices < 0)
+        if numpy.any(is_partially_outside) and \
+                not generate_even_if_submap_partially_outside_datamap:
+            raise ValueError(
+                "Given latitude/longitude bounds are out of the strict "
+                "bounds for this DataMap2D. Consider using the "
+                "'generate_even_if_submap_partially_outside_datamap' "
+                "option.")
+
+        # At most one of the indices in each pair is missing unless there is
+        # no overlap at all
+        has_no_overlap = is_partially_outside & (
+            (min_lats > self._latitude_bounds[1]) |
+            (max_lats < self._latitude_bounds[0]) |
+            (min_lons > self._longitude_bounds[1]) |
+            (max_lons < self._longitude_bounds[0]))
+
+        windows = numpy.column_stack((
+            numpy.maximum(lower_latitude_indices, 0),
+            numpy.where(upper_latitude_indices < 0, len(self._latitudes) - 1,
+                        upper_latitude_indices) + 1,
+            numpy.maximum(lower_longitude_indices, 0),
+            numpy.where(upper_longitude_indices < 0, len(self._longitudes) - 1,
+                        upper_longitude_indices) + 1))
+        windows[has_no_overlap] = 0
+        return windows
+
+    def _get_submap_index_bounds(self, latitude_bounds, longitude_bounds,
+                                 generate_even_if_submap_partially_outside_datamap=False):
+        """
+        Returns the (inclusive) indices of the submap described by the
+        arguments; see :meth:`generate_submap`.
+
+        :return: (lower_latitude_index, upper_latitude_index, \
+                lower_longitude_index, upper_longitude_index)
+        :rtype: tuple of ints
+        """
+        window = self.get_submap_index_windows(
+            [latitude_bounds], [longitude_bounds],
+            generate_even_if_submap_partially_outside_datamap)[0]
+        (latitude_start, latitude_stop, longitude_start, longitude_stop) = \
+            [int(index) for index in window]
+
+        if latitude_start == latitude_stop:
+            raise ValueError(
+                "There is no overlap between the given latitude/longitude "
+                "bounds and this DataMap2D.")
+
+        return (latitude_start, latitude_stop - 1, longitude_start,
+                longitude_stop - 1)
+
     def generate_submap(self, latitude_bounds, longitude_bounds,
                         generate_even_if_submap_partially_outside_datamap=False):
         """
@@ -561,51 +1774,10 @@ class DataMap2D(object):
         :return: data map which contains a subset of the data in this map
         :rtype: :class:`DataMap2D`
         """
-        (min_lat, max_lat) = latitude_bounds
-        if min_lat > max_lat:
-            raise ValueError("Max. latitude should be greater than min. "
-                             "latitude")
-
-        (min_lon, max_lon) = longitude_bounds
-        if min_lon > max_lon:
-            raise ValueError("Max. longitude should be greater than min. "
-                             "longitude")
-
-        lower_latitude_index = helpers.find_last_value_below_or_equal(
-            self.latitudes, min_lat)
-        lower_longitude_index = helpers.find_last_value_below_or_equal(
-            self.longitudes, min_lon)
-        upper_latitude_index = helpers.find_first_value_above_or_equal(
-            self.latitudes, max_lat)
-        upper_longitude_index = helpers.find_first_value_above_or_equal(
-            self.longitudes, max_lon)
-
-        if any([index is None for index in
-                [lower_latitude_index, lower_longitude_index,
-                 upper_latitude_index, upper_longitude_index]]):
-            if not generate_even_if_submap_partially_outside_datamap:
-                raise ValueError(
-                    "Given latitude/longitude bounds are out of the strict "
-                    "bounds for this DataMap2D. Consider using the "
-                    "'generate_even_if_submap_partially_outside_datamap' "
-                    "option.")
-            elif min_lat > self._latitude_bounds[1] or max_lat < \
-                    self._latitude_bounds[0] \
-                    or min_lon > self._longitude_bounds[1] or max_lon < \
-                    self._longitude_bounds[0]:
-                raise ValueError(
-                    "There is no overlap between the given latitude/longitude "
-                    "bounds and this DataMap2D.")
-            else:  # can assume at most one of the indices in each pair is None
-                self.log.debug(
-                    "Generating a submap which is smaller than the requested "
-                    "latitude/longitude bounds")
-                lower_latitude_index = lower_latitude_index or 0
-                upper_latitude_index = upper_latitude_index or len(
-                    self.latitudes) - 1
-                lower_longitude_index = lower_longitude_index or 0
-                upper_longitude_index = upper_longitude_index or len(
-                    self.longitudes) - 1
+        (lower_latitude_index, upper_latitude_index, lower_longitude_index,
+         upper_longitude_index) = self._get_submap_index_bounds(
+            latitude_bounds, longitude_bounds,
+            generate_even_if_submap_partially_outside_datamap)
 
         num_latitude_divisions = upper_latitude_index - lower_latitude_index + 1
         num_longitude_divisions = upper_longitude_index - \
@@ -632,8 +1804,8 @@ class DataMap2D(object):
         """
         Re-integrates the submap into this map by combining corresponding
         values according to ``integration_function``. The integration
-        function should take two arguments of type :class:`numpy.matrix` and
-        output a :class:`numpy.matrix`. The first matrix will contain the
+        function should take two arguments of type :class:`numpy.ndarray` and
+        output a :class:`numpy.ndarray`. The first matrix will contain the
         current values of this map and the second matrix will contain values
         from the submap. Some examples::
 
@@ -656,38 +1828,49 @@ class DataMap2D(object):
         :type integration_function: function object
         """
 
+        (lower_latitude_index, lower_longitude_index) = \
+            self._get_submap_offset(submap)
+        upper_latitude_index = lower_latitude_index + len(submap.latitudes)
+        upper_longitude_index = lower_longitude_index + len(submap.longitudes)
+
+        # Update the internal matrix according to the combination function
+        self.mutable_matrix[lower_latitude_index:upper_latitude_index,
+        lower_longitude_index:upper_longitude_index] = integration_function(
+            self.mutable_matrix[lower_latitude_index:upper_latitude_index,
+            lower_longitude_index:upper_longitude_index],
+            submap.mutable_matrix)
+
+    def _get_submap_offset(self, submap):
+        """
+        Returns the indices in this map of the first latitude and longitude
+        of ``submap``. Raises a ValueError if the submap is not comparable.
+
+        :rtype: tuple of ints
+        """
         # Extract indices for the submatrix and do lots of error checking
         if not isinstance(submap, DataMap2D):
             raise TypeError("Expected a DataMap2D")
 
-        lower_latitude_index = helpers.find_first_value_approximately_equal(
-            self.latitudes, submap.latitudes[0])
-        lower_longitude_index = helpers.find_first_value_approximately_equal(
-            self.longitudes, submap.longitudes[0])
-        if lower_latitude_index is None or lower_longitude_index is None:
+        lower_latitude_index = int(
+            helpers.find_first_value_approximately_equal_in_sorted_array(
+                self._latitudes, submap.latitudes[0]))
+        lower_longitude_index = int(
+            helpers.find_first_value_approximately_equal_in_sorted_array(
+                self._longitudes, submap.longitudes[0]))
+        if lower_latitude_index < 0 or lower_longitude_index < 0:
             raise ValueError(
                 "Submap is not comparable (latitudes and/or longitudes differ)")
-        upper_latitude_index = lower_latitude_index + len(submap.latitudes)
-        upper_longitude_index = lower_longitude_index + len(submap.longitudes)
-
-        target_latitudes = self.latitudes[
-                           lower_latitude_index:upper_latitude_index + 1]
-        target_longitudes = self.longitudes[
-                            lower_longitude_index:upper_longitude_index + 1]
 
-        if not helpers.lists_are_almost_equal(submap.latitudes,
-                                              target_latitudes) or \
-                not helpers.lists_are_almost_equal(submap.longitudes,
-                                                   target_longitudes):
+        if not _coordinates_are_almost_equal(submap.latitudes,
+                                             self._latitudes[
+                                             lower_latitude_index:]) or \
+                not _coordinates_are_almost_equal(submap.longitudes,
+                                                  self._longitudes[
+                                                  lower_longitude_index:]):
             raise ValueError(
                 "Submap is not comparable (latitudes and/or longitudes differ)")
 
-        # Update the internal matrix according to the combination function
-        self.mutable_matrix[lower_latitude_index:upper_latitude_index,
-        lower_longitude_index:upper_longitude_index] = integration_function(
-            self.mutable_matrix[lower_latitude_index:upper_latitude_index,
-            lower_longitude_index:upper_longitude_index],
-            submap.mutable_matrix)
+        return (lower_latitude_index, lower_longitude_index)
 
 
 # ####
@@ -699,7 +1882,8 @@ class DataMap2DWithFixedBoundingBox(DataMap2D):
     States."""
 
     @classmethod
-    def create(cls, num_latitude_divisions=None, num_longitude_divisions=None):
+    def create(cls, num_latitude_divisions=None, num_longitude_divisions=None,
+               dtype=float):
         """
         Creates a :class:`DataMap2D` with latitude and longitude bounds
         tailored to the continental United States.
@@ -708,6 +1892,7 @@ class DataMap2DWithFixedBoundingBox(DataMap2D):
         :type num_latitude_divisions: int
         :param num_longitude_divisions: number of longitude points per latitude
         :type num_longitude_divisions: int
+        :param dtype: data type of the values (see :meth:`from_specification`)
         :return:
         :rtype: :class:`DataMap2DContinentalUnitedStates`
         """
@@ -729,7 +1914,7 @@ class DataMap2DWithFixedBoundingBox(DataMap2D):
 
         return cls.from_specification(cls.latitude_bounds, cls.longitude_bounds,
                                       num_latitude_divisions,
-                                      num_longitude_divisions)
+                                      num_longitude_divisions, dtype=dtype)
 
 
 class DataMap2DContinentalUnitedStates(DataMap2DWithFixedBoundingBox):
@@ -761,13 +1946,19 @@ class DataMap2DWisconsin(DataMap2DWithFixedBoundingBox):
 class DataMap3D(object):
     """Collection of one or more :class:`DataMap2D` objects. Provides
     convenient setter and getter functions for these objects.
+
+    The values of all layers are stored in a single array of shape (layers,
+    latitudes, longitudes) (see :attr:`mutable_array`). The layers returned
+    by :meth:`get_layer` are :class:`DataMap2D` objects whose matrices are
+    views into this array, so modifying a layer in place modifies the
+    DataMap3D.
     """
 
     def __init__(self):
         self.log = getModuleLogger(self)
 
     @classmethod
-    def from_DataMap2D(cls, template_datamap2d, layer_descr_list):
+    def from_DataMap2D(cls, template_datamap2d, layer_descr_list, dtype=None):
         """
         Creates a :class:`DataMap3D` object by replicating the
         :template_datamap2d: object `len(layer_descr_list)` times.
@@ -779,18 +1970,34 @@ class DataMap3D(object):
         :param layer_descr_list: description (key) for each layer; must be \
                 unique
         :type layer_descr_list: list
+        :param dtype: data type of the values (by default, the data type of \
+                ``template_datamap2d``)
         :return:
         :rtype: :class:`DataMap3D`
         """
         obj = cls()
-        obj._initialize_layers(template_datamap2d, layer_descr_list)
+        obj._initialize_layers(template_datamap2d, layer_descr_list,
+                               dtype=dtype)
         return obj
 
-    def _initialize_layers(self, template_datamap2d, layer_descr_list):
+    @classmethod
+    def _from_values(cls, template_datamap2d, layer_descr_list, values):
+        """Creates a :class:`DataMap3D` on the grid of ``template_datamap2d``
+        which takes ownership of ``values`` (shape: (layers, latitudes,
+        longitudes))."""
+        obj = cls()
+        obj._layer_descr_list = list(layer_descr_list)
+        obj._update_layer_index()
+        obj._set_template(template_datamap2d)
+        obj._values = values
+        return obj
+
+    def _initialize_layers(self, template_datamap2d, layer_descr_list,
+                           dtype=None):
         """Internal function to create the layers from the template and the
         list of descriptions."""
-        self._layers = {}
-        self._layer_descr_list = layer_descr_list
+        self._layer_descr_list = list(layer_descr_list)
+        self._update_layer_index()
 
         datamap_class = template_datamap2d.__class__
         self.log.debug("Creating DataMap3D (template: %s %dx%d) (layers: %s)"
@@ -798,17 +2005,43 @@ class DataMap3D(object):
             datamap_class.__name__, template_datamap2d._num_latitude_divisions,
             template_datamap2d._num_longitude_divisions, layer_descr_list))
 
-        for layer_descr in layer_descr_list:
-            self._layers[layer_descr] = datamap_class.get_copy_of(
-                template_datamap2d, verbose=False)
+        self._set_template(template_datamap2d)
+
+        template_matrix = numpy.asarray(template_datamap2d.mutable_matrix)
+        self._values = numpy.empty((len(self._layer_descr_list),) +
+                                   template_matrix.shape,
+                                   dtype=template_matrix.dtype if dtype is None
+                                   else dtype)
+        self._values[:] = template_matrix
 
-        if len(self._layers.keys()) is not len(layer_descr_list):
+        if len(self._layer_index) is not len(layer_descr_list):
             self.log.warning(
                 "Incorrect number of layers created; duplicate keys?")
 
+    def _set_template(self, datamap2d):
+        """Stores everything but the values of ``datamap2d`` so that layer
+        views can be created from it."""
+        self._template = datamap2d.__class__.__new__(datamap2d.__class__)
+        self._template.__dict__.update(datamap2d.__dict__)
+        self._template._matrix = None
+        self._template.__dict__.pop('_matrix_is_shared', None)
+        self._layer_views = {}
+
+    def _update_layer_index(self):
+        self._layer_index = {}
+        for (index, layer_descr) in enumerate(self._layer_descr_list):
+            self._layer_index[layer_descr] = index
+
+    def _get_layer_indices(self, layer_descr_list):
+        """Returns the index in :attr:`mutable_array` of each of the given
+        layers."""
+        self._raise_error_if_any_layer_does_not_exist(layer_descr_list)
+        return [self._layer_index[layer_descr] for layer_descr in
+                layer_descr_list]
+
     def _raise_error_if_any_layer_does_not_exist(self, layer_descr_list):
         for layer_descr in layer_descr_list:
-            if layer_descr not in self._layer_descr_list:
+            if layer_descr not in self._layer_index:
                 raise AttributeError(
                     "Layer does not exist: %s" % str(layer_descr))
 
@@ -821,64 +2054,107 @@ class DataMap3D(object):
         :param other_datamap2d:
         :type other_datamap2d: :class:`DataMap2D`
         """
-        existing_datamap2d = self.get_arbitrary_layer()
-        existing_datamap2d.raise_error_if_datamaps_are_incomparable(
+        self._template.raise_error_if_datamaps_are_incomparable(
             other_datamap2d)
 
+    def _new_datamap2d_with_values(self, matrix):
+        """Creates a new :class:`DataMap2D` on the grid of this DataMap3D
+        which takes ownership of ``matrix``."""
+        datamap2d = DataMap2D.from_specification(
+            self._template._latitude_bounds, self._template._longitude_bounds,
+            self._template._num_latitude_divisions,
+            self._template._num_longitude_divisions, verbose=False)
+        datamap2d._matrix = matrix
+        return datamap2d
+
+    @property
+    def mutable_array(self):
+        """
+        Internal data store for the :class:`DataMap3D`. The first dimension
+        corresponds to the layers (in the order given by
+        :meth:`get_layer_descr_list`), the second to the latitudes and the
+        third to the longitudes.
+
+        :rtype: :class:`numpy.ndarray`
+        :return: array used for storage
+        """
+        return self._values
+
     def get_layer(self, layer_descr):
         """
-        Retrieve a layer based on its description (key).
+        Retrieve a layer based on its description (key). The values of the
+        returned :class:`DataMap2D` are not copied: any change to the layer is
+        reflected in this DataMap3D and vice versa.
         """
         self._raise_error_if_any_layer_does_not_exist([layer_descr])
-        try:
-            return self._layers[layer_descr]
-        except Exception as e:
-            self.log.error("Could not retrieve layer: " + str(e))
-            return
+        if layer_descr not in self._layer_views:
+            view = self._template.__class__.__new__(self._template.__class__)
+            view.__dict__.update(self._template.__dict__)
+            view._matrix = self._values[self._layer_index[layer_descr]]
+            view._matrix_is_shared = True
+            self._layer_views[layer_descr] = view
+        return self._layer_views[layer_descr]
 
     def set_layer(self, layer_descr, new_layer):
         """
-        Replace a layer (:class:`DataMap2D`) with a new :class:`DataMap2D`
+        Replace the values of a layer with those of a new :class:`DataMap2D`
         object. The old and new objects must be comparable and the layer must
-        already exist.
+        already exist. The values are copied; later changes to ``new_layer``
+        do not affect this DataMap3D.
         """
         self._raise_error_if_any_layer_does_not_exist([layer_descr])
+        self._raise_error_if_incomparable_to_internal_datamaps(new_layer)
 
-        old_layer = self.get_layer(layer_descr)
-        old_layer.raise_error_if_datamaps_are_incomparable(new_layer)
-
-        self._layers[layer_descr] = new_layer
+        self._values[self._layer_index[layer_descr]] = new_layer.mutable_matrix
 
     def append_layer(self, layer_descr, layer):
         """
         Append a layer (:class:`DataMap2D`) to the DataMap3D object. The
         layer must be comparable with existing layers. A layer which is already
-        stored in this DataMap3D may not be appended.
+        stored in this DataMap3D may not be appended. The values are copied;
+        use :meth:`get_layer` to retrieve the stored layer.
 
         See also: :meth:`append_layers`, :meth:`set_layer`
         """
-        self._raise_error_if_incomparable_to_internal_datamaps(layer)
-        if layer_descr in self._layer_descr_list:
-            raise KeyError("Layer with description '%s' already exists" %
-                           str(layer_descr))
+        self.append_layers([layer_descr], [layer])
+
+    def append_layers(self, layer_descr_list, layer_list):
+        """
+        Append multiple layers to this DataMap3D. Layers will be appended in
+        order. See also: :meth:`append_layer`.
+        """
+        for (layer_descr, layer) in zip(layer_descr_list, layer_list):
+            self._raise_error_if_incomparable_to_internal_datamaps(layer)
+            if layer_descr in self._layer_index:
+                raise KeyError("Layer with description '%s' already exists" %
+                               str(layer_descr))
 
-        for existing_layer in self._layers.values():
-            if layer == existing_layer:
+            if any(layer is view for view in self._layer_views.values()):
                 raise ValueError(
                     "Cannot append a DataMap2D instance that is already part "
                     "of this DataMap3D (error encountered for layer with "
                     "description '%s')." % layer_descr)
 
-        self._layer_descr_list.append(layer_descr)
-        self._layers[layer_descr] = layer
+        if len(set(layer_descr_list)) != len(layer_descr_list):
+            raise KeyError("Duplicate layer descriptions: %s" %
+                           str(layer_descr_list))
 
-    def append_layers(self, layer_descr_list, layer_list):
-        """
-        Append multiple layers to this DataMap3D. Layers will be appended in
-        order. See also: :meth:`append_layer`.
-        """
-        for layer_descr, layer in zip(layer_descr_list, layer_list):
-            self.append_layer(layer_descr, layer)
+        new_matrices = [numpy.asarray(layer.mutable_matrix) for layer in
+                        layer_list]
+        dtype = numpy.result_type(self._values, *new_matrices)
+        values = numpy.empty((len(self._values) + len(new_matrices),) +
+                             self._values.shape[1:], dtype=dtype)
+        values[:len(self._values)] = self._values
+        for (offset, matrix) in enumerate(new_matrices):
+            values[len(self._values) + offset] = matrix
+        self._values = values
+
+        self._layer_descr_list.extend(layer_descr_list)
+        self._update_layer_index()
+
+        # Existing layers must refer to the new array
+        for (layer_descr, view) in self._layer_views.iteritems():
+            view._matrix = self._values[self._layer_index[layer_descr]]
 
     def get_some_layers_at_index_as_list(self, layer_descr_list,
                                          latitude_index, longitude_index):
@@ -891,14 +2167,9 @@ class DataMap3D(object):
                   :meth:`set_all_layers_at_index_from_list`, \
                   :meth:`set_some_layers_at_index_from_list`
         """
-        self._raise_error_if_any_layer_does_not_exist(layer_descr_list)
-
-        value_dict = self.get_all_layers_at_index_as_dict(latitude_index,
-                                                          longitude_index)
-        value_list = []
-        for layer_descr in layer_descr_list:
-            value_list.append(value_dict[layer_descr])
-        return value_list
+        layer_indices = self._get_layer_indices(layer_descr_list)
+        return list(self._values[layer_indices, latitude_index,
+                                 longitude_index])
 
     def get_all_layers_at_index_as_list(self, latitude_index, longitude_index):
         """
@@ -910,9 +2181,57 @@ class DataMap3D(object):
                   :meth:`set_all_layers_at_index_from_list` \
                   :meth:`set_some_layers_at_index_from_list`
         """
-        return self.get_some_layers_at_index_as_list(self._layer_descr_list,
-                                                     latitude_index,
-                                                     longitude_index)
+        return list(self._values[:, latitude_index, longitude_index])
+
+    def get_all_layers_at_index_as_array(self, latitude_index,
+                                         longitude_index):
+        """
+        Returns an array containing the value of each layer at the specified
+        location, ordered according to the original `layer_descr_list`. The
+        array is a view into :attr:`mutable_array`.
+
+        See also: :meth:`get_all_layers_at_index_as_list`
+        """
+        return self._values[:, latitude_index, longitude_index]
+
+    def get_values_at_locations(self, latitudes, longitudes,
+                                method='nearest', fill_value=numpy.nan,
+                                layer_descr_list=None):
+        """
+        Looks up the values of all layers at many locations at once; see
+        :meth:`DataMap2D.get_values_at_locations`.
+
+        :param layer_descr_list: layers to be looked up (by default, all \
+                layers in the order given by :meth:`get_layer_descr_list`)
+        :type layer_descr_list: list
+        :return: array of shape (locations x layers)
+        :rtype: :class:`numpy.ndarray`
+        """
+        (latitude_positions, longitude_positions, is_inside) = \
+            self._template._get_grid_positions(latitudes, longitudes)
+        values = self._get_values_of_layers(layer_descr_list)
+        sampled_values = _sample_grid(values, latitude_positions,
+                                      longitude_positions, is_inside, method,
+                                      fill_value)
+        # Move the layer axis to the end (numpy.rollaxis rather than
+        # numpy.moveaxis, which requires numpy 1.11)
+        return numpy.rollaxis(sampled_values, 0, sampled_values.ndim)
+
+    def set_values_at_locations(self, latitudes, longitudes, new_values):
+        """
+        Sets the values of all layers at the pixel nearest to each location;
+        see :meth:`DataMap2D.set_values_at_locations`.
+
+        :param new_values: array of shape (locations x layers) or anything \
+                which broadcasts to it (e.g. a scalar)
+        :return: None
+        """
+        (latitude_indices, longitude_indices) = \
+            self._template._get_nearest_indices(latitudes, longitudes)
+        new_values = numpy.asarray(new_values)
+        if new_values.ndim > 0:
+            new_values = numpy.rollaxis(new_values, new_values.ndim - 1)
+        self._values[:, latitude_indices, longitude_indices] = new_values
 
     def get_all_layers_at_index_as_dict(self, latitude_index, longitude_index):
         """
@@ -924,21 +2243,17 @@ class DataMap3D(object):
                   :meth:`get_some_layers_at_index_as_list`, \
                   :meth:`set_all_layers_at_index_from_dict`.
         """
-        value_dict = {}
-        for (layer_descr, layer) in self._layers.iteritems():
-            value_dict[layer_descr] = layer.get_value_by_index(
-                latitude_index, longitude_index)
-        return value_dict
+        return dict(zip(self._layer_descr_list,
+                        self._values[:, latitude_index, longitude_index]))
 
     def get_some_layers_at_location_as_list(self, layer_descr_list, location):
         """
         Returns a list containing the value of each layer at the specified
         location. The list is ordered according to the given `layer_descr_list`.
         """
-        some_layer = self._layers.values()[0]
         (
             latitude_index,
-            longitude_index) = some_layer.get_indices_from_location(
+            longitude_index) = self._template.get_indices_from_location(
             location)
         return self.get_some_layers_at_index_as_list(layer_descr_list,
                                                      latitude_index,
@@ -959,10 +2274,9 @@ class DataMap3D(object):
         specified location. The keys of the dictionary are taken from the
         original `layer_descr_list`.
         """
-        some_layer = self._layers.values()[0]
         (
             latitude_index,
-            longitude_index) = some_layer.get_indices_from_location(
+            longitude_index) = self._template.get_indices_from_location(
             location)
         return self.get_all_layers_at_index_as_dict(latitude_index,
                                                     longitude_index)
@@ -984,11 +2298,9 @@ class DataMap3D(object):
                     len(self._layer_descr_list),
                     len(list_of_values)))
 
-        dict_of_values = {}
-        for (descr, value) in zip(layer_descr_list, list_of_values):
-            dict_of_values[descr] = value
-        self.set_layers_at_index_from_dict(latitude_index, longitude_index,
-                                           dict_of_values)
+        layer_indices = self._get_layer_indices(layer_descr_list)
+        self._values[layer_indices, latitude_index, longitude_index] = \
+            list_of_values
 
     def set_all_layers_at_index_from_list(self, latitude_index, longitude_index,
                                           list_of_values):
@@ -1024,33 +2336,44 @@ class DataMap3D(object):
                   :meth:`set_some_layers_at_index_as_list`, \
                   :meth:`get_all_layers_at_index_from_dict`.
         """
-        for (descr, value) in dict_of_values.iteritems():
-            layer = self.get_layer(descr)
-            if layer is None:
-                self.log.error(
-                    "Could not set layer '%s': layer was not retrieved." %
-                    descr)
-                continue
-            layer.set_value_by_index(latitude_index, longitude_index, value)
+        layer_descr_list = dict_of_values.keys()
+        self.set_some_layers_at_index_from_list(
+            layer_descr_list, latitude_index, longitude_index,
+            [dict_of_values[layer_descr] for layer_descr in layer_descr_list])
 
-    def _add_layers(self, list_of_layers):
+    def _get_values_of_layers(self, layer_descrs):
         """
-        Internal helper function to add a generic list of layers.
-
-        :type list_of_layers: list of :class:`DataMap2D` objects
-        :rtype: :class:`DataMap2D`
+        Returns the values of the given layers as an array of shape (layers,
+        latitudes, longitudes); all layers are returned if ``layer_descrs``
+        is None.
         """
-        if any(layer is None for layer in list_of_layers):
-            self.log.error("Can't add layers: at least one is None")
-            return
+        if layer_descrs is None:
+            return self._values
+        return self._values[self._get_layer_indices(layer_descrs)]
 
-        destination_data_map = DataMap2D.from_existing_DataMap2D(
-            list_of_layers[0], 0)
-
-        for layer in list_of_layers:
-            destination_data_map.mutable_matrix += layer.mutable_matrix
+    def iter_blocks(self, block_shape=DEFAULT_BLOCK_SHAPE, layer_descrs=None):
+        """
+        Visits the map one block of pixels at a time; see
+        :meth:`DataMap2D.iter_blocks`. The values of each block have the
+        shape (layers, latitudes, longitudes). They are a view of
+        :attr:`mutable_array` unless ``layer_descrs`` is given, in which
+        case they are a copy of the block.
 
-        return destination_data_map
+        :param block_shape: number of latitudes and longitudes per block; a \
+                single int is used for both
+        :type block_shape: int or tuple of ints
+        :param layer_descrs: layer descriptions (keys); all layers are used \
+                if None
+        """
+        if layer_descrs is None:
+            layer_indices = slice(None)
+        else:
+            layer_indices = self._get_layer_indices(layer_descrs)
+        for (lat_slice, lon_slice) in _get_block_slices(self._values.shape[1:],
+                                                        block_shape):
+            yield (lat_slice, lon_slice, self._template._latitudes[lat_slice],
+                   self._template._longitudes[lon_slice],
+                   self._values[layer_indices, lat_slice, lon_slice])
 
     def sum_all_layers(self):
         """
@@ -1059,23 +2382,180 @@ class DataMap3D(object):
 
         :rtype: :class:`DataMap2D`
         """
-        return self._add_layers(self._layers.values())
+        return self.sum_subset_of_layers(None)
 
     def sum_subset_of_layers(self, layer_descrs):
         """
         Sums a subset of layers element-wise (i.e. determines the sum across
-        layers at each location).
+        layers at each location). The layers are summed one block at a time
+        (see :meth:`iter_blocks`), so only one block of a map opened with
+        :meth:`from_memmap` is read at once.
 
         :param layer_descrs: layer descriptions (keys) corresponding to those \
-                in the original `layer_descr_list`.
+                in the original `layer_descr_list`; all layers are summed \
+                if None
+        :rtype: :class:`DataMap2D`
+        """
+        if layer_descrs is not None:
+            self._raise_error_if_any_layer_does_not_exist(layer_descrs)
+        total = numpy.empty(self._values.shape[1:],
+                            dtype=numpy.result_type(self._values, float))
+        for (lat_slice, lon_slice, _, _, values) in self.iter_blocks(
+                layer_descrs=layer_descrs):
+            numpy.sum(values, axis=0, dtype=total.dtype,
+                      out=total[lat_slice, lon_slice])
+        return self._new_datamap2d_with_values(total)
+
+    def any_layers(self, layer_descrs=None):
+        """
+        Determines at each location whether any of the layers is nonzero
+        (e.g. whether any channel is available).
+
+        :param layer_descrs: layer descriptions (keys); all layers are used \
+                if None
+        :rtype: :class:`DataMap2D` with boolean values
+        """
+        return self._new_datamap2d_with_values(
+            numpy.any(self._get_values_of_layers(layer_descrs), axis=0))
+
+    def all_layers(self, layer_descrs=None):
+        """
+        Determines at each location whether all of the layers are nonzero.
+
+        :param layer_descrs: layer descriptions (keys); all layers are used \
+                if None
+        :rtype: :class:`DataMap2D` with boolean values
+        """
+        return self._new_datamap2d_with_values(
+            numpy.all(self._get_values_of_layers(layer_descrs), axis=0))
+
+    def get_layer_descr_of_max_value(self, layer_descrs=None):
+        """
+        Determines at each location which layer holds the largest value. In
+        case of a tie, the first such layer (according to ``layer_descrs``)
+        is used.
+
+        :param layer_descrs: layer descriptions (keys); all layers are used \
+                if None
+        :return: data map whose values are the layer descriptions
+        :rtype: :class:`DataMap2D`
+        """
+        if layer_descrs is None:
+            layer_descrs = self._layer_descr_list
+        values = self._get_values_of_layers(layer_descrs)
+        return self._new_datamap2d_with_values(
+            numpy.asarray(layer_descrs)[numpy.argmax(values, axis=0)])
+
+    def count_nonzero_layers(self, layer_descrs=None):
+        """
+        Counts at each location the number of layers which are nonzero (e.g.
+        the number of available channels). NaN values are not counted.
+
+        :param layer_descrs: layer descriptions (keys); all layers are used \
+                if None
+        :rtype: :class:`DataMap2D`
+        """
+        return self._new_datamap2d_with_values(numpy.sum(
+            _is_nonzero(self._get_values_of_layers(layer_descrs)), axis=0,
+            dtype=float))
+
+    def weighted_sum_of_layers(self, weights, layer_descrs=None):
+        """
+        Computes at each location the sum of the layers weighted by
+        ``weights`` (e.g. the bandwidth or the data rate of each channel).
+        NaN values do not contribute to the sum.
+
+        :param weights: one weight per layer
+        :type weights: list of floats
+        :param layer_descrs: layer descriptions (keys) in the order of \
+                ``weights``; all layers are used if None
         :rtype: :class:`DataMap2D`
         """
-        return self._add_layers(
-            [self.get_layer(descr) for descr in layer_descrs])
+        values = self._get_values_of_layers(layer_descrs)
+        weights = numpy.asarray(weights, dtype=float)
+        if weights.shape != (len(values),):
+            raise ValueError("Expected %d weights but got %d" %
+                             (len(values), weights.size))
+        if numpy.issubdtype(values.dtype, numpy.inexact):
+            values = numpy.where(numpy.isnan(values), 0, values)
+        return self._new_datamap2d_with_values(
+            numpy.tensordot(weights, values, axes=1))
+
+    def get_first_layer_descr_where_nonzero(self, layer_descrs=None):
+        """
+        Determines at each location the first layer (according to
+        ``layer_descrs``) which is nonzero, e.g. the lowest available
+        channel. Locations at which no layer is nonzero are NaN.
+
+        :param layer_descrs: numeric layer descriptions (keys); all layers \
+                are used if None
+        :return: data map whose values are the layer descriptions
+        :rtype: :class:`DataMap2D`
+        """
+        if layer_descrs is None:
+            layer_descrs = self._layer_descr_list
+        is_nonzero = _is_nonzero(self._get_values_of_layers(layer_descrs))
+        first_layer_descrs = numpy.asarray(layer_descrs, dtype=float)[
+            numpy.argmax(is_nonzero, axis=0)]
+        first_layer_descrs[~numpy.any(is_nonzero, axis=0)] = numpy.nan
+        return self._new_datamap2d_with_values(first_layer_descrs)
+
+    def get_max_run_of_nonzero_layers(self, layer_descrs=None):
+        """
+        Determines at each location the largest number of consecutive layers
+        (according to ``layer_descrs``) which are nonzero, e.g. the largest
+        number of adjacent available channels.
+
+        .. note:: Only the order of the layers is taken into account; to \
+                find runs of adjacent channels, ``layer_descrs`` should \
+                not skip channels (or the runs should be computed \
+                separately for each group of adjacent channels).
+
+        :param layer_descrs: layer descriptions (keys); all layers are used \
+                if None
+        :rtype: :class:`DataMap2D`
+        """
+        is_nonzero = _is_nonzero(self._get_values_of_layers(layer_descrs))
+        current_run = numpy.zeros(is_nonzero.shape[1:])
+        max_run = numpy.zeros(is_nonzero.shape[1:])
+        for layer_is_nonzero in is_nonzero:
+            current_run += 1
+            current_run *= layer_is_nonzero
+            numpy.maximum(max_run, current_run, out=max_run)
+        return self._new_datamap2d_with_values(max_run)
+
+    def aggregate_blocks(self, block_shape, method="mean",
+                         partial_blocks=False):
+        """
+        Creates a coarser :class:`DataMap3D` by aggregating each layer over
+        blocks of pixels. See :meth:`DataMap2D.aggregate_blocks`.
+
+        :param block_shape: number of latitudes and longitudes per block; a \
+                single int is used for both
+        :type block_shape: int or tuple of ints
+        :param method: one of "sum", "mean", "fraction", "min" or "max"
+        :type method: str
+        :param partial_blocks: whether the map need not be divisible into \
+                blocks; see :meth:`DataMap2D.aggregate_blocks`
+        :type partial_blocks: bool
+        :rtype: :class:`DataMap3D`
+        """
+        block_shape = _get_block_shape(block_shape)
+        values = _aggregate_blocks(self._values, block_shape, method,
+                                   partial_blocks)
+        template = self._template._create_aggregated_datamap2d(block_shape,
+                                                                values[0])
+        return self.__class__._from_values(template, self._layer_descr_list,
+                                           values)
 
     def combine_values_elementwise_across_layers_using_function(self,
                                                                 combination_function,
-                                                                layer_descr_list=None):
+                                                                layer_descr_list=None,
+                                                                num_processes=1,
+                                                                chunk_size=None,
+                                                                use_fork=False,
+                                                                vectorized=False,
+                                                                block_shape=None):
         """
         Combines all of the values in the specified layers elementwise into a
         new :class:`DataMap2D` according to ``combination_function``. Values
@@ -1091,9 +2571,42 @@ class DataMap3D(object):
                 ...
                 return combined_value_for_pixel      # may also return None to keep NaN value
 
+        If ``vectorized`` is True, ``combination_function`` is instead called
+        once for the whole grid (or once per block of ``block_shape`` pixels)
+        in the manner of :meth:`DataMap2D.update_all_values_via_vectorized_function`.
+        The last argument is then an array of shape (layers, latitudes,
+        longitudes) and an array of shape (latitudes, longitudes) should be
+        returned; masked entries of a :class:`numpy.ma.MaskedArray` keep the
+        NaN value. For example::
+
+            def combination_function(latitudes, longitudes, latitude_indices, longitude_indices, values_in_order):
+                return numpy.sum(values_in_order, axis=0)
+
+        Common combinations are available as methods, e.g.
+        :meth:`count_nonzero_layers`, :meth:`weighted_sum_of_layers`,
+        :meth:`get_first_layer_descr_where_nonzero` and
+        :meth:`get_max_run_of_nonzero_layers`.
+
         :param combination_function: function used to update the values
         :type combination_function: function object
         :param layer_descr_list: list of layer descriptions that will be combined
+        :param num_processes: number of processes used to evaluate \
+                ``combination_function`` (see \
+                :meth:`DataMap2D.update_all_values_via_function`)
+        :type num_processes: int
+        :param chunk_size: number of latitude rows handed to a worker at once
+        :type chunk_size: int
+        :param use_fork: if True, worker processes inherit \
+                ``combination_function`` by forking
+        :type use_fork: bool
+        :param vectorized: if True, ``combination_function`` receives arrays \
+                rather than the values of a single pixel
+        :type vectorized: bool
+        :param block_shape: if given (and ``vectorized`` is True), \
+                ``combination_function`` is called once per block of \
+                (latitudes, longitudes) pixels, which limits the size of \
+                the arrays it receives
+        :type block_shape: tuple of ints
         :return: data map holding the combined values
         :rtype: :class:`DataMap2D`
         """
@@ -1104,14 +2617,31 @@ class DataMap3D(object):
             raise ValueError("Could not combine layers: only one layer")
 
         sample_datamap = self.get_layer(layer_descr_list[0])
-        destination_datamap = DataMap2D.get_copy_of(sample_datamap)
+        destination_datamap = DataMap2D.get_copy_of(sample_datamap, dtype=float)
         destination_datamap.reset_all_values(fill_value=numpy.NaN)
 
+        layer_indices = self._get_layer_indices(layer_descr_list)
+
+        if vectorized:
+            self._combine_layers_via_vectorized_function(
+                combination_function, layer_indices, destination_datamap,
+                block_shape)
+            return destination_datamap
+
+        if num_processes != 1:
+            stacked_values = numpy.rollaxis(self._values[layer_indices], 0, 3)
+            data_map_parallel.update_matrix_in_parallel(
+                destination_datamap.mutable_matrix,
+                destination_datamap.latitudes, destination_datamap.longitudes,
+                data_map_parallel.ListOfValuesAdapter(combination_function),
+                input_values=stacked_values, num_processes=num_processes,
+                chunk_size=chunk_size, use_fork=use_fork)
+            return destination_datamap
+
         def pixel_update_function(latitude, longitude, latitude_index,
                                   longitude_index, current_value):
-            all_values = self.get_some_layers_at_index_as_list(layer_descr_list,
-                                                               latitude_index,
-                                                               longitude_index)
+            all_values = list(self._values[layer_indices, latitude_index,
+                                           longitude_index])
             return combination_function(latitude, longitude, latitude_index,
                                         longitude_index, all_values)
 
@@ -1120,12 +2650,35 @@ class DataMap3D(object):
 
         return destination_datamap
 
-    def reset_all_values(self, fill_value=numpy.NaN):
-        """
-        Resets all values of all layers to `fill_value`.
-        """
-        for layer in self._layers.values():
-            layer.reset_all_values(fill_value)
+    def _combine_layers_via_vectorized_function(self, combination_function,
+                                                layer_indices,
+                                                destination_datamap,
+                                                block_shape=None):
+        """Calls the vectorized ``combination_function`` once per block of
+        pixels and stores the results in ``destination_datamap``."""
+        if block_shape is None:
+            block_shape = self._values.shape[1:]
+        if layer_indices == range(len(self._layer_descr_list)):
+            layer_indices = slice(None)
+
+        for (lat_slice, lon_slice, latitudes, longitudes, destination) in \
+                destination_datamap.iter_blocks(block_shape):
+            new_values = combination_function(
+                latitudes.reshape(-1, 1), longitudes.reshape(1, -1),
+                numpy.arange(lat_slice.start, lat_slice.stop).reshape(-1, 1),
+                numpy.arange(lon_slice.start, lon_slice.stop).reshape(1, -1),
+                self._values[layer_indices, lat_slice, lon_slice])
+            if new_values is not None:
+                _copy_vectorized_update(destination, new_values)
+
+    def reset_all_values(self, fill_value=None):
+        """
+        Resets all values of all layers to `fill_value`. By default,
+        floating-point maps are reset to NaN and all others to zero (False).
+        """
+        if fill_value is None:
+            fill_value = _get_default_fill_value(self._values.dtype)
+        self._values[:] = fill_value
 
     def to_pickle(self, filename):
         """
@@ -1156,22 +2709,83 @@ class DataMap3D(object):
                 obj.log = getModuleLogger(obj)
             return obj
 
+    def to_memmap(self, filename):
+        """
+        Saves the values of the DataMap3D as raw data to ``filename`` and a
+        description of the map (bounds, divisions, layer descriptions, data
+        type) as JSON to ``filename`` + ".json". See also:
+        :meth:`from_memmap`, :meth:`DataMap2D.to_memmap`.
+
+        .. note:: The layer descriptions must be representable in JSON \
+                (e.g. ints or strings); tuples are restored as tuples.
+
+        :param filename: destination filename
+        :type filename: str
+        :return: None
+        """
+        header = dict(_get_memmap_grid_header(self._template),
+                      kind="DataMap3D",
+                      layer_descr_list=self._layer_descr_list)
+        _write_memmap(filename, header, self._values)
+
+    @classmethod
+    def from_memmap(cls, filename, mode="r"):
+        """
+        Opens a DataMap3D saved with :meth:`to_memmap` without reading its
+        values; see :meth:`DataMap2D.from_memmap`. Reading a single layer
+        or a single value only touches the pages that are needed.
+
+        :param filename: filename given to :meth:`to_memmap`
+        :type filename: str
+        :param mode: "r" (read-only), "r+" (changes are written to the \
+                file) or "c" (copy-on-write: changes are kept in memory only)
+        :type mode: str
+        :return:
+        :rtype: :class:`DataMap3D`
+        """
+        (header, values) = _read_memmap(filename, "DataMap3D", mode)
+
+        template = _get_datamap2d_class(header["class"])()
+        _initialize_from_memmap_grid_header(template, header, values[0])
+
+        obj = cls()
+        obj._layer_descr_list = [_layer_descr_from_json(layer_descr) for
+                                 layer_descr in header["layer_descr_list"]]
+        obj._update_layer_index()
+        obj._set_template(template)
+        obj._values = values
+        return obj
+
     # Helper functions required for pickling
     # Objects with open file descriptors (e.g. logs) cannot be pickled,
-    # so we remove the logs when saving
+    # so we remove the logs when saving. The layer views are recreated on
+    # demand.
     def __getstate__(self):
         state = self.__dict__.copy()
         del state['log']
+        state.pop('_layer_views', None)
         return state
 
     def __setstate__(self, d):
         self.__dict__.update(d)
+        self.log = getModuleLogger(self)
+
+        # Older pickles store a dictionary of independent DataMap2D objects
+        if '_layers' in d:
+            layers = self.__dict__.pop('_layers')
+            self._set_template(layers[self._layer_descr_list[0]])
+            self._values = numpy.array(
+                [numpy.asarray(layers[layer_descr].mutable_matrix) for
+                 layer_descr in self._layer_descr_list])
+            self._update_layer_index()
+        else:
+            self._layer_views = {}
 
     def get_layer_descr_list(self):
         return self._layer_descr_list
 
     def get_arbitrary_layer(self):
-        return self._layers[self._layer_descr_list[0]]
+        return self.get_layer(self._layer_descr_list[0])
 
     def raise_error_if_datamaps_are_incomparable(self, other_datamap3d):
         """Tests two :class:`DataMap3D` objects for comparability (i.e. are
@@ -1187,26 +2801,40 @@ class DataMap3D(object):
             raise AttributeError("Layers of %r and %r are not equivalent." %
                                  (self, other_datamap3d))
 
-        # Make sure each layer is comparable
-        for layer_descr in self._layer_descr_list:
-            self._raise_error_if_incomparable_to_internal_datamaps(
-                other_datamap3d.get_layer(layer_descr))
+        # All layers of a DataMap3D share the same grid
+        self._raise_error_if_incomparable_to_internal_datamaps(
+            other_datamap3d.get_arbitrary_layer())
 
-    def get_clean_copy(self, fill_value=numpy.nan):
+    def get_clean_copy(self, fill_value=None, dtype=None):
         """
         Returns a new :class:`DataMap3D` object which has the same properties
         and layers as this one but with the internal matrix filled with
         ``fill_value``.
 
-        :param fill_value: fill value for the matrix of the new object
+        :param fill_value: fill value for the matrix of the new object (by \
+                default, NaN for floating-point data and zero otherwise)
+        :param dtype: data type of the new object (by default, the data type \
+                of this object)
         :return: new object
         :rtype: :class:`DataMap3D`
         """
         existing_datamap2d = self.get_arbitrary_layer()
         clean_datamap2d = existing_datamap2d.get_clean_copy(
-            fill_value=fill_value)
+            fill_value=fill_value, dtype=dtype)
 
         clean_copy = self.__class__.from_DataMap2D(clean_datamap2d,
                                                    self._layer_descr_list)
 
         return clean_copy
+
+    def astype(self, dtype):
+        """
+        Returns a copy of this :class:`DataMap3D` whose values are of type
+        ``dtype``.
+
+        :param dtype: data type of the copy
+        :rtype: :class:`DataMap3D`
+        """
+        copy = self.get_clean_copy(dtype=dtype)
+        copy.mutable_array[:] = self._values
+        return copy
@@ -0,0 +1,234 @@
+from data_map import DataMap2D, DataMap3D
+import numpy
+
+
+# Number of bits set in each possible byte
+_POPCOUNT_TABLE = numpy.array([bin(value).count("1") for value in range(256)],
+                              dtype=numpy.uint8)
+
+_MAX_NUM_CHANNELS = 64
+
+
+class DataMap2DChannelBitmask(DataMap2D):
+    """
+    :class:`data_map.DataMap2D` which stores a set of channels (e.g. the
+    available whitespace channels) at each pixel. Each pixel holds a uint64
+    whose i-th bit is set if and only if the i-th channel of
+    :meth:`get_channel_list` is in the set. Compared to a
+    :class:`data_map.DataMap3D` with one float layer per channel, this uses
+    a fraction of the memory.
+
+    At most 64 channels are supported, which is enough for e.g.
+    :meth:`region.Region.get_tvws_channel_list`.
+    """
+
+    @classmethod
+    def from_DataMap2D(cls, template_datamap2d, channel_list,
+                       fill_value=False):
+        """
+        Creates a :class:`DataMap2DChannelBitmask` with the same coordinates
+        as ``template_datamap2d``.
+
+        :param template_datamap2d: provides the latitude and longitude bounds \
+                and number of divisions
+        :type template_datamap2d: :class:`data_map.DataMap2D`
+        :param channel_list: channels which may be stored; the order \
+                determines the bit used for each channel
+        :type channel_list: list of ints
+        :param fill_value: if True, all channels are initially in the set; \
+                otherwise, no channels are
+        :type fill_value: bool
+        :rtype: :class:`DataMap2DChannelBitmask`
+        """
+        if len(channel_list) > _MAX_NUM_CHANNELS:
+            raise ValueError("At most %d channels are supported (got %d)" %
+                             (_MAX_NUM_CHANNELS, len(channel_list)))
+        if len(set(channel_list)) != len(channel_list):
+            raise ValueError("Duplicate channels: %s" % str(channel_list))
+
+        obj = cls.from_specification(template_datamap2d._latitude_bounds,
+                                     template_datamap2d._longitude_bounds,
+                                     template_datamap2d._num_latitude_divisions,
+                                     template_datamap2d._num_longitude_divisions,
+                                     verbose=False, dtype=numpy.uint64)
+        obj._channel_list = list(channel_list)
+        if fill_value:
+            obj._matrix[:] = obj._get_mask_of_all_channels()
+        return obj
+
+    @classmethod
+    def from_DataMap3D(cls, datamap3d, channel_list=None):
+        """
+        Creates a :class:`DataMap2DChannelBitmask` from a
+        :class:`data_map.DataMap3D` whose layers are described by channels
+        (e.g. a whitespace map). A channel is in the set at a pixel if the
+        value of its layer is truthy.
+
+        :param datamap3d: source of the data
+        :type datamap3d: :class:`data_map.DataMap3D`
+        :param channel_list: channels to be stored (by default, all layers \
+                in the order given by \
+                :meth:`data_map.DataMap3D.get_layer_descr_list`)
+        :type channel_list: list of ints
+        :rtype: :class:`DataMap2DChannelBitmask`
+        """
+        if channel_list is None:
+            channel_list = datamap3d.get_layer_descr_list()
+
+        obj = cls.from_DataMap2D(datamap3d.get_arbitrary_layer(), channel_list)
+        for channel in channel_list:
+            obj.set_channel(channel, datamap3d.get_layer(channel))
+        return obj
+
+    @classmethod
+    def get_copy_of(cls, other_datamap2d, verbose=True, dtype=None):
+        obj = super(DataMap2DChannelBitmask, cls).get_copy_of(other_datamap2d,
+                                                              verbose=verbose,
+                                                              dtype=dtype)
+        obj._channel_list = list(other_datamap2d._channel_list)
+        return obj
+
+    def get_clean_copy(self, fill_value=False, dtype=None):
+        """
+        Returns a new :class:`DataMap2DChannelBitmask` object which has the
+        same properties as this one. If ``fill_value`` is True, all channels
+        will be in the set; otherwise, none will be.
+
+        ``dtype`` is accepted for compatibility with
+        :meth:`data_map.DataMap2D.get_clean_copy` but must be None or uint64.
+        """
+        if dtype is not None and numpy.dtype(dtype) != numpy.uint64:
+            raise TypeError("A channel bitmask must have data type uint64 "
+                            "(got %s)" % numpy.dtype(dtype).name)
+        return self.__class__.from_DataMap2D(self, self._channel_list,
+                                             fill_value=fill_value)
+
+    def _get_memmap_header(self):
+        return {"channel_list": self._channel_list}
+
+    def _restore_memmap_header(self, header):
+        self._channel_list = header["channel_list"]
+
+    def get_channel_list(self):
+        """
+        :return: the channels which may be stored, in bit order
+        :rtype: list of ints
+        """
+        return self._channel_list
+
+    def _get_bit(self, channel):
+        if channel not in self._channel_list:
+            raise ValueError("Channel %s is not part of this map" %
+                             str(channel))
+        return numpy.uint64(1) << numpy.uint64(
+            self._channel_list.index(channel))
+
+    def _get_mask_of_all_channels(self):
+        mask = numpy.uint64(0)
+        for channel in self._channel_list:
+            mask |= self._get_bit(channel)
+        return mask
+
+    def get_channel(self, channel):
+        """
+        Extracts the availability of a single channel.
+
+        :param channel: channel to be extracted
+        :type channel: int
+        :return: data map which is True where the channel is in the set
+        :rtype: :class:`data_map.DataMap2D`
+        """
+        is_available = (self._matrix & self._get_bit(channel)) != 0
+        datamap2d = DataMap2D.from_specification(self._latitude_bounds,
+                                                 self._longitude_bounds,
+                                                 self._num_latitude_divisions,
+                                                 self._num_longitude_divisions,
+                                                 verbose=False, dtype=bool)
+        datamap2d.mutable_matrix = is_available
+        return datamap2d
+
+    def set_channel(self, channel, is_available):
+        """
+        Adds the channel to the set at pixels where ``is_available`` is truthy
+        and removes it everywhere else.
+
+        :param channel: channel to be set
+        :type channel: int
+        :param is_available: availability of the channel
+        :type is_available: :class:`data_map.DataMap2D` or array of bools
+        :return: None
+        """
+        bit = self._get_bit(channel)
+        is_available = self._get_mask_matrix(is_available)
+        self._matrix &= ~bit
+        self._matrix[is_available] |= bit
+
+    def count_channels(self):
+        """
+        Counts the number of channels in the set at each pixel. This is
+        equivalent to :meth:`data_map.DataMap3D.sum_all_layers` on the
+        corresponding DataMap3D.
+
+        :return: data map holding the number of channels
+        :rtype: :class:`data_map.DataMap2D`
+        """
+        matrix = numpy.ascontiguousarray(self._matrix, dtype=numpy.uint64)
+        bytes_per_pixel = matrix.dtype.itemsize
+        counts = _POPCOUNT_TABLE[matrix.view(numpy.uint8)].reshape(
+            matrix.shape + (bytes_per_pixel,)).sum(axis=2)
+
+        datamap2d = DataMap2D.from_specification(self._latitude_bounds,
+                                                 self._longitude_bounds,
+                                                 self._num_latitude_divisions,
+                                                 self._num_longitude_divisions,
+                                                 verbose=False)
+        datamap2d.mutable_matrix = counts.astype(float)
+        return datamap2d
+
+    def _raise_error_if_bitmasks_are_incompatible(self, other_bitmask):
+        if not isinstance(other_bitmask, DataMap2DChannelBitmask):
+            raise TypeError("Expected a DataMap2DChannelBitmask")
+        self.raise_error_if_datamaps_are_incomparable(other_bitmask)
+        if self._channel_list != other_bitmask.get_channel_list():
+            raise ValueError("Channel lists are not equal: %s vs. %s" %
+                             (str(self._channel_list),
+                              str(other_bitmask.get_channel_list())))
+
+    def logical_and(self, other_bitmask):
+        """
+        Intersects the channel sets of the two maps at each pixel and returns
+        the result as a new :class:`DataMap2DChannelBitmask`. The maps must
+        be comparable and have the same channel list.
+        """
+        self._raise_error_if_bitmasks_are_incompatible(other_bitmask)
+        result = self.get_copy_of(self, verbose=False)
+        result.mutable_matrix &= other_bitmask.mutable_matrix
+        return result
+
+    def logical_or(self, other_bitmask):
+        """
+        Combines the channel sets of the two maps at each pixel and returns
+        the result as a new :class:`DataMap2DChannelBitmask`. The maps must
+        be comparable and have the same channel list.
+        """
+        self._raise_error_if_bitmasks_are_incompatible(other_bitmask)
+        result = self.get_copy_of(self, verbose=False)
+        result.mutable_matrix |= other_bitmask.mutable_matrix
+        return result
+
+    def to_DataMap3D(self):
+        """
+        Expands the bitmask into a :class:`data_map.DataMap3D` with one
+        boolean layer per channel.
+
+        :rtype: :class:`data_map.DataMap3D`
+        """
+        template = DataMap2D.from_specification(self._latitude_bounds,
+                                                self._longitude_bounds,
+                                                self._num_latitude_divisions,
+                                                self._num_longitude_divisions,
+                                                verbose=False, dtype=bool)
+        datamap3d = DataMap3D.from_DataMap2D(template, self._channel_list)
+        for channel in self._channel_list:
+            datamap3d.set_layer(channel, self.get_channel(channel))
+        return datamap3d
@@ -0,0 +1,103 @@
+from data_map_channel_bitmask import DataMap2DChannelBitmask
+import data_map
+import numpy
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+
+class ChannelBitmaskTestCase(unittest.TestCase):
+    def setUp(self):
+        template = data_map.DataMap2DBayArea.create(3, 4)
+        template.reset_all_values(0)
+        self.channel_list = [2] + range(5, 37) + range(38, 52)
+        self.datamap3d = data_map.DataMap3D.from_DataMap2D(template,
+                                                           self.channel_list)
+        numpy.random.seed(0)
+        self.datamap3d.mutable_array[:] = numpy.random.randint(
+            0, 2, size=self.datamap3d.mutable_array.shape)
+        self.bitmask = DataMap2DChannelBitmask.from_DataMap3D(self.datamap3d)
+
+    def test_storage(self):
+        self.assertEqual(self.bitmask.mutable_matrix.dtype, numpy.uint64)
+        self.assertEqual(self.bitmask.get_channel_list(), self.channel_list)
+
+    def test_count_channels(self):
+        self.assertTrue(numpy.array_equal(
+            self.bitmask.count_channels().mutable_matrix,
+            self.datamap3d.sum_all_layers().mutable_matrix))
+
+    def test_get_and_set_channel(self):
+        for channel in [2, 36, 51]:
+            self.assertTrue(numpy.array_equal(
+                self.bitmask.get_channel(channel).mutable_matrix,
+                self.datamap3d.get_layer(channel).mutable_matrix != 0))
+
+        self.bitmask.set_channel(51, numpy.ones((3, 4), dtype=bool))
+        self.assertTrue(numpy.all(self.bitmask.get_channel(51).mutable_matrix))
+        self.assertTrue(numpy.array_equal(
+            self.bitmask.get_channel(50).mutable_matrix,
+            self.datamap3d.get_layer(50).mutable_matrix != 0))
+
+        with self.assertRaises(ValueError):
+            self.bitmask.get_channel(37)
+
+    def test_logical_operations(self):
+        empty = self.bitmask.get_clean_copy()
+        full = self.bitmask.get_clean_copy(fill_value=True)
+        self.assertTrue(numpy.all(full.count_channels().mutable_matrix ==
+                                  len(self.channel_list)))
+
+        self.assertTrue(numpy.array_equal(
+            self.bitmask.logical_and(full).mutable_matrix,
+            self.bitmask.mutable_matrix))
+        self.assertTrue(numpy.array_equal(
+            self.bitmask.logical_or(empty).mutable_matrix,
+            self.bitmask.mutable_matrix))
+        self.assertTrue(numpy.all(
+            self.bitmask.logical_and(empty).mutable_matrix == 0))
+
+        self.assertTrue(numpy.array_equal(
+            self.bitmask.get_clean_copy(dtype=numpy.uint64).mutable_matrix,
+            empty.mutable_matrix))
+        with self.assertRaises(TypeError):
+            self.bitmask.get_clean_copy(dtype=bool)
+
+        other = DataMap2DChannelBitmask.from_DataMap2D(self.bitmask, [2, 5])
+        with self.assertRaises(ValueError):
+            self.bitmask.logical_or(other)
+
+    def test_to_DataMap3D(self):
+        datamap3d = self.bitmask.to_DataMap3D()
+        self.assertEqual(datamap3d.get_layer_descr_list(), self.channel_list)
+        self.assertTrue(numpy.array_equal(datamap3d.mutable_array,
+                                          self.datamap3d.mutable_array != 0))
+
+    def test_pickle(self):
+        restored = pickle.loads(pickle.dumps(self.bitmask))
+        self.assertIsInstance(restored, DataMap2DChannelBitmask)
+        self.assertEqual(restored.get_channel_list(), self.channel_list)
+        self.assertTrue(numpy.array_equal(restored.mutable_matrix,
+                                          self.bitmask.mutable_matrix))
+
+    def test_memmap(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "bitmask.dat")
+            self.bitmask.to_memmap(filename)
+            restored = DataMap2DChannelBitmask.from_memmap(filename)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(restored.get_channel_list(), self.channel_list)
+        self.assertTrue(numpy.array_equal(
+            restored.count_channels().mutable_matrix,
+            self.bitmask.count_channels().mutable_matrix))
+
+
+from custom_logging import getCurrentLogLevel, changeLogLevel, disableLogging
+original_log_level = getCurrentLogLevel()
+disableLogging()
+unittest.main()
+changeLogLevel(original_log_level)
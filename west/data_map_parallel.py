@@ -0,0 +1,181 @@
+"""
+Evaluates per-pixel update functions in a pool of worker processes.
+
+The grid is split into bands of consecutive latitude rows. Each band is
+evaluated independently by a worker and the results are copied back into
+the destination matrix in band order, so the output does not depend on the
+number of processes or on the order in which the workers finish.
+
+Normally, the update function is sent to the workers by pickling it. This
+rules out closures, lambdas and bound methods (e.g. the functions built in
+:meth:`ruleset_fcc2012.RulesetFcc2012.apply_tv_exclusions_to_map`). For
+these, ``use_fork=True`` may be given: the function is then stored in this
+module before the workers are forked so that they inherit it instead of
+receiving a pickled copy.
+
+This module is used by :meth:`data_map.DataMap2D.update_all_values_via_function`
+and
+:meth:`data_map.DataMap3D.combine_values_elementwise_across_layers_using_function`
+when more than one process is requested; it is not usually necessary to call
+it directly.
+"""
+
+import multiprocessing
+import os
+import pickle
+import numpy
+
+
+# Update function inherited by forked workers (see use_fork)
+_forked_update_function = None
+
+
+class ListOfValuesAdapter(object):
+    """
+    Wraps a function which expects a list of values (e.g. the combination
+    functions used by :class:`data_map.DataMap3D`) so that it can be given
+    the values of a pixel as a 1D array. Picklable if the wrapped function is
+    picklable.
+    """
+
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, latitude, longitude, latitude_index, longitude_index,
+                 values):
+        return self.function(latitude, longitude, latitude_index,
+                             longitude_index, list(values))
+
+
+def raise_error_if_not_picklable(update_function):
+    """
+    Raises a TypeError with a helpful message if ``update_function`` cannot
+    be sent to a worker process.
+    """
+    try:
+        pickle.dumps(update_function, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        raise TypeError("The update function %r cannot be pickled (%s) and "
+                        "therefore cannot be sent to a worker process. Use a "
+                        "module-level function or pass use_fork=True to let "
+                        "forked workers inherit it." % (update_function, e))
+
+
+def update_matrix_in_parallel(matrix, latitudes, longitudes, update_function,
+                              input_values=None, mask=None,
+                              num_processes=None, chunk_size=None,
+                              use_fork=False, log=None):
+    """
+    Updates ``matrix`` in place: for each pixel, ``update_function`` is
+    called as::
+
+        update_function(latitude, longitude, latitude_index, longitude_index, current_value)
+
+    and its return value becomes the new value of the pixel unless it is
+    None, in which case the pixel is left unchanged.
+
+    :param matrix: destination matrix (latitudes x longitudes)
+    :type matrix: :class:`numpy.ndarray`
+    :param latitudes: latitude of each row of ``matrix``
+    :param longitudes: longitude of each column of ``matrix``
+    :param update_function: function used to update the values
+    :type update_function: function object
+    :param input_values: values given to ``update_function`` as \
+            ``current_value``; defaults to ``matrix``. If it has a third \
+            dimension, a 1D array of values is given for each pixel.
+    :type input_values: :class:`numpy.ndarray`
+    :param mask: if given, only pixels where ``mask`` is True are evaluated
+    :type mask: :class:`numpy.ndarray` of bools
+    :param num_processes: number of worker processes (None to use all CPUs)
+    :type num_processes: int
+    :param chunk_size: number of latitude rows per task (by default, the \
+            rows are split into about four tasks per process)
+    :type chunk_size: int
+    :param use_fork: if True, the workers inherit ``update_function`` by \
+            forking rather than receiving a pickled copy
+    :type use_fork: bool
+    :param log: logger used to report progress (nothing is logged if None)
+    :return: None
+    """
+    global _forked_update_function
+
+    num_latitudes = matrix.shape[0]
+    if input_values is None:
+        input_values = matrix
+    if input_values.shape[:2] != matrix.shape[:2]:
+        raise ValueError("Input values have shape %s but expected %s." %
+                         (str(input_values.shape[:2]), str(matrix.shape)))
+
+    if num_processes is None:
+        num_processes = multiprocessing.cpu_count()
+    if num_processes < 1:
+        raise ValueError("Number of processes must be positive")
+    if chunk_size is None:
+        chunk_size = max(1, -(-num_latitudes // (4 * num_processes)))
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be positive")
+
+    if use_fork:
+        if not hasattr(os, "fork"):
+            raise ValueError("Fork-based workers are not supported on this "
+                             "platform")
+        function_for_tasks = None
+    else:
+        raise_error_if_not_picklable(update_function)
+        function_for_tasks = update_function
+
+    longitudes = numpy.asarray(longitudes)
+    tasks = []
+    for row_start in range(0, num_latitudes, chunk_size):
+        rows = slice(row_start, min(row_start + chunk_size, num_latitudes))
+        band_mask = None if mask is None else mask[rows]
+        tasks.append((row_start, numpy.asarray(latitudes)[rows], longitudes,
+                      matrix[rows], input_values[rows], band_mask,
+                      function_for_tasks))
+
+    if log is not None:
+        log.info("Updating %d bands of %d rows using %d processes" %
+                 (len(tasks), chunk_size, num_processes))
+
+    if use_fork:
+        # The function must be in place before the workers are created
+        _forked_update_function = update_function
+    try:
+        pool = _create_pool(num_processes, use_fork)
+        try:
+            for (row_start, new_values) in pool.imap(_evaluate_band, tasks):
+                matrix[row_start:row_start + len(new_values)] = new_values
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        _forked_update_function = None
+
+
+def _create_pool(num_processes, use_fork):
+    if use_fork and hasattr(multiprocessing, "get_context"):
+        return multiprocessing.get_context("fork").Pool(num_processes)
+    return multiprocessing.Pool(num_processes)
+
+
+def _evaluate_band(task):
+    """Evaluates the update function on one band of rows (in a worker)."""
+    (row_start, latitudes, longitudes, values, input_values, mask,
+     update_function) = task
+    if update_function is None:
+        update_function = _forked_update_function
+
+    new_values = values.copy()
+    if mask is None:
+        indices = numpy.ndindex(*values.shape[:2])
+    else:
+        indices = zip(*[idx.tolist() for idx in numpy.nonzero(mask)])
+
+    for (row, lon_idx) in indices:
+        new_value = update_function(latitudes[row], longitudes[lon_idx],
+                                    row_start + row, lon_idx,
+                                    input_values[row, lon_idx])
+        if new_value is not None:
+            new_values[row, lon_idx] = new_value
+
+    return (row_start, new_values)
@@ -1,4 +1,4 @@
-from data_map import DataMap2D, DataMap3D
+from data_map import DataMap2D, DataMap3D, _copy_vectorized_update
 import numpy
 
 
@@ -28,7 +28,8 @@ def _raise_error_if_bad_input(tuple_of_datamaps, expected_type):
             input_datamap)
 
 
-def synthesize_pixels(combination_function, tuple_of_datamap2ds):
+def synthesize_pixels(combination_function, tuple_of_datamap2ds,
+                      vectorized=False):
     """
         Creates a new :class:`data_map.DataMap2D`, iterates over all of its
         pixels, and fills each pixel independently and according to the output
@@ -74,11 +75,48 @@ def synthesize_pixels(combination_function, tuple_of_datamap2ds):
             rate_map = synthesize_pixels(ideal_data_rate,
                                          (is_whitespace_datamap2d,
                                           noise_datamap2d))
+
+        If ``vectorized`` is True, ``combination_function`` is called only
+        once for the whole grid (see
+        :meth:`data_map.DataMap2D.update_all_values_via_vectorized_function`).
+        In that case it receives a column of latitudes, a row of longitudes,
+        the corresponding indices, and a tuple containing the matrix of each
+        input DataMap2D. It should return an array of synthesized values;
+        masked entries of a :class:`numpy.ma.MaskedArray` will keep the
+        default NaN value. The example above becomes::
+
+            def ideal_data_rate(latitudes, longitudes, latitude_indices,
+                                longitude_indices, tuple_of_values):
+                is_whitespace, noise_level = tuple_of_values
+                return numpy.where(is_whitespace,
+                                   bandwidth * log(1 + signal / noise_level),
+                                   0)
+
+            rate_map = synthesize_pixels(ideal_data_rate,
+                                         (is_whitespace_datamap2d,
+                                          noise_datamap2d),
+                                         vectorized=True)
     """
     _raise_error_if_bad_input(tuple_of_datamap2ds, DataMap2D)
 
     arbitrary_input_datamap = tuple_of_datamap2ds[0]
-    output_map = arbitrary_input_datamap.get_clean_copy(fill_value=numpy.nan)
+    output_map = arbitrary_input_datamap.get_clean_copy(fill_value=numpy.nan,
+                                                        dtype=float)
+
+    if vectorized:
+        def vectorized_calculation_function(latitudes, longitudes,
+                                            latitude_indices,
+                                            longitude_indices,
+                                            current_values):
+            tuple_of_matrices = tuple(datamap.mutable_matrix for datamap in
+                                      tuple_of_datamap2ds)
+            return combination_function(latitudes, longitudes,
+                                        latitude_indices, longitude_indices,
+                                        tuple_of_matrices)
+
+        output_map.update_all_values_via_vectorized_function(
+            vectorized_calculation_function)
+        return output_map
 
     def calculation_function(latitude, longitude, latitude_index,
                              longitude_index, current_value):
@@ -92,7 +130,8 @@ def synthesize_pixels(combination_function, tuple_of_datamap2ds):
     return output_map
 
 
-def synthesize_pixels_all_layers(combination_function, tuple_of_datamap3ds):
+def synthesize_pixels_all_layers(combination_function, tuple_of_datamap3ds,
+                                 vectorized=False):
     """
     See :meth:`synthesize_pixels` for the main documentation of this
     function.
@@ -102,15 +141,39 @@ def synthesize_pixels_all_layers(combination_function, tuple_of_datamap3ds):
     (rather than a scalar value) is returned, with each element corresponding to
     a layer in the DataMap3D.
 
+    If ``vectorized`` is True, ``combination_function`` is called only once.
+    It receives a column of latitudes, a row of longitudes, the
+    corresponding indices, and a tuple containing the values of each input
+    DataMap3D as an array of shape (layers, latitudes, longitudes). The
+    layers of all arrays are in the order of the first DataMap3D. It should
+    return an array of that shape; masked entries of a
+    :class:`numpy.ma.MaskedArray` will keep the default NaN value.
+
     .. warning:: Although this function will enforce that all of the DataMap3D \
     objects have the same set of layers, it does not enforce (although it \
     assumes) that they are in the same order. Behavior is undefined if layer \
-    order is not consistent.
+    order is not consistent. (This does not apply if ``vectorized`` is True.)
     """
     _raise_error_if_bad_input(tuple_of_datamap3ds, DataMap3D)
 
     arbitrary_input_datamap3d = tuple_of_datamap3ds[0]
-    output_map = arbitrary_input_datamap3d.get_clean_copy(fill_value=numpy.nan)
+    output_map = arbitrary_input_datamap3d.get_clean_copy(fill_value=numpy.nan,
+                                                          dtype=float)
+
+    if vectorized:
+        grid = arbitrary_input_datamap3d.get_arbitrary_layer()
+        layer_descr_list = output_map.get_layer_descr_list()
+        tuple_of_arrays = tuple(
+            _get_values_in_layer_order(datamap3d, layer_descr_list)
+            for datamap3d in tuple_of_datamap3ds)
+        new_values = combination_function(
+            grid.latitudes.reshape(-1, 1), grid.longitudes.reshape(1, -1),
+            numpy.arange(len(grid.latitudes)).reshape(-1, 1),
+            numpy.arange(len(grid.longitudes)).reshape(1, -1),
+            tuple_of_arrays)
+        if new_values is not None:
+            _copy_vectorized_update(output_map.mutable_array, new_values)
+        return output_map
 
     arbitrary_input_datamap2d = arbitrary_input_datamap3d.get_arbitrary_layer()
     for (lat_idx, lat) in enumerate(arbitrary_input_datamap2d.latitudes):
@@ -125,3 +188,147 @@ def synthesize_pixels_all_layers(combination_function, tuple_of_datamap3ds):
                                                          new_values)
 
     return output_map
+
+
+def _get_grid(datamap):
+    """Returns a :class:`data_map.DataMap2D` describing the grid of
+    ``datamap``."""
+    if isinstance(datamap, DataMap3D):
+        return datamap.get_arbitrary_layer()
+    return datamap
+
+
+def _get_values_in_layer_order(datamap, layer_descr_list):
+    """Returns the values of ``datamap``; the layers of a DataMap3D are
+    ordered according to ``layer_descr_list``."""
+    if isinstance(datamap, DataMap2D):
+        return datamap.mutable_matrix
+    if datamap.get_layer_descr_list() == layer_descr_list:
+        return datamap.mutable_array
+    return datamap._get_values_of_layers(layer_descr_list)
+
+
+def _apply(function, matrices, is_fold, kwargs):
+    """Calls ``function`` with all matrices or, if ``is_fold`` is True, folds
+    the binary ``function`` over them from left to right."""
+    if not is_fold:
+        return function(*matrices, **kwargs)
+    result = function(matrices[0], matrices[1], **kwargs)
+    for matrix in matrices[2:]:
+        result = function(result, matrix, **kwargs)
+    return result
+
+
+def combine_datamaps(function, tuple_of_datamaps, out=None, **kwargs):
+    """
+    Combines the values of any number of comparable data maps by calling
+    ``function`` once with the whole matrix of each map::
+
+        function(matrix_a, matrix_b, ..., **kwargs)
+
+    ``function`` is typically a NumPy callable such as :data:`numpy.add`,
+    :data:`numpy.logical_and`, :data:`numpy.fmax` or :func:`numpy.where`,
+    but any function which works element-wise on arrays may be used. A
+    binary ufunc given more than two maps is applied from left to right
+    (e.g. :data:`numpy.add` computes ``(a + b) + c``). Unlike
+    :func:`synthesize_pixels` and
+    :meth:`data_map.DataMap2D.combine_datamaps_with_function`, there is no
+    per-pixel Python call.
+
+    The inputs may be :class:`data_map.DataMap2D` and
+    :class:`data_map.DataMap3D` objects. If any input is a DataMap3D, the
+    result is a DataMap3D: the layers of all DataMap3D inputs are matched by
+    their descriptions (their order may differ) and each DataMap2D input is
+    applied to every layer. For example, the following masks every layer of
+    a whitespace map with a region map::
+
+        combine_datamaps(numpy.logical_and, (whitespace_datamap3d,
+                                             is_in_region_datamap2d))
+
+    If ``out`` is given, the result is written into it (and it is
+    returned); ufuncs write into it directly so that no temporary matrix is
+    created. ``out`` may be one of the inputs. Otherwise, a new data map
+    with the data type of the result is returned.
+
+    :param function: function applied to the matrices
+    :type function: :class:`numpy.ufunc` or function object
+    :param tuple_of_datamaps: the data maps to be combined, in the order in \
+            which their matrices are passed to ``function``
+    :type tuple_of_datamaps: tuple of :class:`data_map.DataMap2D` and/or \
+            :class:`data_map.DataMap3D`
+    :param out: data map in which the result is stored
+    :type out: :class:`data_map.DataMap2D` or :class:`data_map.DataMap3D`
+    :param kwargs: additional keyword arguments for ``function``
+    :return: the combined data map
+    :rtype: :class:`data_map.DataMap2D` or :class:`data_map.DataMap3D`
+    """
+    if not isinstance(tuple_of_datamaps, tuple):
+        raise TypeError("Expected a tuple of DataMaps as an argument; got %r "
+                        "instead." % tuple_of_datamaps)
+    if not len(tuple_of_datamaps):
+        raise ValueError("Expected to receive at least one input DataMap")
+
+    all_datamaps = tuple_of_datamaps + (() if out is None else (out,))
+    for datamap in all_datamaps:
+        _raise_error_if_not_correct_type(datamap, (DataMap2D, DataMap3D))
+
+    grid = _get_grid(all_datamaps[0])
+    for datamap in all_datamaps[1:]:
+        grid.raise_error_if_datamaps_are_incomparable(_get_grid(datamap))
+
+    datamap3ds = [datamap for datamap in all_datamaps
+                  if isinstance(datamap, DataMap3D)]
+    layer_descr_list = None
+    if datamap3ds:
+        if isinstance(out, DataMap2D):
+            raise TypeError("Cannot store the combination of DataMap3D "
+                            "objects in a DataMap2D")
+        reference = out if out is not None else datamap3ds[0]
+        for datamap3d in datamap3ds:
+            reference.raise_error_if_datamaps_are_incomparable(datamap3d)
+        layer_descr_list = reference.get_layer_descr_list()
+
+    matrices = [_get_values_in_layer_order(datamap, layer_descr_list)
+                for datamap in tuple_of_datamaps]
+    if datamap3ds:
+        expected_shape = (len(layer_descr_list),) + grid.mutable_matrix.shape
+    else:
+        expected_shape = grid.mutable_matrix.shape
+
+    is_ufunc = isinstance(function, numpy.ufunc) and function.nout == 1
+    is_fold = is_ufunc and function.nin == 2 and len(matrices) > 2
+
+    if out is not None:
+        out_values = _get_values_in_layer_order(out, layer_descr_list)
+        if is_fold and not any(numpy.may_share_memory(out_values, matrix)
+                               for matrix in matrices[2:]):
+            function(matrices[0], matrices[1], out=out_values, **kwargs)
+            for matrix in matrices[2:]:
+                function(out_values, matrix, out=out_values, **kwargs)
+        elif is_ufunc and not is_fold:
+            function(*matrices, out=out_values, **kwargs)
+        else:
+            numpy.copyto(out_values,
+                         _apply(function, matrices, is_fold, kwargs),
+                         casting='unsafe')
+        return out
+
+    values = numpy.asarray(_apply(function, matrices, is_fold, kwargs))
+    if values.shape != expected_shape:
+        raise ValueError("Expected the function to return an array of shape "
+                         "%s but got %s." % (str(expected_shape),
+                                             str(values.shape)))
+    # The new map must not share its values with an input
+    if any(numpy.may_share_memory(values, matrix) for matrix in matrices):
+        values = values.copy()
+
+    if datamap3ds:
+        return DataMap3D._from_values(grid, layer_descr_list, values)
+    output_map = DataMap2D.from_specification(grid._latitude_bounds,
+                                              grid._longitude_bounds,
+                                              grid._num_latitude_divisions,
+                                              grid._num_longitude_divisions,
+                                              verbose=False,
+                                              dtype=values.dtype)
+    output_map._matrix = values
+    return output_map
@@ -0,0 +1,986 @@
+import data_map
+import data_map_synthesis
+import numpy
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+
+class VectorizedUpdateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.datamap = data_map.DataMap2DBayArea.create(4, 5)
+        self.datamap.reset_all_values(0)
+
+    def test_matches_per_pixel_update(self):
+        def pixel_function(latitude, longitude, latitude_index,
+                           longitude_index, current_value):
+            return latitude * 2 + longitude + latitude_index - longitude_index
+
+        def vectorized_function(latitudes, longitudes, latitude_indices,
+                                longitude_indices, current_values):
+            return latitudes * 2 + longitudes + latitude_indices - \
+                longitude_indices
+
+        expected = self.datamap.get_clean_copy()
+        expected.update_all_values_via_function(pixel_function)
+
+        self.datamap.update_all_values_via_vectorized_function(
+            vectorized_function)
+        self.assertTrue(numpy.allclose(self.datamap.mutable_matrix,
+                                       expected.mutable_matrix))
+
+    def test_argument_shapes(self):
+        shapes = []
+
+        def vectorized_function(latitudes, longitudes, latitude_indices,
+                                longitude_indices, current_values):
+            shapes.extend([latitudes.shape, longitudes.shape,
+                           latitude_indices.shape, longitude_indices.shape,
+                           current_values.shape])
+
+        self.datamap.update_all_values_via_vectorized_function(
+            vectorized_function)
+        self.assertEqual(shapes, [(4, 1), (1, 5), (4, 1), (1, 5), (4, 5)])
+
+    def test_masked_values_are_not_updated(self):
+        def vectorized_function(latitudes, longitudes, latitude_indices,
+                                longitude_indices, current_values):
+            new_values = numpy.ones(current_values.shape) * 7
+            return numpy.ma.masked_array(new_values,
+                                         mask=(longitude_indices % 2 == 0) &
+                                         numpy.ones(current_values.shape,
+                                                    dtype=bool))
+
+        self.datamap.update_all_values_via_vectorized_function(
+            vectorized_function)
+        self.assertTrue(numpy.all(self.datamap.mutable_matrix[:, 0::2] == 0))
+        self.assertTrue(numpy.all(self.datamap.mutable_matrix[:, 1::2] == 7))
+
+    def test_none_means_no_update(self):
+        self.datamap.update_all_values_via_vectorized_function(
+            lambda *args: None)
+        self.assertTrue(numpy.all(self.datamap.mutable_matrix == 0))
+
+    def test_synthesize_pixels_vectorized(self):
+        other = self.datamap.get_clean_copy(fill_value=3)
+        self.datamap.mutable_matrix = numpy.arange(20).reshape(4, 5)
+
+        def pixel_function(latitude, longitude, latitude_index,
+                           longitude_index, tuple_of_values):
+            (a, b) = tuple_of_values
+            if a % 3 == 0:
+                return None
+            return a * b
+
+        def vectorized_function(latitudes, longitudes, latitude_indices,
+                                longitude_indices, tuple_of_values):
+            (a, b) = tuple_of_values
+            return numpy.ma.masked_array(a * b, mask=(a % 3 == 0))
+
+        expected = data_map_synthesis.synthesize_pixels(
+            pixel_function, (self.datamap, other))
+        actual = data_map_synthesis.synthesize_pixels(
+            vectorized_function, (self.datamap, other), vectorized=True)
+
+        self.assertTrue(numpy.array_equal(numpy.isnan(actual.mutable_matrix),
+                                          numpy.isnan(
+                                              expected.mutable_matrix)))
+        self.assertTrue(numpy.allclose(
+            numpy.nan_to_num(actual.mutable_matrix),
+            numpy.nan_to_num(expected.mutable_matrix)))
+
+
+class MaskedUpdateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.datamap = data_map.DataMap2DBayArea.create(4, 5)
+        self.datamap.reset_all_values(0)
+        self.mask = self.datamap.get_clean_copy(fill_value=False)
+        self.mask.mutable_matrix[1, 2] = True
+        self.mask.mutable_matrix[3, 0] = True
+
+    def test_nonzero_indices(self):
+        (latitude_indices, longitude_indices) = self.mask.nonzero_indices()
+        self.assertEqual(zip(latitude_indices, longitude_indices),
+                         [(1, 2), (3, 0)])
+
+    def test_only_masked_pixels_are_visited(self):
+        visited = []
+
+        def update_function(latitude, longitude, latitude_index,
+                            longitude_index, current_value):
+            visited.append((latitude_index, longitude_index))
+            self.assertEqual(latitude, self.datamap.latitudes[latitude_index])
+            self.assertEqual(longitude,
+                             self.datamap.longitudes[longitude_index])
+            return 5
+
+        self.datamap.update_all_values_via_function(update_function,
+                                                    only_where=self.mask)
+        self.assertEqual(visited, [(1, 2), (3, 0)])
+        self.assertEqual(numpy.sum(self.datamap.mutable_matrix), 10)
+        self.assertEqual(self.datamap.get_value_by_index(3, 0), 5)
+
+    def test_mask_is_evaluated_before_updates(self):
+        # Updating the mask itself must not change which pixels are visited
+        def update_function(latitude, longitude, latitude_index,
+                            longitude_index, current_value):
+            return False
+
+        self.mask.update_all_values_via_function(update_function,
+                                                 only_where=self.mask)
+        self.assertFalse(numpy.any(self.mask.mutable_matrix))
+
+    def test_array_mask(self):
+        self.datamap.update_all_values_via_function(
+            lambda *args: 1, only_where=self.mask.get_matrix_copy())
+        self.assertEqual(numpy.sum(self.datamap.mutable_matrix), 2)
+
+    def test_bad_masks(self):
+        with self.assertRaises(ValueError):
+            self.datamap.update_all_values_via_function(
+                lambda *args: 1, only_where=numpy.ones((2, 2)))
+        with self.assertRaises(TypeError):
+            self.datamap.update_all_values_via_function(
+                lambda *args: 1,
+                only_where=data_map.DataMap2DBayArea.create(5, 4))
+
+
+def _module_level_update_function(latitude, longitude, latitude_index,
+                                  longitude_index, current_value):
+    if latitude_index == longitude_index:
+        return None
+    return latitude * 100 + longitude + latitude_index * longitude_index
+
+
+def _module_level_combination_function(latitude, longitude, latitude_index,
+                                       longitude_index, list_of_values):
+    return sum(list_of_values) * latitude_index
+
+
+class ParallelUpdateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.datamap = data_map.DataMap2DBayArea.create(7, 5)
+        self.datamap.reset_all_values(-1)
+        self.expected = self.datamap.get_copy_of(self.datamap)
+        self.expected.update_all_values_via_function(
+            _module_level_update_function)
+
+    def test_matches_serial_update(self):
+        for chunk_size in [None, 1, 3, 100]:
+            actual = self.datamap.get_copy_of(self.datamap)
+            actual.update_all_values_via_function(
+                _module_level_update_function, num_processes=2,
+                chunk_size=chunk_size)
+            self.assertTrue(numpy.array_equal(actual.mutable_matrix,
+                                              self.expected.mutable_matrix))
+
+    def test_unpicklable_function(self):
+        offset = 3
+
+        def closure(latitude, longitude, latitude_index, longitude_index,
+                    current_value):
+            return latitude_index + offset
+
+        with self.assertRaises(TypeError):
+            self.datamap.update_all_values_via_function(closure,
+                                                        num_processes=2)
+
+        self.datamap.update_all_values_via_function(closure, num_processes=2,
+                                                    use_fork=True)
+        self.assertTrue(numpy.array_equal(
+            self.datamap.mutable_matrix[:, 0], numpy.arange(7) + offset))
+
+    def test_only_where(self):
+        mask = self.datamap.get_clean_copy(fill_value=False)
+        mask.mutable_matrix[2:5, 1] = True
+        self.datamap.update_all_values_via_function(
+            _module_level_update_function, only_where=mask, num_processes=2,
+            chunk_size=2)
+        self.assertTrue(numpy.array_equal(
+            self.datamap.mutable_matrix[2:5, 1],
+            self.expected.mutable_matrix[2:5, 1]))
+        self.assertEqual(numpy.sum(self.datamap.mutable_matrix == -1), 32)
+
+    def test_combine_layers(self):
+        datamap3d = data_map.DataMap3D.from_DataMap2D(self.expected,
+                                                      ["a", "b", "c"])
+        datamap3d.get_layer("b").reset_all_values(2)
+        expected = datamap3d.combine_values_elementwise_across_layers_using_function(
+            _module_level_combination_function)
+        actual = datamap3d.combine_values_elementwise_across_layers_using_function(
+            _module_level_combination_function, num_processes=3, chunk_size=2)
+        self.assertTrue(numpy.array_equal(actual.mutable_matrix,
+                                          expected.mutable_matrix))
+
+
+class DataMap3DTestCase(unittest.TestCase):
+    def setUp(self):
+        self.template = data_map.DataMap2DBayArea.create(3, 4)
+        self.template.reset_all_values(0)
+        self.datamap3d = data_map.DataMap3D.from_DataMap2D(self.template,
+                                                           [5, 7, 9])
+        for (index, layer_descr) in enumerate([5, 7, 9]):
+            self.datamap3d.get_layer(layer_descr).mutable_matrix = \
+                numpy.arange(12).reshape(3, 4) % (index + 2)
+
+    def test_layers_are_views(self):
+        layer = self.datamap3d.get_layer(7)
+        self.assertIs(layer, self.datamap3d.get_layer(7))
+        layer.set_value_by_index(1, 2, 42)
+        self.assertEqual(self.datamap3d.mutable_array[1, 1, 2], 42)
+        self.assertEqual(
+            self.datamap3d.get_all_layers_at_index_as_dict(1, 2)[7], 42)
+
+        self.datamap3d.reset_all_values(3)
+        self.assertTrue(numpy.all(layer.mutable_matrix == 3))
+
+        # Copies are independent
+        copy = data_map.DataMap2D.get_copy_of(layer)
+        copy.reset_all_values(0)
+        self.assertTrue(numpy.all(layer.mutable_matrix == 3))
+
+    def test_append_layer(self):
+        layer = self.datamap3d.get_layer(5)
+        new_layer = self.template.get_clean_copy(fill_value=8)
+        self.datamap3d.append_layer(11, new_layer)
+        self.assertEqual(self.datamap3d.get_layer_descr_list(), [5, 7, 9, 11])
+        self.assertEqual(self.datamap3d.mutable_array.shape, (4, 3, 4))
+
+        # Existing layers still refer to the data of the DataMap3D
+        layer.reset_all_values(-1)
+        self.assertTrue(numpy.all(self.datamap3d.mutable_array[0] == -1))
+        self.assertTrue(numpy.all(
+            self.datamap3d.get_layer(11).mutable_matrix == 8))
+
+        with self.assertRaises(KeyError):
+            self.datamap3d.append_layer(11, new_layer)
+        with self.assertRaises(ValueError):
+            self.datamap3d.append_layer(13, layer)
+
+    def test_set_layer(self):
+        self.datamap3d.set_layer(9, self.template)
+        self.assertTrue(numpy.all(
+            self.datamap3d.get_layer(9).mutable_matrix == 0))
+
+    def test_values_at_index(self):
+        self.assertEqual(self.datamap3d.get_all_layers_at_index_as_list(1, 3),
+                         [1, 1, 3])
+        self.assertEqual(
+            self.datamap3d.get_some_layers_at_index_as_list([9, 5], 1, 3),
+            [3, 1])
+        self.datamap3d.set_all_layers_at_index_from_list(1, 3, [None, 6, 2])
+        self.assertEqual(
+            list(self.datamap3d.get_all_layers_at_index_as_array(1, 3)),
+            [1, 6, 2])
+
+    def test_reductions(self):
+        values = self.datamap3d.mutable_array
+        self.assertTrue(numpy.array_equal(
+            self.datamap3d.sum_all_layers().mutable_matrix,
+            values[0] + values[1] + values[2]))
+        self.assertTrue(numpy.array_equal(
+            self.datamap3d.sum_subset_of_layers([5, 9]).mutable_matrix,
+            values[0] + values[2]))
+        self.assertTrue(numpy.array_equal(
+            self.datamap3d.any_layers().mutable_matrix,
+            (values[0] != 0) | (values[1] != 0) | (values[2] != 0)))
+        self.assertTrue(numpy.array_equal(
+            self.datamap3d.all_layers([7, 9]).mutable_matrix,
+            (values[1] != 0) & (values[2] != 0)))
+
+        argmax = self.datamap3d.get_layer_descr_of_max_value()
+        self.assertEqual(argmax.get_value_by_index(0, 0), 5)
+        self.assertEqual(argmax.get_value_by_index(0, 3), 9)
+        self.assertEqual(argmax.get_value_by_index(1, 1), 7)
+
+    def test_vectorized_combination(self):
+        def pixel_function(latitude, longitude, latitude_index,
+                           longitude_index, list_of_values):
+            if latitude_index == 1:
+                return None
+            return list_of_values[0] * 10 + list_of_values[1] + longitude
+
+        def vectorized_function(latitudes, longitudes, latitude_indices,
+                                longitude_indices, values):
+            self.assertEqual(values.shape[0], 2)
+            return numpy.ma.masked_array(
+                values[0] * 10 + values[1] + longitudes,
+                mask=numpy.broadcast_arrays(latitude_indices == 1,
+                                            values[0])[0])
+
+        expected = self.datamap3d.combine_values_elementwise_across_layers_using_function(
+            pixel_function, [9, 5])
+        for block_shape in [None, (2, 3), (1, 1)]:
+            actual = self.datamap3d.combine_values_elementwise_across_layers_using_function(
+                vectorized_function, [9, 5], vectorized=True,
+                block_shape=block_shape)
+            self.assertTrue(numpy.array_equal(
+                numpy.isnan(actual.mutable_matrix),
+                numpy.isnan(expected.mutable_matrix)))
+            self.assertTrue(numpy.allclose(
+                numpy.nan_to_num(actual.mutable_matrix),
+                numpy.nan_to_num(expected.mutable_matrix)))
+
+    def test_builtin_combinations(self):
+        values = self.datamap3d.mutable_array
+        values[1, 0, 0] = numpy.nan
+        self.assertTrue(numpy.array_equal(
+            self.datamap3d.count_nonzero_layers().mutable_matrix,
+            numpy.sum(numpy.nan_to_num(values) != 0, axis=0)))
+        self.assertTrue(numpy.allclose(
+            self.datamap3d.weighted_sum_of_layers([1, 0.5],
+                                                  [9, 7]).mutable_matrix,
+            values[2] + 0.5 * numpy.nan_to_num(values[1])))
+        self.assertRaises(ValueError, self.datamap3d.weighted_sum_of_layers,
+                          [1, 2])
+
+        # Pixel (0, 0) is zero (or NaN) in all layers
+        first = self.datamap3d.get_first_layer_descr_where_nonzero()
+        self.assertTrue(numpy.isnan(first.get_value_by_index(0, 0)))
+        self.assertEqual(first.get_value_by_index(0, 1), 5)
+        self.assertEqual(first.get_value_by_index(0, 2), 7)
+        self.assertEqual(
+            self.datamap3d.get_first_layer_descr_where_nonzero(
+                [9, 7, 5]).get_value_by_index(0, 1), 9)
+
+        def max_run(latitude, longitude, latitude_index, longitude_index,
+                    list_of_values):
+            (run, longest) = (0, 0)
+            for value in list_of_values:
+                run = run + 1 if value and not numpy.isnan(value) else 0
+                longest = max(longest, run)
+            return longest
+
+        expected = self.datamap3d.combine_values_elementwise_across_layers_using_function(
+            max_run)
+        self.assertTrue(numpy.array_equal(
+            self.datamap3d.get_max_run_of_nonzero_layers().mutable_matrix,
+            expected.mutable_matrix))
+
+    def test_synthesize_pixels_all_layers_vectorized(self):
+        other = data_map.DataMap3D.from_DataMap2D(self.template, [9, 5, 7])
+        other.get_layer(9).reset_all_values(100)
+
+        def pixel_function(latitude, longitude, latitude_index,
+                           longitude_index, tuple_of_values):
+            (a, b) = tuple_of_values
+            return [x + y for (x, y) in zip(a, b)]
+
+        def vectorized_function(latitudes, longitudes, latitude_indices,
+                                longitude_indices, tuple_of_values):
+            (a, b) = tuple_of_values
+            return a + b
+
+        expected = data_map_synthesis.synthesize_pixels_all_layers(
+            pixel_function, (self.datamap3d, self.datamap3d))
+        actual = data_map_synthesis.synthesize_pixels_all_layers(
+            vectorized_function, (self.datamap3d, self.datamap3d),
+            vectorized=True)
+        self.assertTrue(numpy.array_equal(actual.mutable_array,
+                                          expected.mutable_array))
+
+        # Layers are matched by their descriptions
+        actual = data_map_synthesis.synthesize_pixels_all_layers(
+            vectorized_function, (self.datamap3d, other), vectorized=True)
+        self.assertTrue(numpy.array_equal(
+            actual.get_layer(9).mutable_matrix,
+            self.datamap3d.get_layer(9).mutable_matrix + 100))
+        self.assertTrue(numpy.array_equal(
+            actual.get_layer(5).mutable_matrix,
+            self.datamap3d.get_layer(5).mutable_matrix))
+
+    def test_pickle(self):
+        restored = pickle.loads(pickle.dumps(self.datamap3d))
+        self.assertTrue(numpy.array_equal(restored.mutable_array,
+                                          self.datamap3d.mutable_array))
+        restored.get_layer(5).reset_all_values(1)
+        self.assertTrue(numpy.all(restored.mutable_array[0] == 1))
+
+    def test_unpickle_dictionary_of_layers(self):
+        layers = {}
+        for layer_descr in [5, 7, 9]:
+            layers[layer_descr] = data_map.DataMap2D.get_copy_of(
+                self.datamap3d.get_layer(layer_descr))
+        old_style = data_map.DataMap3D.__new__(data_map.DataMap3D)
+        old_style.__dict__.update({'log': self.datamap3d.log,
+                                   '_layers': layers,
+                                   '_layer_descr_list': [5, 7, 9]})
+
+        restored = pickle.loads(pickle.dumps(old_style))
+        self.assertTrue(numpy.array_equal(restored.mutable_array,
+                                          self.datamap3d.mutable_array))
+        self.assertEqual(restored.get_layer(7).get_value_by_index(0, 1), 1)
+
+
+class CombineDatamapsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.datamap_a = data_map.DataMap2DBayArea.create(3, 4)
+        self.datamap_a.mutable_matrix[:] = numpy.arange(12.0).reshape(3, 4)
+        self.datamap_b = data_map.DataMap2DBayArea.create(3, 4)
+        self.datamap_b.mutable_matrix[:] = 2
+
+    def test_datamap2ds(self):
+        total = data_map_synthesis.combine_datamaps(
+            numpy.add, (self.datamap_a, self.datamap_b, self.datamap_b))
+        self.assertTrue(numpy.array_equal(total.mutable_matrix,
+                                          self.datamap_a.mutable_matrix + 4))
+
+        selected = data_map_synthesis.combine_datamaps(
+            numpy.where, (self.datamap_a, self.datamap_b, self.datamap_a))
+        self.assertEqual(selected.get_value_by_index(0, 0), 0)
+        self.assertEqual(selected.get_value_by_index(0, 1), 2)
+
+        # The ufunc fast path matches the per-pixel combination
+        expected = self.datamap_a.combine_datamaps_with_function(
+            self.datamap_b, lambda x, y: max(x, y))
+        actual = self.datamap_a.combine_datamaps_with_function(
+            self.datamap_b, numpy.maximum)
+        self.assertTrue(numpy.array_equal(actual.mutable_matrix,
+                                          expected.mutable_matrix))
+
+    def test_out(self):
+        matrix = self.datamap_a.mutable_matrix
+        result = data_map_synthesis.combine_datamaps(
+            numpy.multiply, (self.datamap_a, self.datamap_b),
+            out=self.datamap_a)
+        self.assertIs(result, self.datamap_a)
+        self.assertIs(self.datamap_a.mutable_matrix, matrix)
+        self.assertEqual(self.datamap_a.get_value_by_index(2, 3), 22)
+
+    def test_datamap3ds(self):
+        datamap3d_a = data_map.DataMap3D.from_DataMap2D(self.datamap_a,
+                                                        [1, 2])
+        datamap3d_a.mutable_array[1] *= 10
+        datamap3d_b = data_map.DataMap3D.from_DataMap2D(self.datamap_b,
+                                                        [2, 1])
+        datamap3d_b.mutable_array[0] = 5
+
+        result = data_map_synthesis.combine_datamaps(
+            numpy.add, (datamap3d_a, datamap3d_b, self.datamap_b))
+        self.assertEqual(result.get_layer_descr_list(), [1, 2])
+        self.assertTrue(numpy.array_equal(
+            result.get_layer(1).mutable_matrix,
+            self.datamap_a.mutable_matrix + 4))
+        self.assertTrue(numpy.array_equal(
+            result.get_layer(2).mutable_matrix,
+            self.datamap_a.mutable_matrix * 10 + 7))
+
+        # Layers are matched to those of the output
+        data_map_synthesis.combine_datamaps(numpy.negative, (datamap3d_a,),
+                                            out=datamap3d_b)
+        self.assertTrue(numpy.array_equal(
+            datamap3d_b.get_layer(2).mutable_matrix,
+            -datamap3d_a.get_layer(2).mutable_matrix))
+
+    def test_bad_input(self):
+        other_grid = data_map.DataMap2DWisconsin.create(3, 4)
+        self.assertRaises(TypeError, data_map_synthesis.combine_datamaps,
+                          numpy.add, (self.datamap_a, other_grid))
+        self.assertRaises(TypeError, data_map_synthesis.combine_datamaps,
+                          numpy.add, [self.datamap_a])
+        self.assertRaises(ValueError, data_map_synthesis.combine_datamaps,
+                          numpy.sum, (self.datamap_a,))
+        datamap3d = data_map.DataMap3D.from_DataMap2D(self.datamap_a, [1])
+        self.assertRaises(TypeError, data_map_synthesis.combine_datamaps,
+                          numpy.add, (datamap3d,), out=self.datamap_b)
+
+
+class KmlExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.datamap = data_map.DataMap2D.from_specification((0, 3), (0, 4),
+                                                             4, 5)
+        self.datamap.mutable_matrix[:] = 1
+        self.datamap.mutable_matrix[1:3, 1:4] = 2
+        self.datamap.mutable_matrix[3, 4] = numpy.nan
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_polygons(self, kml):
+        return [(feature.description,
+                 sorted(tuple(coordinate[:2]) for coordinate in
+                        feature.outerboundaryis.coords._coords))
+                for feature in kml.features]
+
+    def test_merged_polygons_cover_pixels(self):
+        kml = self.datamap.add_to_kml(merge_pixels=True, save=False)
+        polygons = self.get_polygons(kml)
+        # Bottom row, left and right of the block, block, top row, NaN
+        self.assertEqual(len(polygons), 6)
+        self.assertIn(("2.0", [(0.5, 0.5), (0.5, 2.5), (3.5, 0.5),
+                               (3.5, 2.5)]), polygons)
+        self.assertIn(("nan", [(3.5, 2.5), (3.5, 3.5), (4.5, 2.5),
+                               (4.5, 3.5)]), polygons)
+
+        # Total area equals that of the included pixels
+        kml = self.datamap.add_to_kml(
+            merge_pixels=True, save=False,
+            include_polygon_function=lambda value: value == value)
+        area = sum((coordinates[-1][0] - coordinates[0][0]) *
+                   (coordinates[-1][1] - coordinates[0][1])
+                   for (_, coordinates) in self.get_polygons(kml))
+        self.assertEqual(area, 19)
+
+    def test_binning(self):
+        values = []
+        kml = self.datamap.add_to_kml(
+            merge_pixels=True, save=False,
+            binning_function=lambda value: value > 1,
+            geometry_modification_function=lambda poly, value:
+            values.append(value))
+        self.assertEqual(sorted(values), [False, False, False, False, True])
+        self.assertEqual(len(kml.features), 5)
+
+    def test_ground_overlay(self):
+        kml_filename = os.path.join(self.directory, "map.kml")
+        image_filename = os.path.join(self.directory, "map.png")
+        kml = self.datamap.add_to_kml_as_ground_overlay(image_filename,
+                                                        filename=kml_filename)
+        self.assertTrue(os.path.exists(kml_filename))
+        self.assertTrue(os.path.exists(image_filename))
+        ground_overlay = kml.features[0]
+        self.assertEqual(ground_overlay.icon.href, "map.png")
+        self.assertEqual((ground_overlay.latlonbox.south,
+                          ground_overlay.latlonbox.north,
+                          ground_overlay.latlonbox.west,
+                          ground_overlay.latlonbox.east),
+                         (-0.5, 3.5, -0.5, 4.5))
+
+
+class SubmapTestCase(unittest.TestCase):
+    def setUp(self):
+        self.datamap = data_map.DataMap2DBayArea.create(20, 30)
+        self.datamap.mutable_matrix[:] = numpy.arange(600.0).reshape(20, 30)
+
+    def test_windows_match_generate_submap(self):
+        latitudes = self.datamap.latitudes
+        longitudes = self.datamap.longitudes
+        latitude_bounds = [(latitudes[2], latitudes[5]),
+                           (latitudes[0] - 1, latitudes[3] + 0.001),
+                           (latitudes[10], latitudes[-1] + 5)]
+        longitude_bounds = [(longitudes[7] + 0.001, longitudes[20]),
+                            (longitudes[1], longitudes[1]),
+                            (longitudes[0] - 5, longitudes[4])]
+        windows = self.datamap.get_submap_index_windows(
+            latitude_bounds, longitude_bounds,
+            generate_even_if_submap_partially_outside_datamap=True)
+        self.assertEqual(windows.shape, (3, 4))
+
+        for (window, lat_bounds, lon_bounds) in zip(windows, latitude_bounds,
+                                                    longitude_bounds):
+            submap = self.datamap.generate_submap(
+                lat_bounds, lon_bounds,
+                generate_even_if_submap_partially_outside_datamap=True)
+            (lat_start, lat_stop, lon_start, lon_stop) = window
+            self.assertTrue(numpy.array_equal(
+                submap.mutable_matrix,
+                self.datamap.mutable_matrix[lat_start:lat_stop,
+                                            lon_start:lon_stop]))
+
+            submap.mutable_matrix[:] = -1
+            self.datamap.reintegrate_submap(submap, lambda x, y: y)
+            self.assertTrue(numpy.all(self.datamap.mutable_matrix[
+                                      lat_start:lat_stop,
+                                      lon_start:lon_stop] == -1))
+
+    def test_windows_outside_of_map(self):
+        bounds = [(0, 1), (self.datamap.latitudes[0],
+                           self.datamap.latitudes[1])]
+        self.assertRaises(ValueError, self.datamap.get_submap_index_windows,
+                          bounds, [self.datamap._longitude_bounds] * 2)
+        windows = self.datamap.get_submap_index_windows(
+            bounds, [self.datamap._longitude_bounds] * 2,
+            generate_even_if_submap_partially_outside_datamap=True)
+        self.assertEqual(windows[0].tolist(), [0, 0, 0, 0])
+        self.assertEqual(windows[1].tolist(), [0, 3, 0, 30])
+        self.assertRaises(ValueError, self.datamap.generate_submap, (0, 1),
+                          self.datamap._longitude_bounds, True)
+
+
+class LocationLookupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.datamap = data_map.DataMap2D.from_specification((10, 12), (0, 4),
+                                                             3, 5)
+        self.datamap.mutable_matrix[:] = numpy.arange(15.0).reshape(3, 5)
+
+    def test_nearest(self):
+        values = self.datamap.get_values_at_locations(
+            [10, 11.4, 11.6, 12, 13, 10], [0, 1.4, 3.6, 4, 1, -0.1])
+        self.assertTrue(numpy.array_equal(values[:4], [0, 6, 14, 14]))
+        self.assertTrue(numpy.all(numpy.isnan(values[4:])))
+
+        # Grid points match get_value_by_location
+        (latitudes, longitudes) = numpy.meshgrid(self.datamap.latitudes,
+                                                 self.datamap.longitudes,
+                                                 indexing='ij')
+        self.assertTrue(numpy.array_equal(
+            self.datamap.get_values_at_locations(latitudes, longitudes),
+            self.datamap.mutable_matrix))
+
+    def test_bilinear(self):
+        values = self.datamap.get_values_at_locations(
+            numpy.array([10, 10.5, 11.25, 12]), numpy.array([0, 2, 0.5, 4]),
+            method='bilinear', fill_value=-1)
+        self.assertTrue(numpy.allclose(values, [0, 4.5, 6.75, 14]))
+
+        # NaN only spreads to locations which depend on it
+        self.datamap.set_value_by_index(1, 1, numpy.nan)
+        values = self.datamap.get_values_at_locations(
+            [11, 11, 10.5], [2, 1.5, 3], method='bilinear')
+        self.assertEqual(values[0], 7)
+        self.assertTrue(numpy.isnan(values[1]))
+        self.assertEqual(values[2], 5.5)
+
+        self.assertRaises(ValueError, self.datamap.get_values_at_locations,
+                          [10], [0], method='cubic')
+
+    def test_set_values(self):
+        self.datamap.set_values_at_locations([10.1, 11.9], [3.9, 0.2],
+                                             [-1, -2])
+        self.assertEqual(self.datamap.get_value_by_index(0, 4), -1)
+        self.assertEqual(self.datamap.get_value_by_index(2, 0), -2)
+        self.assertRaises(ValueError, self.datamap.set_values_at_locations,
+                          [10, 9], [0, 0], 0)
+        self.assertEqual(self.datamap.get_value_by_index(0, 0), 0)
+
+    def test_datamap3d(self):
+        datamap3d = data_map.DataMap3D.from_DataMap2D(self.datamap, [5, 6])
+        datamap3d.mutable_array[1] *= 10
+        values = datamap3d.get_values_at_locations([10, 11, 20], [1, 2, 0])
+        self.assertEqual(values.shape, (3, 2))
+        self.assertTrue(numpy.array_equal(values[:2], [[1, 10], [7, 70]]))
+        self.assertTrue(numpy.all(numpy.isnan(values[2])))
+        self.assertTrue(numpy.array_equal(
+            datamap3d.get_values_at_locations([11], [2], layer_descr_list=[6]),
+            [[70]]))
+
+        datamap3d.set_values_at_locations([10, 12], [0, 4], [[-1, -2],
+                                                             [-3, -4]])
+        self.assertEqual(datamap3d.get_all_layers_at_index_as_list(0, 0),
+                         [-1, -2])
+        self.assertEqual(datamap3d.get_all_layers_at_index_as_list(2, 4),
+                         [-3, -4])
+
+
+class AggregateBlocksTestCase(unittest.TestCase):
+    def setUp(self):
+        self.datamap = data_map.DataMap2DBayArea.create(8, 12)
+        self.datamap.mutable_matrix[:] = numpy.arange(96.0).reshape(8, 12)
+
+    def test_grid(self):
+        coarse = self.datamap.aggregate_blocks((2, 4), method="sum")
+        self.assertEqual(coarse.mutable_matrix.shape, (4, 3))
+        self.assertTrue(numpy.allclose(
+            coarse.latitudes,
+            self.datamap.latitudes.reshape(4, 2).mean(axis=1)))
+        self.assertTrue(numpy.allclose(
+            coarse.longitudes,
+            self.datamap.longitudes.reshape(3, 4).mean(axis=1)))
+        self.assertEqual(coarse.get_value_by_index(0, 0),
+                         numpy.sum(self.datamap.mutable_matrix[:2, :4]))
+
+        # Aggregating twice matches aggregating once with larger blocks
+        twice = coarse.aggregate_blocks((2, 1), method="sum")
+        once = self.datamap.aggregate_blocks((4, 4), method="sum")
+        self.assertTrue(once.datamap_is_comparable(twice)[0])
+        self.assertTrue(numpy.array_equal(once.mutable_matrix,
+                                          twice.mutable_matrix))
+
+        self.assertRaises(ValueError, self.datamap.aggregate_blocks, 3)
+        self.assertRaises(ValueError, self.datamap.aggregate_blocks, 2,
+                          "median")
+
+    def test_partial_blocks(self):
+        matrix = self.datamap.mutable_matrix
+        coarse = self.datamap.aggregate_blocks(3, "sum", partial_blocks=True)
+        self.assertEqual(coarse.mutable_matrix.shape, (3, 4))
+        self.assertTrue(numpy.allclose(
+            coarse.latitudes, self.datamap.latitudes[1] +
+            numpy.arange(3) * 3 * (self.datamap.latitudes[1] -
+                                   self.datamap.latitudes[0])))
+        self.assertTrue(numpy.allclose(
+            coarse.longitudes, self.datamap.longitudes[1::3]))
+        self.assertEqual(coarse.get_value_by_index(2, 3),
+                         numpy.sum(matrix[6:, 9:]))
+        self.assertEqual(
+            self.datamap.aggregate_blocks(3, "mean", partial_blocks=True)
+            .get_value_by_index(2, 0), numpy.mean(matrix[6:, :3]))
+
+        # Integer and boolean data
+        integers = self.datamap.astype(int)
+        for method in ["min", "max"]:
+            coarse = integers.aggregate_blocks(3, method, partial_blocks=True)
+            self.assertEqual(coarse.mutable_matrix.dtype, int)
+            self.assertEqual(coarse.get_value_by_index(2, 3),
+                             getattr(numpy, method)(matrix[6:, 9:]))
+        self.assertEqual(integers.aggregate_blocks(
+            3, "fraction", partial_blocks=True).get_value_by_index(2, 3), 1)
+        is_available = self.datamap.astype(bool)
+        self.assertTrue(is_available.aggregate_blocks(
+            (5, 5), "min", partial_blocks=True).get_value_by_index(1, 2))
+        self.assertFalse(is_available.aggregate_blocks(
+            (5, 5), "min", partial_blocks=True).get_value_by_index(0, 0))
+
+        # Divisible maps are not affected
+        self.assertTrue(numpy.array_equal(
+            self.datamap.aggregate_blocks(2, partial_blocks=True)
+            .mutable_matrix, self.datamap.aggregate_blocks(2).mutable_matrix))
+
+        datamap3d = data_map.DataMap3D.from_DataMap2D(self.datamap, [2, 3])
+        coarse = datamap3d.aggregate_blocks(3, "max", partial_blocks=True)
+        self.assertEqual(coarse.get_layer(3).get_value_by_index(2, 3),
+                         numpy.max(matrix[6:, 9:]))
+
+    def test_methods_ignore_nan(self):
+        matrix = self.datamap.mutable_matrix
+        matrix[0, 0] = numpy.nan
+        matrix[2:4, 2:4] = numpy.nan
+        matrix[4:6, 4:6] = 0
+        for (method, expected_value) in [("sum", 12 + 13 + 1),
+                                         ("mean", 26 / 3.0),
+                                         ("fraction", 1.0),
+                                         ("min", 1),
+                                         ("max", 13)]:
+            coarse = self.datamap.aggregate_blocks(2, method)
+            self.assertEqual(coarse.get_value_by_index(0, 0), expected_value)
+            self.assertTrue(numpy.isnan(coarse.get_value_by_index(1, 1)))
+        self.assertEqual(
+            self.datamap.aggregate_blocks(2, "fraction").get_value_by_index(
+                2, 2), 0)
+
+    def test_data_types(self):
+        is_available = self.datamap.astype(bool)
+        fraction = is_available.aggregate_blocks(4, "fraction")
+        self.assertEqual(fraction.mutable_matrix.dtype, float)
+        self.assertEqual(fraction.get_value_by_index(0, 0), 15 / 16.0)
+        maximum = is_available.aggregate_blocks(4, "max")
+        self.assertEqual(maximum.mutable_matrix.dtype, bool)
+
+    def test_datamap3d(self):
+        datamap3d = data_map.DataMap3D.from_DataMap2D(self.datamap, [2, 3])
+        datamap3d.mutable_array[1] *= -1
+        coarse = datamap3d.aggregate_blocks(4, "min")
+        self.assertEqual(coarse.get_layer_descr_list(), [2, 3])
+        for layer_descr in [2, 3]:
+            expected = datamap3d.get_layer(layer_descr).aggregate_blocks(
+                4, "min")
+            self.assertTrue(expected.datamap_is_comparable(
+                coarse.get_layer(layer_descr))[0])
+            self.assertTrue(numpy.array_equal(
+                coarse.get_layer(layer_descr).mutable_matrix,
+                expected.mutable_matrix))
+
+
+class GridTestCase(unittest.TestCase):
+    def setUp(self):
+        self.datamap = data_map.DataMap2DBayArea.create(6, 7)
+        self.datamap.mutable_matrix[:] = numpy.arange(42.0).reshape(6, 7)
+
+    def test_grid_is_shared(self):
+        other = data_map.DataMap2D.from_specification(
+            (37.2, 38.4), (numpy.float64(-123.2), -121), 6, 7, dtype=bool)
+        self.assertIs(other.grid, self.datamap.grid)
+        self.assertIs(other.latitudes, self.datamap.latitudes)
+        self.assertTrue(self.datamap.datamap_is_comparable(other)[0])
+        self.assertEqual(len(set([other.grid, self.datamap.grid])), 1)
+
+        different = data_map.DataMap2DBayArea.create(6, 8)
+        self.assertNotEqual(different.grid, self.datamap.grid)
+        self.assertFalse(self.datamap.datamap_is_comparable(different)[0])
+
+        datamap3d = data_map.DataMap3D.from_DataMap2D(self.datamap, [1, 2])
+        self.assertIs(datamap3d.get_layer(2).grid, self.datamap.grid)
+        self.assertIs(datamap3d.sum_all_layers().grid, self.datamap.grid)
+
+    def test_grid_is_immutable(self):
+        with self.assertRaises(ValueError):
+            self.datamap.latitudes[0] = 0
+        with self.assertRaises(AttributeError):
+            self.datamap.grid.num_latitude_divisions = 3
+        self.assertRaises(ValueError, data_map.Grid, (1, 0), (0, 1), 2, 2)
+
+    def test_pickle(self):
+        restored = pickle.loads(pickle.dumps(self.datamap))
+        self.assertIs(restored.grid, self.datamap.grid)
+        self.assertEqual(restored.get_latitude_index(
+            self.datamap.latitudes[3]), 3)
+
+        # Older pickles store the coordinates in every map
+        state = self.datamap.__getstate__()
+        del state['_grid']
+        state.update({'_latitude_bounds': [37.2, 38.4],
+                      '_longitude_bounds': [-123.2, -121],
+                      '_num_latitude_divisions': 6,
+                      '_num_longitude_divisions': 7,
+                      '_latitudes': self.datamap.latitudes.copy(),
+                      '_longitudes': self.datamap.longitudes.copy(),
+                      '_latitude_index_dict': {}, '_longitude_index_dict': {}})
+        old_style = data_map.DataMap2D.__new__(data_map.DataMap2D)
+        old_style.__setstate__(state)
+        self.assertIs(old_style.grid, self.datamap.grid)
+        self.assertNotIn('_latitudes', old_style.__dict__)
+        self.assertTrue(numpy.array_equal(old_style.mutable_matrix,
+                                          self.datamap.mutable_matrix))
+
+
+class IterBlocksTestCase(unittest.TestCase):
+    def setUp(self):
+        self.datamap = data_map.DataMap2DBayArea.create(5, 7)
+        self.datamap.mutable_matrix[:] = numpy.arange(35.0).reshape(5, 7)
+
+    def test_blocks_are_views(self):
+        blocks = list(self.datamap.iter_blocks((2, 3)))
+        self.assertEqual(len(blocks), 9)
+        (lat_slice, lon_slice, latitudes, longitudes, values) = blocks[5]
+        self.assertEqual((lat_slice, lon_slice), (slice(2, 4), slice(6, 7)))
+        self.assertTrue(numpy.array_equal(latitudes,
+                                          self.datamap.latitudes[2:4]))
+        self.assertTrue(numpy.array_equal(longitudes,
+                                          self.datamap.longitudes[6:7]))
+        self.assertTrue(numpy.array_equal(values, [[20], [27]]))
+
+        for (_, _, _, _, values) in self.datamap.iter_blocks(2):
+            values *= -1
+        self.assertTrue(numpy.array_equal(self.datamap.mutable_matrix,
+                                          -numpy.arange(35.0).reshape(5, 7)))
+
+    def test_datamap3d(self):
+        datamap3d = data_map.DataMap3D.from_DataMap2D(self.datamap,
+                                                      [1, 2, 3])
+        datamap3d.mutable_array[1] *= 2
+        datamap3d.mutable_array[2] = numpy.nan
+        for (lat_slice, lon_slice, _, _, values) in datamap3d.iter_blocks(
+                (3, 4), layer_descrs=[2, 1]):
+            self.assertTrue(numpy.array_equal(
+                values, datamap3d.mutable_array[[1, 0], lat_slice,
+                                                lon_slice]))
+        self.assertTrue(numpy.array_equal(
+            datamap3d.sum_subset_of_layers([1, 2]).mutable_matrix,
+            self.datamap.mutable_matrix * 3))
+        self.assertTrue(numpy.all(numpy.isnan(
+            datamap3d.sum_all_layers().mutable_matrix)))
+        self.assertRaises(AttributeError, datamap3d.sum_subset_of_layers, [4])
+
+
+class DataTypeTestCase(unittest.TestCase):
+    def test_default_fill_values(self):
+        for (dtype, expected) in [(bool, False), (numpy.uint8, 0),
+                                  (numpy.float32, numpy.nan),
+                                  (float, numpy.nan)]:
+            datamap = data_map.DataMap2DBayArea.create(3, 4, dtype=dtype)
+            self.assertEqual(datamap.mutable_matrix.dtype, numpy.dtype(dtype))
+            numpy.testing.assert_equal(datamap.get_value_by_index(1, 1),
+                                       expected)
+
+    def test_dtype_is_preserved(self):
+        datamap = data_map.DataMap2DBayArea.create(3, 4, dtype=numpy.uint8)
+        datamap.reset_all_values(7)
+
+        self.assertEqual(data_map.DataMap2D.get_copy_of(datamap).mutable_matrix.dtype,
+                         numpy.uint8)
+        self.assertEqual(datamap.get_clean_copy().mutable_matrix.dtype,
+                         numpy.uint8)
+        restored = pickle.loads(pickle.dumps(datamap))
+        self.assertEqual(restored.mutable_matrix.dtype, numpy.uint8)
+
+        datamap3d = data_map.DataMap3D.from_DataMap2D(datamap, [1, 2])
+        self.assertEqual(datamap3d.mutable_array.dtype, numpy.uint8)
+        self.assertEqual(datamap3d.get_layer(2).get_value_by_index(0, 0), 7)
+        self.assertEqual(datamap3d.get_clean_copy().mutable_array.dtype,
+                         numpy.uint8)
+
+    def test_conversion(self):
+        datamap = data_map.DataMap2DBayArea.create(3, 4)
+        datamap.reset_all_values(0)
+        datamap.set_value_by_index(1, 2, 3.0)
+
+        converted = datamap.astype(bool)
+        self.assertEqual(converted.mutable_matrix.dtype, numpy.bool_)
+        self.assertEqual(numpy.sum(converted.mutable_matrix), 1)
+        self.assertEqual(data_map.DataMap2D.get_copy_of(
+            datamap, dtype=numpy.float32).mutable_matrix.dtype, numpy.float32)
+        self.assertEqual(datamap.get_clean_copy(
+            dtype=numpy.uint8).mutable_matrix.dtype, numpy.uint8)
+
+        datamap3d = data_map.DataMap3D.from_DataMap2D(datamap, [1, 2],
+                                                      dtype=bool)
+        self.assertEqual(datamap3d.mutable_array.dtype, numpy.bool_)
+        self.assertEqual(datamap3d.astype(numpy.uint8).sum_all_layers()
+                         .get_value_by_index(1, 2), 2)
+
+
+class MemmapTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "map.dat")
+
+        self.datamap = data_map.DataMap2DBayArea.create(3, 4,
+                                                        dtype=numpy.float32)
+        self.datamap.mutable_matrix[:] = numpy.arange(12).reshape(3, 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_datamap2d(self):
+        self.datamap.to_memmap(self.filename)
+        restored = data_map.DataMap2DBayArea.from_memmap(self.filename)
+
+        self.assertIsInstance(restored, data_map.DataMap2DBayArea)
+        self.assertIsInstance(restored.mutable_matrix, numpy.memmap)
+        self.assertEqual(restored.mutable_matrix.dtype, numpy.float32)
+        restored.raise_error_if_datamaps_are_incomparable(self.datamap)
+        self.assertTrue(numpy.array_equal(restored.mutable_matrix,
+                                          self.datamap.mutable_matrix))
+        location = (self.datamap.latitudes[2], self.datamap.longitudes[1])
+        self.assertEqual(restored.get_value_by_location(location), 9)
+
+        # Read-only maps cannot be modified
+        with self.assertRaises(ValueError):
+            restored.set_value_by_index(0, 0, 1)
+
+    def test_writable_modes(self):
+        self.datamap.to_memmap(self.filename)
+
+        copy_on_write = data_map.DataMap2D.from_memmap(self.filename,
+                                                       mode="c")
+        copy_on_write.reset_all_values(-1)
+        self.assertEqual(
+            data_map.DataMap2D.from_memmap(self.filename).get_value_by_index(
+                0, 1), 1)
+
+        writable = data_map.DataMap2D.from_memmap(self.filename, mode="r+")
+        writable.mutable_matrix = numpy.zeros((3, 4))
+        writable.mutable_matrix.flush()
+        self.assertEqual(
+            data_map.DataMap2D.from_memmap(self.filename).get_value_by_index(
+                0, 1), 0)
+
+    def test_datamap3d(self):
+        datamap3d = data_map.DataMap3D.from_DataMap2D(self.datamap,
+                                                      [2, "a", (3, 4)])
+        datamap3d.get_layer("a").reset_all_values(5)
+        datamap3d.to_memmap(self.filename)
+
+        restored = data_map.DataMap3D.from_memmap(self.filename)
+        self.assertEqual(restored.get_layer_descr_list(), [2, "a", (3, 4)])
+        self.assertIsInstance(restored.mutable_array, numpy.memmap)
+        self.assertIsInstance(restored.get_layer((3, 4)),
+                              data_map.DataMap2DBayArea)
+        self.assertTrue(numpy.array_equal(restored.mutable_array,
+                                          datamap3d.mutable_array))
+        self.assertEqual(restored.get_layer("a").get_value_by_index(1, 1), 5)
+
+    def test_wrong_kind(self):
+        self.datamap.to_memmap(self.filename)
+        with self.assertRaises(TypeError):
+            data_map.DataMap3D.from_memmap(self.filename)
+
+
+from custom_logging import getCurrentLogLevel, changeLogLevel, disableLogging
+original_log_level = getCurrentLogLevel()
+disableLogging()
+unittest.main()
+changeLogLevel(original_log_level)
@@ -0,0 +1,927 @@
+"""
+Out-of-core data maps for grids which are too large to be kept in memory
+(e.g. a 2800x5800 :class:`data_map.DataMap2DContinentalUnitedStates` with
+one layer per TV channel).
+
+The values are split into tiles of a fixed number of latitudes and
+longitudes, each of which is stored as raw data in its own file in a
+directory (together with a JSON header describing the grid). Only a bounded
+number of tiles is kept in memory at once: when the memory budget is
+exhausted, the least recently used tile is written back to disk (if it was
+modified) and dropped. Operations such as
+:meth:`DataMap2DTiled.update_all_values_via_function` and
+:meth:`DataMap3DTiled.sum_all_layers` visit the map one tile at a time, so
+their peak memory use is governed by the budget rather than by the size of
+the grid.
+
+Tiles which were never written are not stored at all; they are read as the
+fill value of the map.
+
+Changes are only guaranteed to be on disk after :meth:`flush` has been
+called.
+"""
+
+import collections
+import json
+import os
+import numpy
+from custom_logging import getModuleLogger
+import data_map
+from data_map import DataMap2D, DataMap3D
+
+
+# Version of the header written to each tile directory
+_TILED_FORMAT_VERSION = 1
+
+_HEADER_FILENAME = "header.json"
+
+DEFAULT_TILE_SHAPE = (256, 256)
+DEFAULT_MEMORY_BUDGET_BYTES = 256 * 2 ** 20
+
+
+class _TileStore(object):
+    """
+    Reads and writes the tiles of an array of shape (layers, latitudes,
+    longitudes) and keeps the most recently used tiles in memory. Each tile
+    holds all layers of its pixels.
+    """
+
+    def __init__(self, directory, shape, tile_shape, dtype, fill_value,
+                 memory_budget_bytes):
+        if len(tile_shape) != 2 or min(tile_shape) < 1:
+            raise ValueError("Invalid tile shape: %s" % str(tile_shape))
+        if memory_budget_bytes <= 0:
+            raise ValueError("Memory budget must be positive")
+
+        self.directory = directory
+        self.shape = tuple(shape)
+        self.tile_shape = tuple(tile_shape)
+        self.dtype = numpy.dtype(dtype)
+        self.fill_value = fill_value
+        self.memory_budget_bytes = memory_budget_bytes
+
+        self.num_tile_rows = -(-self.shape[1] // self.tile_shape[0])
+        self.num_tile_columns = -(-self.shape[2] // self.tile_shape[1])
+
+        tile_nbytes = self.shape[0] * self.tile_shape[0] * \
+            self.tile_shape[1] * self.dtype.itemsize
+        self.max_num_cached_tiles = max(1, memory_budget_bytes // tile_nbytes)
+
+        self._cache = collections.OrderedDict()
+        self._dirty_keys = set()
+
+    def get_tile_keys(self):
+        """Returns the (tile_row, tile_column) of each tile in row-major
+        order."""
+        return [(tile_row, tile_column)
+                for tile_row in range(self.num_tile_rows)
+                for tile_column in range(self.num_tile_columns)]
+
+    def get_tile_slices(self, key):
+        """Returns the latitude and longitude slices covered by the tile."""
+        (tile_row, tile_column) = key
+        lat_start = tile_row * self.tile_shape[0]
+        lon_start = tile_column * self.tile_shape[1]
+        return (slice(lat_start, min(lat_start + self.tile_shape[0],
+                                     self.shape[1])),
+                slice(lon_start, min(lon_start + self.tile_shape[1],
+                                     self.shape[2])))
+
+    def _get_tile_filename(self, key):
+        return os.path.join(self.directory, "tile_%d_%d.dat" % key)
+
+    def get_tile(self, key, writable=False):
+        """
+        Returns the values of the tile (shape: (layers, rows, columns)). If
+        ``writable`` is True, the tile will be written back to disk when it
+        is evicted or flushed, so changes made to the returned array are
+        kept.
+        """
+        if key in self._cache:
+            tile = self._cache.pop(key)
+        else:
+            while len(self._cache) >= self.max_num_cached_tiles:
+                self._evict_least_recently_used_tile()
+            tile = self._load_tile(key)
+        self._cache[key] = tile
+
+        if writable:
+            self._dirty_keys.add(key)
+        return tile
+
+    def _load_tile(self, key):
+        (lat_slice, lon_slice) = self.get_tile_slices(key)
+        shape = (self.shape[0], lat_slice.stop - lat_slice.start,
+                 lon_slice.stop - lon_slice.start)
+        filename = self._get_tile_filename(key)
+        if os.path.exists(filename):
+            return numpy.fromfile(filename, dtype=self.dtype).reshape(shape)
+        tile = numpy.empty(shape, dtype=self.dtype)
+        tile[:] = self.fill_value
+        return tile
+
+    def _evict_least_recently_used_tile(self):
+        (key, tile) = self._cache.popitem(last=False)
+        if key in self._dirty_keys:
+            tile.tofile(self._get_tile_filename(key))
+            self._dirty_keys.discard(key)
+
+    def flush(self):
+        """Writes all modified tiles to disk."""
+        for key in sorted(self._dirty_keys):
+            self._cache[key].tofile(self._get_tile_filename(key))
+        self._dirty_keys.clear()
+
+    def reset(self, fill_value):
+        """Sets every value to ``fill_value`` by deleting all tiles."""
+        self._cache.clear()
+        self._dirty_keys.clear()
+        for key in self.get_tile_keys():
+            filename = self._get_tile_filename(key)
+            if os.path.exists(filename):
+                os.remove(filename)
+        self.fill_value = fill_value
+
+    def iter_region(self, lat_start, lat_stop, lon_start, lon_stop,
+                    writable=False):
+        """
+        Visits the tiles which overlap the given region (stop indices are
+        exclusive). For each tile, yields the tile and the slices of the
+        overlap within the tile and within the region.
+        """
+        first_tile_row = lat_start // self.tile_shape[0]
+        last_tile_row = (lat_stop - 1) // self.tile_shape[0]
+        first_tile_column = lon_start // self.tile_shape[1]
+        last_tile_column = (lon_stop - 1) // self.tile_shape[1]
+
+        for tile_row in range(first_tile_row, last_tile_row + 1):
+            for tile_column in range(first_tile_column, last_tile_column + 1):
+                key = (tile_row, tile_column)
+                (lat_slice, lon_slice) = self.get_tile_slices(key)
+                lat_from = max(lat_start, lat_slice.start)
+                lat_to = min(lat_stop, lat_slice.stop)
+                lon_from = max(lon_start, lon_slice.start)
+                lon_to = min(lon_stop, lon_slice.stop)
+
+                tile = self.get_tile(key, writable=writable)
+                yield (tile,
+                       (slice(lat_from - lat_slice.start,
+                              lat_to - lat_slice.start),
+                        slice(lon_from - lon_slice.start,
+                              lon_to - lon_slice.start)),
+                       (slice(lat_from - lat_start, lat_to - lat_start),
+                        slice(lon_from - lon_start, lon_to - lon_start)))
+
+    def read_region(self, lat_start, lat_stop, lon_start, lon_stop,
+                    layer_indices=None):
+        """Assembles the values of the given region (stop indices are
+        exclusive) into a new array of shape (layers, rows, columns)."""
+        if layer_indices is None:
+            layer_indices = range(self.shape[0])
+        layer_indices = list(layer_indices)
+
+        values = numpy.empty((len(layer_indices), lat_stop - lat_start,
+                              lon_stop - lon_start), dtype=self.dtype)
+        for (tile, tile_slices, region_slices) in self.iter_region(
+                lat_start, lat_stop, lon_start, lon_stop):
+            values[(slice(None),) + region_slices] = \
+                tile[(layer_indices,) + tile_slices]
+        return values
+
+    def write_region(self, lat_start, lon_start, values, layer_indices=None):
+        """Inverse of :meth:`read_region`."""
+        if layer_indices is None:
+            layer_indices = range(self.shape[0])
+        layer_indices = list(layer_indices)
+
+        (_, num_rows, num_columns) = values.shape
+        for (tile, tile_slices, region_slices) in self.iter_region(
+                lat_start, lat_start + num_rows, lon_start,
+                lon_start + num_columns, writable=True):
+            for (position, layer_index) in enumerate(layer_indices):
+                tile[(layer_index,) + tile_slices] = \
+                    values[(position,) + region_slices]
+
+
+def _create_grid(header):
+    """Creates a :class:`data_map.DataMap2D` which describes the grid of a
+    tiled map but holds no values (its matrix is a read-only placeholder
+    which takes no memory)."""
+    grid_class = getattr(data_map, header["class"], None)
+    if not isinstance(grid_class, type) or \
+            not issubclass(grid_class, DataMap2D):
+        grid_class = DataMap2D
+    grid = grid_class()
+    placeholder = numpy.lib.stride_tricks.as_strided(
+        numpy.zeros(1, dtype=bool), shape=(header["num_latitude_divisions"],
+                                           header["num_longitude_divisions"]),
+        strides=(0, 0))
+    placeholder.flags.writeable = False
+    data_map._initialize_from_memmap_grid_header(grid, header, placeholder)
+    return grid
+
+
+class _DataMapTiled(object):
+    """Functionality shared by :class:`DataMap2DTiled` and
+    :class:`DataMap3DTiled`."""
+
+    def __init__(self):
+        self.log = getModuleLogger(self)
+
+    @classmethod
+    def _create(cls, directory, grid_header, layer_descr_list, dtype,
+                tile_shape, memory_budget_bytes):
+        if os.path.exists(os.path.join(directory, _HEADER_FILENAME)):
+            raise ValueError("%s already contains a tiled data map" %
+                             directory)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        dtype = numpy.dtype(dtype)
+        header = dict(grid_header,
+                      kind=cls.__name__,
+                      format_version=_TILED_FORMAT_VERSION,
+                      dtype=dtype.str,
+                      tile_shape=list(tile_shape),
+                      fill_value=data_map._get_default_fill_value(dtype),
+                      layer_descr_list=layer_descr_list)
+
+        obj = cls()
+        obj._initialize(directory, header, memory_budget_bytes)
+        obj._write_header()
+        return obj
+
+    @classmethod
+    def from_directory(cls, directory, memory_budget_bytes=
+                       DEFAULT_MEMORY_BUDGET_BYTES):
+        """
+        Opens a tiled map which was previously created in ``directory``.
+        No values are read until they are accessed.
+
+        :param directory: directory containing the tiles
+        :type directory: str
+        :param memory_budget_bytes: maximum size of the tiles kept in memory \
+                (at least one tile is always kept)
+        :type memory_budget_bytes: int
+        """
+        with open(os.path.join(directory, _HEADER_FILENAME), "r") as f:
+            header = json.load(f)
+
+        if header.get("format_version") != _TILED_FORMAT_VERSION:
+            raise ValueError("Unsupported format version in %s: %s" %
+                             (directory, header.get("format_version")))
+        if header["kind"] != cls.__name__:
+            raise TypeError("%s contains a %s, not a %s" %
+                            (directory, header["kind"], cls.__name__))
+
+        obj = cls()
+        obj._initialize(directory, header, memory_budget_bytes)
+        return obj
+
+    def _initialize(self, directory, header, memory_budget_bytes):
+        self._directory = directory
+        self._header = header
+        self._grid = _create_grid(header)
+        self._layer_descr_list = [data_map._layer_descr_from_json(layer_descr)
+                                  for layer_descr in
+                                  header["layer_descr_list"]]
+        self._layer_index = dict((layer_descr, index) for (index, layer_descr)
+                                 in enumerate(self._layer_descr_list))
+        self._store = _TileStore(directory,
+                                 (len(self._layer_descr_list),
+                                  self._grid._num_latitude_divisions,
+                                  self._grid._num_longitude_divisions),
+                                 header["tile_shape"], str(header["dtype"]),
+                                 header["fill_value"], memory_budget_bytes)
+
+    def _write_header(self):
+        self._header["fill_value"] = numpy.asarray(
+            self._store.fill_value, dtype=self._store.dtype).item()
+        with open(os.path.join(self._directory, _HEADER_FILENAME), "w") as f:
+            json.dump(self._header, f, indent=1, sort_keys=True)
+
+    @property
+    def directory(self):
+        """Directory in which the tiles are stored."""
+        return self._directory
+
+    @property
+    def dtype(self):
+        """Data type of the values."""
+        return self._store.dtype
+
+    @property
+    def tile_shape(self):
+        """(latitudes, longitudes) per tile."""
+        return self._store.tile_shape
+
+    @property
+    def latitudes(self):
+        """Latitude values which define the grid."""
+        return self._grid.latitudes
+
+    @property
+    def longitudes(self):
+        """Longitude values which define the grid."""
+        return self._grid.longitudes
+
+    def datamap_is_comparable(self, other_datamap):
+        """
+        Tests whether ``other_datamap`` (a :class:`data_map.DataMap2D` or a
+        tiled map) describes the same points; see
+        :meth:`data_map.DataMap2D.datamap_is_comparable`.
+
+        :rtype: boolean, str
+        """
+        if isinstance(other_datamap, _DataMapTiled):
+            other_datamap = other_datamap._grid
+        return self._grid.datamap_is_comparable(other_datamap)
+
+    def raise_error_if_datamaps_are_incomparable(self, other_datamap):
+        """Raises a TypeError if :meth:`datamap_is_comparable` is False."""
+        (comparable, error_msg) = self.datamap_is_comparable(other_datamap)
+        if not comparable:
+            raise TypeError(error_msg)
+
+    def flush(self):
+        """Writes all modified tiles to disk."""
+        self._store.flush()
+
+    def reset_all_values(self, fill_value=None):
+        """
+        Resets all values to ``fill_value``. By default, floating-point maps
+        are reset to NaN and all others to zero (False). This deletes all
+        tiles.
+        """
+        if fill_value is None:
+            fill_value = data_map._get_default_fill_value(self.dtype)
+        self._store.reset(fill_value)
+        self._write_header()
+
+    def _iter_tiles(self, verbose=False, writable=False):
+        """Visits every tile; yields the tile and its latitude and longitude
+        slices."""
+        keys = self._store.get_tile_keys()
+        for (number, key) in enumerate(keys):
+            if verbose:
+                self.log.info("Tile %d of %d" % (number + 1, len(keys)))
+            (lat_slice, lon_slice) = self._store.get_tile_slices(key)
+            yield (self._store.get_tile(key, writable=writable), lat_slice,
+                   lon_slice)
+
+    def iter_blocks(self, block_shape=None, writable=False):
+        """
+        Visits the map one block of pixels at a time; see
+        :meth:`data_map.DataMap2D.iter_blocks` and
+        :meth:`data_map.DataMap3D.iter_blocks`.
+
+        By default, the blocks are the tiles and their values are views of
+        the tiles held in memory; if ``writable`` is True, changes made to
+        them are kept. Other block shapes are assembled from the tiles (i.e.
+        the values are copies) and cannot be written.
+
+        :param block_shape: number of latitudes and longitudes per block (by \
+                default, :attr:`tile_shape`)
+        :type block_shape: int or tuple of ints
+        :param writable: if True, the values may be modified in place
+        :type writable: bool
+        """
+        latitudes = self.latitudes
+        longitudes = self.longitudes
+        if block_shape is None or \
+                data_map._get_block_shape(block_shape) == self.tile_shape:
+            for (tile, lat_slice, lon_slice) in self._iter_tiles(
+                    writable=writable):
+                yield (lat_slice, lon_slice, latitudes[lat_slice],
+                       longitudes[lon_slice], self._get_block_values(tile))
+            return
+
+        if writable:
+            raise ValueError("Only blocks of the tile shape (%d, %d) can be "
+                             "written" % self.tile_shape)
+        for (lat_slice, lon_slice) in data_map._get_block_slices(
+                (len(latitudes), len(longitudes)), block_shape):
+            values = self._store.read_region(lat_slice.start, lat_slice.stop,
+                                             lon_slice.start, lon_slice.stop)
+            yield (lat_slice, lon_slice, latitudes[lat_slice],
+                   longitudes[lon_slice], self._get_block_values(values))
+
+    def _get_mask_of_tile(self, only_where, lat_slice, lon_slice):
+        if only_where is None:
+            return None
+        if isinstance(only_where, DataMap2DTiled):
+            self.raise_error_if_datamaps_are_incomparable(only_where)
+            return only_where._store.read_region(
+                lat_slice.start, lat_slice.stop, lon_slice.start,
+                lon_slice.stop)[0].astype(bool)
+        return only_where[lat_slice, lon_slice]
+
+    def _update_layer_via_function(self, layer_index, update_function,
+                                   verbose, only_where):
+        if only_where is not None and \
+                not isinstance(only_where, DataMap2DTiled):
+            only_where = self._grid._get_mask_matrix(only_where)
+
+        latitudes = self.latitudes
+        longitudes = self.longitudes
+        for (tile, lat_slice, lon_slice) in self._iter_tiles(verbose,
+                                                             writable=True):
+            values = tile[layer_index]
+            mask = self._get_mask_of_tile(only_where, lat_slice, lon_slice)
+            if mask is None:
+                indices = numpy.ndindex(*values.shape)
+            else:
+                indices = zip(*[idx.tolist() for idx in numpy.nonzero(mask)])
+
+            for (row, column) in indices:
+                lat_idx = lat_slice.start + row
+                lon_idx = lon_slice.start + column
+                new_value = update_function(latitudes[lat_idx],
+                                            longitudes[lon_idx], lat_idx,
+                                            lon_idx, values[row, column])
+                if new_value is not None:
+                    values[row, column] = new_value
+
+    def _get_submap_indices(self, latitude_bounds, longitude_bounds,
+                            generate_even_if_submap_partially_outside_datamap):
+        (lower_latitude_index, upper_latitude_index, lower_longitude_index,
+         upper_longitude_index) = self._grid._get_submap_index_bounds(
+            latitude_bounds, longitude_bounds,
+            generate_even_if_submap_partially_outside_datamap)
+        return (lower_latitude_index, upper_latitude_index + 1,
+                lower_longitude_index, upper_longitude_index + 1)
+
+    def _create_datamap2d(self, lat_start, lat_stop, lon_start, lon_stop,
+                          dtype=None):
+        """Creates an in-memory :class:`data_map.DataMap2D` covering the given
+        part of the grid (stop indices are exclusive)."""
+        return DataMap2D.from_specification(
+            (self.latitudes[lat_start], self.latitudes[lat_stop - 1]),
+            (self.longitudes[lon_start], self.longitudes[lon_stop - 1]),
+            lat_stop - lat_start, lon_stop - lon_start, verbose=False,
+            dtype=self.dtype if dtype is None else dtype)
+
+
+class DataMap2DTiled(_DataMapTiled):
+    """
+    Tiled counterpart of :class:`data_map.DataMap2D` whose values are kept
+    on disk (see :mod:`data_map_tiled`).
+    """
+
+    @classmethod
+    def from_specification(cls, directory, latitude_bounds, longitude_bounds,
+                           num_latitude_divisions, num_longitude_divisions,
+                           dtype=float, tile_shape=DEFAULT_TILE_SHAPE,
+                           memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES):
+        """
+        Creates a new tiled map in ``directory`` (which is created if
+        necessary). All values are initialized to the default fill value
+        (see :meth:`data_map.DataMap2D.from_specification`).
+
+        :param directory: directory in which the tiles are stored
+        :type directory: str
+        :param latitude_bounds: (min_latitude, max_latitude)
+        :param longitude_bounds: (min_longitude, max_longitude)
+        :param num_latitude_divisions: number of latitude points per longitude
+        :type num_latitude_divisions: int
+        :param num_longitude_divisions: number of longitude points per latitude
+        :type num_longitude_divisions: int
+        :param dtype: data type of the values
+        :param tile_shape: (latitudes, longitudes) per tile
+        :type tile_shape: tuple of ints
+        :param memory_budget_bytes: maximum size of the tiles kept in memory \
+                (at least one tile is always kept)
+        :type memory_budget_bytes: int
+        :rtype: :class:`DataMap2DTiled`
+        """
+        grid_header = {"latitude_bounds": [float(x) for x in latitude_bounds],
+                       "longitude_bounds": [float(x) for x in
+                                            longitude_bounds],
+                       "num_latitude_divisions": num_latitude_divisions,
+                       "num_longitude_divisions": num_longitude_divisions,
+                       "class": DataMap2D.__name__}
+        return cls._create(directory, grid_header, [None], dtype, tile_shape,
+                           memory_budget_bytes)
+
+    @classmethod
+    def from_DataMap2D(cls, directory, datamap2d,
+                       tile_shape=DEFAULT_TILE_SHAPE,
+                       memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES):
+        """
+        Creates a new tiled map in ``directory`` which holds a copy of the
+        values of ``datamap2d``. See :meth:`from_specification`.
+
+        :type datamap2d: :class:`data_map.DataMap2D`
+        :rtype: :class:`DataMap2DTiled`
+        """
+        matrix = numpy.asarray(datamap2d.mutable_matrix)
+        obj = cls._create(directory,
+                          data_map._get_memmap_grid_header(datamap2d), [None],
+                          matrix.dtype, tile_shape, memory_budget_bytes)
+        obj._store.write_region(0, 0, matrix[numpy.newaxis])
+        obj.flush()
+        return obj
+
+    def to_DataMap2D(self):
+        """
+        Reads all values into an in-memory :class:`data_map.DataMap2D`
+        (which must fit in memory).
+
+        :rtype: :class:`data_map.DataMap2D`
+        """
+        datamap2d = self._grid.__class__.from_specification(
+            self._grid._latitude_bounds, self._grid._longitude_bounds,
+            self._grid._num_latitude_divisions,
+            self._grid._num_longitude_divisions, verbose=False,
+            dtype=self.dtype)
+        datamap2d.mutable_matrix[:] = self._store.read_region(
+            0, len(self.latitudes), 0, len(self.longitudes))[0]
+        return datamap2d
+
+    def _get_block_values(self, values):
+        return values[0]
+
+    def get_value_by_index(self, latitude_index, longitude_index):
+        """Get the value at the specified indices."""
+        return self._store.read_region(latitude_index, latitude_index + 1,
+                                       longitude_index,
+                                       longitude_index + 1)[0, 0, 0]
+
+    def set_value_by_index(self, latitude_index, longitude_index, new_value):
+        """Set the value at the specified indices."""
+        self._store.write_region(latitude_index, longitude_index,
+                                 numpy.array([[[new_value]]],
+                                             dtype=self.dtype))
+
+    def get_value_by_location(self, location):
+        """
+        :param location: (latitude, longitude)
+        :type location: tuple of floats
+        :return: the data corresponding to that location (None if the \
+                location is not on the grid)
+        """
+        try:
+            (latitude_index, longitude_index) = \
+                self._grid.get_indices_from_location(location)
+        except ValueError:
+            return None
+        return self.get_value_by_index(latitude_index, longitude_index)
+
+    def update_all_values_via_function(self, update_function, verbose=False,
+                                       only_where=None):
+        """
+        Updates each pixel according to ``update_function``, one tile at a
+        time; see :meth:`data_map.DataMap2D.update_all_values_via_function`
+        for the signature of ``update_function``. The indices given to it
+        refer to the whole grid.
+
+        :param update_function: function used to update the values
+        :type update_function: function object
+        :param verbose: if True, progress updates will be logged (level = \
+                INFO); otherwise, nothing will be logged
+        :type verbose: bool
+        :param only_where: mask selecting the pixels to be updated
+        :type only_where: :class:`DataMap2DTiled`, \
+                :class:`data_map.DataMap2D` or array of bools
+        :return: None
+        """
+        self._update_layer_via_function(0, update_function, verbose,
+                                        only_where)
+
+    def update_all_values_via_vectorized_function(self, update_function,
+                                                  verbose=False):
+        """
+        Tiled counterpart of
+        :meth:`data_map.DataMap2D.update_all_values_via_vectorized_function`:
+        ``update_function`` is called once per tile with the latitudes,
+        longitudes and (global) indices of that tile.
+
+        :param update_function: function used to update the values
+        :type update_function: function object
+        :param verbose: if True, progress updates will be logged (level = \
+                INFO); otherwise, nothing will be logged
+        :type verbose: bool
+        :return: None
+        """
+        latitudes = numpy.asarray(self.latitudes)
+        longitudes = numpy.asarray(self.longitudes)
+        for (tile, lat_slice, lon_slice) in self._iter_tiles(verbose,
+                                                             writable=True):
+            new_values = update_function(
+                latitudes[lat_slice].reshape(-1, 1),
+                longitudes[lon_slice].reshape(1, -1),
+                numpy.arange(lat_slice.start, lat_slice.stop).reshape(-1, 1),
+                numpy.arange(lon_slice.start, lon_slice.stop).reshape(1, -1),
+                tile[0])
+            if new_values is not None:
+                data_map._copy_vectorized_update(tile[0], new_values)
+
+    def generate_submap(self, latitude_bounds, longitude_bounds,
+                        generate_even_if_submap_partially_outside_datamap=False):
+        """
+        Generates an in-memory :class:`data_map.DataMap2D` which contains a
+        subset of this map's coordinates and data; see
+        :meth:`data_map.DataMap2D.generate_submap`. Only the tiles which
+        overlap the submap are read.
+
+        :param latitude_bounds: (min_latitude, max_latitude)
+        :param longitude_bounds: (min_longitude, max_longitude)
+        :param generate_even_if_submap_partially_outside_datamap: see \
+                :meth:`data_map.DataMap2D.generate_submap`
+        :rtype: :class:`data_map.DataMap2D`
+        """
+        (lat_start, lat_stop, lon_start, lon_stop) = self._get_submap_indices(
+            latitude_bounds, longitude_bounds,
+            generate_even_if_submap_partially_outside_datamap)
+
+        submap = self._create_datamap2d(lat_start, lat_stop, lon_start,
+                                        lon_stop)
+        submap.mutable_matrix[:] = self._store.read_region(
+            lat_start, lat_stop, lon_start, lon_stop)[0]
+        return submap
+
+    def reintegrate_submap(self, submap, integration_function):
+        """
+        Re-integrates the submap into this map, one tile at a time; see
+        :meth:`data_map.DataMap2D.reintegrate_submap`.
+
+        :param submap: submap to be reintegrated into this map (submap is not \
+                modified)
+        :type submap: :class:`data_map.DataMap2D`
+        :param integration_function: function which dictates how the two \
+                matrices should be combined
+        :type integration_function: function object
+        """
+        (lat_start, lon_start) = self._grid._get_submap_offset(submap)
+        submap_matrix = numpy.asarray(submap.mutable_matrix)
+        for (tile, tile_slices, region_slices) in self._store.iter_region(
+                lat_start, lat_start + submap_matrix.shape[0], lon_start,
+                lon_start + submap_matrix.shape[1], writable=True):
+            current_values = tile[(0,) + tile_slices]
+            current_values[:] = integration_function(
+                current_values, submap_matrix[region_slices])
+
+
+class DataMap3DTiled(_DataMapTiled):
+    """
+    Tiled counterpart of :class:`data_map.DataMap3D` whose values are kept
+    on disk (see :mod:`data_map_tiled`). Each tile holds all layers of its
+    pixels.
+    """
+
+    @classmethod
+    def from_DataMap2D(cls, directory, template_datamap2d, layer_descr_list,
+                       dtype=None, tile_shape=DEFAULT_TILE_SHAPE,
+                       memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES):
+        """
+        Creates a new tiled map in ``directory`` (which is created if
+        necessary) with the grid of ``template_datamap2d`` and one layer per
+        entry of ``layer_descr_list``. Unlike
+        :meth:`data_map.DataMap3D.from_DataMap2D`, the values of the template
+        are not copied: all values are initialized to the default fill
+        value.
+
+        .. note:: The layer descriptions must be representable in JSON \
+                (e.g. ints or strings); tuples are restored as tuples.
+
+        :param directory: directory in which the tiles are stored
+        :type directory: str
+        :param template_datamap2d: provides the latitude and longitude bounds \
+                and number of divisions
+        :type template_datamap2d: :class:`data_map.DataMap2D`
+        :param layer_descr_list: description (key) for each layer; must be \
+                unique
+        :type layer_descr_list: list
+        :param dtype: data type of the values (by default, the data type of \
+                ``template_datamap2d``)
+        :param tile_shape: (latitudes, longitudes) per tile
+        :type tile_shape: tuple of ints
+        :param memory_budget_bytes: maximum size of the tiles kept in memory \
+                (at least one tile is always kept)
+        :type memory_budget_bytes: int
+        :rtype: :class:`DataMap3DTiled`
+        """
+        if len(set(layer_descr_list)) != len(layer_descr_list):
+            raise ValueError("Duplicate layer descriptions: %s" %
+                             str(layer_descr_list))
+        if dtype is None:
+            dtype = numpy.asarray(template_datamap2d.mutable_matrix).dtype
+        return cls._create(directory,
+                           data_map._get_memmap_grid_header(template_datamap2d),
+                           list(layer_descr_list), dtype, tile_shape,
+                           memory_budget_bytes)
+
+    @classmethod
+    def from_DataMap3D(cls, directory, datamap3d,
+                       tile_shape=DEFAULT_TILE_SHAPE,
+                       memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES):
+        """
+        Creates a new tiled map in ``directory`` which holds a copy of the
+        layers of ``datamap3d``. See :meth:`from_DataMap2D`.
+
+        :type datamap3d: :class:`data_map.DataMap3D`
+        :rtype: :class:`DataMap3DTiled`
+        """
+        obj = cls.from_DataMap2D(directory, datamap3d.get_arbitrary_layer(),
+                                 datamap3d.get_layer_descr_list(),
+                                 dtype=datamap3d.mutable_array.dtype,
+                                 tile_shape=tile_shape,
+                                 memory_budget_bytes=memory_budget_bytes)
+        obj._store.write_region(0, 0, datamap3d.mutable_array)
+        obj.flush()
+        return obj
+
+    def to_DataMap3D(self):
+        """
+        Reads all values into an in-memory :class:`data_map.DataMap3D`
+        (which must fit in memory).
+
+        :rtype: :class:`data_map.DataMap3D`
+        """
+        datamap3d = DataMap3D.from_DataMap2D(
+            self._create_datamap2d(0, len(self.latitudes), 0,
+                                   len(self.longitudes)),
+            self._layer_descr_list)
+        datamap3d.mutable_array[:] = self._store.read_region(
+            0, len(self.latitudes), 0, len(self.longitudes))
+        return datamap3d
+
+    def _get_block_values(self, values):
+        return values
+
+    def get_layer_descr_list(self):
+        """:return: the description (key) of each layer, in storage order"""
+        return self._layer_descr_list
+
+    def _get_layer_indices(self, layer_descr_list):
+        for layer_descr in layer_descr_list:
+            if layer_descr not in self._layer_index:
+                raise AttributeError(
+                    "Layer does not exist: %s" % str(layer_descr))
+        return [self._layer_index[layer_descr] for layer_descr in
+                layer_descr_list]
+
+    def get_layer(self, layer_descr):
+        """
+        Reads a layer into an in-memory :class:`data_map.DataMap2D`. Unlike
+        :meth:`data_map.DataMap3D.get_layer`, the result is a copy.
+
+        :rtype: :class:`data_map.DataMap2D`
+        """
+        layer_index = self._get_layer_indices([layer_descr])[0]
+        datamap2d = self._create_datamap2d(0, len(self.latitudes), 0,
+                                           len(self.longitudes))
+        datamap2d.mutable_matrix[:] = self._store.read_region(
+            0, len(self.latitudes), 0, len(self.longitudes),
+            layer_indices=[layer_index])[0]
+        return datamap2d
+
+    def set_layer(self, layer_descr, new_layer):
+        """
+        Replaces the values of a layer with those of ``new_layer``.
+
+        :type new_layer: :class:`data_map.DataMap2D`
+        """
+        layer_index = self._get_layer_indices([layer_descr])[0]
+        self.raise_error_if_datamaps_are_incomparable(new_layer)
+        self._store.write_region(
+            0, 0, numpy.asarray(new_layer.mutable_matrix)[numpy.newaxis],
+            layer_indices=[layer_index])
+
+    def get_all_layers_at_index_as_list(self, latitude_index, longitude_index):
+        """
+        :return: the value of each layer (in the order given by \
+                :meth:`get_layer_descr_list`) at the given indices
+        :rtype: list
+        """
+        return list(self._store.read_region(latitude_index,
+                                            latitude_index + 1,
+                                            longitude_index,
+                                            longitude_index + 1)[:, 0, 0])
+
+    def update_layer_via_function(self, layer_descr, update_function,
+                                  verbose=False, only_where=None):
+        """
+        Updates each pixel of a layer according to ``update_function``, one
+        tile at a time; see
+        :meth:`DataMap2DTiled.update_all_values_via_function`.
+
+        :param layer_descr: description (key) of the layer to be updated
+        :param update_function: function used to update the values
+        :type update_function: function object
+        :param verbose: if True, progress updates will be logged (level = \
+                INFO); otherwise, nothing will be logged
+        :type verbose: bool
+        :param only_where: mask selecting the pixels to be updated
+        :type only_where: :class:`DataMap2DTiled`, \
+                :class:`data_map.DataMap2D` or array of bools
+        :return: None
+        """
+        layer_index = self._get_layer_indices([layer_descr])[0]
+        self._update_layer_via_function(layer_index, update_function,
+                                        verbose, only_where)
+
+    def sum_all_layers(self, directory, memory_budget_bytes=None):
+        """
+        Sums all layers element-wise, one tile at a time; see
+        :meth:`data_map.DataMap3D.sum_all_layers`. The result is a new
+        tiled map with the same tile shape.
+
+        :param directory: directory in which the result is stored
+        :type directory: str
+        :param memory_budget_bytes: memory budget of the result (by default, \
+                the budget of this map)
+        :type memory_budget_bytes: int
+        :rtype: :class:`DataMap2DTiled`
+        """
+        return self.sum_subset_of_layers(None, directory,
+                                         memory_budget_bytes=memory_budget_bytes)
+
+    def sum_subset_of_layers(self, layer_descrs, directory,
+                             memory_budget_bytes=None):
+        """
+        Sums a subset of layers element-wise, one tile at a time; see
+        :meth:`sum_all_layers`.
+
+        :param layer_descrs: layer descriptions (keys); all layers are summed \
+                if None
+        :param directory: directory in which the result is stored
+        :type directory: str
+        :param memory_budget_bytes: memory budget of the result (by default, \
+                the budget of this map)
+        :type memory_budget_bytes: int
+        :rtype: :class:`DataMap2DTiled`
+        """
+        if layer_descrs is None:
+            layer_indices = range(len(self._layer_descr_list))
+        else:
+            layer_indices = self._get_layer_indices(layer_descrs)
+        if memory_budget_bytes is None:
+            memory_budget_bytes = self._store.memory_budget_bytes
+
+        result = DataMap2DTiled._create(
+            directory, data_map._get_memmap_grid_header(self._grid), [None],
+            numpy.result_type(self.dtype, float), self.tile_shape,
+            memory_budget_bytes)
+        for (lat_slice, lon_slice, _, _, values) in self.iter_blocks():
+            result._store.write_region(
+                lat_slice.start, lon_slice.start,
+                numpy.sum(values[layer_indices], axis=0, dtype=result.dtype,
+                          keepdims=True))
+        result.flush()
+        return result
+
+    def generate_submap(self, latitude_bounds, longitude_bounds,
+                        generate_even_if_submap_partially_outside_datamap=False):
+        """
+        Generates an in-memory :class:`data_map.DataMap3D` which contains a
+        subset of this map's coordinates and data (all layers); see
+        :meth:`data_map.DataMap2D.generate_submap`. Only the tiles which
+        overlap the submap are read.
+
+        :param latitude_bounds: (min_latitude, max_latitude)
+        :param longitude_bounds: (min_longitude, max_longitude)
+        :param generate_even_if_submap_partially_outside_datamap: see \
+                :meth:`data_map.DataMap2D.generate_submap`
+        :rtype: :class:`data_map.DataMap3D`
+        """
+        (lat_start, lat_stop, lon_start, lon_stop) = self._get_submap_indices(
+            latitude_bounds, longitude_bounds,
+            generate_even_if_submap_partially_outside_datamap)
+
+        submap = DataMap3D.from_DataMap2D(
+            self._create_datamap2d(lat_start, lat_stop, lon_start, lon_stop),
+            self._layer_descr_list)
+        submap.mutable_array[:] = self._store.read_region(
+            lat_start, lat_stop, lon_start, lon_stop)
+        return submap
+
+    def reintegrate_submap(self, submap, integration_function):
+        """
+        Re-integrates each layer of the submap into the corresponding layer
+        of this map, one tile at a time; see
+        :meth:`data_map.DataMap2D.reintegrate_submap`. The submap may contain
+        a subset of the layers.
+
+        :param submap: submap to be reintegrated into this map (submap is not \
+                modified)
+        :type submap: :class:`data_map.DataMap3D`
+        :param integration_function: function which dictates how the two \
+                matrices should be combined
+        :type integration_function: function object
+        """
+        if not isinstance(submap, DataMap3D):
+            raise TypeError("Expected a DataMap3D")
+        layer_indices = self._get_layer_indices(
+            submap.get_layer_descr_list())
+        (lat_start, lon_start) = self._grid._get_submap_offset(
+            submap.get_arbitrary_layer())
+
+        submap_values = submap.mutable_array
+        for (tile, tile_slices, region_slices) in self._store.iter_region(
+                lat_start, lat_start + submap_values.shape[1], lon_start,
+                lon_start + submap_values.shape[2], writable=True):
+            for (position, layer_index) in enumerate(layer_indices):
+                current_values = tile[(layer_index,) + tile_slices]
+                current_values[:] = integration_function(
+                    current_values, submap_values[(position,) + region_slices])
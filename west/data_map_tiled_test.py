@@ -0,0 +1,207 @@
+import data_map
+import data_map_tiled
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class DataMap2DTiledTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.datamap = data_map.DataMap2DBayArea.create(7, 9)
+        self.datamap.mutable_matrix[:] = numpy.arange(63.0).reshape(7, 9)
+        # Tiles of 3x4 values (the edge tiles are clipped); at most two
+        # tiles are kept in memory
+        self.tiled = data_map_tiled.DataMap2DTiled.from_DataMap2D(
+            os.path.join(self.directory, "map"), self.datamap,
+            tile_shape=(3, 4), memory_budget_bytes=2 * 3 * 4 * 8)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        self.assertEqual(self.tiled._store.max_num_cached_tiles, 2)
+        self.assertTrue(self.tiled.datamap_is_comparable(self.datamap)[0])
+        self.assertTrue(numpy.array_equal(
+            self.tiled.to_DataMap2D().mutable_matrix,
+            self.datamap.mutable_matrix))
+
+        reopened = data_map_tiled.DataMap2DTiled.from_directory(
+            self.tiled.directory)
+        self.assertEqual(reopened.get_value_by_index(5, 6), 51)
+        location = (self.datamap.latitudes[2], self.datamap.longitudes[8])
+        self.assertEqual(reopened.get_value_by_location(location), 26)
+        self.assertRaises(TypeError,
+                          data_map_tiled.DataMap3DTiled.from_directory,
+                          self.tiled.directory)
+
+    def test_update_matches_in_memory_map(self):
+        def update_function(latitude, longitude, latitude_index,
+                            longitude_index, current_value):
+            return current_value + latitude + longitude * latitude_index - \
+                longitude_index
+
+        mask = self.datamap.mutable_matrix % 3 == 0
+        self.datamap.update_all_values_via_function(update_function,
+                                                    only_where=mask)
+        self.tiled.update_all_values_via_function(update_function,
+                                                  only_where=mask)
+        # Make sure that evicted tiles were written back
+        reopened = data_map_tiled.DataMap2DTiled.from_directory(
+            self.tiled.directory)
+        self.assertFalse(numpy.allclose(
+            reopened.to_DataMap2D().mutable_matrix,
+            self.datamap.mutable_matrix))
+        self.tiled.flush()
+        reopened = data_map_tiled.DataMap2DTiled.from_directory(
+            self.tiled.directory)
+        self.assertTrue(numpy.allclose(reopened.to_DataMap2D().mutable_matrix,
+                                       self.datamap.mutable_matrix))
+
+    def test_vectorized_update(self):
+        def update_function(latitudes, longitudes, latitude_indices,
+                            longitude_indices, current_values):
+            return current_values + latitude_indices * 100 + longitude_indices
+
+        self.datamap.update_all_values_via_vectorized_function(update_function)
+        self.tiled.update_all_values_via_vectorized_function(update_function)
+        self.assertTrue(numpy.array_equal(
+            self.tiled.to_DataMap2D().mutable_matrix,
+            self.datamap.mutable_matrix))
+
+    def test_submaps(self):
+        latitude_bounds = (self.datamap.latitudes[2], self.datamap.latitudes[5])
+        longitude_bounds = (self.datamap.longitudes[1],
+                            self.datamap.longitudes[7])
+        expected = self.datamap.generate_submap(latitude_bounds,
+                                                longitude_bounds)
+        submap = self.tiled.generate_submap(latitude_bounds, longitude_bounds)
+        self.assertTrue(expected.datamap_is_comparable(submap)[0])
+        self.assertTrue(numpy.array_equal(submap.mutable_matrix,
+                                          expected.mutable_matrix))
+
+        submap.mutable_matrix[:] = 1000
+        self.datamap.reintegrate_submap(submap, numpy.add)
+        self.tiled.reintegrate_submap(submap, numpy.add)
+        self.assertTrue(numpy.array_equal(
+            self.tiled.to_DataMap2D().mutable_matrix,
+            self.datamap.mutable_matrix))
+
+    def test_iter_blocks(self):
+        tiles = list(self.tiled.iter_blocks(writable=True))
+        self.assertEqual(len(tiles), 9)
+        for (lat_slice, lon_slice, latitudes, longitudes, values) in tiles:
+            self.assertTrue(numpy.array_equal(
+                values, self.datamap.mutable_matrix[lat_slice, lon_slice]))
+            self.assertTrue(numpy.array_equal(
+                latitudes, self.datamap.latitudes[lat_slice]))
+            self.assertTrue(numpy.array_equal(
+                longitudes, self.datamap.longitudes[lon_slice]))
+        for (_, _, _, _, values) in self.tiled.iter_blocks(writable=True):
+            values += 1
+        self.assertTrue(numpy.array_equal(
+            self.tiled.to_DataMap2D().mutable_matrix,
+            self.datamap.mutable_matrix + 1))
+
+        # Blocks which do not match the tiles are copies
+        for (lat_slice, lon_slice, _, _, values) in self.tiled.iter_blocks(
+                (2, 9)):
+            self.assertTrue(numpy.array_equal(
+                values, self.datamap.mutable_matrix[lat_slice, lon_slice] + 1))
+        self.assertRaises(ValueError, list,
+                          self.tiled.iter_blocks(5, writable=True))
+
+    def test_reset(self):
+        self.tiled.reset_all_values(3)
+        self.tiled.set_value_by_index(6, 8, 4)
+        self.tiled.flush()
+        reopened = data_map_tiled.DataMap2DTiled.from_directory(
+            self.tiled.directory)
+        matrix = reopened.to_DataMap2D().mutable_matrix
+        self.assertEqual(matrix[6, 8], 4)
+        self.assertEqual(numpy.sum(matrix == 3), 62)
+        # Only the tile which was written is stored
+        self.assertEqual(len([filename for filename in
+                              os.listdir(self.tiled.directory)
+                              if filename.startswith("tile_")]), 1)
+
+
+class DataMap3DTiledTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        template = data_map.DataMap2DWisconsin.create(6, 5)
+        self.datamap3d = data_map.DataMap3D.from_DataMap2D(template,
+                                                           [2, 3, (4, "a")])
+        self.datamap3d.mutable_array[:] = numpy.arange(90.0).reshape(3, 6, 5)
+        self.tiled = data_map_tiled.DataMap3DTiled.from_DataMap3D(
+            os.path.join(self.directory, "map3d"), self.datamap3d,
+            tile_shape=(4, 2), memory_budget_bytes=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        reopened = data_map_tiled.DataMap3DTiled.from_directory(
+            self.tiled.directory)
+        self.assertEqual(reopened.get_layer_descr_list(), [2, 3, (4, "a")])
+        self.assertEqual(reopened.get_all_layers_at_index_as_list(1, 2),
+                         [7, 37, 67])
+        self.assertTrue(numpy.array_equal(
+            reopened.to_DataMap3D().mutable_array,
+            self.datamap3d.mutable_array))
+        self.assertTrue(numpy.array_equal(
+            reopened.get_layer(3).mutable_matrix,
+            self.datamap3d.get_layer(3).mutable_matrix))
+
+    def test_sum_all_layers(self):
+        total = self.tiled.sum_all_layers(os.path.join(self.directory, "sum"))
+        self.assertTrue(numpy.array_equal(
+            total.to_DataMap2D().mutable_matrix,
+            self.datamap3d.sum_all_layers().mutable_matrix))
+
+        partial = self.tiled.sum_subset_of_layers(
+            [3], os.path.join(self.directory, "partial"))
+        self.assertTrue(numpy.array_equal(
+            partial.to_DataMap2D().mutable_matrix,
+            self.datamap3d.get_layer(3).mutable_matrix))
+
+    def test_update_layer(self):
+        def update_function(latitude, longitude, latitude_index,
+                            longitude_index, current_value):
+            return -latitude_index * 10 - longitude_index
+
+        self.tiled.update_layer_via_function(2, update_function)
+        self.datamap3d.get_layer(2).update_all_values_via_function(
+            update_function)
+        self.assertTrue(numpy.array_equal(
+            self.tiled.to_DataMap3D().mutable_array,
+            self.datamap3d.mutable_array))
+
+    def test_submaps(self):
+        layer = self.datamap3d.get_layer(3)
+        latitude_bounds = (layer.latitudes[1], layer.latitudes[3])
+        longitude_bounds = (layer.longitudes[1], layer.longitudes[2])
+        expected = layer.generate_submap(latitude_bounds, longitude_bounds)
+        submap = self.tiled.generate_submap(latitude_bounds, longitude_bounds)
+        self.assertTrue(expected.datamap_is_comparable(
+            submap.get_layer(3))[0])
+        self.assertTrue(numpy.array_equal(submap.get_layer(3).mutable_matrix,
+                                          expected.mutable_matrix))
+
+        submap.mutable_array[:] = 0
+        self.tiled.reintegrate_submap(submap, numpy.multiply)
+        for layer_descr in self.datamap3d.get_layer_descr_list():
+            self.datamap3d.get_layer(layer_descr).reintegrate_submap(
+                submap.get_layer(layer_descr), numpy.multiply)
+        self.assertTrue(numpy.array_equal(
+            self.tiled.to_DataMap3D().mutable_array,
+            self.datamap3d.mutable_array))
+
+
+from custom_logging import getCurrentLogLevel, changeLogLevel, disableLogging
+original_log_level = getCurrentLogLevel()
+disableLogging()
+unittest.main()
+changeLogLevel(original_log_level)
@@ -1,3 +1,6 @@
+import numpy
+from geopy.distance import ELLIPSOIDS
+
 horizontal_separator = "".center(80, "-")
 
 
@@ -105,6 +108,180 @@ def find_first_value_approximately_equal(list_to_search, value_to_find,
                                   lambda v: abs(value_to_find - v) < tolerance)
 
 
+def find_first_value_above_or_equal_in_sorted_array(sorted_array,
+                                                    values_to_find):
+    """
+    Vectorized counterpart of :func:`find_first_value_above_or_equal` for an
+    array sorted in ascending order. Uses a binary search rather than a
+    linear scan.
+
+    :param sorted_array: values to search (ascending)
+    :type sorted_array: :class:`numpy.ndarray`
+    :param values_to_find: value(s) to find
+    :type values_to_find: float or array-like of floats
+    :return: index for each value (-1 where no such index exists)
+    :rtype: :class:`numpy.ndarray` of ints
+    """
+    sorted_array = numpy.asarray(sorted_array)
+    indices = numpy.searchsorted(sorted_array, values_to_find, side='right')
+    return numpy.where(indices < len(sorted_array), indices, -1)
+
+
+def find_last_value_below_or_equal_in_sorted_array(sorted_array,
+                                                   values_to_find):
+    """
+    Vectorized counterpart of :func:`find_last_value_below_or_equal` for an
+    array sorted in ascending order; see
+    :func:`find_first_value_above_or_equal_in_sorted_array`.
+
+    :return: index for each value (-1 where no such index exists)
+    :rtype: :class:`numpy.ndarray` of ints
+    """
+    sorted_array = numpy.asarray(sorted_array)
+    values_to_find = numpy.asarray(values_to_find)
+    indices = find_first_value_above_or_equal_in_sorted_array(sorted_array,
+                                                              values_to_find)
+    is_found = indices >= 0
+
+    # Equality is fine; otherwise need to subtract 1
+    is_equal = is_found & (numpy.abs(sorted_array[numpy.maximum(indices, 0)] -
+                                     values_to_find) < 0.001)
+    return numpy.where(is_equal, indices,
+                       numpy.where(is_found & (indices > 0), indices - 1, -1))
+
+
+def find_first_value_approximately_equal_in_sorted_array(sorted_array,
+                                                         values_to_find,
+                                                         tolerance=1e-4):
+    """
+    Vectorized counterpart of :func:`find_first_value_approximately_equal`
+    for an array sorted in ascending order; see
+    :func:`find_first_value_above_or_equal_in_sorted_array`.
+
+    :return: index for each value (-1 where no such index exists)
+    :rtype: :class:`numpy.ndarray` of ints
+    """
+    sorted_array = numpy.asarray(sorted_array)
+    values_to_find = numpy.asarray(values_to_find)
+    indices = numpy.searchsorted(sorted_array, values_to_find - tolerance,
+                                 side='right')
+    is_found = (indices < len(sorted_array))
+    candidates = sorted_array[numpy.minimum(indices, len(sorted_array) - 1)]
+    is_found &= numpy.abs(values_to_find - candidates) < tolerance
+    return numpy.where(is_found, indices, -1)
+
+
+def vincenty_distances_km(location, latitudes, longitudes, iterations=20):
+    """
+    Vectorized counterpart of :class:`geopy.distance.vincenty` (WGS-84):
+    computes the distance between ``location`` and each of the given points.
+    Each point follows the same iteration as geopy's implementation (it
+    stops iterating once it has converged) so that the results agree with
+    geopy up to floating-point rounding.
+
+    ``latitudes`` and ``longitudes`` are broadcast against each other, e.g.
+    a column of latitudes and a row of longitudes give the distance to each
+    point of a grid.
+
+    :param location: (latitude, longitude) in decimal degrees
+    :type location: tuple of floats
+    :param latitudes: latitudes in decimal degrees
+    :type latitudes: float or array-like of floats
+    :param longitudes: longitudes in decimal degrees
+    :type longitudes: float or array-like of floats
+    :param iterations: maximum number of iterations (as in geopy)
+    :type iterations: int
+    :return: distance to each point in kilometers
+    :rtype: :class:`numpy.ndarray` of floats
+    """
+    (major, minor, f) = ELLIPSOIDS['WGS-84']
+    (latitudes, longitudes) = numpy.broadcast_arrays(
+        numpy.asarray(latitudes, dtype=float),
+        numpy.asarray(longitudes, dtype=float))
+    shape = latitudes.shape
+    (latitudes, longitudes) = (latitudes.ravel(), longitudes.ravel())
+
+    lat1 = numpy.radians(location[0])
+    lat2 = numpy.radians(latitudes)
+    delta_lng = numpy.radians(longitudes) - numpy.radians(location[1])
+
+    reduced_lat1 = numpy.arctan((1 - f) * numpy.tan(lat1))
+    reduced_lat2 = numpy.arctan((1 - f) * numpy.tan(lat2))
+    sin_reduced1 = numpy.sin(reduced_lat1)
+    cos_reduced1 = numpy.cos(reduced_lat1)
+    sin_reduced2 = numpy.sin(reduced_lat2)
+    cos_reduced2 = numpy.cos(reduced_lat2)
+
+    lambda_lng = delta_lng.copy()
+    lambda_prime = numpy.empty_like(delta_lng)
+    lambda_prime.fill(2 * numpy.pi)
+    sin_sigma = numpy.zeros_like(delta_lng)
+    cos_sigma = numpy.zeros_like(delta_lng)
+    sigma = numpy.zeros_like(delta_lng)
+    cos_sq_alpha = numpy.zeros_like(delta_lng)
+    cos2_sigma_m = numpy.zeros_like(delta_lng)
+    is_coincident = numpy.zeros(delta_lng.shape, dtype=bool)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        for _ in xrange(iterations + 1):
+            # Only the points which have not converged yet are updated
+            active = (numpy.abs(lambda_lng - lambda_prime) > 10e-12) & \
+                     ~is_coincident
+            if not numpy.any(active):
+                break
+
+            sin_lambda_lng = numpy.sin(lambda_lng[active])
+            cos_lambda_lng = numpy.cos(lambda_lng[active])
+            s_r2 = sin_reduced2[active]
+            c_r2 = cos_reduced2[active]
+
+            new_sin_sigma = numpy.sqrt(
+                (c_r2 * sin_lambda_lng) ** 2 +
+                (cos_reduced1 * s_r2 -
+                 sin_reduced1 * c_r2 * cos_lambda_lng) ** 2)
+            new_cos_sigma = sin_reduced1 * s_r2 + \
+                cos_reduced1 * c_r2 * cos_lambda_lng
+            new_sigma = numpy.arctan2(new_sin_sigma, new_cos_sigma)
+            sin_alpha = cos_reduced1 * c_r2 * sin_lambda_lng / new_sin_sigma
+            new_cos_sq_alpha = 1 - sin_alpha ** 2
+            new_cos2_sigma_m = numpy.where(
+                new_cos_sq_alpha != 0,
+                new_cos_sigma - 2 * (sin_reduced1 * s_r2 / new_cos_sq_alpha),
+                0.0)    # Equatorial line
+            C = f / 16. * new_cos_sq_alpha * (
+                4 + f * (4 - 3 * new_cos_sq_alpha))
+
+            sin_sigma[active] = new_sin_sigma
+            cos_sigma[active] = new_cos_sigma
+            sigma[active] = new_sigma
+            cos_sq_alpha[active] = new_cos_sq_alpha
+            cos2_sigma_m[active] = new_cos2_sigma_m
+            is_coincident[active] = (new_sin_sigma == 0)
+
+            lambda_prime[active] = lambda_lng[active]
+            lambda_lng[active] = delta_lng[active] + \
+                (1 - C) * f * sin_alpha * (
+                    new_sigma + C * new_sin_sigma * (
+                        new_cos2_sigma_m + C * new_cos_sigma * (
+                            -1 + 2 * new_cos2_sigma_m ** 2)))
+        else:
+            if numpy.any((numpy.abs(lambda_lng - lambda_prime) > 10e-12) &
+                         ~is_coincident):
+                raise ValueError("Vincenty formula failed to converge!")
+
+    u_sq = cos_sq_alpha * (major ** 2 - minor ** 2) / minor ** 2
+    A = 1 + u_sq / 16384. * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    B = u_sq / 1024. * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = B * sin_sigma * (
+        cos2_sigma_m + B / 4. * (
+            cos_sigma * (-1 + 2 * cos2_sigma_m ** 2) -
+            B / 6. * cos2_sigma_m * (-3 + 4 * sin_sigma ** 2) *
+            (-3 + 4 * cos2_sigma_m ** 2)))
+
+    return numpy.where(is_coincident, 0.0,
+                       minor * A * (sigma - delta_sigma)).reshape(shape)
+
+
 def generate_submap_for_protected_entity(base_datamap2d, protected_entity):
     bb = protected_entity.get_bounding_box()
     latitude_bounds = (bb['min_lat'], bb['max_lat'])
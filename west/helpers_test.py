@@ -1,5 +1,7 @@
 import helpers
+import numpy
 import unittest
+from geopy.distance import vincenty
 
 
 class IndexFindingTestCase(unittest.TestCase):
@@ -62,6 +64,28 @@ class IndexFindingTestCase(unittest.TestCase):
                                                                  value)
             self.assertIsNone(index, msg="Value = %2.2f" % value)
 
+    def test_sorted_array_variants(self):
+        # 0 to 9.5 in increments of 0.5
+        list_to_search = [l / 2.0 for l in range(0, 20)]
+        values = [v / 3.0 for v in range(-6, 36)] + list_to_search + \
+                 [0.2501, 0.24995, 9.5004]
+
+        functions = [
+            (helpers.find_first_value_above_or_equal,
+             helpers.find_first_value_above_or_equal_in_sorted_array),
+            (helpers.find_last_value_below_or_equal,
+             helpers.find_last_value_below_or_equal_in_sorted_array),
+            (helpers.find_first_value_approximately_equal,
+             helpers.find_first_value_approximately_equal_in_sorted_array)]
+        for (function, sorted_array_function) in functions:
+            indices = sorted_array_function(numpy.array(list_to_search),
+                                            values)
+            for (value, index) in zip(values, indices):
+                expected = function(list_to_search, value)
+                self.assertEqual(index, -1 if expected is None else expected,
+                                 msg="%s: value = %f" % (function.__name__,
+                                                         value))
+
     def test_lists_are_almost_equal(self):
         # 0 to 9.5 in increments of 0.5
         base_list = [l / 2.0 for l in range(0, 20)]
@@ -80,4 +104,25 @@ class IndexFindingTestCase(unittest.TestCase):
                                                        tolerance=1e-5))
 
 
+
+class VincentyDistancesTestCase(unittest.TestCase):
+    def test_matches_geopy(self):
+        location = (37.5, -122.2)
+        latitudes = numpy.linspace(25, 50, 21).reshape(-1, 1)
+        longitudes = numpy.linspace(-125, -65, 31).reshape(1, -1)
+
+        distances = helpers.vincenty_distances_km(location, latitudes,
+                                                  longitudes)
+        self.assertEqual(distances.shape, (21, 31))
+        for (lat_idx, latitude) in enumerate(latitudes[:, 0]):
+            for (lon_idx, longitude) in enumerate(longitudes[0]):
+                self.assertAlmostEqual(
+                    distances[lat_idx, lon_idx],
+                    vincenty(location, (latitude, longitude)).kilometers,
+                    places=9)
+
+        # Coincident points
+        self.assertEqual(helpers.vincenty_distances_km(location, 37.5,
+                                                       -122.2), 0)
+
 unittest.main()
@@ -119,7 +119,7 @@ class Map(object):
 
         import numpy.ma as ma
 
-        mask = 1.0 - is_in_region_map.get_matrix_copy()
+        mask = numpy.not_equal(is_in_region_map.mutable_matrix, 1)
         self._data = ma.masked_array(self._data, mask=mask)
 
     def set_data_max_value(self, threshold=None):
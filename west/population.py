@@ -128,7 +128,7 @@ class PopulationData(object):
         """
         # Note: will use is_in_region map to help but will not modify it
         population_datamap2d = data_map.DataMap2D.get_copy_of(
-            is_in_region_datamap2d)
+            is_in_region_datamap2d, dtype=float)
         population_datamap2d.reset_all_values(
             0)  # set everything to 0 so we can accumulate
 
@@ -139,16 +139,13 @@ class PopulationData(object):
 
         def calculate_population(latitude, longitude, latitude_index,
                                  longitude_index, current_value):
-            if not is_in_region_datamap2d.get_value_by_index(latitude_index,
-                                                             longitude_index):
-                return None
-
             return self._calculate_population_for_pixel((latitude, longitude),
                                                         latitude_width_degrees,
                                                         longitude_width_degrees)
 
         population_datamap2d.update_all_values_via_function(
-            calculate_population, verbose=True)
+            calculate_population, verbose=True,
+            only_where=is_in_region_datamap2d)
 
         return population_datamap2d
 
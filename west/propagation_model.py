@@ -271,6 +271,14 @@ class PropagationModel(object):
         :class:`PropagationCurve`)."""
         return
 
+    def distance_depends_on_rx_location(self):
+        """Returns a boolean specifying whether or not the results of this
+        propagation model (e.g. :meth:`get_distance`) may change with the
+        receiver's location. If not, results computed for one receiver
+        location may be reused for any other.
+
+        Defaults to :meth:`requires_rx_location`."""
+        return self.requires_rx_location()
 
     def parameters_are_sufficient(self, provides_terrain=False,
                                   provides_tx_height=False,
@@ -521,6 +521,11 @@ class PropagationModelFcurves(PropagationModel):
 
     def requires_curve_enum(self):
         return True
+
+    def distance_depends_on_rx_location(self):
+        # The locations are not used until _get_haat() takes terrain into
+        # account
+        return False
 ####
 #   END DESCRIPTIVE PROPERTIES
 ####
@@ -37,6 +37,9 @@ class PropagationModelFreeSpace(PropagationModel):
     def requires_curve_enum(self):
         return False
 
+    def distance_depends_on_rx_location(self):
+        return False
+
     def get_pathloss_coefficient_unchecked(self, distance, frequency=None,
                                            tx_height=None, rx_height=None,
                                            tx_location=None, rx_location=None,
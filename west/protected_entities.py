@@ -1,17 +1,74 @@
 from abc import ABCMeta, abstractmethod
 from custom_logging import getModuleLogger
+import math
 import simplekml
 
 
+class _BoundingBoxIndex(object):
+    """
+    Spatial index over the bounding boxes of protected entities (see
+    :meth:`protected_entity.ProtectedEntity.get_bounding_box`). The
+    latitude/longitude plane is divided into square buckets and each entity
+    is listed in every bucket its bounding box overlaps, so that a query
+    only needs to look at the entities listed in a single bucket.
+    """
+
+    def __init__(self, entities, bucket_size_degrees):
+        """
+        :param entities: the entities to be indexed
+        :type entities: list of :class:`protected_entity.ProtectedEntity`
+        :param bucket_size_degrees: width and height of a bucket in decimal \
+                degrees
+        :type bucket_size_degrees: float
+        """
+        self._bucket_size_degrees = float(bucket_size_degrees)
+        self._buckets = {}
+
+        # Entities are added in order so that queries preserve the order of
+        # the input list
+        for entity in entities:
+            bb = entity.get_bounding_box()
+            (min_lat_bucket, min_lon_bucket) = self._get_bucket(
+                (bb['min_lat'], bb['min_lon']))
+            (max_lat_bucket, max_lon_bucket) = self._get_bucket(
+                (bb['max_lat'], bb['max_lon']))
+            for lat_bucket in range(min_lat_bucket, max_lat_bucket + 1):
+                for lon_bucket in range(min_lon_bucket, max_lon_bucket + 1):
+                    self._buckets.setdefault((lat_bucket, lon_bucket),
+                                             []).append(entity)
+
+    def _get_bucket(self, location):
+        (lat, lon) = location
+        return (int(math.floor(lat / self._bucket_size_degrees)),
+                int(math.floor(lon / self._bucket_size_degrees)))
+
+    def get_entities_containing_location(self, location):
+        """
+        :param location: (latitude, longitude) in decimal degrees
+        :type location: tuple of floats
+        :return: the entities whose bounding box contains ``location`` (in \
+                the order in which they were indexed)
+        :rtype: list of :class:`protected_entity.ProtectedEntity`
+        """
+        return [entity for entity in
+                self._buckets.get(self._get_bucket(location), []) if
+                entity.location_in_bounding_box(location)]
+
+
 class ProtectedEntities(object):
     """Protected entities: a collection of protected entities."""
     __metaclass__ = ABCMeta
 
+    # Used to size the buckets of the spatial indices
+    _km_per_degree_latitude = 111.0
+    _min_bucket_size_degrees = 0.01
+
     def __init__(self, region):
         self.log = getModuleLogger(self)
 
         self.region = region
 
+        self._revision = 0
         self._reset_entities()
 
         self.log.debug("Loading protected entities")
@@ -45,9 +102,21 @@ class ProtectedEntities(object):
         """List of entities."""
         return self._entities
 
+    def get_revision(self):
+        """
+        Returns a number which changes whenever the set of protected entities
+        changes (e.g. via :meth:`add_entity` or :meth:`remove_entities`). It
+        can be used to detect whether data derived from the entities is out
+        of date.
+
+        :rtype: int
+        """
+        return self._revision
+
     def _reset_entities(self):
         """Reset the set of protected entities."""
         self._entities = []
+        self._revision += 1
 
     def _add_entity(self, new_entity):
         """
@@ -59,6 +128,7 @@ class ProtectedEntities(object):
         :type new_entity: :class:`protected_entity.ProtectedEntity`
         """
         self._entities.append(new_entity)
+        self._revision += 1
 
     def add_entity(self, new_entity, update_internal_data_caches=True):
         """
@@ -90,6 +160,39 @@ class ProtectedEntities(object):
         return [entity for entity in self.list_of_entities() if
                 entity.get_channel() == channel_number]
 
+    def get_list_of_entities_near_location(self, location,
+                                           channel_number=None):
+        """
+        Returns the entities whose bounding box contains ``location`` (see
+        :meth:`protected_entity.ProtectedEntity.location_in_bounding_box`),
+        i.e. the only entities which can be protected at ``location``. If
+        ``channel_number`` is given, only entities on that channel are
+        returned; as in :meth:`get_list_of_entities_on_channel`, a ValueError
+        is raised if the channel number is unsupported by the
+        :class:`region.Region`.
+
+        The entities are looked up in a spatial index built by
+        :meth:`_refresh_cached_data` rather than by testing each entity.
+
+        :param location: (latitude, longitude) in decimal degrees
+        :type location: tuple of floats
+        :param channel_number: channel of the entities (None for all entities)
+        :type channel_number: int or None
+        :return: entities near ``location`` in the same order as \
+                :meth:`list_of_entities`
+        :rtype: list of :class:`protected_entity.ProtectedEntity`
+        """
+        if channel_number is None:
+            return self._spatial_index.get_entities_containing_location(
+                location)
+
+        if channel_number not in self.region.get_channel_list():
+            raise ValueError("Unsupported channel number: %d" % channel_number)
+        if channel_number not in self._spatial_index_by_channel:
+            return []
+        return self._spatial_index_by_channel[channel_number]\
+            .get_entities_containing_location(location)
+
     def remove_entities(self, filter_function):
         """
         Removes entities for which ``filter_function(entity)`` does *not*
@@ -112,9 +215,30 @@ class ProtectedEntities(object):
     def _refresh_cached_data(self):
         """
         Use this function to create/refresh any data that might be cached in
-        the ProtectedEntities object.
+        the ProtectedEntities object. Subclasses which override this function
+        should call it as well.
+
+        Builds the spatial indices used by
+        :meth:`get_list_of_entities_near_location` (one for all entities and
+        one per channel). The size of their buckets is determined by
+        :meth:`get_max_protected_radius_km`.
         """
-        pass
+        # Roughly the size of a bounding box (i.e. twice the maximum protected
+        # radius) in degrees of latitude
+        bucket_size_degrees = max(
+            2 * self.get_max_protected_radius_km() /
+            self._km_per_degree_latitude, self._min_bucket_size_degrees)
+
+        entities_by_channel = {}
+        for entity in self.list_of_entities():
+            entities_by_channel.setdefault(entity.get_channel(),
+                                           []).append(entity)
+
+        self._spatial_index = _BoundingBoxIndex(self.list_of_entities(),
+                                                bucket_size_degrees)
+        self._spatial_index_by_channel = dict(
+            (channel, _BoundingBoxIndex(entities, bucket_size_degrees)) for
+            (channel, entities) in entities_by_channel.iteritems())
 
 
     def export_to_kml(self, kml_filename, filter_function=None,
@@ -69,6 +69,9 @@ class ProtectedEntitiesPLMRSUnitedStatesFromGoogle(ProtectedEntitiesPLMRS):
                 self._add_entity(new_plmrs_entry)
 
     def _refresh_cached_data(self):
+        super(ProtectedEntitiesPLMRSUnitedStatesFromGoogle,
+              self)._refresh_cached_data()
+
         self.log.debug("Categorizing entities by channel")
         self.entities_by_channel = {}
 
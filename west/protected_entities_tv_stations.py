@@ -41,6 +41,8 @@ class ProtectedEntitiesTVStations(ProtectedEntities):
 
     def _refresh_cached_data(self):
         """Put the stations into a few dictionaries for easy access."""
+        super(ProtectedEntitiesTVStations, self)._refresh_cached_data()
+
         self.log.debug("Categorizing TV stations")
         self.stations_by_tx_type = {}
         self.stations_by_channel = {}
@@ -1,5 +1,6 @@
 from abc import ABCMeta, abstractmethod
 from custom_logging import getModuleLogger
+import numpy
 
 
 class Ruleset(object):
@@ -38,6 +39,99 @@ class Ruleset(object):
         """
         return
 
+    def available_channels(self, region, locations, devices,
+                           channel_list=None, as_bitmask=False):
+        """
+        Batch counterpart of :meth:`location_is_whitespace`: determines which
+        channels are available for whitespace operation at each of the
+        given locations.
+
+        This implementation calls :meth:`location_is_whitespace` for each
+        pair of location and channel. Subclasses may override it with a
+        batched evaluation.
+
+        :param region: region containing the protected entities
+        :type region: :class:`region.Region` object
+        :param locations: (latitude, longitude) of each point
+        :type locations: list of tuples of floats or array-like of shape \
+            (points x 2)
+        :param devices: the device at each point (e.g. with its own HAAT or \
+            portability) or a single device used at all points
+        :type devices: list of :class:`device.Device` objects or \
+            :class:`device.Device` object
+        :param channel_list: channels to be tested (by default, \
+            :meth:`region.Region.get_tvws_channel_list`)
+        :type channel_list: list of ints
+        :param as_bitmask: if True, returns the available channels of each \
+            point as a uint64 whose i-th bit is set if and only if \
+            ``channel_list[i]`` is available (see \
+            :class:`data_map_channel_bitmask.DataMap2DChannelBitmask`); \
+            otherwise, returns a list of channels for each point
+        :type as_bitmask: bool
+        :return: available channels at each point
+        :rtype: list of lists of ints or :class:`numpy.ndarray` of uint64
+        """
+        (locations, devices, channel_list) = \
+            self._get_available_channels_arguments(region, locations, devices,
+                                                   channel_list, as_bitmask)
+        is_available = numpy.zeros((len(locations), len(channel_list)),
+                                   dtype=bool)
+        for (point_index, (location, device)) in enumerate(zip(locations,
+                                                               devices)):
+            for (channel_index, channel) in enumerate(channel_list):
+                is_available[point_index, channel_index] = \
+                    self.location_is_whitespace(region, location, channel,
+                                                device)
+        return self._format_available_channels(is_available, channel_list,
+                                               as_bitmask)
+
+    def _get_available_channels_arguments(self, region, locations, devices,
+                                          channel_list, as_bitmask):
+        """
+        Checks and normalizes the arguments of :meth:`available_channels`.
+
+        :return: (locations, devices, channel_list) where locations is an \
+            array of shape (points x 2) and devices is a list with one \
+            device per point
+        :rtype: tuple
+        """
+        locations = numpy.asarray(locations, dtype=float).reshape(-1, 2)
+
+        if isinstance(devices, (list, tuple)):
+            if len(devices) != len(locations):
+                raise ValueError("Expected one device per location (got %d "
+                                 "devices for %d locations)" %
+                                 (len(devices), len(locations)))
+            devices = list(devices)
+        else:
+            devices = [devices] * len(locations)
+
+        if channel_list is None:
+            channel_list = region.get_tvws_channel_list()
+        channel_list = list(channel_list)
+        if as_bitmask and len(channel_list) > 64:
+            raise ValueError("At most 64 channels are supported in a bitmask "
+                             "(got %d)" % len(channel_list))
+
+        return (locations, devices, channel_list)
+
+    def _format_available_channels(self, is_available, channel_list,
+                                   as_bitmask):
+        """
+        Converts an array of bools of shape (points x channels) into the
+        output of :meth:`available_channels`.
+        """
+        if as_bitmask:
+            bits = numpy.left_shift(numpy.uint64(1), numpy.arange(
+                len(channel_list), dtype=numpy.uint64))
+            return numpy.bitwise_or.reduce(
+                numpy.where(is_available, bits, numpy.uint64(0)), axis=1)\
+                .astype(numpy.uint64)
+
+        return [[channel for (channel, is_channel_available) in
+                 zip(channel_list, row) if is_channel_available] for row in
+                is_available.tolist()]
+
     @abstractmethod
     def classes_of_protected_entities(self):
         """
@@ -63,6 +157,8 @@ class Ruleset(object):
     def set_propagation_model(self, propagation_model=None):
         """Sets the propagation model to be used with this ruleset. When
         called without arguments, the default propagation model is used.
+        Clears the protected radius cache (see
+        :meth:`clear_protected_radius_cache`).
 
         :param propagation_model: the propagation model to use with this ruleset
         :type propagation_model: :class:`propagation_model.PropagationModel` \
@@ -71,10 +167,94 @@ class Ruleset(object):
         """
         self._propagation_model = propagation_model or \
                                   self.get_default_propagation_model()
+        self.clear_protected_radius_cache()
 
     def get_mutable_propagation_model(self):
         """
+        .. note:: If the propagation model is modified, call \
+            :meth:`clear_protected_radius_cache` afterwards.
+
         :return: the propagation model used with this ruleset
         :rtype: :class:`propagation_model.PropagationModel` object
         """
         return self._propagation_model
+
+    def clear_protected_radius_cache(self):
+        """
+        Clears the cache of protected radii (see
+        :meth:`_get_cached_protected_radius_km`) and resets its statistics.
+
+        :return: None
+        """
+        self._protected_radius_cache = {}
+        self._protected_radius_cache_revisions = {}
+        self._protected_radius_cache_hits = 0
+        self._protected_radius_cache_misses = 0
+
+    def get_protected_radius_cache_info(self):
+        """
+        Returns statistics about the cache of protected radii since it was
+        last cleared. Each miss corresponds to one computation of a protected
+        radius (e.g. one call to the propagation model).
+
+        :return: dictionary with the keys 'hits', 'misses' and 'size' (the \
+            number of cached radii)
+        :rtype: dict
+        """
+        return {'hits': self._protected_radius_cache_hits,
+                'misses': self._protected_radius_cache_misses,
+                'size': len(self._protected_radius_cache)}
+
+    def _get_cached_protected_radius_km(self, protected_entity, key,
+                                        compute_radius_function):
+        """
+        Returns the protected radius of ``protected_entity``, computing it
+        with ``compute_radius_function()`` only if it is not already cached
+        under ``key``.
+
+        The key should contain everything (other than the entity's identity
+        and the class of the propagation model, which are added
+        automatically) that the radius depends on, e.g. the entity's
+        attributes and the propagation curve.
+
+        The cache is bypassed if the propagation model's results depend on
+        the receiver's location (see \
+        :meth:`propagation_model.PropagationModel.distance_depends_on_rx_location`)
+        and cleared whenever the set of entities in the entity's container
+        changes (see \
+        :meth:`protected_entities.ProtectedEntities.get_revision`).
+
+        :param protected_entity: the entity whose radius is requested
+        :type protected_entity: :class:`protected_entity.ProtectedEntity`
+        :param key: hashable description of the computation
+        :type key: tuple
+        :param compute_radius_function: function which takes no arguments \
+            and returns the protected radius in kilometers
+        :type compute_radius_function: function object
+        :return: the protected radius in kilometers
+        :rtype: float
+        """
+        if self._propagation_model.distance_depends_on_rx_location():
+            return compute_radius_function()
+
+        container = protected_entity.container
+        revision = container.get_revision()
+        if self._protected_radius_cache_revisions.get(id(container),
+                                                      revision) != revision:
+            self.log.debug("Protected entities have changed; clearing the "
+                           "protected radius cache")
+            self._protected_radius_cache = {}
+            self._protected_radius_cache_revisions = {}
+        self._protected_radius_cache_revisions[id(container)] = revision
+
+        key = (id(protected_entity), self._propagation_model.__class__) + \
+            tuple(key)
+        try:
+            radius_km = self._protected_radius_cache[key]
+        except KeyError:
+            self._protected_radius_cache_misses += 1
+            radius_km = compute_radius_function()
+            self._protected_radius_cache[key] = radius_km
+        else:
+            self._protected_radius_cache_hits += 1
+        return radius_km
@@ -6,10 +6,12 @@ from protected_entities_plmrs import ProtectedEntitiesPLMRS
 from protected_entities_radio_astronomy_sites import ProtectedEntitiesRadioAstronomySites
 from propagation_model_fcurves import PropagationModelFcurves
 import helpers
+import collections
 from geopy.distance import vincenty
 from propagation_model import PropagationCurve
 from ruleset import Ruleset
 import data_map
+import numpy
 
 
 class RulesetFcc2012(Ruleset):
@@ -24,6 +26,10 @@ class RulesetFcc2012(Ruleset):
     _uhf_lower_frequency_mhz = 470      # US channel 14 (lower edge)
     _uhf_upper_frequency_mhz = 890      # US channel 83 (upper edge)
 
+    # Vectorized distances which are closer than this to a protection
+    # distance are recomputed with geopy to avoid rounding differences
+    _vectorized_distance_tolerance_km = 1e-9
+
     def name(self):
         return "FCC 2012 regulations"
 
@@ -78,6 +84,10 @@ class RulesetFcc2012(Ruleset):
         Determines the protected radius of the TV station in the direction of
         `device_location`.
 
+        The result is cached per station (see
+        :meth:`ruleset.Ruleset.get_protected_radius_cache_info`) unless the
+        propagation model's results depend on `device_location`.
+
         :param tv_station: the TV station of interest
         :type tv_station: \
             :class:`protected_entity_tv_station.ProtectedEntityTVStation`
@@ -89,23 +99,26 @@ class RulesetFcc2012(Ruleset):
         freq = tv_station.get_center_frequency()
 
         curve = self.get_tv_curve(tv_station.is_digital())
-        target_field_strength_dbu = self.get_tv_target_field_strength_dBu(
-            tv_station.is_digital(), freq)
-
         tv_location = tv_station.get_location()
 
-        desired_watts = self._propagation_model.dBu_to_Watts(
-            target_field_strength_dbu, freq)
-        tv_power_watts = tv_station.get_erp_watts()
-        pathloss_coefficient = desired_watts / tv_power_watts
-        protection_distance_km = \
-            self._propagation_model.get_distance(pathloss_coefficient,
-                                                 frequency=freq,
-                                                 tx_height=tv_station.get_haat_meters(),
-                                                 tx_location=tv_location,
-                                                 rx_location=device_location,
-                                                 curve_enum=curve)
-        return protection_distance_km
+        def compute_protected_radius_km():
+            target_field_strength_dbu = self.get_tv_target_field_strength_dBu(
+                tv_station.is_digital(), freq)
+
+            desired_watts = self._propagation_model.dBu_to_Watts(
+                target_field_strength_dbu, freq)
+            tv_power_watts = tv_station.get_erp_watts()
+            pathloss_coefficient = desired_watts / tv_power_watts
+            return self._propagation_model.get_distance(
+                pathloss_coefficient, frequency=freq,
+                tx_height=tv_station.get_haat_meters(),
+                tx_location=tv_location, rx_location=device_location,
+                curve_enum=curve)
+
+        key = (tv_location, freq, tv_station.is_digital(),
+               tv_station.get_erp_watts(), tv_station.get_haat_meters(), curve)
+        return self._get_cached_protected_radius_km(
+            tv_station, key, compute_protected_radius_km)
 
     def cochannel_tv_station_is_protected(self, tv_station, device_location,
                                           device_haat):
@@ -212,8 +225,11 @@ class RulesetFcc2012(Ruleset):
         tv_stations_container = region.get_protected_entities_of_type(
             ProtectedEntitiesTVStations, use_fallthrough_if_not_found=True)
 
-        # Check cochannel exclusions
-        cochannel_stations = tv_stations_container.get_list_of_entities_on_channel(device_channel)
+        # Check cochannel exclusions (only stations whose bounding box contains
+        # the location can be protected)
+        cochannel_stations = \
+            tv_stations_container.get_list_of_entities_near_location(
+                location, device_channel)
         for station in cochannel_stations:
             if self.cochannel_tv_station_is_protected(station, location, device_haat):
                 return False
@@ -228,7 +244,9 @@ class RulesetFcc2012(Ruleset):
             if not adj_chan in region.get_channel_list():
                 continue
             if helpers.channels_are_adjacent_in_frequency(region, adj_chan, device_channel):
-                adjacent_channel_stations += tv_stations_container.get_list_of_entities_on_channel(adj_chan)
+                adjacent_channel_stations += \
+                    tv_stations_container.get_list_of_entities_near_location(
+                        location, adj_chan)
 
         for station in adjacent_channel_stations:
             if self.adjacent_channel_tv_station_is_protected(station, location, device_haat):
@@ -333,8 +351,10 @@ class RulesetFcc2012(Ruleset):
         plmrs_container = region.get_protected_entities_of_type(
             ProtectedEntitiesPLMRS, use_fallthrough_if_not_found=True)
 
-        # Check cochannel exclusions
-        cochannel_plmrs = plmrs_container.get_list_of_entities_on_channel(device_channel)
+        # Check cochannel exclusions (only entities whose bounding box
+        # contains the location can be protected)
+        cochannel_plmrs = plmrs_container.get_list_of_entities_near_location(
+            location, device_channel)
         for plmrs_entry in cochannel_plmrs:
             if self.plmrs_is_protected(plmrs_entry, location, device_channel, region):
                 return False
@@ -345,7 +365,9 @@ class RulesetFcc2012(Ruleset):
             if not adj_chan in region.get_channel_list():
                 continue
             if helpers.channels_are_adjacent_in_frequency(region, adj_chan, device_channel):
-                adjacent_channel_plmrs += plmrs_container.get_list_of_entities_on_channel(adj_chan)
+                adjacent_channel_plmrs += \
+                    plmrs_container.get_list_of_entities_near_location(
+                        location, adj_chan)
 
         for plmrs_entry in adjacent_channel_plmrs:
             if self.plmrs_is_protected(plmrs_entry, location, device_channel, region):
@@ -385,7 +407,8 @@ class RulesetFcc2012(Ruleset):
         ras_container = region.get_protected_entities_of_type(
             ProtectedEntitiesRadioAstronomySites,
             use_fallthrough_if_not_found=True)
-        for ras_site in ras_container.list_of_entities():
+        for ras_site in ras_container.get_list_of_entities_near_location(
+                location):
             if self.radioastronomy_site_is_protected(ras_site, location):
                 return False
         return True
@@ -419,14 +442,11 @@ class RulesetFcc2012(Ruleset):
 
         # TODO: think about how to add wireless microphone protections (the 2 extra channels)
 
-        device_haat = device.get_haat()
-
         if not self._is_permissible_channel(region, channel, device):
             return False
 
         if not self.location_is_whitespace_tv_stations_only(region, location,
-                                                            channel,
-                                                            device_haat):
+                                                            channel, device):
             return False
 
         if not self.location_is_whitespace_plmrs_only(region, location,
@@ -439,6 +459,261 @@ class RulesetFcc2012(Ruleset):
 
         return True
 
+    def available_channels(self, region, locations, devices,
+                           channel_list=None, as_bitmask=False):
+        """
+        Batched implementation of
+        :meth:`ruleset.Ruleset.available_channels`: rather than checking
+        every channel at every point, each protected entity is visited once
+        and its exclusions are applied to all of the affected points and
+        channels at once. In particular, the protected radius of each TV
+        station is computed once and the distances to the points in its
+        bounding box are computed together (see
+        :meth:`_locations_within_distances_km`).
+
+        The results are identical to calling :meth:`location_is_whitespace`
+        for each point and channel, which is done regardless if the
+        protected radius of a TV station depends on the location (see
+        :meth:`propagation_model.PropagationModel.distance_depends_on_rx_location`).
+
+        Takes the same arguments as :meth:`ruleset.Ruleset.available_channels`.
+        """
+        if self._propagation_model.distance_depends_on_rx_location():
+            return super(RulesetFcc2012, self).available_channels(
+                region, locations, devices, channel_list=channel_list,
+                as_bitmask=as_bitmask)
+
+        (locations, devices, channel_list) = \
+            self._get_available_channels_arguments(region, locations, devices,
+                                                   channel_list, as_bitmask)
+        latitudes = locations[:, 0]
+        longitudes = locations[:, 1]
+        columns = dict((channel, column) for (column, channel) in
+                       enumerate(channel_list))
+
+        # Channel restrictions and separation distances only depend on the
+        # device
+        is_permissible_by_device = {}
+        separation_distances_km_by_haat = {}
+        is_evaluated = numpy.zeros((len(locations), len(channel_list)),
+                                   dtype=bool)
+        is_portable = numpy.zeros(len(locations), dtype=bool)
+        cochannel_separation_distances_km = numpy.zeros(len(locations))
+        adjacent_channel_separation_distances_km = numpy.zeros(len(locations))
+        for (point_index, device) in enumerate(devices):
+            if id(device) not in is_permissible_by_device:
+                is_permissible_by_device[id(device)] = [
+                    self._is_permissible_channel(region, channel, device)
+                    for channel in channel_list]
+            is_evaluated[point_index] = is_permissible_by_device[id(device)]
+
+            is_portable[point_index] = device.is_portable()
+            device_haat = 1 if device.is_portable() else device.get_haat()
+            if device_haat not in separation_distances_km_by_haat:
+                separation_distances_km_by_haat[device_haat] = (
+                    self.get_tv_cochannel_separation_distance_km(device_haat),
+                    self.get_tv_adjacent_channel_separation_distance_km(
+                        device_haat))
+            (cochannel_separation_distances_km[point_index],
+             adjacent_channel_separation_distances_km[point_index]) = \
+                separation_distances_km_by_haat[device_haat]
+        is_excluded = numpy.zeros(is_evaluated.shape, dtype=bool)
+
+        # Sorting the points by latitude lets us find those in a bounding box
+        # with a binary search
+        order = numpy.argsort(latitudes, kind="mergesort")
+        sorted_latitudes = latitudes[order]
+
+        def get_candidates(entity):
+            """Indices of the points which are in the bounding box of
+            ``entity`` and still need to be evaluated."""
+            bb = entity.get_bounding_box()
+            point_indices = order[
+                numpy.searchsorted(sorted_latitudes, bb['min_lat'],
+                                   side="left"):
+                numpy.searchsorted(sorted_latitudes, bb['max_lat'],
+                                   side="right")]
+            point_indices = point_indices[
+                (bb['min_lon'] <= longitudes[point_indices]) &
+                (longitudes[point_indices] <= bb['max_lon'])]
+            return point_indices[numpy.any(
+                is_evaluated[point_indices] & ~is_excluded[point_indices],
+                axis=1)]
+
+        def apply_exclusions(entity, get_columns_and_max_distances_km):
+            """Excludes the points around ``entity`` on the channels returned
+            by ``get_columns_and_max_distances_km(point_indices)`` (a list of
+            (columns, maximum distances in kilometers) pairs; the maximum
+            distances are given for each of the candidate points)."""
+            point_indices = get_candidates(entity)
+            if len(point_indices) == 0:
+                return
+
+            columns_and_max_distances_km = [
+                (entity_columns, max_distances_km) for
+                (entity_columns, max_distances_km) in
+                get_columns_and_max_distances_km(point_indices)
+                if entity_columns]
+            if not columns_and_max_distances_km:
+                return
+
+            are_within = self._locations_within_distances_km(
+                entity.get_location(), latitudes[point_indices],
+                longitudes[point_indices],
+                [max_distances_km for (_, max_distances_km) in
+                 columns_and_max_distances_km])
+            for ((entity_columns, _), is_within) in \
+                    zip(columns_and_max_distances_km, are_within):
+                is_excluded[numpy.ix_(point_indices[is_within],
+                                      entity_columns)] = True
+
+        # Radioastronomy sites are protected on all channels
+        all_columns = range(len(channel_list))
+        ras_container = region.get_protected_entities_of_type(
+            ProtectedEntitiesRadioAstronomySites,
+            use_fallthrough_if_not_found=True)
+        for ras_site in ras_container.list_of_entities():
+            if ras_site.is_point():
+                apply_exclusions(
+                    ras_site, lambda point_indices: [
+                        (all_columns,
+                         self.get_radioastronomy_site_exclusion_radius_km())])
+                continue
+
+            for point_index in get_candidates(ras_site):
+                if ras_site.location_in_protected_polygon(
+                        tuple(locations[point_index])):
+                    is_excluded[point_index] = True
+
+        # PLMRS entities are protected on their own and the first-adjacent
+        # channels
+        plmrs_container = region.get_protected_entities_of_type(
+            ProtectedEntitiesPLMRS, use_fallthrough_if_not_found=True)
+        for plmrs_entry in plmrs_container.list_of_entities():
+            plmrs_channel = plmrs_entry.get_channel()
+            if plmrs_channel not in region.get_channel_list():
+                continue
+            columns_and_max_distances_km = [
+                (self._get_adjacent_channel_indices(region, plmrs_channel,
+                                                    columns),
+                 self.get_plmrs_exclusion_radius_km(plmrs_entry.is_metro(),
+                                                    False))]
+            if plmrs_channel in columns:
+                columns_and_max_distances_km.append(
+                    ([columns[plmrs_channel]],
+                     self.get_plmrs_exclusion_radius_km(
+                         plmrs_entry.is_metro(), True)))
+            apply_exclusions(plmrs_entry,
+                             lambda point_indices: columns_and_max_distances_km)
+
+        # TV stations are protected on their own channel and, from fixed
+        # devices, on the first-adjacent channels
+        tv_stations_container = region.get_protected_entities_of_type(
+            ProtectedEntitiesTVStations, use_fallthrough_if_not_found=True)
+        for channel in region.get_channel_list():
+            cochannel_columns = [columns[channel]] if channel in columns \
+                else []
+            adjacent_columns = self._get_adjacent_channel_indices(
+                region, channel, columns)
+            if not cochannel_columns and not adjacent_columns:
+                continue
+
+            for station in \
+                    tv_stations_container.get_list_of_entities_on_channel(
+                        channel):
+                def get_columns_and_max_distances_km(point_indices):
+                    protection_distance_km = self.get_tv_protected_radius_km(
+                        station, tuple(locations[point_indices[0]]))
+                    # Portable devices are not subject to adjacent-channel
+                    # exclusions
+                    adjacent_max_distances_km = numpy.where(
+                        is_portable[point_indices], -numpy.inf,
+                        protection_distance_km +
+                        adjacent_channel_separation_distances_km[
+                            point_indices])
+                    return [(cochannel_columns, protection_distance_km +
+                             cochannel_separation_distances_km[
+                                 point_indices]),
+                            (adjacent_columns, adjacent_max_distances_km)]
+
+                apply_exclusions(station, get_columns_and_max_distances_km)
+
+        return self._format_available_channels(is_evaluated & ~is_excluded,
+                                               channel_list, as_bitmask)
+
+    def get_exclusion_distances_km(self, region, device):
+        """
+        Lists the protected entities of ``region`` together with the
+        distances within which each of them may be protected from
+        ``device`` (on some channel). Together with the entities' bounding
+        boxes, this bounds the areas in which the result of
+        :meth:`location_is_whitespace` can change: away from these
+        distances and bounding boxes, it is the same at all nearby
+        locations.
+
+        Radioastronomy sites which are polygons are listed with None
+        instead of distances since they are protected within their
+        bounding boxes.
+
+        .. note:: Requires a propagation model whose distances do not \
+            depend on the receiver location (see \
+            :meth:`propagation_model.PropagationModel.distance_depends_on_rx_location`).
+
+        :param region: region containing the protected entities
+        :type region: :class:`region.Region` object
+        :param device: the device which desires whitespace access
+        :type device: :class:`device.Device` object
+        :return: (entity, list of distances in kilometers or None) for each \
+            protected entity
+        :rtype: list of tuples
+        """
+        if self._propagation_model.distance_depends_on_rx_location():
+            raise ValueError("Exclusion distances are not defined when the "
+                             "protected radii depend on the location.")
+
+        exclusion_distances_km = []
+
+        ras_container = region.get_protected_entities_of_type(
+            ProtectedEntitiesRadioAstronomySites,
+            use_fallthrough_if_not_found=True)
+        for ras_site in ras_container.list_of_entities():
+            if ras_site.is_point():
+                exclusion_distances_km.append(
+                    (ras_site,
+                     [self.get_radioastronomy_site_exclusion_radius_km()]))
+            else:
+                exclusion_distances_km.append((ras_site, None))
+
+        plmrs_container = region.get_protected_entities_of_type(
+            ProtectedEntitiesPLMRS, use_fallthrough_if_not_found=True)
+        for plmrs_entry in plmrs_container.list_of_entities():
+            exclusion_distances_km.append(
+                (plmrs_entry,
+                 [self.get_plmrs_exclusion_radius_km(plmrs_entry.is_metro(),
+                                                     is_cochannel)
+                  for is_cochannel in [True, False]]))
+
+        if device.is_portable():
+            separation_distances_km = \
+                [self.get_tv_cochannel_separation_distance_km(1)]
+        else:
+            separation_distances_km = [
+                self.get_tv_cochannel_separation_distance_km(
+                    device.get_haat()),
+                self.get_tv_adjacent_channel_separation_distance_km(
+                    device.get_haat())]
+        tv_stations_container = region.get_protected_entities_of_type(
+            ProtectedEntitiesTVStations, use_fallthrough_if_not_found=True)
+        for station in tv_stations_container.list_of_entities():
+            protection_distance_km = self.get_tv_protected_radius_km(
+                station, station.get_location())
+            exclusion_distances_km.append(
+                (station, [protection_distance_km + separation_distance_km
+                           for separation_distance_km in
+                           separation_distances_km]))
+
+        return exclusion_distances_km
+
     def apply_all_protections_to_map(self, region, is_whitespace_datamap2d,
                                      channel, device,
                                      ignore_channel_restrictions=False,
@@ -486,6 +761,332 @@ class RulesetFcc2012(Ruleset):
         self.apply_plmrs_exclusions_to_map(region, is_whitespace_datamap2d, channel, verbose=verbose)
         self.apply_tv_exclusions_to_map(region, is_whitespace_datamap2d, channel, device, verbose=verbose)
 
+    def apply_all_protections_to_datamap3d(self, region,
+                                           is_whitespace_datamap3d, device,
+                                           ignore_channel_restrictions=False,
+                                           verbose=False, vectorized=True,
+                                           tv_margin_datamap3ds=None):
+        """
+        :class:`data_map.DataMap3D` counterpart of
+        :meth:`apply_all_protections_to_map`: each layer of
+        ``is_whitespace_datamap3d`` is described by a channel and is turned
+        into the whitespace availability map of that channel.
+
+        If ``vectorized`` is True, the whole DataMap3D is computed in a
+        single sweep over the protected entities rather than channel by
+        channel: each entity is visited once and its cochannel and
+        adjacent-channel exclusions are applied to all affected layers at
+        once. The results are identical to calling
+        :meth:`apply_all_protections_to_map` for each layer, which is done
+        regardless if the protected radius of a TV station depends on the
+        location (see
+        :meth:`propagation_model.PropagationModel.distance_depends_on_rx_location`).
+
+        .. note:: Any entries which are already `False` will not be evaluated.
+
+        :param region: region containing the protected entities
+        :type region: :class:`region.Region` object
+        :param is_whitespace_datamap3d: DataMap3D (one layer per channel) to \
+            be filled with the output
+        :type is_whitespace_datamap3d: :class:`data_map.DataMap3D` object
+        :param device: the device which desires whitespace access
+        :type device: :class:`device.Device` object
+        :param ignore_channel_restrictions: if True, skips checks relating to \
+            permissible channels of operation for the specified device
+        :type ignore_channel_restrictions: bool
+        :param verbose: if True, progress updates will be logged \
+            (level = INFO); otherwise, nothing will be logged
+        :type verbose: bool
+        :param vectorized: if True, uses the single-sweep computation when \
+            possible
+        :type vectorized: bool
+        :param tv_margin_datamap3ds: if given, the TV exclusions of the \
+            single-sweep computation are derived from these (cochannel, \
+            adjacent-channel) margin maps rather than from the TV stations; \
+            see :meth:`create_tv_margin_datamap3ds`
+        :type tv_margin_datamap3ds: tuple of :class:`data_map.DataMap3D` \
+            objects
+        :return: None
+        """
+        channel_list = is_whitespace_datamap3d.get_layer_descr_list()
+        if not channel_list:
+            return
+
+        if not vectorized or \
+                self._propagation_model.distance_depends_on_rx_location():
+            for channel in channel_list:
+                self.apply_all_protections_to_map(
+                    region, is_whitespace_datamap3d.get_layer(channel),
+                    channel, device,
+                    ignore_channel_restrictions=ignore_channel_restrictions,
+                    verbose=verbose)
+            return
+
+        if not ignore_channel_restrictions:
+            for channel in channel_list:
+                self.apply_channel_restrictions_to_map(
+                    region, is_whitespace_datamap3d.get_layer(channel),
+                    channel, device)
+
+        values = is_whitespace_datamap3d.mutable_array
+        layer_indices = dict((channel, layer_index) for (layer_index, channel)
+                             in enumerate(channel_list))
+        template_datamap2d = is_whitespace_datamap3d.get_layer(
+            channel_list[0])
+        latitudes = numpy.asarray(template_datamap2d.latitudes)
+        longitudes = numpy.asarray(template_datamap2d.longitudes)
+
+        # Entries which are already False are not evaluated
+        is_evaluated = numpy.array(values, dtype=bool)
+        is_excluded = numpy.zeros(values.shape, dtype=bool)
+
+        def apply_exclusions(entity, lat_slice, lon_slice, is_in_bounding_box,
+                             get_layers_and_max_distances_km):
+            """Excludes the pixels around ``entity`` in each of the layers
+            returned by ``get_layers_and_max_distances_km(location)`` (a list
+            of (layer indices, maximum distance in kilometers) pairs; the
+            location is that of one of the pixels in the bounding box)."""
+            is_candidate = is_in_bounding_box & numpy.any(
+                is_evaluated[:, lat_slice, lon_slice], axis=0)
+            (lat_indices, lon_indices) = numpy.nonzero(is_candidate)
+            if len(lat_indices) == 0:
+                return
+
+            candidate_latitudes = latitudes[lat_slice][lat_indices]
+            candidate_longitudes = longitudes[lon_slice][lon_indices]
+            layers_and_max_distances_km = [
+                (layers, max_distance_km) for (layers, max_distance_km) in
+                get_layers_and_max_distances_km((candidate_latitudes[0],
+                                                 candidate_longitudes[0]))
+                if layers]
+            if not layers_and_max_distances_km:
+                return
+
+            are_within = self._locations_within_distances_km(
+                entity.get_location(), candidate_latitudes,
+                candidate_longitudes,
+                [max_distance_km for (_, max_distance_km) in
+                 layers_and_max_distances_km])
+            for ((layers, _), is_within) in zip(layers_and_max_distances_km,
+                                                are_within):
+                for layer_index in layers:
+                    is_excluded[layer_index,
+                                lat_slice.start + lat_indices[is_within],
+                                lon_slice.start + lon_indices[is_within]] = \
+                        True
+
+        # Radioastronomy sites are protected on all channels
+        ras_container = region.get_protected_entities_of_type(
+            ProtectedEntitiesRadioAstronomySites,
+            use_fallthrough_if_not_found=True)
+        ras_sites = ras_container.list_of_entities()
+        if verbose:
+            self.log.info("Applying radioastronomy exclusions (%d sites)" %
+                          len(ras_sites))
+        all_layers = range(len(channel_list))
+        for (ras_site, (lat_slice, lon_slice, is_in_bounding_box)) in \
+                zip(ras_sites, self._get_bounding_box_windows(
+                    template_datamap2d, ras_sites)):
+            if ras_site.is_point():
+                apply_exclusions(
+                    ras_site, lat_slice, lon_slice, is_in_bounding_box,
+                    lambda location: [
+                        (all_layers,
+                         self.get_radioastronomy_site_exclusion_radius_km())])
+                continue
+
+            # The bounding box of a polygon is the protected region itself
+            for (lat_index, lon_index) in zip(*numpy.nonzero(
+                    is_in_bounding_box)):
+                location = (latitudes[lat_slice][lat_index],
+                            longitudes[lon_slice][lon_index])
+                if ras_site.location_in_protected_polygon(location):
+                    is_excluded[:, lat_slice.start + lat_index,
+                                lon_slice.start + lon_index] = True
+
+        # PLMRS entities are protected on their own and the first-adjacent
+        # channels
+        plmrs_container = region.get_protected_entities_of_type(
+            ProtectedEntitiesPLMRS, use_fallthrough_if_not_found=True)
+        plmrs_entries = [entry for entry in plmrs_container.list_of_entities()
+                         if entry.get_channel() in region.get_channel_list()]
+        if verbose:
+            self.log.info("Applying PLMRS exclusions (%d entities)" %
+                          len(plmrs_entries))
+        for (plmrs_entry, (lat_slice, lon_slice, is_in_bounding_box)) in \
+                zip(plmrs_entries, self._get_bounding_box_windows(
+                    template_datamap2d, plmrs_entries)):
+            plmrs_channel = plmrs_entry.get_channel()
+            layers_and_max_distances_km = [
+                (self._get_adjacent_channel_indices(region, plmrs_channel,
+                                                    layer_indices),
+                 self.get_plmrs_exclusion_radius_km(plmrs_entry.is_metro(),
+                                                    False))]
+            if plmrs_channel in layer_indices:
+                layers_and_max_distances_km.append(
+                    ([layer_indices[plmrs_channel]],
+                     self.get_plmrs_exclusion_radius_km(
+                         plmrs_entry.is_metro(), True)))
+            apply_exclusions(plmrs_entry, lat_slice, lon_slice,
+                             is_in_bounding_box,
+                             lambda location: layers_and_max_distances_km)
+
+        if tv_margin_datamap3ds is not None:
+            self._apply_tv_margins_to_exclusions(
+                region, device, is_whitespace_datamap3d, tv_margin_datamap3ds,
+                is_evaluated, is_excluded)
+            values[is_evaluated] = ~is_excluded[is_evaluated]
+            return
+
+        # TV stations are protected on their own channel and, from fixed
+        # devices, on the first-adjacent channels
+        if device.is_portable():
+            device_haat = 1
+        else:
+            device_haat = device.get_haat()
+        cochannel_separation_distance_km = \
+            self.get_tv_cochannel_separation_distance_km(device_haat)
+        adjacent_channel_separation_distance_km = \
+            self.get_tv_adjacent_channel_separation_distance_km(device_haat)
+
+        tv_stations_container = region.get_protected_entities_of_type(
+            ProtectedEntitiesTVStations, use_fallthrough_if_not_found=True)
+        tv_stations = []
+        for channel in region.get_channel_list():
+            tv_stations += tv_stations_container\
+                .get_list_of_entities_on_channel(channel)
+        if verbose:
+            self.log.info("Applying TV exclusions (%d stations)" %
+                          len(tv_stations))
+        for (station, (lat_slice, lon_slice, is_in_bounding_box)) in \
+                zip(tv_stations, self._get_bounding_box_windows(
+                    template_datamap2d, tv_stations)):
+            station_channel = station.get_channel()
+            cochannel_layers = [layer_indices[station_channel]] if \
+                station_channel in layer_indices else []
+            if device.is_portable():
+                adjacent_layers = []
+            else:
+                adjacent_layers = self._get_adjacent_channel_indices(
+                    region, station_channel, layer_indices)
+            if not cochannel_layers and not adjacent_layers:
+                continue
+
+            def get_layers_and_max_distances_km(location):
+                protection_distance_km = self.get_tv_protected_radius_km(
+                    station, location)
+                return [(cochannel_layers, protection_distance_km +
+                         cochannel_separation_distance_km),
+                        (adjacent_layers, protection_distance_km +
+                         adjacent_channel_separation_distance_km)]
+
+            apply_exclusions(station, lat_slice, lon_slice,
+                             is_in_bounding_box,
+                             get_layers_and_max_distances_km)
+
+        values[is_evaluated] = ~is_excluded[is_evaluated]
+
+    def update_whitespace_datamap3d(self, region, is_whitespace_datamap3d,
+                                    is_in_region_datamap2d, device,
+                                    changed_entities,
+                                    ignore_channel_restrictions=False,
+                                    verbose=False):
+        """
+        Updates a whitespace map created by
+        :meth:`apply_all_protections_to_datamap3d` (starting from
+        ``is_in_region_datamap2d``) after some of the protected entities of
+        ``region`` have been added, removed or modified. Only the pixels in
+        the bounding boxes of the changed entities are recomputed, and only
+        on the layers of the channels that they may protect (their own and
+        the first-adjacent channels; all channels for radioastronomy sites).
+        The result is identical to recomputing the whole map.
+
+        ``region`` must already contain the new set of protected entities.
+        A modified entity must be listed both as it was and as it is now
+        (e.g. as a removed entity and an added entity) since either version
+        may determine which pixels are affected.
+
+        :param region: region containing the (updated) protected entities
+        :type region: :class:`region.Region` object
+        :param is_whitespace_datamap3d: DataMap3D (one layer per channel) to \
+            be updated
+        :type is_whitespace_datamap3d: :class:`data_map.DataMap3D` object
+        :param is_in_region_datamap2d: the map with which \
+            ``is_whitespace_datamap3d`` was initialized
+        :type is_in_region_datamap2d: :class:`data_map.DataMap2D` object
+        :param device: the device for which ``is_whitespace_datamap3d`` \
+            was computed
+        :type device: :class:`device.Device` object
+        :param changed_entities: the entities which were added, removed or \
+            modified
+        :type changed_entities: list of \
+            :class:`protected_entity.ProtectedEntity` objects
+        :param ignore_channel_restrictions: the value given to \
+            :meth:`apply_all_protections_to_datamap3d`
+        :type ignore_channel_restrictions: bool
+        :param verbose: if True, progress updates will be logged \
+            (level = INFO); otherwise, nothing will be logged
+        :type verbose: bool
+        :return: None
+        """
+        channel_list = is_whitespace_datamap3d.get_layer_descr_list()
+        layer_indices = dict((channel, layer_index) for (layer_index, channel)
+                             in enumerate(channel_list))
+        if not is_in_region_datamap2d.datamap_is_comparable(
+                is_whitespace_datamap3d.get_layer(channel_list[0]))[0]:
+            raise ValueError("The region map does not match the whitespace "
+                             "map.")
+
+        # Windows (in the grid of the map) to be recomputed on each layer
+        windows_by_layer = collections.defaultdict(list)
+        for (entity, (lat_slice, lon_slice, _)) in zip(
+                changed_entities, self._get_bounding_box_windows(
+                    is_in_region_datamap2d, changed_entities)):
+            if lat_slice.start == lat_slice.stop or \
+                    lon_slice.start == lon_slice.stop:
+                continue
+            if isinstance(entity, ProtectedEntityRadioAstronomySite):
+                layers = range(len(channel_list))
+            else:
+                entity_channel = entity.get_channel()
+                layers = self._get_adjacent_channel_indices(
+                    region, entity_channel, layer_indices)
+                if entity_channel in layer_indices:
+                    layers.append(layer_indices[entity_channel])
+            for layer_index in layers:
+                windows_by_layer[layer_index].append((lat_slice, lon_slice))
+        if not windows_by_layer:
+            return
+
+        # The affected layers are recomputed on the grid of the map (rather
+        # than on submaps, whose coordinates may differ by rounding) but
+        # only the pixels in the windows are evaluated
+        affected_layers = sorted(windows_by_layer)
+        affected_datamap3d = data_map.DataMap3D.from_DataMap2D(
+            is_in_region_datamap2d,
+            [channel_list[layer_index] for layer_index in affected_layers],
+            dtype=is_whitespace_datamap3d.mutable_array.dtype)
+        is_in_windows = numpy.zeros(affected_datamap3d.mutable_array.shape,
+                                    dtype=bool)
+        for (affected_index, layer_index) in enumerate(affected_layers):
+            for (lat_slice, lon_slice) in windows_by_layer[layer_index]:
+                is_in_windows[affected_index, lat_slice, lon_slice] = True
+        affected_datamap3d.mutable_array[~is_in_windows] = 0
+        if verbose:
+            self.log.info("Recomputing %d pixels on %d layers" %
+                          (numpy.sum(is_in_windows), len(affected_layers)))
+
+        self.apply_all_protections_to_datamap3d(
+            region, affected_datamap3d, device,
+            ignore_channel_restrictions=ignore_channel_restrictions,
+            verbose=verbose)
+
+        for (affected_index, layer_index) in enumerate(affected_layers):
+            is_in_layer_windows = is_in_windows[affected_index]
+            is_whitespace_datamap3d.mutable_array[layer_index][
+                is_in_layer_windows] = affected_datamap3d.mutable_array[
+                affected_index][is_in_layer_windows]
+
     def apply_entity_protections_to_map(self, region, is_whitespace_datamap2d,
                                         channel, device,
                                         protected_entities_list,
@@ -542,8 +1143,6 @@ class RulesetFcc2012(Ruleset):
             self.apply_channel_restrictions_to_map(region, is_whitespace_datamap2d, channel, device)
 
         def update_function(latitude, longitude, latitude_index, longitude_index, currently_whitespace):
-            if not currently_whitespace:       # already known to not be whitespace
-                return None
 
             location = (latitude, longitude)
 
@@ -577,7 +1176,9 @@ class RulesetFcc2012(Ruleset):
 
             return location_is_whitespace
 
-        is_whitespace_datamap2d.update_all_values_via_function(update_function, verbose=verbose)
+        is_whitespace_datamap2d.update_all_values_via_function(
+            update_function, verbose=verbose,
+            only_where=is_whitespace_datamap2d)
 
     def apply_channel_restrictions_to_map(self, region,
                                           is_whitespace_datamap2d, channel, device):
@@ -603,7 +1204,8 @@ class RulesetFcc2012(Ruleset):
             is_whitespace_datamap2d.reset_all_values(False)
 
     def apply_tv_exclusions_to_map(self, region, is_whitespace_datamap2d,
-                                   channel, device, verbose=False):
+                                   channel, device, verbose=False,
+                                   vectorized=True):
         """
         Applies TV exclusions to the given :class:`data_map.DataMap2D`.
         Entries will be marked `True` if they are whitespace and `False`
@@ -611,6 +1213,14 @@ class RulesetFcc2012(Ruleset):
 
         .. note:: Any entries which are already `False` will not be evaluated.
 
+        If ``vectorized`` is True, the exclusions are computed station by
+        station rather than pixel by pixel (see
+        :meth:`_apply_tv_exclusions_to_map_vectorized`). The results are
+        identical. The per-pixel computation is used regardless if the
+        protected radius of a station depends on the pixel's location (see
+        :meth:`propagation_model.PropagationModel.distance_depends_on_rx_location`)
+        or if the map is not a :class:`data_map.DataMap2D`.
+
         :param region: region containing the protected entities
         :type region: :class:`region.Region` object
         :param is_whitespace_datamap2d: DataMap2D to be filled with the output
@@ -622,12 +1232,21 @@ class RulesetFcc2012(Ruleset):
         :param verbose: if True, progress updates will be logged \
             (level = INFO); otherwise, nothing will be logged
         :type verbose: bool
+        :param vectorized: if True, uses the station-centric computation when \
+            possible
+        :type vectorized: bool
         :return: None
         """
+        if vectorized and \
+                isinstance(is_whitespace_datamap2d, data_map.DataMap2D) and \
+                not self._propagation_model.distance_depends_on_rx_location():
+            self._apply_tv_exclusions_to_map_vectorized(
+                region, is_whitespace_datamap2d, channel, device,
+                verbose=verbose)
+            return
+
         def tv_station_update_function(latitude, longitude, latitude_index,
                                        longitude_index, currently_whitespace):
-            if not currently_whitespace:       # already known to not be whitespace
-                return None
             return self.location_is_whitespace_tv_stations_only(region,
                                                                 (latitude,
                                                                  longitude),
@@ -636,7 +1255,506 @@ class RulesetFcc2012(Ruleset):
 
         if verbose:
             self.log.info("Applying TV exclusions")
-        is_whitespace_datamap2d.update_all_values_via_function(tv_station_update_function, verbose=verbose)
+        is_whitespace_datamap2d.update_all_values_via_function(
+            tv_station_update_function, verbose=verbose,
+            only_where=is_whitespace_datamap2d)
+
+    def _get_tv_stations_and_separation_distances_km(self, region, channel,
+                                                     device):
+        """
+        Lists the TV stations which are protected from a ``device`` on
+        ``channel`` together with the separation distance that applies to
+        each of them; see :meth:`location_is_whitespace_tv_stations_only`.
+
+        :return: (station, separation distance in kilometers) for each \
+            cochannel station followed by each adjacent-channel station
+        :rtype: list of tuples
+        """
+        if device.is_portable():
+            device_haat = 1
+        else:
+            device_haat = device.get_haat()
+
+        tv_stations_container = region.get_protected_entities_of_type(
+            ProtectedEntitiesTVStations, use_fallthrough_if_not_found=True)
+
+        cochannel_separation_distance_km = \
+            self.get_tv_cochannel_separation_distance_km(device_haat)
+        stations_and_separation_distances_km = [
+            (station, cochannel_separation_distance_km) for station in
+            tv_stations_container.get_list_of_entities_on_channel(channel)]
+
+        # Portable devices are not subject to adjacent-channel exclusions
+        if device.is_portable():
+            return stations_and_separation_distances_km
+
+        adjacent_channel_separation_distance_km = \
+            self.get_tv_adjacent_channel_separation_distance_km(device_haat)
+        for adj_chan in [channel-1, channel+1]:
+            if not adj_chan in region.get_channel_list():
+                continue
+            if helpers.channels_are_adjacent_in_frequency(region, adj_chan,
+                                                          channel):
+                stations_and_separation_distances_km += [
+                    (station, adjacent_channel_separation_distance_km)
+                    for station in
+                    tv_stations_container.get_list_of_entities_on_channel(
+                        adj_chan)]
+
+        return stations_and_separation_distances_km
+
+    def _get_bounding_box_windows(self, datamap2d, protected_entities):
+        """
+        Determines, for each protected entity, the window of ``datamap2d``
+        which covers the entity's bounding box.
+
+        :param datamap2d: the map whose grid is used
+        :type datamap2d: :class:`data_map.DataMap2D`
+        :param protected_entities: the protected entities
+        :type protected_entities: list of \
+            :class:`protected_entity.ProtectedEntity` objects
+        :return: (latitude slice, longitude slice, is_in_bounding_box) for \
+            each entity, where is_in_bounding_box is an array of bools with \
+            the shape of the window which applies the same test as \
+            :meth:`protected_entity.ProtectedEntity.location_in_bounding_box`
+        :rtype: list of tuples
+        """
+        if not protected_entities:
+            return []
+
+        latitudes = numpy.asarray(datamap2d.latitudes)
+        longitudes = numpy.asarray(datamap2d.longitudes)
+        bounding_boxes = [entity.get_bounding_box() for entity in
+                          protected_entities]
+        windows = datamap2d.get_submap_index_windows(
+            [(bb['min_lat'], bb['max_lat']) for bb in bounding_boxes],
+            [(bb['min_lon'], bb['max_lon']) for bb in bounding_boxes],
+            generate_even_if_submap_partially_outside_datamap=True)
+
+        bounding_box_windows = []
+        for (bb, window) in zip(bounding_boxes, windows):
+            (lat_start, lat_stop, lon_start, lon_stop) = \
+                [int(index) for index in window]
+            window_latitudes = latitudes[lat_start:lat_stop]
+            window_longitudes = longitudes[lon_start:lon_stop]
+
+            # The window may extend slightly beyond the bounding box
+            is_in_bounding_box = (
+                ((bb['min_lat'] <= window_latitudes) &
+                 (window_latitudes <= bb['max_lat'])).reshape(-1, 1) &
+                ((bb['min_lon'] <= window_longitudes) &
+                 (window_longitudes <= bb['max_lon'])).reshape(1, -1))
+            bounding_box_windows.append((slice(lat_start, lat_stop),
+                                         slice(lon_start, lon_stop),
+                                         is_in_bounding_box))
+        return bounding_box_windows
+
+    def _get_adjacent_channel_indices(self, region, channel, indices):
+        """
+        Returns the indices (given by ``indices``, a dictionary from channel
+        to index) of the channels which are first-adjacent in frequency to
+        ``channel``.
+        """
+        return [indices[adj_chan] for adj_chan in [channel-1, channel+1]
+                if adj_chan in indices and
+                helpers.channels_are_adjacent_in_frequency(region, adj_chan,
+                                                           channel)]
+
+    def create_tv_margin_datamap3ds(self, region, is_in_region_datamap2d,
+                                    channel_list=None, verbose=False):
+        """
+        Creates the TV "margin" maps from which the TV exclusions of any
+        device (whatever its HAAT and whether it is portable) can be derived
+        by thresholding rather than by visiting the TV stations again; see
+        the ``tv_margin_datamap3ds`` argument of
+        :meth:`apply_all_protections_to_datamap3d`.
+
+        For each channel, the cochannel margin of a pixel is the minimum
+        over the TV stations on that channel (whose bounding box contains
+        the pixel) of the distance to the station minus its protected
+        radius. The adjacent-channel margin is the same minimum over the
+        stations on the first-adjacent channels. A device is excluded from a
+        channel by TV stations if and only if one of the margins does not
+        exceed the corresponding separation distance (see
+        :meth:`get_tv_cochannel_separation_distance_km` and
+        :meth:`get_tv_adjacent_channel_separation_distance_km`).
+
+        Pixels which are not near any such station have an infinite margin.
+        Pixels which are False in ``is_in_region_datamap2d`` are not
+        evaluated and are NaN.
+
+        .. note:: Requires a propagation model whose distances do not \
+            depend on the receiver location (see \
+            :meth:`propagation_model.PropagationModel.distance_depends_on_rx_location`).
+
+        :param region: region containing the TV stations
+        :type region: :class:`region.Region` object
+        :param is_in_region_datamap2d: map of the pixels to be evaluated
+        :type is_in_region_datamap2d: :class:`data_map.DataMap2D` object
+        :param channel_list: channels of the layers (by default, \
+            :meth:`region.Region.get_tvws_channel_list`)
+        :type channel_list: list of ints
+        :param verbose: if True, progress updates will be logged \
+            (level = INFO); otherwise, nothing will be logged
+        :type verbose: bool
+        :return: (cochannel margins, adjacent-channel margins) in kilometers
+        :rtype: tuple of :class:`data_map.DataMap3D` objects
+        """
+        if self._propagation_model.distance_depends_on_rx_location():
+            raise ValueError("TV margins are not defined when the protected "
+                             "radii depend on the location.")
+        if channel_list is None:
+            channel_list = region.get_tvws_channel_list()
+
+        layer_indices = dict((channel, layer_index) for (layer_index, channel)
+                             in enumerate(channel_list))
+        is_in_region = numpy.asarray(is_in_region_datamap2d.mutable_matrix,
+                                     dtype=bool)
+
+        margin_datamap3ds = tuple(
+            data_map.DataMap3D.from_DataMap2D(is_in_region_datamap2d,
+                                              channel_list, dtype=float)
+            for _ in range(2))
+        for margin_datamap3d in margin_datamap3ds:
+            margin_datamap3d.mutable_array[:] = numpy.where(
+                is_in_region, numpy.inf, numpy.nan)
+        (cochannel_margins, adjacent_channel_margins) = \
+            [margin_datamap3d.mutable_array for margin_datamap3d in
+             margin_datamap3ds]
+
+        self._lower_tv_margins(region, is_in_region_datamap2d, layer_indices,
+                               (cochannel_margins, adjacent_channel_margins),
+                               verbose=verbose)
+
+        return margin_datamap3ds
+
+    def update_tv_margin_datamap3ds(self, region, tv_margin_datamap3ds,
+                                    is_in_region_datamap2d, changed_entities,
+                                    verbose=False):
+        """
+        Updates the TV margin maps created by
+        :meth:`create_tv_margin_datamap3ds` (from ``is_in_region_datamap2d``)
+        after some of the TV stations of ``region`` have been added, removed
+        or modified. Only the pixels in the bounding boxes of the changed
+        stations are recomputed, and only on the layers to which they
+        contribute (the cochannel margins of their own channel and the
+        adjacent-channel margins of the first-adjacent channels). The result
+        is identical to creating the maps again.
+
+        ``region`` must already contain the new set of TV stations. A
+        modified station must be listed both as it was and as it is now.
+        Other protected entities do not affect the margins and are ignored.
+
+        :param region: region containing the (updated) TV stations
+        :type region: :class:`region.Region` object
+        :param tv_margin_datamap3ds: (cochannel margins, adjacent-channel \
+            margins) to be updated
+        :type tv_margin_datamap3ds: tuple of :class:`data_map.DataMap3D` \
+            objects
+        :param is_in_region_datamap2d: the map from which the margin maps \
+            were created
+        :type is_in_region_datamap2d: :class:`data_map.DataMap2D` object
+        :param changed_entities: the entities which were added, removed or \
+            modified
+        :type changed_entities: list of \
+            :class:`protected_entity.ProtectedEntity` objects
+        :param verbose: if True, progress updates will be logged \
+            (level = INFO); otherwise, nothing will be logged
+        :type verbose: bool
+        :return: None
+        """
+        if self._propagation_model.distance_depends_on_rx_location():
+            raise ValueError("TV margins are not defined when the protected "
+                             "radii depend on the location.")
+        channel_list = tv_margin_datamap3ds[0].get_layer_descr_list()
+        for margin_datamap3d in tv_margin_datamap3ds:
+            if margin_datamap3d.get_layer_descr_list() != channel_list or \
+                    not is_in_region_datamap2d.datamap_is_comparable(
+                        margin_datamap3d.get_layer(channel_list[0]))[0]:
+                raise ValueError("The region map does not match the TV "
+                                 "margin maps.")
+        layer_indices = dict((channel, layer_index) for (layer_index, channel)
+                             in enumerate(channel_list))
+        is_in_region = numpy.asarray(is_in_region_datamap2d.mutable_matrix,
+                                     dtype=bool)
+        (cochannel_margins, adjacent_channel_margins) = \
+            [margin_datamap3d.mutable_array for margin_datamap3d in
+             tv_margin_datamap3ds]
+
+        # Entries (cochannel and adjacent-channel) to be recomputed
+        is_updated = numpy.zeros((2,) + cochannel_margins.shape, dtype=bool)
+        changed_stations = [entity for entity in changed_entities
+                            if isinstance(entity, ProtectedEntityTVStation)]
+        for (station, (lat_slice, lon_slice, is_in_bounding_box)) in \
+                zip(changed_stations, self._get_bounding_box_windows(
+                    is_in_region_datamap2d, changed_stations)):
+            station_channel = station.get_channel()
+            if station_channel in layer_indices:
+                is_updated[0, layer_indices[station_channel], lat_slice,
+                           lon_slice] |= is_in_bounding_box
+            for layer_index in self._get_adjacent_channel_indices(
+                    region, station_channel, layer_indices):
+                is_updated[1, layer_index, lat_slice,
+                           lon_slice] |= is_in_bounding_box
+        is_updated &= is_in_region
+        if not numpy.any(is_updated):
+            return
+        if verbose:
+            self.log.info("Recomputing %d TV margins" % numpy.sum(is_updated))
+
+        cochannel_margins[is_updated[0]] = numpy.inf
+        adjacent_channel_margins[is_updated[1]] = numpy.inf
+        self._lower_tv_margins(region, is_in_region_datamap2d, layer_indices,
+                               (cochannel_margins, adjacent_channel_margins),
+                               is_updated=is_updated)
+
+    def _lower_tv_margins(self, region, is_in_region_datamap2d, layer_indices,
+                          margin_arrays, is_updated=None, verbose=False):
+        """
+        Lowers the margins in ``margin_arrays`` (the cochannel and
+        adjacent-channel margins; see :meth:`create_tv_margin_datamap3ds`)
+        to those of each TV station of ``region``. Only the pixels which are
+        True in ``is_in_region_datamap2d`` are evaluated.
+
+        If ``is_updated`` (an array of bools whose first axis selects the
+        cochannel or adjacent-channel margins) is given, only its True
+        entries are changed and the stations which contribute to none of
+        them are skipped.
+        """
+        latitudes = numpy.asarray(is_in_region_datamap2d.latitudes)
+        longitudes = numpy.asarray(is_in_region_datamap2d.longitudes)
+        is_in_region = numpy.asarray(is_in_region_datamap2d.mutable_matrix,
+                                     dtype=bool)
+
+        tv_stations_container = region.get_protected_entities_of_type(
+            ProtectedEntitiesTVStations, use_fallthrough_if_not_found=True)
+        tv_stations = []
+        for channel in region.get_channel_list():
+            tv_stations += tv_stations_container\
+                .get_list_of_entities_on_channel(channel)
+        if verbose:
+            self.log.info("Computing TV margins (%d stations)" %
+                          len(tv_stations))
+
+        for (station, (lat_slice, lon_slice, is_in_bounding_box)) in \
+                zip(tv_stations, self._get_bounding_box_windows(
+                    is_in_region_datamap2d, tv_stations)):
+            station_channel = station.get_channel()
+            layers_and_margin_indices = [
+                (self._get_adjacent_channel_indices(region, station_channel,
+                                                    layer_indices), 1)]
+            if station_channel in layer_indices:
+                layers_and_margin_indices.append(
+                    ([layer_indices[station_channel]], 0))
+            if not any(layers for (layers, _) in layers_and_margin_indices):
+                continue
+
+            is_candidate = is_in_bounding_box & is_in_region[lat_slice,
+                                                             lon_slice]
+            if is_updated is not None:
+                is_candidate &= numpy.any(numpy.concatenate(
+                    [is_updated[margin_index, layers, lat_slice, lon_slice]
+                     for (layers, margin_index) in
+                     layers_and_margin_indices]), axis=0)
+            (lat_indices, lon_indices) = numpy.nonzero(is_candidate)
+            if len(lat_indices) == 0:
+                continue
+            candidate_latitudes = latitudes[lat_slice][lat_indices]
+            candidate_longitudes = longitudes[lon_slice][lon_indices]
+            protection_distance_km = self.get_tv_protected_radius_km(
+                station, (candidate_latitudes[0], candidate_longitudes[0]))
+            station_margins = helpers.vincenty_distances_km(
+                station.get_location(), candidate_latitudes,
+                candidate_longitudes) - protection_distance_km
+
+            rows = lat_slice.start + lat_indices
+            columns = lon_slice.start + lon_indices
+            for (layers, margin_index) in layers_and_margin_indices:
+                margins = margin_arrays[margin_index]
+                for layer_index in layers:
+                    if is_updated is None:
+                        entries = slice(None)
+                    else:
+                        entries = is_updated[margin_index, layer_index, rows,
+                                             columns]
+                    margins[layer_index, rows[entries], columns[entries]] = \
+                        numpy.minimum(margins[layer_index, rows[entries],
+                                              columns[entries]],
+                                      station_margins[entries])
+
+    def _apply_tv_margins_to_exclusions(self, region, device,
+                                        is_whitespace_datamap3d,
+                                        tv_margin_datamap3ds, is_evaluated,
+                                        is_excluded):
+        """
+        Marks the entries of ``is_excluded`` (an array with the shape of
+        ``is_whitespace_datamap3d``) which are excluded by TV stations
+        according to ``tv_margin_datamap3ds`` (see
+        :meth:`create_tv_margin_datamap3ds`). Only the entries which are
+        True in ``is_evaluated`` are considered.
+
+        Margins which are too close to a separation distance to be decided
+        despite floating-point rounding are decided by
+        :meth:`location_is_whitespace_tv_stations_only` so that the results
+        are identical to those of the TV stations themselves. The tolerance
+        grows with the precision of the margins' data type (e.g. float32).
+        """
+        channel_list = is_whitespace_datamap3d.get_layer_descr_list()
+        template_datamap2d = is_whitespace_datamap3d.get_layer(
+            channel_list[0])
+        for margin_datamap3d in tv_margin_datamap3ds:
+            if margin_datamap3d.get_layer_descr_list() != channel_list or \
+                    not template_datamap2d.datamap_is_comparable(
+                        margin_datamap3d.get_layer(channel_list[0]))[0]:
+                raise ValueError("The TV margin maps do not match the "
+                                 "whitespace map.")
+        (cochannel_margins, adjacent_channel_margins) = \
+            [margin_datamap3d.mutable_array for margin_datamap3d in
+             tv_margin_datamap3ds]
+        if numpy.any(numpy.isnan(cochannel_margins[is_evaluated])):
+            raise ValueError("The TV margin maps do not cover all of the "
+                             "pixels to be evaluated.")
+
+        if device.is_portable():
+            device_haat = 1
+        else:
+            device_haat = device.get_haat()
+        margins_and_separation_distances_km = [
+            (cochannel_margins,
+             self.get_tv_cochannel_separation_distance_km(device_haat))]
+        # Portable devices are not subject to adjacent-channel exclusions
+        if not device.is_portable():
+            margins_and_separation_distances_km.append(
+                (adjacent_channel_margins,
+                 self.get_tv_adjacent_channel_separation_distance_km(
+                     device_haat)))
+
+        is_tv_excluded = numpy.zeros(is_excluded.shape, dtype=bool)
+        is_undecided = numpy.zeros(is_excluded.shape, dtype=bool)
+        with numpy.errstate(invalid="ignore"):
+            for (margins, separation_distance_km) in \
+                    margins_and_separation_distances_km:
+                # Margins may have been rounded to a lower precision
+                tolerance_km = self._vectorized_distance_tolerance_km + \
+                    numpy.finfo(margins.dtype).eps * \
+                    abs(separation_distance_km)
+                is_tv_excluded |= margins <= separation_distance_km
+                is_undecided |= numpy.abs(margins - separation_distance_km) <= \
+                    tolerance_km
+        is_undecided &= is_evaluated & ~is_excluded
+        is_excluded |= is_tv_excluded & is_evaluated & ~is_undecided
+
+        latitudes = template_datamap2d.latitudes
+        longitudes = template_datamap2d.longitudes
+        for (layer_index, lat_index, lon_index) in \
+                zip(*numpy.nonzero(is_undecided)):
+            is_excluded[layer_index, lat_index, lon_index] = \
+                not self.location_is_whitespace_tv_stations_only(
+                    region, (latitudes[lat_index], longitudes[lon_index]),
+                    channel_list[layer_index], device)
+
+    def _locations_within_distances_km(self, location, latitudes, longitudes,
+                                       max_distances_km):
+        """
+        Vectorized counterpart of ``vincenty(location, (latitude,
+        longitude)).kilometers <= max_distance_km`` for several points and
+        maximum distances. The distances are computed once (see
+        :func:`helpers.vincenty_distances_km`); those which are too close to
+        a maximum distance to be decided despite floating-point rounding are
+        recomputed with :class:`geopy.distance.vincenty` so that the results
+        are identical.
+
+        :param location: (latitude, longitude)
+        :type location: tuple of floats
+        :param latitudes: latitude of each point
+        :type latitudes: :class:`numpy.ndarray` of floats
+        :param longitudes: longitude of each point
+        :type longitudes: :class:`numpy.ndarray` of floats
+        :param max_distances_km: maximum distances in kilometers; each of \
+            them is either a single distance or an array with one distance \
+            per point
+        :type max_distances_km: list of floats or :class:`numpy.ndarray` \
+            objects
+        :return: for each maximum distance, an array of bools which is True \
+            for the points within that distance
+        :rtype: list of :class:`numpy.ndarray` objects
+        """
+        distances_km = helpers.vincenty_distances_km(location, latitudes,
+                                                     longitudes)
+        results = []
+        for max_distance_km in max_distances_km:
+            max_distance_km = numpy.zeros(distances_km.shape) + max_distance_km
+            is_within = distances_km <= max_distance_km
+            for index in numpy.nonzero(
+                    numpy.abs(distances_km - max_distance_km) <=
+                    self._vectorized_distance_tolerance_km)[0]:
+                is_within[index] = vincenty(
+                    location, (latitudes[index], longitudes[index])
+                ).kilometers <= max_distance_km[index]
+            results.append(is_within)
+        return results
+
+    def _apply_tv_exclusions_to_map_vectorized(self, region,
+                                               is_whitespace_datamap2d,
+                                               channel, device,
+                                               verbose=False):
+        """
+        Station-centric counterpart of :meth:`apply_tv_exclusions_to_map`.
+        Rather than checking every station for every pixel, each station is
+        visited once: the distances to all pixels in its bounding box are
+        computed at once (see :func:`helpers.vincenty_distances_km`) and the
+        pixels within the protected radius plus the separation distance are
+        excluded.
+
+        Since the protected radius is computed once per station, this
+        requires a propagation model whose results do not depend on the
+        receiver's location. The results are identical to the per-pixel
+        computation (see :meth:`_locations_within_distances_km`).
+
+        Takes the same arguments as :meth:`apply_tv_exclusions_to_map`.
+        """
+        matrix = is_whitespace_datamap2d.mutable_matrix
+        latitudes = numpy.asarray(is_whitespace_datamap2d.latitudes)
+        longitudes = numpy.asarray(is_whitespace_datamap2d.longitudes)
+
+        # Entries which are already False are not evaluated
+        is_evaluated = numpy.asarray(matrix, dtype=bool)
+        is_excluded = numpy.zeros(matrix.shape, dtype=bool)
+
+        stations_and_separation_distances_km = \
+            self._get_tv_stations_and_separation_distances_km(region, channel,
+                                                              device)
+        if verbose:
+            self.log.info("Applying TV exclusions (%d stations)" %
+                          len(stations_and_separation_distances_km))
+
+        bounding_box_windows = self._get_bounding_box_windows(
+            is_whitespace_datamap2d,
+            [station for (station, _) in stations_and_separation_distances_km])
+        for ((station, separation_distance_km),
+             (lat_slice, lon_slice, is_in_bounding_box)) in \
+                zip(stations_and_separation_distances_km,
+                    bounding_box_windows):
+            is_candidate = is_in_bounding_box & \
+                is_evaluated[lat_slice, lon_slice] & \
+                ~is_excluded[lat_slice, lon_slice]
+            (lat_indices, lon_indices) = numpy.nonzero(is_candidate)
+            if len(lat_indices) == 0:
+                continue
+
+            candidate_latitudes = latitudes[lat_slice][lat_indices]
+            candidate_longitudes = longitudes[lon_slice][lon_indices]
+            protection_distance_km = self.get_tv_protected_radius_km(
+                station, (candidate_latitudes[0], candidate_longitudes[0]))
+
+            [is_protected] = self._locations_within_distances_km(
+                station.get_location(), candidate_latitudes,
+                candidate_longitudes,
+                [protection_distance_km + separation_distance_km])
+            is_excluded[lat_slice.start + lat_indices[is_protected],
+                        lon_slice.start + lon_indices[is_protected]] = True
+
+        matrix[is_evaluated] = ~is_excluded[is_evaluated]
 
     def apply_plmrs_exclusions_to_map(self, region, is_whitespace_datamap2d,
                                       channel, verbose=False):
@@ -660,15 +1778,15 @@ class RulesetFcc2012(Ruleset):
         """
         def plmrs_update_function(latitude, longitude, latitude_index,
                                   longitude_index, currently_whitespace):
-            if not currently_whitespace:       # already known to not be whitespace
-                return None
             return self.location_is_whitespace_plmrs_only(region, (latitude,
                                                                    longitude),
                                                           channel)
 
         if verbose:
             self.log.info("Applying PLMRS exclusions")
-        is_whitespace_datamap2d.update_all_values_via_function(plmrs_update_function, verbose=verbose)
+        is_whitespace_datamap2d.update_all_values_via_function(
+            plmrs_update_function, verbose=verbose,
+            only_where=is_whitespace_datamap2d)
 
     def apply_radioastronomy_exclusions_to_map(self, region,
                                                is_whitespace_datamap2d,
@@ -692,13 +1810,13 @@ class RulesetFcc2012(Ruleset):
         def radioastronomy_update_function(latitude, longitude,
                                            latitude_index, longitude_index,
                                            currently_whitespace):
-            if not currently_whitespace:       # already known to not be whitespace
-                return None
             return self.location_is_whitespace_radioastronomy_only(region, (latitude, longitude))
 
         if verbose:
             self.log.info("Applying radioastronomy exclusions")
-        is_whitespace_datamap2d.update_all_values_via_function(radioastronomy_update_function, verbose=verbose)
+        is_whitespace_datamap2d.update_all_values_via_function(
+            radioastronomy_update_function, verbose=verbose,
+            only_where=is_whitespace_datamap2d)
 
 ####
 #   END GENERAL WHITESPACE CALCULATIONS
@@ -901,7 +2019,8 @@ class RulesetFcc2012(Ruleset):
         :rtype: :class:`data_map.DataMap2D`
         """
 
-        viewership_map = data_map.DataMap2D.get_copy_of(is_in_region_datamap2d)
+        viewership_map = data_map.DataMap2D.get_copy_of(is_in_region_datamap2d,
+                                                        dtype=float)
         viewership_map.reset_all_values(0)
 
         # Use the TV stations from the region if no list is provided
@@ -916,9 +2035,6 @@ class RulesetFcc2012(Ruleset):
             """Returns True if TV can be viewed at this location and False
             otherwise. Returns None if the location is already listed as
             viewable."""
-            if not is_in_region_datamap2d.get_value_by_index(latitude_index,
-                                                             longitude_index):
-                return False        # outside of the region is defined as not viewable
             if currently_viewable:
                 return None         # don't update if it is already known that TV is viewable at this location
 
@@ -930,7 +2046,11 @@ class RulesetFcc2012(Ruleset):
 
             return False
 
-        viewership_map.update_all_values_via_function(tv_station_viewership_update_function, verbose=verbose)
+        # Locations outside of the region are defined as not viewable and keep
+        # their initial value
+        viewership_map.update_all_values_via_function(
+            tv_station_viewership_update_function, verbose=verbose,
+            only_where=is_in_region_datamap2d)
         return viewership_map
 
 ####
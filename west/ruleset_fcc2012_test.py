@@ -0,0 +1,559 @@
+from ruleset import Ruleset
+from ruleset_fcc2012 import RulesetFcc2012
+from ruleset_fcc2012_test_base import RegionUnitedStatesTest, \
+    RegionUnitedStatesTestTvStations
+from protected_entities_tv_stations import ProtectedEntitiesTVStations
+from protected_entities_plmrs import ProtectedEntitiesPLMRS
+from protected_entities_radio_astronomy_sites import \
+    ProtectedEntitiesRadioAstronomySites
+from protected_entity_tv_station import ProtectedEntityTVStation
+from protected_entity_plmrs import ProtectedEntityPLMRS
+from protected_entity_radio_astronomy_site import \
+    ProtectedEntityRadioAstronomySite
+from device import Device
+import data_map
+import numpy
+import unittest
+
+
+class VectorizedTvExclusionsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.region = RegionUnitedStatesTestTvStations()
+        self.ruleset = RulesetFcc2012()
+        self.datamap = data_map.DataMap2D.from_specification(
+            (36, 39.5), (-124.5, -119.5), 41, 51)
+
+    def _apply_tv_exclusions(self, initial_matrix, channel, device,
+                             vectorized):
+        is_whitespace = data_map.DataMap2D.from_existing_DataMap2D(
+            self.datamap, initial_matrix.copy())
+        self.ruleset.apply_tv_exclusions_to_map(self.region, is_whitespace,
+                                                channel, device,
+                                                vectorized=vectorized)
+        return is_whitespace.mutable_matrix
+
+    def test_matches_per_pixel_computation(self):
+        all_true = numpy.ones(self.datamap.mutable_matrix.shape, dtype=bool)
+        # Entries which are already False are not evaluated
+        partially_false = all_true.copy()
+        partially_false[::3, 5:] = False
+
+        devices = [Device(is_portable=False, haat_meters=30),
+                   Device(is_portable=False, haat_meters=5),
+                   Device(is_portable=True)]
+        for channel in [29, 30, 31, 45]:
+            for device in devices:
+                for initial_matrix in [all_true, partially_false]:
+                    expected = self._apply_tv_exclusions(
+                        initial_matrix, channel, device, vectorized=False)
+                    actual = self._apply_tv_exclusions(
+                        initial_matrix, channel, device, vectorized=True)
+                    self.assertEqual(actual.dtype, expected.dtype)
+                    self.assertTrue(numpy.array_equal(actual, expected),
+                                    msg="Channel %d" % channel)
+
+                    if channel == 45:
+                        self.assertTrue(numpy.array_equal(actual,
+                                                          initial_matrix))
+                    else:
+                        self.assertTrue(numpy.any(actual))
+                        self.assertTrue(numpy.any(actual != initial_matrix))
+
+    def test_non_boolean_map(self):
+        initial_matrix = numpy.ones(self.datamap.mutable_matrix.shape) * 2
+        initial_matrix[:10, :10] = 0
+        device = Device(is_portable=False, haat_meters=30)
+
+        expected = self._apply_tv_exclusions(initial_matrix, 30, device,
+                                             vectorized=False)
+        actual = self._apply_tv_exclusions(initial_matrix, 30, device,
+                                           vectorized=True)
+        self.assertTrue(numpy.array_equal(actual, expected))
+        self.assertEqual(set(numpy.unique(actual)), {0, 1})
+
+
+class ProtectedRadiusCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.region = RegionUnitedStatesTestTvStations()
+        self.ruleset = RulesetFcc2012()
+        self.tv_stations = self.region.get_protected_entities_of_type(
+            ProtectedEntitiesTVStations)
+        self.station = self.tv_stations.get_list_of_entities_on_channel(30)[0]
+
+    def test_one_computation_per_station(self):
+        is_whitespace = data_map.DataMap2D.from_specification(
+            (36, 39.5), (-124.5, -119.5), 21, 26)
+        is_whitespace.reset_all_values(True)
+        self.ruleset.apply_tv_exclusions_to_map(
+            self.region, is_whitespace, 30,
+            Device(is_portable=False, haat_meters=30), vectorized=False)
+
+        # Stations on channels 29, 30 and 31 are all within reach
+        info = self.ruleset.get_protected_radius_cache_info()
+        self.assertEqual(info['misses'], 5)
+        self.assertEqual(info['size'], 5)
+        self.assertGreater(info['hits'], 0)
+
+        self.ruleset.set_propagation_model()
+        self.assertEqual(self.ruleset.get_protected_radius_cache_info(),
+                         {'hits': 0, 'misses': 0, 'size': 0})
+
+    def test_invalidation(self):
+        location = (37.6, -122.1)
+        radius_km = self.ruleset.get_tv_protected_radius_km(self.station,
+                                                            location)
+        self.assertEqual(self.ruleset.get_tv_protected_radius_km(
+            self.station, (38, -121)), radius_km)
+        self.assertEqual(self.ruleset.get_protected_radius_cache_info(),
+                         {'hits': 1, 'misses': 1, 'size': 1})
+
+        # Modified stations are not served from the cache
+        self.station._ERP_Watts *= 10
+        self.assertGreater(self.ruleset.get_tv_protected_radius_km(
+            self.station, location), radius_km)
+        self.assertEqual(
+            self.ruleset.get_protected_radius_cache_info()['misses'], 2)
+
+        # Neither are stations whose container has changed
+        self.tv_stations.remove_entities(lambda station: True)
+        self.ruleset.get_tv_protected_radius_km(self.station, location)
+        self.assertEqual(self.ruleset.get_protected_radius_cache_info(),
+                         {'hits': 1, 'misses': 3, 'size': 1})
+
+
+class WhitespaceDataMap3DTestCase(unittest.TestCase):
+    def setUp(self):
+        self.region = RegionUnitedStatesTest()
+        self.ruleset = RulesetFcc2012()
+        self.is_in_region = data_map.DataMap2D.from_specification(
+            (36, 39.5), (-124.5, -119.5), 21, 26)
+        self.is_in_region.reset_all_values(True)
+        self.is_in_region.mutable_matrix[:3, -5:] = False
+        self.channel_list = self.region.get_tvws_channel_list()
+
+    def _apply_all_protections(self, device, vectorized, dtype=bool,
+                               ignore_channel_restrictions=False):
+        is_whitespace = data_map.DataMap3D.from_DataMap2D(
+            self.is_in_region, self.channel_list, dtype=dtype)
+        self.ruleset.apply_all_protections_to_datamap3d(
+            self.region, is_whitespace, device,
+            ignore_channel_restrictions=ignore_channel_restrictions,
+            vectorized=vectorized)
+        return is_whitespace.mutable_array
+
+    def test_matches_per_channel_computation(self):
+        for device in [Device(is_portable=False, haat_meters=30),
+                       Device(is_portable=False, haat_meters=5),
+                       Device(is_portable=True)]:
+            expected = self._apply_all_protections(device, vectorized=False)
+            actual = self._apply_all_protections(device, vectorized=True)
+            self.assertTrue(numpy.array_equal(actual, expected))
+
+            # Each kind of entity has excluded some pixels
+            for (channel, location) in [(21, (37.05, -121.5)),
+                                        (21, (38.0, -123.0)),
+                                        (30, (37.7, -122.4)),
+                                        (30, (37.5, -122.0))]:
+                lat_idx = numpy.argmin(numpy.abs(
+                    numpy.asarray(self.is_in_region.latitudes) - location[0]))
+                lon_idx = numpy.argmin(numpy.abs(
+                    numpy.asarray(self.is_in_region.longitudes) -
+                    location[1]))
+                self.assertFalse(actual[self.channel_list.index(channel),
+                                        lat_idx, lon_idx])
+            self.assertTrue(numpy.any(actual))
+
+        expected = self._apply_all_protections(device, vectorized=False,
+                                               dtype=float,
+                                               ignore_channel_restrictions=True)
+        actual = self._apply_all_protections(device, vectorized=True,
+                                             dtype=float,
+                                             ignore_channel_restrictions=True)
+        self.assertTrue(numpy.array_equal(actual, expected))
+
+    def test_layer_matches_map(self):
+        device = Device(is_portable=False, haat_meters=30)
+        actual = self._apply_all_protections(device, vectorized=True)
+        for channel in [15, 36, 38]:
+            expected = data_map.DataMap2D.get_copy_of(self.is_in_region)
+            self.ruleset.apply_all_protections_to_map(self.region, expected,
+                                                      channel, device)
+            self.assertTrue(numpy.array_equal(
+                actual[self.channel_list.index(channel)],
+                expected.mutable_matrix))
+
+
+class TvMarginTestCase(unittest.TestCase):
+    def setUp(self):
+        self.region = RegionUnitedStatesTest()
+        self.ruleset = RulesetFcc2012()
+        self.is_in_region = data_map.DataMap2D.from_specification(
+            (36, 39.5), (-124.5, -119.5), 21, 26)
+        self.is_in_region.reset_all_values(True)
+        self.is_in_region.mutable_matrix[:3, -5:] = False
+        self.channel_list = self.region.get_tvws_channel_list()
+        self.tv_margin_datamap3ds = self.ruleset.create_tv_margin_datamap3ds(
+            self.region, self.is_in_region)
+
+    def _apply_all_protections(self, device, tv_margin_datamap3ds=None):
+        is_whitespace = data_map.DataMap3D.from_DataMap2D(
+            self.is_in_region, self.channel_list)
+        self.ruleset.apply_all_protections_to_datamap3d(
+            self.region, is_whitespace, device,
+            tv_margin_datamap3ds=tv_margin_datamap3ds)
+        return is_whitespace.mutable_array
+
+    def test_margins(self):
+        (cochannel_margins, adjacent_channel_margins) = \
+            [margin_datamap3d.mutable_array for margin_datamap3d in
+             self.tv_margin_datamap3ds]
+        self.assertTrue(numpy.all(numpy.isnan(cochannel_margins[:, :3, -5:])))
+        # Channel 30 has stations but channel 15 has none
+        layer_30 = self.channel_list.index(30)
+        self.assertTrue(numpy.nanmin(cochannel_margins[layer_30]) < 0)
+        self.assertTrue(numpy.all(numpy.isinf(
+            cochannel_margins[self.channel_list.index(15)][3:])))
+        # Channel 30 is adjacent to the stations on channels 29 and 31
+        self.assertTrue(numpy.any(numpy.isfinite(
+            adjacent_channel_margins[layer_30])))
+        self.assertFalse(numpy.array_equal(
+            numpy.isfinite(adjacent_channel_margins[layer_30]),
+            numpy.isfinite(cochannel_margins[layer_30])))
+
+    def test_haat_sweep_matches_stations(self):
+        devices = [Device(is_portable=False, haat_meters=haat_meters) for
+                   haat_meters in [1, 5, 20, 40, 60, 80, 120, 180, 240]]
+        devices.append(Device(is_portable=True))
+        for device in devices:
+            self.assertTrue(numpy.array_equal(
+                self._apply_all_protections(device, self.tv_margin_datamap3ds),
+                self._apply_all_protections(device)))
+
+        # Margins which are close to a separation distance are decided by
+        # the stations
+        self.ruleset._vectorized_distance_tolerance_km = 5.0
+        device = Device(is_portable=False, haat_meters=30)
+        self.assertTrue(numpy.array_equal(
+            self._apply_all_protections(device, self.tv_margin_datamap3ds),
+            self._apply_all_protections(device)))
+
+    def test_single_precision_margins(self):
+        float32_margin_datamap3ds = [
+            margin_datamap3d.astype(numpy.float32) for margin_datamap3d in
+            self.tv_margin_datamap3ds]
+        device = Device(is_portable=True)
+        self.assertTrue(numpy.array_equal(
+            self._apply_all_protections(device, float32_margin_datamap3ds),
+            self._apply_all_protections(device)))
+
+        # Margins whose rounding crosses the separation distance are decided
+        # by the stations
+        cochannel_margins = self.tv_margin_datamap3ds[0].mutable_array
+        float32_cochannel_margins = float32_margin_datamap3ds[0].mutable_array
+        with numpy.errstate(invalid="ignore"):
+            is_rounded = (cochannel_margins > 0) & \
+                (cochannel_margins != float32_cochannel_margins)
+        index = tuple(indices[0] for indices in numpy.nonzero(is_rounded))
+        separation_distance_km = (cochannel_margins[index] +
+                                  float(float32_cochannel_margins[index])) / 2
+        self.ruleset.get_tv_cochannel_separation_distance_km = \
+            lambda device_haat: separation_distance_km
+        self.assertTrue(numpy.array_equal(
+            self._apply_all_protections(device, float32_margin_datamap3ds),
+            self._apply_all_protections(device)))
+
+    def test_mismatched_margins(self):
+        device = Device(is_portable=False, haat_meters=30)
+        other_margin_datamap3ds = self.ruleset.create_tv_margin_datamap3ds(
+            self.region, self.is_in_region, channel_list=[21, 30])
+        self.assertRaises(ValueError, self._apply_all_protections, device,
+                          other_margin_datamap3ds)
+
+        is_in_smaller_region = data_map.DataMap2D.get_copy_of(
+            self.is_in_region)
+        is_in_smaller_region.mutable_matrix[:5] = False
+        smaller_margin_datamap3ds = self.ruleset.create_tv_margin_datamap3ds(
+            self.region, is_in_smaller_region)
+        self.assertRaises(ValueError, self._apply_all_protections, device,
+                          smaller_margin_datamap3ds)
+
+
+class IncrementalUpdateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.region = RegionUnitedStatesTest()
+        self.ruleset = RulesetFcc2012()
+        self.is_in_region = data_map.DataMap2D.from_specification(
+            (36, 39.5), (-124.5, -119.5), 21, 26)
+        self.is_in_region.reset_all_values(True)
+        self.is_in_region.mutable_matrix[:3, -5:] = False
+        self.channel_list = self.region.get_tvws_channel_list()
+
+    def _create_whitespace_map(self, device):
+        is_whitespace = data_map.DataMap3D.from_DataMap2D(
+            self.is_in_region, self.channel_list)
+        self.ruleset.apply_all_protections_to_datamap3d(
+            self.region, is_whitespace, device)
+        return is_whitespace
+
+    def _change_entities(self):
+        """Adds, removes and modifies some entities; returns the changed
+        entities."""
+        tv_stations = self.region.get_protected_entities_of_type(
+            ProtectedEntitiesTVStations)
+        plmrs = self.region.get_protected_entities_of_type(
+            ProtectedEntitiesPLMRS)
+        ras_sites = self.region.get_protected_entities_of_type(
+            ProtectedEntitiesRadioAstronomySites)
+
+        # Add a station, remove a station and move a station
+        new_station = ProtectedEntityTVStation(
+            tv_stations, self.region, 37.3, -121.2, 37, 2e5, 250, 'DT')
+        moved_station = ProtectedEntityTVStation(
+            tv_stations, self.region, 38.3, -122.0, 29, 2e4, 150, 'DT')
+        [removed_station, old_station] = [
+            station for station in tv_stations.list_of_entities() if
+            station.get_location() in [(38.2, -121.0), (36.8, -122.8)]]
+        tv_stations.remove_entities(
+            lambda station: station not in [removed_station, old_station])
+        tv_stations.add_entity(new_station)
+        tv_stations.add_entity(moved_station)
+
+        # Remove a PLMRS entity and add one
+        [removed_plmrs] = [entry for entry in plmrs.list_of_entities() if
+                           entry.get_channel() == 37]
+        plmrs.remove_entities(lambda entry: entry is not removed_plmrs)
+        new_plmrs = ProtectedEntityPLMRS(plmrs, self.region, 36.6, -123.5, 21,
+                                         False)
+        plmrs.add_entity(new_plmrs)
+
+        # Add a radioastronomy site
+        new_ras_site = ProtectedEntityRadioAstronomySite(
+            ras_sites, self.region, 38.8, -120.5, 37, "New site", True)
+        ras_sites.add_entity(new_ras_site)
+
+        return [new_station, moved_station, removed_station, old_station,
+                removed_plmrs, new_plmrs, new_ras_site]
+
+    def test_matches_full_computation(self):
+        devices = [Device(is_portable=False, haat_meters=30),
+                   Device(is_portable=True)]
+        whitespace_maps = [self._create_whitespace_map(device) for device in
+                           devices]
+        original_arrays = [numpy.array(whitespace_map.mutable_array) for
+                           whitespace_map in whitespace_maps]
+        changed_entities = self._change_entities()
+
+        for (device, whitespace_map, original_array) in \
+                zip(devices, whitespace_maps, original_arrays):
+            self.ruleset.update_whitespace_datamap3d(
+                self.region, whitespace_map, self.is_in_region, device,
+                changed_entities)
+            expected = self._create_whitespace_map(device).mutable_array
+            self.assertTrue(numpy.array_equal(whitespace_map.mutable_array,
+                                              expected))
+            self.assertFalse(numpy.array_equal(original_array, expected))
+
+            # Layers of channels which are unaffected are not recomputed
+            layer_15 = self.channel_list.index(15)
+            whitespace_map.mutable_array[layer_15] = False
+            self.ruleset.update_whitespace_datamap3d(
+                self.region, whitespace_map, self.is_in_region, device,
+                changed_entities[:-1])
+            self.assertFalse(numpy.any(whitespace_map.mutable_array[layer_15]))
+
+    def test_tv_margins_match_full_computation(self):
+        tv_margin_datamap3ds = self.ruleset.create_tv_margin_datamap3ds(
+            self.region, self.is_in_region)
+        changed_entities = self._change_entities()
+        self.ruleset.update_tv_margin_datamap3ds(
+            self.region, tv_margin_datamap3ds, self.is_in_region,
+            changed_entities)
+        for (margin_datamap3d, expected_datamap3d) in zip(
+                tv_margin_datamap3ds, self.ruleset.create_tv_margin_datamap3ds(
+                    self.region, self.is_in_region)):
+            margins = margin_datamap3d.mutable_array
+            expected = expected_datamap3d.mutable_array
+            self.assertTrue(numpy.array_equal(numpy.isnan(margins),
+                                              numpy.isnan(expected)))
+            self.assertTrue(numpy.array_equal(margins[~numpy.isnan(margins)],
+                                              expected[~numpy.isnan(expected)]))
+
+    def test_tv_margins_outside_windows_are_not_recomputed(self):
+        tv_margin_datamap3ds = self.ruleset.create_tv_margin_datamap3ds(
+            self.region, self.is_in_region)
+        for margin_datamap3d in tv_margin_datamap3ds:
+            margin_datamap3d.mutable_array[
+                ~numpy.isnan(margin_datamap3d.mutable_array)] = -1.0
+        changed_entities = self._change_entities()
+        self.ruleset.update_tv_margin_datamap3ds(
+            self.region, tv_margin_datamap3ds, self.is_in_region,
+            changed_entities)
+
+        # Only the bounding boxes of the changed TV stations are recomputed,
+        # on their own layer (cochannel) and the adjacent layers
+        is_expected = numpy.zeros(
+            (2,) + tv_margin_datamap3ds[0].mutable_array.shape, dtype=bool)
+        latitudes = numpy.asarray(self.is_in_region.latitudes)
+        longitudes = numpy.asarray(self.is_in_region.longitudes)
+        for entity in changed_entities:
+            if not isinstance(entity, ProtectedEntityTVStation):
+                continue
+            bb = entity.get_bounding_box()
+            is_in_bounding_box = (
+                ((bb['min_lat'] <= latitudes) &
+                 (latitudes <= bb['max_lat'])).reshape(-1, 1) &
+                ((bb['min_lon'] <= longitudes) &
+                 (longitudes <= bb['max_lon'])).reshape(1, -1))
+            channel = entity.get_channel()
+            if channel in self.channel_list:
+                is_expected[0, self.channel_list.index(channel)] |= \
+                    is_in_bounding_box
+            for adj_chan in [channel - 1, channel + 1]:
+                if adj_chan in self.channel_list:
+                    is_expected[1, self.channel_list.index(adj_chan)] |= \
+                        is_in_bounding_box
+        is_in_region = self.is_in_region.mutable_matrix.astype(bool)
+        is_expected &= is_in_region
+
+        is_recomputed = numpy.array(
+            [margin_datamap3d.mutable_array != -1.0 for margin_datamap3d in
+             tv_margin_datamap3ds])
+        is_recomputed &= is_in_region
+        self.assertTrue(numpy.any(is_recomputed))
+        self.assertTrue(numpy.array_equal(is_recomputed, is_expected))
+
+    def test_no_changes(self):
+        device = Device(is_portable=False, haat_meters=30)
+        whitespace_map = self._create_whitespace_map(device)
+        expected = numpy.array(whitespace_map.mutable_array)
+        tv_stations = self.region.get_protected_entities_of_type(
+            ProtectedEntitiesTVStations)
+        outside_station = ProtectedEntityTVStation(
+            tv_stations, self.region, 45.0, -100.0, 30, 1e3, 50, 'LD')
+        self.ruleset.update_whitespace_datamap3d(
+            self.region, whitespace_map, self.is_in_region, device,
+            [outside_station])
+        self.ruleset.update_whitespace_datamap3d(
+            self.region, whitespace_map, self.is_in_region, device, [])
+        self.assertTrue(numpy.array_equal(whitespace_map.mutable_array,
+                                          expected))
+
+
+class AvailableChannelsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.region = RegionUnitedStatesTest()
+        self.ruleset = RulesetFcc2012()
+        random_state = numpy.random.RandomState(0)
+        self.locations = numpy.column_stack(
+            [random_state.uniform(36, 39.5, 150),
+             random_state.uniform(-124.5, -119.5, 150)])
+        # Points close to each kind of entity
+        self.locations[:4] = [(37.05, -121.5), (38.0, -123.0), (37.7, -122.4),
+                              (37.5, -122.0)]
+        device_choices = [Device(is_portable=False, haat_meters=30),
+                          Device(is_portable=False, haat_meters=5),
+                          Device(is_portable=True)]
+        self.devices = [device_choices[index % 3] for index in
+                        range(len(self.locations))]
+
+    def test_matches_per_channel_computation(self):
+        expected = Ruleset.available_channels(self.ruleset, self.region,
+                                              self.locations, self.devices)
+        actual = self.ruleset.available_channels(self.region, self.locations,
+                                                 self.devices)
+        self.assertEqual(actual, expected)
+        self.assertNotIn(21, actual[0])
+        self.assertNotIn(21, actual[1])
+        self.assertTrue(any(len(channels) > 0 for channels in actual))
+
+        # A single device and a subset of the channels
+        channel_list = [14, 21, 29, 30, 31, 37, 38, 52]
+        device = Device(is_portable=False, haat_meters=30)
+        expected = Ruleset.available_channels(
+            self.ruleset, self.region, self.locations, device,
+            channel_list=channel_list, as_bitmask=True)
+        actual = self.ruleset.available_channels(
+            self.region, self.locations, device, channel_list=channel_list,
+            as_bitmask=True)
+        self.assertEqual(actual.dtype, numpy.uint64)
+        self.assertTrue(numpy.array_equal(actual, expected))
+        self.assertEqual(int(actual[0]) & (1 << channel_list.index(21)), 0)
+
+    def test_bitmask_matches_list(self):
+        channel_list = self.region.get_tvws_channel_list()
+        channels = self.ruleset.available_channels(
+            self.region, self.locations[:20], self.devices[:20])
+        bitmasks = self.ruleset.available_channels(
+            self.region, self.locations[:20], self.devices[:20],
+            as_bitmask=True)
+        for (point_channels, bitmask) in zip(channels, bitmasks):
+            self.assertEqual(point_channels, [
+                channel for (bit, channel) in enumerate(channel_list)
+                if int(bitmask) & (1 << bit)])
+
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, self.ruleset.available_channels,
+                          self.region, self.locations, self.devices[:-1])
+        self.assertRaises(ValueError, self.ruleset.available_channels,
+                          self.region, self.locations[:2], self.devices[0],
+                          channel_list=range(2, 70), as_bitmask=True)
+
+
+class SpatialIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.region = RegionUnitedStatesTest()
+        self.locations = [(latitude, longitude) for latitude in
+                          numpy.linspace(34, 41.5, 16) for longitude in
+                          numpy.linspace(-127, -117, 21)]
+
+    def _assert_index_is_consistent(self, container):
+        for location in self.locations:
+            self.assertEqual(
+                container.get_list_of_entities_near_location(location),
+                [entity for entity in container.list_of_entities() if
+                 entity.location_in_bounding_box(location)])
+            for channel in [14, 29, 30, 31, 37, 45]:
+                self.assertEqual(
+                    container.get_list_of_entities_near_location(location,
+                                                                 channel),
+                    [entity for entity in
+                     container.get_list_of_entities_on_channel(channel) if
+                     entity.location_in_bounding_box(location)])
+
+    def test_queries(self):
+        for entities_type in [ProtectedEntitiesTVStations,
+                              ProtectedEntitiesPLMRS]:
+            container = self.region.get_protected_entities_of_type(
+                entities_type)
+            self._assert_index_is_consistent(container)
+            self.assertRaises(ValueError,
+                              container.get_list_of_entities_near_location,
+                              (37.5, -122), 70)
+
+        ras_container = self.region.get_protected_entities_of_type(
+            ProtectedEntitiesRadioAstronomySites)
+        self.assertEqual(len(ras_container.get_list_of_entities_near_location(
+            (37.05, -121.5))), 1)
+        self.assertEqual(ras_container.get_list_of_entities_near_location(
+            (37.5, -121.5)), [])
+
+    def test_add_and_remove_entities(self):
+        container = self.region.get_protected_entities_of_type(
+            ProtectedEntitiesTVStations)
+        container.add_entity(ProtectedEntityTVStation(
+            container, self.region, 39.0, -120.0, 30, 2e5, 250, 'DT'))
+        self._assert_index_is_consistent(container)
+        self.assertEqual(len(container.get_list_of_entities_near_location(
+            (39.5, -119.5), 30)), 1)
+
+        container.remove_entities(lambda station: station.get_channel() != 30)
+        self._assert_index_is_consistent(container)
+        self.assertEqual(container.get_list_of_entities_near_location(
+            (39.5, -119.5), 30), [])
+
+
+from custom_logging import getCurrentLogLevel, changeLogLevel, disableLogging
+original_log_level = getCurrentLogLevel()
+disableLogging()
+unittest.main()
+changeLogLevel(original_log_level)
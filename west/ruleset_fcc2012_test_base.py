@@ -0,0 +1,98 @@
+"""
+Synthetic protected entities and regions shared by the tests of
+:mod:`ruleset_fcc2012` and of the modules built on it. They do not require
+the data files of :class:`region_united_states.RegionUnitedStates`.
+"""
+
+from region_united_states import RegionUnitedStates
+from protected_entities import ProtectedEntitiesDummy
+from protected_entities_tv_stations import ProtectedEntitiesTVStations, \
+    ProtectedEntitiesTVStationsUnitedStates
+from protected_entities_plmrs import ProtectedEntitiesPLMRS, \
+    ProtectedEntitiesPLMRSUnitedStatesFromGoogle
+from protected_entities_radio_astronomy_sites import \
+    ProtectedEntitiesRadioAstronomySites, \
+    ProtectedEntitiesRadioAstronomySitesUnitedStates
+from protected_entity_tv_station import ProtectedEntityTVStation
+from protected_entity_plmrs import ProtectedEntityPLMRS
+from protected_entity_radio_astronomy_site import \
+    ProtectedEntityRadioAstronomySite
+
+
+class ProtectedEntitiesTVStationsTest(ProtectedEntitiesTVStationsUnitedStates):
+    """A handful of made-up TV stations in and around the Bay Area."""
+
+    # (latitude, longitude, channel, ERP (W), HAAT (m), transmitter type)
+    station_parameters = [(37.5, -122.0, 30, 1e5, 300, 'DT'),
+                          (38.2, -121.0, 31, 5e5, 500, 'TV'),
+                          (36.8, -122.8, 29, 2e4, 150, 'DT'),
+                          (38.5, -123.5, 30, 1e3, 50, 'LD'),
+                          (37.0, -120.3, 30, 3e5, 400, 'DT'),
+                          (37.9, -122.6, 37, 1e5, 200, 'DT')]
+
+    def source_filename(self):
+        return None
+
+    def source_name(self):
+        return "Test TV stations"
+
+    def _load_entities(self):
+        for (latitude, longitude, channel, erp_watts, haat_meters,
+             tx_type) in self.station_parameters:
+            self._add_entity(ProtectedEntityTVStation(
+                self, self.region, latitude, longitude, channel, erp_watts,
+                haat_meters, tx_type))
+
+
+class ProtectedEntitiesPLMRSTest(ProtectedEntitiesPLMRSUnitedStatesFromGoogle):
+    """A handful of made-up PLMRS entities in the Bay Area."""
+
+    # (latitude, longitude, channel, is metropolitan area)
+    entity_parameters = [(37.7, -122.4, 30, True),
+                         (38.6, -121.5, 37, False),
+                         (36.5, -121.9, 14, False)]
+
+    def source_filename(self):
+        return None
+
+    def _load_entities(self):
+        for (latitude, longitude, channel, is_metro) in \
+                self.entity_parameters:
+            self._add_entity(ProtectedEntityPLMRS(
+                self, self.region, latitude, longitude, channel, is_metro))
+
+
+class ProtectedEntitiesRadioAstronomySitesTest(
+        ProtectedEntitiesRadioAstronomySitesUnitedStates):
+    """A made-up point site (at a pixel of the test grids) and a made-up
+    rectangular site."""
+
+    def source_filename(self):
+        return None
+
+    def _load_entities(self):
+        self._add_entity(ProtectedEntityRadioAstronomySite(
+            self, self.region, 37.05, -121.5, 37, "Point site", True))
+        self._add_entity(ProtectedEntityRadioAstronomySite(
+            self, self.region, 38.0, -123.0, 37, "Rectangular site", False,
+            0.2, 0.3))
+
+
+class RegionUnitedStatesTest(RegionUnitedStates):
+    def _load_protected_entities(self):
+        self.protected_entities[ProtectedEntitiesTVStations] = \
+            ProtectedEntitiesTVStationsTest(self)
+        self.protected_entities[ProtectedEntitiesPLMRS] = \
+            ProtectedEntitiesPLMRSTest(self)
+        self.protected_entities[ProtectedEntitiesRadioAstronomySites] = \
+            ProtectedEntitiesRadioAstronomySitesTest(self)
+
+
+class RegionUnitedStatesTestTvStations(RegionUnitedStatesTest):
+    def _load_protected_entities(self):
+        self.protected_entities[ProtectedEntitiesTVStations] = \
+            ProtectedEntitiesTVStationsTest(self)
+        self.protected_entities[ProtectedEntitiesPLMRS] = \
+            ProtectedEntitiesDummy(self)
+        self.protected_entities[ProtectedEntitiesRadioAstronomySites] = \
+            ProtectedEntitiesDummy(self)
@@ -0,0 +1,625 @@
+"""
+A local whitespace database: answers available-channel queries over HTTP.
+
+The region and ruleset (by default, :class:`region_united_states.RegionUnitedStates`
+and :class:`ruleset_fcc2012.RulesetFcc2012`) are loaded once. A query
+consists of a location, the HAAT of the device and whether the device is
+portable; the answer is the list of channels available to that device at
+that location (see :meth:`ruleset.Ruleset.available_channels`).
+
+Queries are answered, in order of preference, from:
+
+  1. a cache of recent answers (keyed by the exact query),
+  2. precomputed grids (see :meth:`WhitespaceQueryEngine.add_grid`): the
+     answer is precomputed at the center of each cell and reused for any
+     location in the cell, except in cells which a protection boundary may
+     cross (e.g. the edge of a protected contour), or
+  3. an exact evaluation. Queries which arrive concurrently are batched
+     into a single call to :meth:`ruleset.Ruleset.available_channels` so
+     that the protected entities are visited once per batch rather than
+     once per query.
+
+All three give identical answers.
+
+The server uses a thread per connection; the evaluations themselves are
+done by a single worker thread. The following requests are supported:
+
+  * ``GET /available_channels?latitude=...&longitude=...&haat_meters=...&is_portable=...``
+  * ``POST /available_channels`` with a JSON query (an object with the same
+    keys) or a list of them
+  * ``GET /metrics``: latency and throughput statistics (see
+    :meth:`WhitespaceQueryEngine.get_metrics`)
+
+Answers are JSON objects of the form ``{"channels": [...]}`` (or a list of
+them). Run this module to start a server::
+
+    python whitespace_server.py --port 8080
+"""
+
+import BaseHTTPServer
+import SocketServer
+import argparse
+import collections
+import json
+import threading
+import time
+import urlparse
+import numpy
+from custom_logging import getModuleLogger
+from device import Device
+from region_united_states import RegionUnitedStates
+from ruleset_fcc2012 import RulesetFcc2012
+import data_map
+import helpers
+
+
+class _PendingQuery(object):
+    """A query waiting to be evaluated by a :class:`_QueryBatcher`."""
+
+    def __init__(self, query):
+        self.query = query
+        self.result = None
+        self.error = None
+        self.is_done = threading.Event()
+
+
+class _QueryBatcher(object):
+    """
+    Collects the queries submitted by any number of threads and evaluates
+    them in batches on a worker thread. After the first query of a batch
+    arrives, the worker waits for ``batch_window_seconds`` so that
+    concurrent queries can join the batch.
+    """
+
+    def __init__(self, evaluate_function, batch_window_seconds,
+                 max_batch_size):
+        if max_batch_size < 1:
+            raise ValueError("Maximum batch size must be positive")
+
+        self._evaluate_function = evaluate_function
+        self._batch_window_seconds = batch_window_seconds
+        self._max_batch_size = max_batch_size
+        self._pending = []
+        self._condition = threading.Condition()
+        self._is_closed = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, queries):
+        """Evaluates ``queries`` and returns their results (in order).
+        Blocks until all of them have been evaluated."""
+        pending_queries = [_PendingQuery(query) for query in queries]
+        with self._condition:
+            if self._is_closed:
+                raise ValueError("Batcher is closed")
+            self._pending.extend(pending_queries)
+            self._condition.notify()
+
+        for pending_query in pending_queries:
+            pending_query.is_done.wait()
+            if pending_query.error is not None:
+                raise pending_query.error
+        return [pending_query.result for pending_query in pending_queries]
+
+    def close(self):
+        """Stops the worker thread once the pending queries are done."""
+        with self._condition:
+            self._is_closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._is_closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+
+            if self._batch_window_seconds > 0:
+                time.sleep(self._batch_window_seconds)
+
+            with self._condition:
+                batch = self._pending[:self._max_batch_size]
+                del self._pending[:self._max_batch_size]
+
+            try:
+                results = self._evaluate_function(
+                    [pending_query.query for pending_query in batch])
+            except Exception as e:
+                for pending_query in batch:
+                    pending_query.error = e
+            else:
+                for (pending_query, result) in zip(batch, results):
+                    pending_query.result = result
+            for pending_query in batch:
+                pending_query.is_done.set()
+
+
+class _WhitespaceGrid(object):
+    """
+    Available channels (as bitmasks) precomputed at the centers of the
+    cells of a grid for one class of device, together with the cells in
+    which they may not apply.
+
+    A cell is *ambiguous* if the boundary of an exclusion (an exclusion
+    distance or the bounding box of a protected entity; see
+    :meth:`ruleset_fcc2012.RulesetFcc2012.get_exclusion_distances_km`) may
+    cross it. The answer at the center of any other cell is the answer at
+    every location in the cell.
+    """
+
+    # Safety margin on the radius of a cell to make up for the geodesic
+    # distance to a location in the cell slightly exceeding the distance to
+    # the corners, and for rounding
+    _cell_radius_factor = 1.01
+    _cell_radius_margin_km = 1e-6
+
+    def __init__(self, region, ruleset, device, channel_list,
+                 latitude_bounds, longitude_bounds, num_latitude_divisions,
+                 num_longitude_divisions):
+        if num_latitude_divisions < 2 or num_longitude_divisions < 2:
+            raise ValueError("A grid needs at least two divisions along "
+                             "each axis")
+
+        self.bitmasks = data_map.DataMap2D.from_specification(
+            latitude_bounds, longitude_bounds, num_latitude_divisions,
+            num_longitude_divisions, verbose=False, dtype=numpy.uint64)
+        self.latitudes = numpy.asarray(self.bitmasks.latitudes)
+        self.longitudes = numpy.asarray(self.bitmasks.longitudes)
+        self.latitude_step = self.latitudes[1] - self.latitudes[0]
+        self.longitude_step = self.longitudes[1] - self.longitudes[0]
+
+        (latitude_grid, longitude_grid) = numpy.meshgrid(
+            self.latitudes, self.longitudes, indexing="ij")
+        self.bitmasks.mutable_matrix[:] = ruleset.available_channels(
+            region, numpy.column_stack([latitude_grid.ravel(),
+                                        longitude_grid.ravel()]),
+            device, channel_list=channel_list, as_bitmask=True).reshape(
+            latitude_grid.shape)
+
+        self.is_ambiguous = numpy.zeros(latitude_grid.shape, dtype=bool)
+        self._mark_ambiguous_cells(
+            ruleset.get_exclusion_distances_km(region, device))
+
+    def _mark_ambiguous_cells(self, exclusion_distances_km):
+        # Half of the size of a cell (slightly enlarged so that locations
+        # rounded into a cell are covered)
+        half_latitude_step = self.latitude_step / 2 * (1 + 1e-9)
+        half_longitude_step = self.longitude_step / 2 * (1 + 1e-9)
+
+        # Distance from the center of a cell to its farthest corner; it only
+        # depends on the latitude
+        cell_radii_km = numpy.array([numpy.max(helpers.vincenty_distances_km(
+            (latitude, 0.0),
+            latitude + numpy.array([-1, -1, 1, 1]) * half_latitude_step,
+            numpy.array([-1, 1, -1, 1]) * half_longitude_step))
+            for latitude in self.latitudes])
+        cell_radii_km = cell_radii_km * self._cell_radius_factor + \
+            self._cell_radius_margin_km
+
+        for (entity, max_distances_km) in exclusion_distances_km:
+            bb = entity.get_bounding_box()
+            rows_intersect = (self.latitudes + half_latitude_step >=
+                              bb['min_lat']) & \
+                (self.latitudes - half_latitude_step <= bb['max_lat'])
+            columns_intersect = (self.longitudes + half_longitude_step >=
+                                 bb['min_lon']) & \
+                (self.longitudes - half_longitude_step <= bb['max_lon'])
+            row_indices = numpy.nonzero(rows_intersect)[0]
+            column_indices = numpy.nonzero(columns_intersect)[0]
+            if len(row_indices) == 0 or len(column_indices) == 0:
+                continue
+            window = (slice(row_indices[0], row_indices[-1] + 1),
+                      slice(column_indices[0], column_indices[-1] + 1))
+
+            if max_distances_km is None:
+                self.is_ambiguous[window] = True
+                continue
+
+            latitudes = self.latitudes[window[0]]
+            longitudes = self.longitudes[window[1]]
+            rows_inside = (latitudes - half_latitude_step >= bb['min_lat']) & \
+                (latitudes + half_latitude_step <= bb['max_lat'])
+            columns_inside = \
+                (longitudes - half_longitude_step >= bb['min_lon']) & \
+                (longitudes + half_longitude_step <= bb['max_lon'])
+            is_inside_bounding_box = rows_inside.reshape(-1, 1) & \
+                columns_inside.reshape(1, -1)
+
+            distances_km = helpers.vincenty_distances_km(
+                entity.get_location(), latitudes.reshape(-1, 1),
+                longitudes.reshape(1, -1))
+            radii_km = cell_radii_km[window[0]].reshape(-1, 1)
+
+            # An exclusion distance crosses the cell or the edge of the
+            # bounding box crosses an excluded part of the cell
+            is_ambiguous = ~is_inside_bounding_box & \
+                (distances_km - radii_km <= max(max_distances_km))
+            for max_distance_km in max_distances_km:
+                is_ambiguous |= numpy.abs(distances_km - max_distance_km) <= \
+                    radii_km
+            self.is_ambiguous[window] |= is_ambiguous
+
+    def get_bitmask(self, location):
+        """Returns the precomputed bitmask for ``location`` or None if the
+        location is outside of the grid or in an ambiguous cell."""
+        (latitude, longitude) = location
+        latitude_index = int(round((latitude - self.latitudes[0]) /
+                                   self.latitude_step))
+        longitude_index = int(round((longitude - self.longitudes[0]) /
+                                    self.longitude_step))
+        if not (0 <= latitude_index < len(self.latitudes) and
+                0 <= longitude_index < len(self.longitudes)):
+            return None
+        if self.is_ambiguous[latitude_index, longitude_index]:
+            return None
+        return int(self.bitmasks.mutable_matrix[latitude_index,
+                                                longitude_index])
+
+
+class WhitespaceQueryEngine(object):
+    """
+    Answers available-channel queries for a region and ruleset; see the
+    module documentation. Thread-safe.
+
+    A query is a tuple (latitude, longitude, haat_meters, is_portable); the
+    HAAT is ignored for portable devices.
+    """
+
+    # Number of recent requests used for the latency statistics
+    _num_latency_samples = 10000
+
+    def __init__(self, region, ruleset, channel_list=None, cache_size=100000,
+                 batch_window_seconds=0.002, max_batch_size=4096):
+        """
+        :param region: region containing the protected entities
+        :type region: :class:`region.Region` object
+        :param ruleset: ruleset used to evaluate the queries
+        :type ruleset: :class:`ruleset.Ruleset` object
+        :param channel_list: channels to be tested (by default, \\
+            :meth:`region.Region.get_tvws_channel_list`)
+        :type channel_list: list of ints
+        :param cache_size: maximum number of answers kept in the cache (0 \\
+            to disable the cache)
+        :type cache_size: int
+        :param batch_window_seconds: how long to wait for concurrent \\
+            queries before evaluating a batch
+        :type batch_window_seconds: float
+        :param max_batch_size: maximum number of queries in a batch
+        :type max_batch_size: int
+        """
+        self.log = getModuleLogger(self)
+        self.region = region
+        self.ruleset = ruleset
+        if channel_list is None:
+            channel_list = region.get_tvws_channel_list()
+        self.channel_list = list(channel_list)
+        if len(self.channel_list) > 64:
+            raise ValueError("At most 64 channels are supported (got %d)" %
+                             len(self.channel_list))
+
+        self._devices = {}
+        self._grids = {}
+        self._cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # The ruleset (e.g. its cache of protected radii) is not thread-safe
+        self._ruleset_lock = threading.Lock()
+        self._batcher = _QueryBatcher(self._evaluate_exactly,
+                                      batch_window_seconds, max_batch_size)
+
+        self._start_time = time.time()
+        self._counts = collections.Counter()
+        self._latencies_seconds = collections.deque(
+            maxlen=self._num_latency_samples)
+
+    def _get_device_class(self, haat_meters, is_portable):
+        if is_portable:
+            return (True, None)
+        if haat_meters is None:
+            raise ValueError("The HAAT of a fixed device must be specified")
+        return (False, float(haat_meters))
+
+    def _get_device(self, device_class):
+        # Devices are shared so that the ruleset evaluates each class once
+        with self._lock:
+            if device_class not in self._devices:
+                (is_portable, haat_meters) = device_class
+                self._devices[device_class] = Device(
+                    is_portable=is_portable, haat_meters=haat_meters)
+            return self._devices[device_class]
+
+    def add_grid(self, haat_meters, is_portable, latitude_bounds,
+                 longitude_bounds, num_latitude_divisions,
+                 num_longitude_divisions):
+        """
+        Precomputes the answers for a class of device on a grid. Queries by
+        such a device in the grid are then answered from the grid unless
+        they are near the edge of an exclusion. Cells should be small
+        compared to the exclusions (e.g. a few kilometers) for most of them
+        to be usable.
+
+        Requires a ruleset which implements ``get_exclusion_distances_km``
+        (see :meth:`ruleset_fcc2012.RulesetFcc2012.get_exclusion_distances_km`).
+
+        :param haat_meters: HAAT of the device in meters (ignored for \\
+            portable devices)
+        :type haat_meters: float
+        :param is_portable: whether the device is portable
+        :type is_portable: bool
+        :param latitude_bounds: (min_latitude, max_latitude) of the cell \\
+            centers
+        :param longitude_bounds: (min_longitude, max_longitude) of the cell \\
+            centers
+        :param num_latitude_divisions: number of cells along the latitude
+        :type num_latitude_divisions: int
+        :param num_longitude_divisions: number of cells along the longitude
+        :type num_longitude_divisions: int
+        :return: None
+        """
+        device_class = self._get_device_class(haat_meters, is_portable)
+        device = self._get_device(device_class)
+        # Queries which need the ruleset wait until the grid is done; the
+        # others are still answered
+        with self._ruleset_lock:
+            grid = _WhitespaceGrid(self.region, self.ruleset, device,
+                                   self.channel_list, latitude_bounds,
+                                   longitude_bounds, num_latitude_divisions,
+                                   num_longitude_divisions)
+        self.log.info("Precomputed a grid for %s (%.1f%% of the cells are "
+                      "ambiguous)" % (str(device_class),
+                                      100.0 * numpy.mean(grid.is_ambiguous)))
+        with self._lock:
+            self._grids[device_class] = grid
+
+    def get_available_channels(self, queries):
+        """
+        :param queries: (latitude, longitude, haat_meters, is_portable) for \\
+            each query
+        :type queries: list of tuples
+        :return: the available channels for each query
+        :rtype: list of lists of ints
+        """
+        start_time = time.time()
+        keys = [(float(latitude), float(longitude),
+                 self._get_device_class(haat_meters, is_portable))
+                for (latitude, longitude, haat_meters, is_portable) in queries]
+
+        bitmasks = [None] * len(keys)
+        num_cache_hits = 0
+        num_grid_hits = 0
+        with self._lock:
+            for (index, key) in enumerate(keys):
+                if key in self._cache:
+                    bitmasks[index] = self._cache.pop(key)
+                    self._cache[key] = bitmasks[index]
+                    num_cache_hits += 1
+                    continue
+                grid = self._grids.get(key[2])
+                if grid is not None:
+                    bitmasks[index] = grid.get_bitmask(key[:2])
+                    if bitmasks[index] is not None:
+                        num_grid_hits += 1
+
+        missing_indices = [index for (index, bitmask) in enumerate(bitmasks)
+                           if bitmask is None]
+        if missing_indices:
+            missing_keys = [keys[index] for index in missing_indices]
+            for (index, bitmask) in zip(missing_indices,
+                                        self._batcher.submit(missing_keys)):
+                bitmasks[index] = bitmask
+
+        with self._lock:
+            if self._cache_size > 0:
+                for index in missing_indices:
+                    self._cache[keys[index]] = bitmasks[index]
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+
+            self._counts["requests"] += 1
+            self._counts["queries"] += len(keys)
+            self._counts["cache_hits"] += num_cache_hits
+            self._counts["grid_hits"] += num_grid_hits
+            self._latencies_seconds.append(time.time() - start_time)
+
+        return [[channel for (bit, channel) in enumerate(self.channel_list)
+                 if bitmask & (1 << bit)] for bitmask in bitmasks]
+
+    def _evaluate_exactly(self, keys):
+        """Evaluates a batch of queries (run by the batcher's worker)."""
+        locations = [key[:2] for key in keys]
+        devices = [self._get_device(key[2]) for key in keys]
+        with self._ruleset_lock:
+            bitmasks = self.ruleset.available_channels(
+                self.region, locations, devices,
+                channel_list=self.channel_list, as_bitmask=True)
+        with self._lock:
+            self._counts["batches"] += 1
+            self._counts["exact_evaluations"] += len(keys)
+        return [int(bitmask) for bitmask in bitmasks]
+
+    def get_metrics(self):
+        """
+        Returns statistics about the queries answered so far:
+
+          * ``uptime_seconds``
+          * ``num_requests``: number of calls to \\
+            :meth:`get_available_channels`
+          * ``num_queries``, ``num_cache_hits``, ``num_grid_hits`` and \\
+            ``num_exact_evaluations``
+          * ``num_batches`` and ``mean_batch_size`` of the exact evaluations
+          * ``queries_per_second``: mean throughput since the engine was \\
+            created
+          * ``latency_seconds``: mean, median, 90th and 99th percentiles \\
+            and maximum latency of the most recent requests
+          * ``cache_size`` and ``num_grids``
+
+        :rtype: dict
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            latencies_seconds = numpy.array(self._latencies_seconds)
+            cache_size = len(self._cache)
+            num_grids = len(self._grids)
+
+        uptime_seconds = time.time() - self._start_time
+        metrics = {"uptime_seconds": uptime_seconds,
+                   "cache_size": cache_size,
+                   "num_grids": num_grids}
+        for name in ["requests", "queries", "cache_hits", "grid_hits",
+                     "exact_evaluations", "batches"]:
+            metrics["num_" + name] = counts.get(name, 0)
+        metrics["mean_batch_size"] = \
+            float(metrics["num_exact_evaluations"]) / metrics["num_batches"] \
+            if metrics["num_batches"] else 0.0
+        metrics["queries_per_second"] = \
+            metrics["num_queries"] / uptime_seconds if uptime_seconds else 0.0
+
+        if len(latencies_seconds):
+            (p50, p90, p99) = numpy.percentile(latencies_seconds,
+                                               [50, 90, 99])
+            metrics["latency_seconds"] = {
+                "mean": float(numpy.mean(latencies_seconds)),
+                "p50": float(p50), "p90": float(p90), "p99": float(p99),
+                "max": float(numpy.max(latencies_seconds))}
+        else:
+            metrics["latency_seconds"] = None
+        return metrics
+
+    def close(self):
+        """Stops the worker thread."""
+        self._batcher.close()
+
+
+def _parse_query(parameters):
+    """
+    Converts a JSON object (or the parameters of a GET request) into a query
+    for :meth:`WhitespaceQueryEngine.get_available_channels`.
+    """
+    if not isinstance(parameters, dict):
+        raise ValueError("A query must be an object")
+    try:
+        latitude = float(parameters["latitude"])
+        longitude = float(parameters["longitude"])
+    except KeyError as e:
+        raise ValueError("Missing parameter: %s" % e.args[0])
+
+    is_portable = parameters.get("is_portable", False)
+    if isinstance(is_portable, basestring):
+        if is_portable.lower() not in ["true", "false", "1", "0"]:
+            raise ValueError("Invalid value for is_portable: %s" %
+                             is_portable)
+        is_portable = is_portable.lower() in ["true", "1"]
+    haat_meters = parameters.get("haat_meters")
+    if haat_meters is not None:
+        haat_meters = float(haat_meters)
+    return (latitude, longitude, haat_meters, bool(is_portable))
+
+
+class WhitespaceQueryRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves the requests described in the module documentation."""
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        if url.path == "/metrics":
+            self._send_json(200, self.server.engine.get_metrics())
+        elif url.path == "/available_channels":
+            parameters = dict((key, values[-1]) for (key, values) in
+                              urlparse.parse_qs(url.query).items())
+            self._answer(lambda: _parse_query(parameters), False)
+        else:
+            self._send_json(404, {"error": "Unknown path: %s" % url.path})
+
+    def do_POST(self):
+        url = urlparse.urlparse(self.path)
+        if url.path != "/available_channels":
+            self._send_json(404, {"error": "Unknown path: %s" % url.path})
+            return
+
+        length = int(self.headers.getheader("content-length", 0))
+        body = self.rfile.read(length)
+
+        def parse_queries():
+            try:
+                queries = json.loads(body)
+            except ValueError:
+                raise ValueError("Invalid JSON")
+            if isinstance(queries, list):
+                return [_parse_query(query) for query in queries]
+            return _parse_query(queries)
+
+        self._answer(parse_queries, True)
+
+    def _answer(self, parse_queries, allow_lists):
+        try:
+            queries = parse_queries()
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        is_list = allow_lists and isinstance(queries, list)
+        if not is_list:
+            queries = [queries]
+        try:
+            answers = [{"channels": channels} for channels in
+                       self.server.engine.get_available_channels(queries)]
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        self._send_json(200, answers if is_list else answers[0])
+
+    def _send_json(self, status, content):
+        body = json.dumps(content)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.engine.log.debug("%s - %s" % (self.address_string(),
+                                                  format % args))
+
+
+class WhitespaceQueryHTTPServer(SocketServer.ThreadingMixIn,
+                                BaseHTTPServer.HTTPServer):
+    """HTTP server (one thread per connection) for a
+    :class:`WhitespaceQueryEngine`."""
+
+    daemon_threads = True
+
+    def __init__(self, server_address, engine):
+        BaseHTTPServer.HTTPServer.__init__(self, server_address,
+                                           WhitespaceQueryRequestHandler)
+        self.engine = engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Local whitespace database for the United States "
+                    "(FCC 2012 rules).")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--cache-size", type=int, default=100000)
+    parser.add_argument("--batch-window", type=float, default=0.002,
+                        help="seconds to wait for concurrent queries")
+    args = parser.parse_args(argv)
+
+    engine = WhitespaceQueryEngine(RegionUnitedStates(), RulesetFcc2012(),
+                                   cache_size=args.cache_size,
+                                   batch_window_seconds=args.batch_window)
+    server = WhitespaceQueryHTTPServer((args.host, args.port), engine)
+    engine.log.info("Serving on %s:%d" % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+from whitespace_server import WhitespaceQueryEngine, WhitespaceQueryHTTPServer
+from ruleset_fcc2012 import RulesetFcc2012
+from ruleset_fcc2012_test_base import RegionUnitedStatesTest
+from device import Device
+import json
+import numpy
+import threading
+import time
+import unittest
+import urllib2
+
+
+class WhitespaceQueryEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.region = RegionUnitedStatesTest()
+        self.ruleset = RulesetFcc2012()
+        random_state = numpy.random.RandomState(1)
+        self.locations = numpy.column_stack(
+            [random_state.uniform(36, 39.5, 300),
+             random_state.uniform(-124.5, -119.5, 300)])
+        # (HAAT, is portable)
+        self.device_classes = [(30, False), (5, False), (None, True)]
+        self.queries = [(latitude, longitude) +
+                        self.device_classes[index % 3] for
+                        (index, (latitude, longitude)) in
+                        enumerate(self.locations.tolist())]
+
+    def _get_expected_channels(self, queries):
+        devices = [Device(is_portable=is_portable, haat_meters=haat_meters)
+                   for (_, _, haat_meters, is_portable) in queries]
+        return self.ruleset.available_channels(
+            self.region, [query[:2] for query in queries], devices)
+
+    def test_matches_ruleset(self):
+        engine = WhitespaceQueryEngine(self.region, self.ruleset,
+                                       batch_window_seconds=0)
+        try:
+            expected = self._get_expected_channels(self.queries)
+            self.assertEqual(engine.get_available_channels(self.queries),
+                             expected)
+            # Repeated queries are served from the cache
+            self.assertEqual(engine.get_available_channels(self.queries[:50]),
+                             expected[:50])
+            metrics = engine.get_metrics()
+        finally:
+            engine.close()
+
+        self.assertEqual(metrics["num_requests"], 2)
+        self.assertEqual(metrics["num_queries"], 350)
+        self.assertEqual(metrics["num_cache_hits"], 50)
+        self.assertEqual(metrics["num_exact_evaluations"], 300)
+        self.assertEqual(metrics["num_batches"], 1)
+        self.assertEqual(metrics["cache_size"], 300)
+        self.assertTrue(metrics["latency_seconds"]["max"] >=
+                        metrics["latency_seconds"]["p50"] > 0)
+
+        self.assertRaises(ValueError, engine.get_available_channels,
+                          [(37.0, -122.0, None, False)])
+
+    def test_grid_matches_ruleset(self):
+        engine = WhitespaceQueryEngine(self.region, self.ruleset,
+                                       cache_size=0, batch_window_seconds=0)
+        try:
+            for (haat_meters, is_portable) in self.device_classes:
+                engine.add_grid(haat_meters, is_portable, (36, 39.5),
+                                (-124.5, -119.5), 71, 101)
+            self.assertEqual(engine.get_available_channels(self.queries),
+                             self._get_expected_channels(self.queries))
+            metrics = engine.get_metrics()
+        finally:
+            engine.close()
+
+        # Most queries are answered from the grids but some are too close to
+        # the edge of an exclusion
+        self.assertTrue(metrics["num_grid_hits"] > 150)
+        self.assertTrue(metrics["num_exact_evaluations"] > 0)
+        self.assertEqual(metrics["num_grid_hits"] +
+                         metrics["num_exact_evaluations"], 300)
+
+    def test_concurrent_queries_are_batched(self):
+        engine = WhitespaceQueryEngine(self.region, self.ruleset,
+                                       batch_window_seconds=0.2)
+        results = [None] * 10
+
+        def run_query(index):
+            results[index] = engine.get_available_channels(
+                self.queries[index * 10:(index + 1) * 10])
+
+        threads = [threading.Thread(target=run_query, args=(index,))
+                   for index in range(len(results))]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            metrics = engine.get_metrics()
+        finally:
+            engine.close()
+
+        self.assertEqual(sum(results, []),
+                         self._get_expected_channels(self.queries[:100]))
+        self.assertTrue(metrics["num_batches"] < len(results))
+        self.assertTrue(metrics["mean_batch_size"] > 10)
+
+
+    def test_queries_during_add_grid(self):
+        expected = self._get_expected_channels(self.queries)
+
+        # Records how many threads are using the ruleset at once
+        num_active_calls = [0]
+        max_num_active_calls = [0]
+        counter_lock = threading.Lock()
+        get_cached_protected_radius_km = \
+            self.ruleset._get_cached_protected_radius_km
+
+        def count_active_calls(*args, **kwargs):
+            with counter_lock:
+                num_active_calls[0] += 1
+                max_num_active_calls[0] = max(max_num_active_calls[0],
+                                              num_active_calls[0])
+            try:
+                time.sleep(0.0005)
+                return get_cached_protected_radius_km(*args, **kwargs)
+            finally:
+                with counter_lock:
+                    num_active_calls[0] -= 1
+        self.ruleset._get_cached_protected_radius_km = count_active_calls
+
+        engine = WhitespaceQueryEngine(self.region, self.ruleset,
+                                       cache_size=0, batch_window_seconds=0)
+        grid_thread = threading.Thread(
+            target=engine.add_grid,
+            args=(30, False, (36, 39.5), (-124.5, -119.5), 71, 101))
+        results = []
+        try:
+            grid_thread.start()
+            while grid_thread.is_alive() or not results:
+                index = (len(results) * 10) % len(self.queries)
+                results.append((index, engine.get_available_channels(
+                    self.queries[index:index + 10])))
+            grid_thread.join()
+        finally:
+            engine.close()
+
+        self.assertEqual(engine.get_metrics()["num_grids"], 1)
+        self.assertEqual(max_num_active_calls[0], 1)
+        for (index, channels) in results:
+            self.assertEqual(channels, expected[index:index + 10])
+
+class WhitespaceQueryHTTPServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.region = RegionUnitedStatesTest()
+        self.ruleset = RulesetFcc2012()
+        self.engine = WhitespaceQueryEngine(self.region, self.ruleset,
+                                            batch_window_seconds=0)
+        self.server = WhitespaceQueryHTTPServer(("localhost", 0), self.engine)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = "http://localhost:%d" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.engine.close()
+
+    def _request(self, path, body=None):
+        try:
+            response = urllib2.urlopen(self.url + path, body)
+        except urllib2.HTTPError as e:
+            return (e.code, json.loads(e.read()))
+        return (response.getcode(), json.loads(response.read()))
+
+    def test_queries(self):
+        fixed_device = Device(is_portable=False, haat_meters=30)
+        portable_device = Device(is_portable=True)
+        locations = [(37.5, -122.0), (38.9, -120.2)]
+        expected = self.ruleset.available_channels(
+            self.region, locations, [fixed_device, portable_device])
+
+        self.assertEqual(self._request(
+            "/available_channels?latitude=37.5&longitude=-122.0&"
+            "haat_meters=30&is_portable=false"),
+            (200, {"channels": expected[0]}))
+        self.assertEqual(self._request("/available_channels", json.dumps(
+            [{"latitude": 37.5, "longitude": -122.0, "haat_meters": 30},
+             {"latitude": 38.9, "longitude": -120.2, "is_portable": True}])),
+            (200, [{"channels": channels} for channels in expected]))
+
+        (status, metrics) = self._request("/metrics")
+        self.assertEqual(status, 200)
+        self.assertEqual(metrics["num_queries"], 3)
+        self.assertEqual(metrics["num_cache_hits"], 1)
+
+    def test_invalid_requests(self):
+        for (path, body) in [("/available_channels?latitude=37.5", None),
+                             ("/available_channels?latitude=37.5&"
+                              "longitude=-122.0", None),
+                             ("/available_channels", "{"),
+                             ("/available_channels", "[1]"),
+                             ("/unknown", None)]:
+            (status, content) = self._request(path, body)
+            self.assertTrue(status in [400, 404])
+            self.assertTrue("error" in content)
+
+
+from custom_logging import getCurrentLogLevel, changeLogLevel, disableLogging
+original_log_level = getCurrentLogLevel()
+disableLogging()
+unittest.main()
+changeLogLevel(original_log_level)